@@ -0,0 +1,187 @@
+"""
+End-to-end load scenarios for the real GatewayManager against in-process stand-ins: a
+pymodbus TCP server, an NMEA TCP/UDP emitter and an MQTT broker sink.
+
+Capture-to-publish latency is measured from the binary batch payloads, whose records carry
+the capture timestamp taken by the collector, to the moment the broker stand-in receives
+them. CPU and RSS cover the whole process, stand-ins included.
+
+    python -m benchmarks.bench_gateway --scenario all --duration 10
+    python -m benchmarks.bench_gateway --scenario broker_outage --json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import resource
+import socket
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+from benchmarks.standins.modbus_server import ModbusServerStandIn, free_port
+from benchmarks.standins.mqtt_broker import MqttBrokerStandIn, ReceivedMessage
+from benchmarks.standins.nmea_emitter import NmeaEmitterStandIn, emitter_sensors
+from src.gateway_manager import GatewayManager
+from src.models.config_models import AppConfig
+from src.publishers.batch_codec import decode_batch
+
+SCENARIOS = {
+    "many_sensors": {"modbus_sensors": 2000, "nmea_mode": None, "nmea_rate": 0},
+    "high_nmea_rate": {"modbus_sensors": 0, "nmea_mode": "tcp", "nmea_rate": 20000},
+    "nmea_udp": {"modbus_sensors": 0, "nmea_mode": "udp", "nmea_rate": 5000},
+    "mixed": {"modbus_sensors": 500, "nmea_mode": "tcp", "nmea_rate": 2000},
+    "broker_outage": {"modbus_sensors": 500, "nmea_mode": "tcp", "nmea_rate": 500, "outage": True},
+}
+
+
+class _Recorder:
+    """Collects batch records arriving at the broker stand-in(s)."""
+
+    def __init__(self, batch_topic: str):
+        self.batch_topic = batch_topic
+        self.latencies_ms: List[float] = []
+
+    def on_message(self, message: ReceivedMessage):
+        if message.topic != self.batch_topic:
+            return
+        received_ms = message.received_ns / 1e6
+        for record in decode_batch(message.payload).records:
+            self.latencies_ms.append(received_ms - record.timestamp_ms)
+
+
+def _percentile(sorted_values: List[float], fraction: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    return round(sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))], 2)
+
+
+def _rss_mb() -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return round(int(line.split()[1]) / 1024, 1)
+    return 0.0
+
+
+def _build_config(spec: dict, modbus_port: int, nmea_port: int, broker_port: int, spool_dir: str) -> AppConfig:
+    sensors = [{"id": f"mb_{i}", "name": f"mb_{i}", "collector_type": "modbus_tcp",
+                "collector_config": {"register_address": i},
+                "publisher_config": {"mqtt_topic_suffix": f"bench/modbus/{i}", "unit": "", "change_threshold": 0.0}}
+               for i in range(spec["modbus_sensors"])]
+    nmea_config: Dict = {"enabled": False}
+    if spec["nmea_mode"]:
+        sensors += emitter_sensors()
+        source = {"name": "bench", "type": "tcp_client" if spec["nmea_mode"] == "tcp" else "udp",
+                  "host": "127.0.0.1", "port": nmea_port, "connection_retry_delay_seconds": 1}
+        nmea_config = {"enabled": True, "sources": [source]}
+    return AppConfig(
+        sensors=sensors,
+        collectors={"modbus_collector": {"enabled": bool(spec["modbus_sensors"]), "host": "127.0.0.1",
+                                         "port": modbus_port, "default_polling_interval_seconds": 1},
+                    "nmea_collector": nmea_config},
+        mqtt_publisher={"broker_host": "127.0.0.1", "broker_port": broker_port, "engine": "asyncio",
+                        "keepalive_seconds": 60, "reconnect_delay_seconds": 1, "max_inflight_messages": 1000,
+                        "batch": {"enabled": True},
+                        "spool": {"enabled": bool(spec.get("outage")), "directory": spool_dir,
+                                  "replay_rate_per_second": 2000}},
+        metrics={"http_port": 0})
+
+
+async def run_scenario(name: str, spec: dict, duration: float) -> dict:
+    modbus = ModbusServerStandIn(registers=max(spec["modbus_sensors"], 1)) if spec["modbus_sensors"] else None
+    broker_port = free_port()
+    nmea_port = free_port(kind=socket.SOCK_DGRAM) if spec["nmea_mode"] == "udp" else 0
+    nmea = NmeaEmitterStandIn(mode=spec["nmea_mode"], rate=spec["nmea_rate"], target_port=nmea_port) if spec["nmea_mode"] else None
+
+    with tempfile.TemporaryDirectory() as spool_dir:
+        config = _build_config(spec, modbus.port if modbus else 0, (nmea.port or nmea_port) if nmea else 0,
+                               broker_port, spool_dir)
+        recorder = _Recorder(f"{config.mqtt_publisher.topic_prefix}/{config.mqtt_publisher.batch.topic_suffix}")
+        brokers = [MqttBrokerStandIn(port=broker_port, on_message=recorder.on_message)]
+        await brokers[0].start()
+        if modbus: await modbus.start()
+        if nmea: await nmea.start()
+
+        gateway = GatewayManager(config)
+        cpu_started = time.process_time()
+        started = time.perf_counter()
+        gateway_task = asyncio.create_task(gateway.start())
+        result: Dict = {}
+        if spec.get("outage"):
+            await asyncio.sleep(duration / 3)
+            await brokers[0].stop()
+            outage_started = time.perf_counter()
+            await asyncio.sleep(duration / 3)
+            brokers.append(MqttBrokerStandIn(port=broker_port, on_message=recorder.on_message))
+            await brokers[1].start()
+            result["outage_seconds"] = round(time.perf_counter() - outage_started, 2)
+            await asyncio.sleep(duration / 3)
+            # Recovery: wait for the spool to drain, bounded by another full duration
+            publisher = gateway.mqtt_publisher
+            recovery_deadline = time.perf_counter() + duration
+            while publisher.has_spool_backlog() and time.perf_counter() < recovery_deadline:
+                await asyncio.sleep(0.1)
+            result["spooled"] = publisher.spooled_messages
+            result["replayed"] = publisher.replayed_messages
+        else:
+            await asyncio.sleep(duration)
+        elapsed = time.perf_counter() - started
+
+        await gateway.stop()
+        await gateway_task
+        cpu = time.process_time() - cpu_started
+        if nmea: await nmea.stop()
+        if modbus: await modbus.stop()
+        for broker in brokers:
+            await broker.stop()
+
+    latencies = sorted(recorder.latencies_ms)
+    pipeline = gateway.get_pipeline_stats()
+    result.update({
+        "duration_seconds": round(elapsed, 2),
+        "readings_captured": pipeline.enqueued,
+        "readings_dropped": pipeline.dropped,
+        "readings_published": len(latencies),
+        "readings_per_second": round(len(latencies) / elapsed, 1),
+        "broker_messages": sum(b.stats.messages for b in brokers),
+        "latency_ms": {"p50": _percentile(latencies, 0.50), "p99": _percentile(latencies, 0.99),
+                       "max": round(latencies[-1], 2) if latencies else None},
+        "cpu_seconds": round(cpu, 2),
+        "cpu_percent": round(100 * cpu / elapsed, 1),
+        "rss_mb": _rss_mb(),
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    })
+    if nmea:
+        result["nmea_sentences_sent"] = nmea.sentences_sent
+    return result
+
+
+async def _main(args) -> dict:
+    names = list(SCENARIOS) if args.scenario == "all" else args.scenario.split(",")
+    results = {"duration_seconds": args.duration, "scenarios": {}}
+    for name in names:
+        results["scenarios"][name] = await run_scenario(name, SCENARIOS[name], args.duration)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", default="all", help=f"all or a comma-separated list of: {', '.join(SCENARIOS)}")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of load per scenario")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results only")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    results = asyncio.run(_main(args))
+    if args.json:
+        print(json.dumps(results))
+        return
+    for name, r in results["scenarios"].items():
+        latency = r["latency_ms"]
+        print(f"{name:16s} {r['readings_per_second']:>10,.0f} readings/s  p50 {latency['p50']} ms  p99 {latency['p99']} ms  "
+              f"cpu {r['cpu_percent']}%  rss {r['rss_mb']} MB")
+
+
+if __name__ == "__main__":
+    main()
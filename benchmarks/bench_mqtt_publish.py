@@ -0,0 +1,85 @@
+"""
+Publish throughput of MQTTPublisher against the in-process broker stand-in, comparing the
+paho engine with the asyncio engine (MQTT 3.1.1, and MQTT 5 with topic aliases).
+
+    python -m benchmarks.bench_mqtt_publish --readings 20000
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from benchmarks.standins.mqtt_broker import MqttBrokerStandIn
+from src.models.config_models import MqttPublisherConfig
+from src.models.sensor_reading import SensorDescriptor, SensorReading
+from src.publishers.mqtt_publisher import MQTTPublisher
+
+SCENARIOS = {
+    "paho_v311": {"engine": "paho", "mqtt_version": "3.1.1"},
+    "asyncio_v311": {"engine": "asyncio", "mqtt_version": "3.1.1"},
+    "asyncio_v5_aliases": {"engine": "asyncio", "mqtt_version": "5", "topic_alias_maximum": 64},
+}
+
+
+def _readings(count: int, sensors: int) -> list[SensorReading]:
+    descriptors = [SensorDescriptor(i, f"sensor_{i}", "°C", f"main-crane/luffing/temp-mot-{i}", 0.5)
+                   for i in range(sensors)]
+    return [SensorReading(descriptors[i % sensors], float(i)) for i in range(count)]
+
+
+async def _run_scenario(name: str, overrides: dict, readings: list[SensorReading], batch_size: int) -> dict:
+    broker = MqttBrokerStandIn(topic_alias_maximum=64)
+    port = await broker.start()
+    config = MqttPublisherConfig(broker_host="127.0.0.1", broker_port=port, client_id_prefix=f"bench-{name}",
+                                 keepalive_seconds=60, max_inflight_messages=200, **overrides)
+    publisher = MQTTPublisher(config)
+    await publisher.start()
+    for _ in range(200):
+        if publisher.is_connected(): break
+        await asyncio.sleep(0.01)
+
+    started = time.perf_counter()
+    cpu_started = time.process_time()
+    for i in range(0, len(readings), batch_size):
+        await publisher.publish_readings(readings[i:i + batch_size])
+    while broker.stats.messages < len(readings) and time.perf_counter() - started < 60:
+        await asyncio.sleep(0.001)
+    elapsed = time.perf_counter() - started
+    cpu = time.process_time() - cpu_started
+
+    await publisher.stop()
+    await broker.stop()
+    return {"seconds": round(elapsed, 4), "messages": broker.stats.messages,
+            "messages_per_second": round(broker.stats.messages / elapsed),
+            "cpu_seconds": round(cpu, 4),
+            "wire_bytes_per_message": round(broker.stats.wire_bytes / max(broker.stats.messages, 1), 1)}
+
+
+async def _main(args) -> dict:
+    readings = _readings(args.readings, args.sensors)
+    results = {"readings": args.readings}
+    for name, overrides in SCENARIOS.items():
+        results[name] = await _run_scenario(name, overrides, readings, args.batch_size)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--readings", type=int, default=20000)
+    parser.add_argument("--sensors", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results only")
+    args = parser.parse_args()
+
+    results = asyncio.run(_main(args))
+    if args.json:
+        print(json.dumps(results))
+        return
+    for name in SCENARIOS:
+        r = results[name]
+        print(f"{name:20s} {r['messages_per_second']:>8,d} msg/s  cpu {r['cpu_seconds']:.2f}s  "
+              f"{r['wire_bytes_per_message']} B/msg on the wire")
+
+
+if __name__ == "__main__":
+    main()
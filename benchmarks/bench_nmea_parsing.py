@@ -0,0 +1,152 @@
+"""
+Micro-benchmark of the NMEA ingest path: the previous readline + pynmea2 path against the
+chunked framer, byte-level checksum and fast-path parser.
+
+    python -m benchmarks.bench_nmea_parsing --sentences 200000
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import datetime, timezone
+
+import pynmea2
+
+from src.collectors.nmea_collector import NmeaCollector
+from src.collectors.nmea_framing import NmeaFramer
+from src.collectors.nmea_router import NmeaRouter
+from src.models.config_models import AppConfig, SensorConfig, SensorNmeaCollectorParams
+from src.models.sensor_reading import SensorReading
+
+SAMPLE_SENTENCES = [
+    "$MGROT,12.5,A",
+    "$HEHDT,274.07,T",
+    "$HEHDG,274.07,,,2.5,E",
+    "$GPVTG,054.7,T,034.4,M,005.5,N,010.2,K,A",
+    "$WIMWV,214.8,R,12.1,N,A",
+    "$GPGGA,123519,4807.038,N,01131.000,E,1,08,0.9,545.4,M,46.9,M,,",
+    "$GPGSV,3,1,11,03,03,111,00,04,15,270,00,06,01,010,00,13,06,292,00",
+    "$GPZDA,201530.00,04,07,2002,00,00",
+]
+AIS_SENTENCE = "!AIVDM,1,1,,B,177KQJ5000G?tO`K>RA1wUbN0TKH,0*5C"
+
+
+def _with_checksum(sentence: str) -> str:
+    checksum = 0
+    for char in sentence[1:]:
+        checksum ^= ord(char)
+    return f"{sentence}*{checksum:02X}"
+
+
+def _sensor(sensor_id: str, talker: str, sentence_type: str, value_field: str) -> dict:
+    return {"id": sensor_id, "name": sensor_id, "collector_type": "nmea",
+            "collector_config": {"expected_talker_id": talker, "expected_sentence_type": sentence_type,
+                                 "value_field": value_field},
+            "publisher_config": {"mqtt_topic_suffix": f"bench/{sensor_id}", "unit": "", "change_threshold": 0.0}}
+
+
+BENCH_SENSORS = [
+    _sensor("rot", "MG", "ROT", "rate_of_turn"),
+    _sensor("hdt", "HE", "HDT", "heading"),
+    _sensor("hdg", "HE", "HDG", "heading"),
+    _sensor("sog", "GP", "VTG", "spd_over_grnd_kts"),
+    _sensor("wind_speed", "WI", "MWV", "wind_speed"),
+    _sensor("wind_angle", "WI", "MWV", "wind_angle"),
+    _sensor("altitude", "GP", "GGA", "altitude"),
+    _sensor("sats", "GP", "GGA", "num_sats"),
+]
+
+
+class _CountingSink:
+    def __init__(self):
+        self.count = 0
+
+    async def put(self, item):
+        self.count += 1
+
+
+def build_stream(sentence_count: int, seed: int = 7) -> bytes:
+    rng = random.Random(seed)
+    pool = [_with_checksum(s) for s in SAMPLE_SENTENCES] + [AIS_SENTENCE]
+    return "".join(rng.choice(pool) + "\r\n" for _ in range(sentence_count)).encode("ascii")
+
+
+async def _legacy_path(stream: bytes, sensors: list[SensorConfig], sink: _CountingSink):
+    """The pre-framer ingest path: readline, decode, strip, full pynmea2 parse, linear sensor scan."""
+    reader = asyncio.StreamReader(limit=2 ** 20)
+    reader.feed_data(stream)
+    reader.feed_eof()
+    sensor_configs = {s.id: s for s in sensors}
+    while True:
+        line_bytes = await reader.readline()
+        if not line_bytes:
+            break
+        clean_line = line_bytes.decode("ascii", errors="ignore").strip()
+        try:
+            nmea_msg = pynmea2.parse(clean_line)
+        except pynmea2.ParseError:
+            continue
+        for sensor_id, sensor_cfg in sensor_configs.items():
+            params = sensor_cfg.collector_config
+            if not isinstance(params, SensorNmeaCollectorParams):
+                continue
+            if nmea_msg.talker == params.expected_talker_id and nmea_msg.sentence_type == params.expected_sentence_type:
+                await sink.put(SensorReading.from_values(sensor_id=sensor_id, value=None,
+                                                         unit=sensor_cfg.publisher_config.unit,
+                                                         timestamp=datetime.now(timezone.utc)))
+                break
+
+
+async def _framed_path(stream: bytes, sensors: list[SensorConfig], sink: _CountingSink, chunk_size: int):
+    collector = NmeaCollector(AppConfig().collectors.nmea_collector)
+    router = NmeaRouter(sensors)
+    collector._data_queue = sink
+    reader = asyncio.StreamReader(limit=2 ** 20)
+    reader.feed_data(stream)
+    reader.feed_eof()
+    framer = NmeaFramer()
+    while True:
+        chunk = await reader.read(chunk_size)
+        if not chunk:
+            break
+        for frame in framer.feed(chunk):
+            await collector._process_frame(router, frame)
+
+
+def _run(coro_factory, sentence_count: int) -> dict:
+    sink = _CountingSink()
+    started = time.perf_counter()
+    asyncio.run(coro_factory(sink))
+    elapsed = time.perf_counter() - started
+    return {"seconds": round(elapsed, 4), "sentences_per_second": round(sentence_count / elapsed),
+            "readings": sink.count}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sentences", type=int, default=100000)
+    parser.add_argument("--chunk-bytes", type=int, default=65536)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results only")
+    args = parser.parse_args()
+
+    sensors = AppConfig(sensors=BENCH_SENSORS).sensors
+    stream = build_stream(args.sentences)
+    results = {
+        "sentences": args.sentences,
+        "legacy_readline_pynmea2": _run(lambda sink: _legacy_path(stream, sensors, sink), args.sentences),
+        "framed_fast_path": _run(lambda sink: _framed_path(stream, sensors, sink, args.chunk_bytes), args.sentences),
+    }
+    results["speedup"] = round(results["framed_fast_path"]["sentences_per_second"]
+                               / results["legacy_readline_pynmea2"]["sentences_per_second"], 2)
+    if args.json:
+        print(json.dumps(results))
+        return
+    for name in ("legacy_readline_pynmea2", "framed_fast_path"):
+        r = results[name]
+        print(f"{name:26s} {r['sentences_per_second']:>10,d} sentences/s  ({r['seconds']}s, {r['readings']} readings)")
+    print(f"speedup: {results['speedup']}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Cold-start time of the gateway: interpreter start, imports, configuration load and
+GatewayManager construction, each run in a fresh interpreter as after a power cycle.
+
+Profiles vary which collectors the configured sensors use (only the plugins they need are
+imported); "eager_imports" imports every collector and publisher module up front, as the
+gateway did before plugins were loaded lazily. Every profile runs with the validated-config
+cache disabled ("cold") and primed ("cached").
+
+    python -m benchmarks.bench_startup --sensors 2000 --runs 7
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import yaml
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+HEAVY_MODULES = ("pymodbus", "pynmea2", "paho")
+
+PROFILES = {
+    "nmea_only": {"modbus": False, "nmea": True, "engine": "asyncio"},
+    "modbus_only": {"modbus": True, "nmea": False, "engine": "asyncio"},
+    "mixed_paho": {"modbus": True, "nmea": True, "engine": "paho"},
+    "eager_imports": {"modbus": True, "nmea": True, "engine": "paho", "eager": True},
+}
+
+CHILD = r"""
+import asyncio, json, sys, time
+started = time.perf_counter()
+from pathlib import Path
+from src.config_loader import load_config
+from src.gateway_manager import GatewayManager
+if sys.argv[3] == "1":
+    from src.plugins import COLLECTORS, PUBLISHERS
+    for registry in (COLLECTORS, PUBLISHERS):
+        for name in registry.names():
+            registry.load(name)
+    import paho.mqtt.client
+imported = time.perf_counter()
+config = load_config(Path(sys.argv[1]), use_cache=sys.argv[2] == "1")
+loaded = time.perf_counter()
+
+async def build():
+    GatewayManager(config)  # Modbus clients need a running loop, as under src.main
+    return time.perf_counter()
+
+built = asyncio.run(build())
+print(json.dumps({"import_ms": (imported - started) * 1000, "config_ms": (loaded - imported) * 1000,
+                  "manager_ms": (built - loaded) * 1000,
+                  "heavy_modules": [m for m in %r if m in sys.modules]}))
+""" % (HEAVY_MODULES,)
+
+
+def _write_config(path: Path, profile: dict, sensors: int):
+    config: Dict = {"sensors": [], "metrics": {"http_enabled": False},
+                    "mqtt_publisher": {"engine": profile["engine"]},
+                    "collectors": {"modbus_collector": {"enabled": profile["modbus"]},
+                                   "nmea_collector": {"enabled": profile["nmea"]}}}
+    kinds = [k for k in ("modbus", "nmea") if profile[k]]
+    for i in range(sensors):
+        publisher = {"mqtt_topic_suffix": f"bench/{i}", "unit": "", "change_threshold": 0.5}
+        if kinds[i % len(kinds)] == "modbus":
+            config["sensors"].append({"id": f"s{i}", "name": f"s{i}", "collector_type": "modbus_tcp",
+                                      "collector_config": {"register_address": i % 60000},
+                                      "publisher_config": publisher})
+        else:
+            config["sensors"].append({"id": f"s{i}", "name": f"s{i}", "collector_type": "nmea",
+                                      "collector_config": {"expected_talker_id": "HE", "expected_sentence_type": "HDT"},
+                                      "publisher_config": publisher})
+    path.write_text(yaml.safe_dump(config))
+
+
+def _run_child(config_path: Path, cache_path: Path, use_cache: bool, eager: bool) -> dict:
+    env = dict(os.environ, GATEWAY_CONFIG_CACHE=str(cache_path), PYTHONPATH=str(REPO_ROOT))
+    started = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", CHILD, str(config_path), "1" if use_cache else "0", "1" if eager else "0"],
+                         cwd=REPO_ROOT, env=env, capture_output=True, text=True)
+    if out.returncode:
+        raise RuntimeError(f"startup child failed:\n{out.stderr}")
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    result["process_ms"] = (time.perf_counter() - started) * 1000
+    return result
+
+
+def run_profile(profile: dict, sensors: int, runs: int) -> dict:
+    result = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        config_path, cache_path = Path(tmp) / "gateway_config.yml", Path(tmp) / "config_cache.pickle"
+        _write_config(config_path, profile, sensors)
+        eager = profile.get("eager", False)
+        for mode, use_cache in (("cold", False), ("cached", True)):
+            if use_cache:
+                _run_child(config_path, cache_path, True, eager)  # prime the cache
+            samples: List[dict] = [_run_child(config_path, cache_path, use_cache, eager) for _ in range(runs)]
+            result[mode] = {key: round(statistics.median(s[key] for s in samples), 1)
+                            for key in ("process_ms", "import_ms", "config_ms", "manager_ms")}
+            result[mode]["heavy_modules"] = samples[-1]["heavy_modules"]
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profile", default="all", help=f"all or a comma-separated list of: {', '.join(PROFILES)}")
+    parser.add_argument("--sensors", type=int, default=2000, help="sensors in the generated configuration")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per measurement (median reported)")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results only")
+    args = parser.parse_args()
+
+    names = list(PROFILES) if args.profile == "all" else args.profile.split(",")
+    results = {"sensors": args.sensors, "runs": args.runs,
+               "profiles": {name: run_profile(PROFILES[name], args.sensors, args.runs) for name in names}}
+    if args.json:
+        print(json.dumps(results))
+        return
+    for name, r in results["profiles"].items():
+        for mode in ("cold", "cached"):
+            m = r[mode]
+            print(f"{name:14s} {mode:6s} total {m['process_ms']:7.1f} ms  imports {m['import_ms']:6.1f}  "
+                  f"config {m['config_ms']:6.1f}  manager {m['manager_ms']:6.1f}  loaded: {', '.join(m['heavy_modules']) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
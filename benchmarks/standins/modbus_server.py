@@ -0,0 +1,91 @@
+"""
+In-process Modbus TCP server for benchmarks, backed by pymodbus. It exposes a block of
+holding registers and can rewrite all of them periodically so that every poll sees new
+values. Updates are written over Modbus (FC16) by a side client, which works the same
+across pymodbus datastore implementations.
+"""
+import asyncio
+import socket
+from typing import Optional
+
+from pymodbus.client import AsyncModbusTcpClient
+from pymodbus.datastore import ModbusSequentialDataBlock, ModbusServerContext
+from pymodbus.server import StartAsyncTcpServer
+
+from src.collectors.modbus_connection_pool import _UNIT_KWARG
+
+try:
+    from pymodbus.datastore import ModbusDeviceContext as _DeviceContext
+except ImportError:  # pymodbus < 3.10
+    from pymodbus.datastore import ModbusSlaveContext as _DeviceContext
+
+
+def free_port(host: str = "127.0.0.1", kind: int = socket.SOCK_STREAM) -> int:
+    with socket.socket(socket.AF_INET, kind) as s:
+        s.bind((host, 0))
+        return s.getsockname()[1]
+
+
+class ModbusServerStandIn:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, registers: int = 4000,
+                 update_interval: Optional[float] = 1.0):
+        self.host = host
+        self.port = port or free_port(host)
+        self.registers = registers
+        self.update_interval = update_interval
+        self.updates = 0
+        # pymodbus shifts addresses by one for sequential blocks, so register 0 lives at index 1
+        device = _DeviceContext(hr=ModbusSequentialDataBlock(1, [0] * registers))
+        try:
+            self._context = ModbusServerContext(devices=device, single=True)
+        except TypeError:
+            self._context = ModbusServerContext(slaves=device, single=True)
+        self._server_task: Optional[asyncio.Task] = None
+        self._update_task: Optional[asyncio.Task] = None
+        self._writer: Optional[AsyncModbusTcpClient] = None
+
+    async def start(self) -> int:
+        self._server_task = asyncio.create_task(StartAsyncTcpServer(context=self._context, address=(self.host, self.port)))
+        for _ in range(100):
+            try:
+                _, writer = await asyncio.open_connection(self.host, self.port)
+                writer.close()
+                break
+            except OSError:
+                await asyncio.sleep(0.02)
+        if self.update_interval:
+            self._writer = AsyncModbusTcpClient(self.host, port=self.port)
+            await self._writer.connect()
+            self._update_task = asyncio.create_task(self._update_loop())
+        return self.port
+
+    async def set_values(self, start: int, values: list[int]):
+        for offset in range(0, len(values), 120):
+            await self._writer.write_registers(start + offset, values[offset:offset + 120], **{_UNIT_KWARG: 1})
+
+    async def _update_loop(self):
+        loop = asyncio.get_running_loop()
+        next_update = loop.time()
+        while True:
+            self.updates += 1
+            base = self.updates % 1000
+            await self.set_values(0, [(base + i) & 0xFFFF for i in range(self.registers)])
+            next_update += self.update_interval
+            await asyncio.sleep(max(0.0, next_update - loop.time()))
+
+    async def stop(self):
+        # The side client is closed first: pymodbus does not let a cancel interrupt a write in
+        # flight, and the server waits for open connections when it shuts down
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._update_task is not None:
+            self._update_task.cancel()
+            try: await self._update_task
+            except (asyncio.CancelledError, Exception): pass
+            self._update_task = None
+        if self._server_task is not None:
+            self._server_task.cancel()
+            try: await self._server_task
+            except (asyncio.CancelledError, Exception): pass
+            self._server_task = None
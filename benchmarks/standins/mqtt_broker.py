@@ -0,0 +1,137 @@
+"""
+Minimal in-process MQTT broker sink for benchmarks. It accepts MQTT 3.1.1 and 5 clients,
+acknowledges QoS 1 publishes, resolves topic aliases and records what arrived. It does not
+route messages to subscribers.
+"""
+import asyncio
+import struct
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from src.publishers.mqtt_async_client import (CONNACK, CONNECT, DISCONNECT, PINGREQ, PINGRESP, PROP_TOPIC_ALIAS,
+                                              PROP_TOPIC_ALIAS_MAXIMUM, PUBACK, PUBLISH, MQTT_V5, build_packet,
+                                              decode_properties, encode_varint)
+
+_U16 = struct.Struct(">H")
+
+
+@dataclass
+class ReceivedMessage:
+    received_ns: int
+    topic: str
+    payload: bytes
+
+
+@dataclass
+class BrokerStats:
+    connections: int = 0
+    messages: int = 0
+    payload_bytes: int = 0
+    wire_bytes: int = 0
+    topics: Dict[str, int] = field(default_factory=dict)
+
+
+class MqttBrokerStandIn:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, topic_alias_maximum: int = 64,
+                 keep_messages: bool = False, on_message: Optional[Callable[[ReceivedMessage], None]] = None):
+        self.host = host
+        self.port = port
+        self.topic_alias_maximum = topic_alias_maximum
+        self.keep_messages = keep_messages
+        self.on_message = on_message
+        self.messages: List[ReceivedMessage] = []
+        self.stats = BrokerStats()
+        self._server: Optional[asyncio.base_events.Server] = None
+        self._writers: Set[asyncio.StreamWriter] = set()
+
+    async def start(self) -> int:
+        self._server = await asyncio.start_server(self._handle_client, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def stop(self):
+        """Stops listening and drops every client, e.g. to simulate an uplink outage."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        for writer in list(self._writers):
+            writer.close()
+        self._writers.clear()
+
+    async def _read_packet(self, reader: asyncio.StreamReader) -> Tuple[int, bytes, int]:
+        header = (await reader.readexactly(1))[0]
+        length, shift, length_bytes = 0, 0, 0
+        while True:
+            byte = (await reader.readexactly(1))[0]
+            length_bytes += 1
+            length |= (byte & 0x7F) << shift
+            if not byte & 0x80:
+                break
+            shift += 7
+        body = await reader.readexactly(length) if length else b""
+        return header, body, 1 + length_bytes + length
+
+    def _connack(self, version: int) -> bytes:
+        if version == MQTT_V5:
+            properties = bytes((PROP_TOPIC_ALIAS_MAXIMUM,)) + _U16.pack(self.topic_alias_maximum)
+            return build_packet(CONNACK, b"\x00\x00" + encode_varint(len(properties)) + properties)
+        return build_packet(CONNACK, b"\x00\x00")
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._writers.add(writer)
+        aliases: Dict[int, str] = {}
+        version = 4
+        try:
+            while True:
+                header, body, wire_size = await self._read_packet(reader)
+                packet_type = header & 0xF0
+                self.stats.wire_bytes += wire_size
+                if packet_type == CONNECT:
+                    name_length = _U16.unpack_from(body, 0)[0]
+                    version = body[2 + name_length]
+                    self.stats.connections += 1
+                    writer.write(self._connack(version))
+                elif packet_type == PUBLISH:
+                    qos = (header >> 1) & 0x03
+                    topic_length = _U16.unpack_from(body, 0)[0]
+                    topic = body[2:2 + topic_length].decode("utf-8")
+                    pos = 2 + topic_length
+                    packet_id = 0
+                    if qos:
+                        packet_id = _U16.unpack_from(body, pos)[0]
+                        pos += 2
+                    if version == MQTT_V5:
+                        properties, pos = decode_properties(body, pos)
+                        alias = properties.get(PROP_TOPIC_ALIAS)
+                        if alias is not None:
+                            if topic:
+                                aliases[alias] = topic
+                            else:
+                                topic = aliases.get(alias, "")
+                    payload = body[pos:]
+                    self._record(topic, payload)
+                    if qos:
+                        writer.write(build_packet(PUBACK, _U16.pack(packet_id)))
+                elif packet_type == PINGREQ:
+                    writer.write(bytes((PINGRESP, 0)))
+                elif packet_type == DISCONNECT:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    def _record(self, topic: str, payload: bytes):
+        stats = self.stats
+        stats.messages += 1
+        stats.payload_bytes += len(payload)
+        stats.topics[topic] = stats.topics.get(topic, 0) + 1
+        if self.keep_messages or self.on_message:
+            message = ReceivedMessage(time.time_ns(), topic, payload)
+            if self.keep_messages:
+                self.messages.append(message)
+            if self.on_message:
+                self.on_message(message)
@@ -0,0 +1,121 @@
+"""
+NMEA 0183 emitter for benchmarks. In "tcp" mode it listens and streams sentences to every
+client (the gateway connects with a tcp_client source); in "udp" mode it sends datagrams to
+a target (the gateway listens with a udp source). Sentence values change on every
+sentence so that deadbands do not hide the load.
+"""
+import asyncio
+import socket
+from typing import List, Optional, Set
+
+from .modbus_server import free_port
+
+# (talker + sentence type, template with one {v} placeholder), rotated in this order
+SENTENCE_TEMPLATES = [
+    ("HEHDT", "HEHDT,{v:.2f},T"),
+    ("MGROT", "MGROT,{v:.1f},A"),
+    ("WIMWV", "WIMWV,214.8,R,{v:.1f},N,A"),
+    ("GPVTG", "GPVTG,054.7,T,034.4,M,{v:.1f},N,010.2,K,A"),
+]
+
+
+def with_checksum(body: str) -> bytes:
+    checksum = 0
+    for char in body:
+        checksum ^= ord(char)
+    return f"${body}*{checksum:02X}\r\n".encode("ascii")
+
+
+def emitter_sensors() -> List[dict]:
+    """Sensor definitions matching SENTENCE_TEMPLATES, for use in a benchmark AppConfig."""
+    return [{"id": f"nmea_{address.lower()}", "name": address, "collector_type": "nmea",
+             "collector_config": {"expected_talker_id": address[:2], "expected_sentence_type": address[2:]},
+             "publisher_config": {"mqtt_topic_suffix": f"bench/nmea/{address.lower()}", "unit": "",
+                                  "change_threshold": 0.0}}
+            for address, _ in SENTENCE_TEMPLATES]
+
+
+class NmeaEmitterStandIn:
+    def __init__(self, mode: str = "tcp", rate: float = 1000.0, host: str = "127.0.0.1", port: int = 0,
+                 target_port: Optional[int] = None, tick_seconds: float = 0.01):
+        self.mode = mode
+        self.rate = rate
+        self.host = host
+        self.port = port or (free_port(host) if mode == "tcp" else 0)
+        self.target_port = target_port
+        self.tick_seconds = tick_seconds
+        self.sentences_sent = 0
+        self._server: Optional[asyncio.base_events.Server] = None
+        self._writers: Set[asyncio.StreamWriter] = set()
+        self._socket: Optional[socket.socket] = None
+        self._task: Optional[asyncio.Task] = None
+        self._counter = 0
+
+    async def start(self) -> int:
+        if self.mode == "tcp":
+            self._server = await asyncio.start_server(self._handle_client, self.host, self.port)
+        else:
+            self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._task = asyncio.create_task(self._emit_loop())
+        return self.port
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._writers.add(writer)
+        try:
+            await reader.read()
+        except ConnectionError:
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    def _next_chunk(self, count: int) -> bytes:
+        lines = []
+        for _ in range(count):
+            self._counter += 1
+            _, template = SENTENCE_TEMPLATES[self._counter % len(SENTENCE_TEMPLATES)]
+            lines.append(with_checksum(template.format(v=(self._counter % 3600) / 10)))
+        return b"".join(lines)
+
+    async def _emit_loop(self):
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        owed = 0.0
+        while True:
+            owed += self.rate * self.tick_seconds
+            count = int(owed)
+            owed -= count
+            if count:
+                if self.mode == "tcp":
+                    if self._writers:
+                        chunk = self._next_chunk(count)
+                        for writer in list(self._writers):
+                            writer.write(chunk)
+                        self.sentences_sent += count
+                else:
+                    # Up to ~1400 bytes per datagram, as a 61162-450-style sender would
+                    chunk = self._next_chunk(count)
+                    start = 0
+                    while start < len(chunk):
+                        end = chunk.rfind(b"\n", start, start + 1400) + 1 or len(chunk)
+                        self._socket.sendto(chunk[start:end], (self.host, self.target_port))
+                        start = end
+                    self.sentences_sent += count
+            next_tick += self.tick_seconds
+            await asyncio.sleep(max(0.0, next_tick - loop.time()))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try: await self._task
+            except asyncio.CancelledError: pass
+            self._task = None
+        if self._server is not None:
+            self._server.close()
+            for writer in list(self._writers):
+                writer.close()
+            await self._server.wait_closed()
+            self._server = None
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
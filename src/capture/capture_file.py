@@ -0,0 +1,226 @@
+"""
+Append-only capture of raw collector input, for replaying field traffic without hardware.
+
+File layout: the 8 byte magic, then records of a 15 byte little-endian header
+(kind u8, channel u16, capture time ns i64, payload length u32) and the payload.
+A CHANNEL record (JSON payload) defines a channel id before its first data record:
+
+    {"type": "nmea", "source": name, "datagram": bool}
+    {"type": "modbus", "device": name, "unit": id, "register_type": ..., "address": a, "count": n}
+
+NMEA records carry the bytes as received (stream chunks or whole datagrams), so replay
+goes through the same framing. Modbus records carry the registers (u16 each) or the bits
+(packed LSB first) of one read, the exception code of an exception response, or the
+error text of a failed read.
+"""
+import asyncio
+import heapq
+import json
+import logging
+import os
+import struct
+import time
+from typing import BinaryIO, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence
+
+from ..metrics.registry import REGISTRY
+from ..models.config_models import CaptureConfig
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"MGWCAP1\n"
+HEADER = struct.Struct("<BHqI")
+
+CHANNEL = 0
+NMEA_DATA = 1
+MODBUS_REGISTERS = 2
+MODBUS_BITS = 3
+MODBUS_EXCEPTION = 4
+MODBUS_FAILURE = 5
+
+# Buffered bytes that trigger a write before the flush timer
+_WRITE_THRESHOLD = 256 * 1024
+
+CAPTURE_BYTES = REGISTRY.counter("gateway_capture_bytes_total", "Bytes written to the capture file")
+
+
+class CaptureRecord(NamedTuple):
+    timestamp_ns: int
+    kind: int
+    channel: dict
+    payload: bytes
+
+
+def pack_bits(bits: Sequence[bool]) -> bytes:
+    value = 0
+    for i, bit in enumerate(bits):
+        if bit:
+            value |= 1 << i
+    return value.to_bytes((len(bits) + 7) // 8, "little")
+
+
+def unpack_bits(payload: bytes, count: int) -> List[bool]:
+    value = int.from_bytes(payload, "little")
+    return [bool(value >> i & 1) for i in range(count)]
+
+
+def capture_path(template: str, suffix: str = "") -> str:
+    """Fills {timestamp} in the configured path and inserts a suffix (e.g. a shard) before the extension."""
+    path = template.replace("{timestamp}", time.strftime("%Y%m%d-%H%M%S"))
+    if suffix:
+        root, ext = os.path.splitext(path)
+        path = f"{root}-{suffix}{ext}"
+    return path
+
+
+class CaptureWriter:
+    """
+    Buffers records in memory and appends them to the file in large writes, when the buffer
+    passes _WRITE_THRESHOLD or flush_interval after the first buffered record. Recording
+    stops (with a warning) once the file reaches max_bytes.
+    """
+
+    def __init__(self, path: str, max_bytes: int, flush_interval: float = 1.0, nmea: bool = True, modbus: bool = True):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self._flush_timer: Optional[asyncio.TimerHandle] = None
+        self.nmea_enabled = nmea
+        self.modbus_enabled = modbus
+        self._channels: Dict[tuple, int] = {}
+        self._buffer = bytearray()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file: Optional[BinaryIO] = open(path, "ab")
+        self.size = self._file.tell()
+        if self.size == 0:
+            self._buffer += MAGIC
+        self.records = 0
+        self.full = False
+
+    def _channel(self, key: tuple, definition: dict, timestamp_ns: int) -> int:
+        channel = self._channels.get(key)
+        if channel is None:
+            channel = self._channels[key] = len(self._channels)
+            payload = json.dumps(definition).encode()
+            self._buffer += HEADER.pack(CHANNEL, channel, timestamp_ns, len(payload))
+            self._buffer += payload
+        return channel
+
+    def _append(self, kind: int, channel: int, timestamp_ns: int, payload: bytes):
+        buffer = self._buffer
+        buffer += HEADER.pack(kind, channel, timestamp_ns, len(payload))
+        buffer += payload
+        self.records += 1
+        if len(buffer) >= _WRITE_THRESHOLD:
+            self.flush()
+        elif self._flush_timer is None:
+            self._flush_timer = asyncio.get_running_loop().call_later(self.flush_interval, self.flush)
+
+    def nmea(self, source: str, data: bytes, datagram: bool = False):
+        if not self.nmea_enabled or self.full:
+            return
+        timestamp_ns = time.time_ns()
+        channel = self._channel(("nmea", source, datagram),
+                                {"type": "nmea", "source": source, "datagram": datagram}, timestamp_ns)
+        self._append(NMEA_DATA, channel, timestamp_ns, data)
+
+    def _modbus_channel(self, device: str, unit_id: int, register_type: str, address: int, count: int,
+                        timestamp_ns: int) -> int:
+        return self._channel(("modbus", device, unit_id, register_type, address, count),
+                             {"type": "modbus", "device": device, "unit": unit_id, "register_type": register_type,
+                              "address": address, "count": count}, timestamp_ns)
+
+    def modbus(self, device: str, unit_id: int, register_type: str, address: int, count: int, response):
+        """Records a pymodbus response: its registers/bits, or its exception code."""
+        if not self.modbus_enabled or self.full:
+            return
+        timestamp_ns = time.time_ns()
+        channel = self._modbus_channel(device, unit_id, register_type, address, count, timestamp_ns)
+        if response.isError():
+            code = getattr(response, "exception_code", 0) or 0
+            self._append(MODBUS_EXCEPTION, channel, timestamp_ns, bytes((code,)))
+        elif register_type in ("coil", "discrete_input"):
+            self._append(MODBUS_BITS, channel, timestamp_ns, pack_bits(response.bits[:count]))
+        else:
+            registers = response.registers
+            self._append(MODBUS_REGISTERS, channel, timestamp_ns, struct.pack(f"<{len(registers)}H", *registers))
+
+    def modbus_failure(self, device: str, unit_id: int, register_type: str, address: int, count: int, reason: str):
+        if not self.modbus_enabled or self.full:
+            return
+        timestamp_ns = time.time_ns()
+        channel = self._modbus_channel(device, unit_id, register_type, address, count, timestamp_ns)
+        self._append(MODBUS_FAILURE, channel, timestamp_ns, reason.encode("utf-8", "replace"))
+
+    def flush(self):
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        if not self._buffer or self._file is None:
+            return
+        if self.size + len(self._buffer) > self.max_bytes:
+            self.full = True
+            self._buffer.clear()
+            logger.warning(f"Capture: {self.path} reached its size limit. Recording stopped.")
+            return
+        self._file.write(self._buffer)
+        self._file.flush()
+        self.size += len(self._buffer)
+        CAPTURE_BYTES.inc(len(self._buffer))
+        self._buffer.clear()
+
+    def close(self):
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+# The recorder collectors write to; None while capture is off. Read it as capture_file.ACTIVE
+# at the call site so that starting a capture later is seen.
+ACTIVE: Optional[CaptureWriter] = None
+
+
+def start_capture(config: CaptureConfig, suffix: str = "") -> CaptureWriter:
+    global ACTIVE
+    stop_capture()
+    ACTIVE = CaptureWriter(capture_path(config.path, suffix), int(config.max_file_mb * 1024 * 1024),
+                           config.flush_interval_seconds, nmea=config.nmea, modbus=config.modbus)
+    logger.info(f"Capture: Recording raw input to {ACTIVE.path}")
+    return ACTIVE
+
+
+def stop_capture():
+    global ACTIVE
+    if ACTIVE is not None:
+        writer, ACTIVE = ACTIVE, None
+        writer.close()
+        logger.info(f"Capture: {writer.records} records ({writer.size / 1e6:.1f} MB) written to {writer.path}")
+
+
+def read_capture(path: str) -> Iterator[CaptureRecord]:
+    """Data records of one capture file, with their channel definitions resolved."""
+    channels: Dict[int, dict] = {}
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a capture file")
+        header_size = HEADER.size
+        while True:
+            header = f.read(header_size)
+            if len(header) < header_size:
+                return
+            kind, channel, timestamp_ns, length = HEADER.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length:
+                logger.warning(f"Capture: {path} ends in a truncated record.")
+                return
+            if kind == CHANNEL:
+                channels[channel] = json.loads(payload)
+            else:
+                yield CaptureRecord(timestamp_ns, kind, channels[channel], payload)
+
+
+def read_captures(paths: Iterable[str]) -> Iterator[CaptureRecord]:
+    """Records of several captures (e.g. one per shard) merged in capture time order."""
+    return heapq.merge(*(read_capture(p) for p in paths), key=lambda record: record.timestamp_ns)
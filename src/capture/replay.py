@@ -0,0 +1,272 @@
+"""
+Replays capture files through the real collectors, pipeline and publishers.
+
+NMEA bytes go through the configured sources' framing, routing and parsing; Modbus
+snapshots are served to the Modbus collector's block polls (decoding, circuit breakers,
+adaptive polling) by a stand-in connection pool. Readings are timestamped at replay time.
+
+    python -m src.capture.replay data/capture/capture-20240501-060000.mgwcap
+    python -m src.capture.replay data/capture/*-shard*.mgwcap --speed 10
+    python -m src.capture.replay shift.mgwcap --speed max --no-publish
+
+The sensor configuration comes from the gateway config (or --config); sensors the capture
+has no data for simply produce nothing. Sharding and capture are turned off for the replay.
+Circuit breaker backoffs and adaptive poll intervals run on the wall clock, so at speeds
+other than 1x they span more (or less) capture time than they did live.
+"""
+import argparse
+import asyncio
+import bisect
+import logging
+import struct
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from ..collectors.modbus_connection_pool import ModbusReadError
+from ..collectors.polling_scheduler import PollCallback
+from ..config_loader import load_config, resolve_config_path
+from ..gateway_manager import GatewayManager
+from ..models.config_models import AppConfig, SensorConfig
+from ..models.sensor_reading import SensorDescriptor
+from ..utils.logging_setup import setup_logging, stop_logging
+from .capture_file import (MODBUS_BITS, MODBUS_EXCEPTION, MODBUS_FAILURE, MODBUS_REGISTERS, NMEA_DATA,
+                           CaptureRecord, read_captures, unpack_bits)
+
+logger = logging.getLogger(__name__)
+
+# Exception code returned for registers the capture holds no value for (illegal data address)
+_NOT_CAPTURED = 0x02
+# Records fed between yields to the event loop at --speed max
+_MAX_SPEED_BATCH = 256
+
+
+class ReplayResponse:
+    """The parts of a pymodbus read response the Modbus collector uses."""
+
+    def __init__(self, registers: Sequence[int] = (), bits: Sequence[bool] = (), exception_code: int = 0):
+        self.registers = list(registers)
+        self.bits = list(bits)
+        self.exception_code = exception_code
+
+    def isError(self) -> bool:
+        return self.exception_code != 0
+
+    def __str__(self) -> str:
+        return f"Exception response (replayed), exception code {self.exception_code}"
+
+
+class ReplayModbusConnection:
+    """
+    Serves reads from the last captured value of every register, so a replay config whose
+    read plan differs from the captured one still reads consistent values. While a captured
+    exception or failure is replayed, reads return or raise it instead.
+    """
+
+    connected = True
+
+    def __init__(self, name: str):
+        self.name = name
+        self.values: Dict[Tuple[int, str], Dict[int, Any]] = {}
+        self.outcome: Optional[CaptureRecord] = None
+
+    async def ensure_connected(self) -> bool:
+        return True
+
+    async def read(self, register_type: str, address: int, count: int, unit_id: int) -> ReplayResponse:
+        outcome = self.outcome
+        if outcome is not None:
+            if outcome.kind == MODBUS_FAILURE:
+                raise ModbusReadError(outcome.payload.decode("utf-8", "replace"))
+            return ReplayResponse(exception_code=outcome.payload[0] or _NOT_CAPTURED)
+        values = self.values.get((unit_id, register_type), {})
+        try:
+            data = [values[a] for a in range(address, address + count)]
+        except KeyError:
+            return ReplayResponse(exception_code=_NOT_CAPTURED)
+        if register_type in ("coil", "discrete_input"):
+            return ReplayResponse(bits=data)
+        return ReplayResponse(registers=data)
+
+    def close(self):
+        pass
+
+
+class ReplayModbusPool:
+    def __init__(self, device_names: Sequence[str]):
+        self._connections = {name: ReplayModbusConnection(name) for name in device_names}
+
+    def get(self, name: Optional[str]) -> Optional[ReplayModbusConnection]:
+        return self._connections.get(name)
+
+    def connections(self) -> Dict[str, ReplayModbusConnection]:
+        return self._connections
+
+    def close_all(self):
+        pass
+
+
+class CaptureReplay:
+    """
+    Takes the place of the collectors in GatewayManager: start() hands the sensors to the
+    real NMEA and Modbus collectors in replay mode and feeds them the captured records,
+    paced by their capture timestamps divided by speed (None: as fast as possible).
+    """
+
+    def __init__(self, paths: Sequence[str], collectors: Dict[str, Any], speed: Optional[float]):
+        self.paths = list(paths)
+        self.collectors = collectors
+        self.speed = speed
+        self.done = asyncio.Event()
+        self.records = 0
+        self.unmatched = 0
+        self.elapsed = 0.0
+        self.capture_span = 0.0
+        self._sources = {}
+        self._pool: Optional[ReplayModbusPool] = None
+        # (device, unit, register type) -> blocks sorted by last register, with their poll
+        self._blocks: Dict[Tuple[str, int, str], Tuple[List[int], List[PollCallback]]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, sensors: List[SensorConfig], data_queue: asyncio.Queue,
+                    descriptors: Dict[str, SensorDescriptor]):
+        nmea = self.collectors.get("nmea")
+        if nmea is not None and nmea.config.enabled:
+            self._sources = nmea.attach_replay(sensors, data_queue, descriptors)
+        modbus = self.collectors.get("modbus_tcp")
+        if modbus is not None and modbus.config.enabled:
+            self._pool = ReplayModbusPool(list(modbus.pool.device_configs()))
+            by_target: Dict[Tuple[str, int, str], List[Tuple[int, PollCallback]]] = {}
+            for block, poll in modbus.attach_replay(sensors, data_queue, descriptors, self._pool):
+                by_target.setdefault((block.device, block.unit_id, block.register_type), []).append(
+                    (block.start_address + block.count - 1, poll))
+            for target, blocks in by_target.items():
+                blocks.sort(key=lambda item: item[0])
+                self._blocks[target] = ([end for end, _ in blocks], [poll for _, poll in blocks])
+        self._task = asyncio.create_task(self._run())
+
+    async def update_sensors(self, sensors: List[SensorConfig], descriptors: Dict[str, SensorDescriptor]):
+        pass
+
+    async def _feed_nmea(self, record: CaptureRecord):
+        source = self._sources.get(record.channel["source"])
+        if source is None:
+            self.unmatched += 1
+            return
+        await source.feed(record.payload, record.channel["datagram"])
+
+    async def _feed_modbus(self, record: CaptureRecord):
+        channel = record.channel
+        connection = self._pool.get(channel["device"]) if self._pool else None
+        blocks = self._blocks.get((channel["device"], channel["unit"], channel["register_type"]))
+        if connection is None or blocks is None:
+            self.unmatched += 1
+            return
+        address, count = channel["address"], channel["count"]
+        if record.kind == MODBUS_REGISTERS:
+            registers = struct.unpack(f"<{len(record.payload) // 2}H", record.payload)
+            values = connection.values.setdefault((channel["unit"], channel["register_type"]), {})
+            values.update(zip(range(address, address + len(registers)), registers))
+        elif record.kind == MODBUS_BITS:
+            values = connection.values.setdefault((channel["unit"], channel["register_type"]), {})
+            values.update(zip(range(address, address + count), unpack_bits(record.payload, count)))
+        else:
+            connection.outcome = record
+        # A block is polled once per captured cycle: when the snapshot holding its last register arrives
+        ends, polls = blocks
+        try:
+            for poll in polls[bisect.bisect_left(ends, address):bisect.bisect_left(ends, address + count)]:
+                await poll()
+        finally:
+            connection.outcome = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        first_ns: Optional[int] = None
+        try:
+            for record in read_captures(self.paths):
+                if first_ns is None:
+                    first_ns = record.timestamp_ns
+                offset = (record.timestamp_ns - first_ns) / 1e9
+                if self.speed:
+                    delay = started + offset / self.speed - loop.time()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                elif self.records % _MAX_SPEED_BATCH == 0:
+                    await asyncio.sleep(0)
+                if record.kind == NMEA_DATA:
+                    await self._feed_nmea(record)
+                elif record.kind in (MODBUS_REGISTERS, MODBUS_BITS, MODBUS_EXCEPTION, MODBUS_FAILURE):
+                    await self._feed_modbus(record)
+                self.records += 1
+                self.capture_span = offset
+        except Exception as e:
+            logger.error(f"Replay: Stopped after {self.records} records: {e}", exc_info=True)
+        finally:
+            self.elapsed = loop.time() - started
+            self.done.set()
+
+    async def stop(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try: await self._task
+            except asyncio.CancelledError: pass
+        await asyncio.gather(*(c.stop() for c in self.collectors.values()), return_exceptions=True)
+
+
+def replay_config(config: AppConfig, publish: bool) -> AppConfig:
+    update = {"sharding": config.sharding.model_copy(update={"enabled": False}),
+              "capture": config.capture.model_copy(update={"enabled": False})}
+    if not publish:
+        update["mqtt_publisher"] = config.mqtt_publisher.model_copy(update={"enabled": False})
+    return config.model_copy(update=update)
+
+
+async def run_replay(config: AppConfig, paths: Sequence[str], speed: Optional[float]) -> CaptureReplay:
+    gateway = GatewayManager(config)
+    replay = CaptureReplay(paths, gateway.collectors, speed)
+    gateway.collectors = {"replay": replay}
+    manager_task = asyncio.create_task(gateway.start())
+    try:
+        done = asyncio.create_task(replay.done.wait())
+        await asyncio.wait([manager_task, done], return_when=asyncio.FIRST_COMPLETED)
+        done.cancel()
+        # Let the pipeline drain what the collectors queued
+        while gateway.data_queue.qsize() and not manager_task.done():
+            await asyncio.sleep(0.05)
+        await asyncio.sleep(config.pipeline.batch_max_wait_ms / 1000 + 0.1)
+    finally:
+        await gateway.stop()
+        await asyncio.gather(manager_task, return_exceptions=True)
+    return replay
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("captures", nargs="+", help="capture files; several (e.g. one per shard) are merged by time")
+    parser.add_argument("--config", type=Path, help="gateway config (default: the gateway's own config file)")
+    parser.add_argument("--speed", default="1", help="replay speed factor, or 'max' for as fast as possible (default 1)")
+    parser.add_argument("--no-publish", action="store_true", help="run collectors and pipeline without the MQTT publisher")
+    args = parser.parse_args()
+    speed = None if args.speed == "max" else float(args.speed)
+    if speed is not None and speed <= 0:
+        parser.error("--speed must be positive or 'max'")
+
+    config = replay_config(load_config(args.config or resolve_config_path()), publish=not args.no_publish)
+    setup_logging(config.logging)
+    try:
+        started = time.perf_counter()
+        replay = asyncio.run(run_replay(config, args.captures, speed))
+        wall = time.perf_counter() - started
+        logger.info(f"Replay: {replay.records} records ({replay.unmatched} without a configured source or block), "
+                    f"{replay.capture_span:.1f}s of capture in {replay.elapsed:.1f}s "
+                    f"({replay.records / max(replay.elapsed, 1e-9):,.0f} records/s, {wall:.1f}s total).")
+    except KeyboardInterrupt:
+        logger.info("Replay interrupted.")
+    finally:
+        stop_logging()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import math
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from ..models.config_models import AdaptivePollingConfig, SensorConfig
+
+# Weight of the newest rate sample in the per-sensor rate of change average
+_RATE_SMOOTHING = 0.3
+# A quiet sensor's interval grows at most by this factor per poll
+_MAX_GROWTH = 2.0
+# Budget stretch changes smaller than this are applied only to the block that was just polled
+_STRETCH_TOLERANCE = 0.05
+
+
+def change_threshold(sensor: SensorConfig) -> float:
+    """The sensor's deadband in engineering units, as the exception engine applies it."""
+    params = sensor.publisher_config
+    if params.exception_mode == "percent_of_span":
+        return params.change_threshold / 100.0 * (params.span_high - params.span_low)
+    return params.change_threshold or 0.0
+
+
+@dataclass
+class _SensorActivity:
+    threshold: float
+    interval: float
+    last_value: Optional[float] = None
+    last_time: float = 0.0
+    rate: float = 0.0   # smoothed |d value / dt|
+
+
+@dataclass
+class _BlockState:
+    min_interval: float
+    max_interval: float
+    sensors: List[_SensorActivity] = field(default_factory=list)
+    interval: float = 0.0   # wanted interval before the transaction budget
+
+
+class AdaptivePollController:
+    """
+    Chooses the poll interval of each Modbus read block.
+
+    With adaptive polling, every sensor wants an interval short enough that its value moves
+    about target_change_fraction of its change_threshold between polls, judged from its
+    smoothed rate of change. A block polls at the shortest interval any member wants, between
+    its configured polling interval and the max interval. A change of at least a full threshold
+    is a step: that sensor goes back to the fastest rate on the next poll. Quiet sensors slow
+    down at most 2x per poll.
+
+    With a transaction budget, all wanted intervals are stretched by one common factor
+    whenever the blocks together would poll more often than max_transactions_per_second.
+    """
+
+    def __init__(self, config: AdaptivePollingConfig, max_transactions_per_second: Optional[float] = None):
+        self.config = config
+        self.budget = max_transactions_per_second
+        self._blocks: Dict[str, _BlockState] = {}
+        self.stretch = 1.0
+
+    def add_block(self, key: str, min_interval: float, max_interval: Optional[float], thresholds: Sequence[float]):
+        """Registers a block, or retunes a known one in place keeping its sensors' activity."""
+        max_interval = max(min_interval, max_interval or self.config.max_interval_seconds) \
+            if self.config.enabled else min_interval
+        block = self._blocks.get(key)
+        if block is None or len(block.sensors) != len(thresholds):
+            self._blocks[key] = _BlockState(min_interval, max_interval,
+                                            [_SensorActivity(t, min_interval) for t in thresholds], min_interval)
+            return
+        block.min_interval, block.max_interval = min_interval, max_interval
+        for activity, threshold in zip(block.sensors, thresholds):
+            activity.threshold = threshold
+            activity.interval = min(max(activity.interval, min_interval), max_interval)
+        block.interval = min(a.interval for a in block.sensors)
+
+    def remove_block(self, key: str):
+        self._blocks.pop(key, None)
+
+    def interval(self, key: str) -> float:
+        return self._blocks[key].interval * self.stretch
+
+    def demand(self) -> float:
+        """Read transactions per second the blocks would issue at their wanted intervals."""
+        return sum(1.0 / b.interval for b in self._blocks.values())
+
+    def planned_rate(self) -> float:
+        return self.demand() / self.stretch
+
+    def observe(self, key: str, values: Sequence[Optional[float]], now: float) -> List[Tuple[str, float]]:
+        """
+        Feeds one poll's values (None for Invalid) in block sensor order. Returns the
+        (block key, interval) pairs whose effective interval changed.
+        """
+        block = self._blocks.get(key)
+        if block is None or not self.config.enabled:
+            return []
+        fraction = self.config.target_change_fraction
+        lo, hi = block.min_interval, block.max_interval
+        for activity, value in zip(block.sensors, values):
+            if value is None:
+                continue
+            last, last_time = activity.last_value, activity.last_time
+            activity.last_value, activity.last_time = value, now
+            if last is None or now <= last_time:
+                continue
+            change = abs(value - last)
+            sample = change / (now - last_time)
+            threshold = activity.threshold
+            if change > 0 and change >= threshold:
+                activity.rate = max(sample, activity.rate)
+                activity.interval = lo
+                continue
+            activity.rate += (sample - activity.rate) * _RATE_SMOOTHING
+            wanted = fraction * threshold / activity.rate if activity.rate > 0 and threshold > 0 else math.inf
+            activity.interval = min(max(min(wanted, activity.interval * _MAX_GROWTH), lo), hi)
+        interval = min(a.interval for a in block.sensors)
+        if interval == block.interval:
+            return []
+        block.interval = interval
+        return self.rebalance(key)
+
+    def rebalance(self, changed_key: Optional[str] = None) -> List[Tuple[str, float]]:
+        """
+        Recomputes the budget stretch. Returns every block's interval when the stretch moved,
+        otherwise only changed_key's.
+        """
+        stretch = max(1.0, self.demand() / self.budget) if self.budget else 1.0
+        if abs(stretch - self.stretch) > _STRETCH_TOLERANCE * self.stretch or (stretch == 1.0) != (self.stretch == 1.0):
+            self.stretch = stretch
+            return [(key, block.interval * stretch) for key, block in self._blocks.items()]
+        if changed_key is not None and changed_key in self._blocks:
+            return [(changed_key, self.interval(changed_key))]
+        return []
@@ -0,0 +1,67 @@
+from typing import Optional
+
+CLOSED = 0
+OPEN = 1
+HALF_OPEN = 2
+STATE_NAMES = ("closed", "open", "half_open")
+
+
+class CircuitBreaker:
+    """
+    Health of one Modbus unit (device + unit id).
+
+    closed:    polls run normally; failure_threshold consecutive failures open the breaker
+    open:      polls are skipped until the backoff has passed
+    half_open: a single probe poll is let through; success closes the breaker, failure
+               reopens it with twice the previous backoff (up to max_open_seconds)
+    """
+
+    def __init__(self, failure_threshold: int, open_seconds: float, max_open_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max(max_open_seconds, open_seconds)
+        self.state = CLOSED
+        self.failures = 0
+        self.backoff = open_seconds
+        self.retry_at = 0.0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+
+    def allow(self, now: float) -> bool:
+        """Whether a poll may go ahead. In half-open only one probe is in flight at a time."""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN:
+            if now < self.retry_at:
+                return False
+            self.state = HALF_OPEN
+        if self._probing:
+            return False
+        self._probing = True
+        return True
+
+    def release(self):
+        """Ends a poll that had no outcome for the unit (cancelled, device not connected)."""
+        self._probing = False
+
+    def record_success(self) -> bool:
+        """Returns True when this closes an open breaker."""
+        self.failures = 0
+        self._probing = False
+        if self.state == CLOSED:
+            return False
+        self.state, self.backoff, self.opened_at = CLOSED, self.open_seconds, None
+        return True
+
+    def record_failure(self, now: float) -> bool:
+        """Returns True when this opens a closed breaker."""
+        self.failures += 1
+        if self.state == HALF_OPEN:
+            self._probing = False
+            self.backoff = min(self.backoff * 2, self.max_open_seconds)
+            self.state, self.retry_at = OPEN, now + self.backoff
+            return False
+        if self.state == CLOSED and self.failures >= self.failure_threshold:
+            self.state, self.retry_at, self.opened_at = OPEN, now + self.backoff, now
+            return True
+        return False
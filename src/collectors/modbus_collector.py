@@ -1,140 +1,330 @@
 import asyncio
+import functools
 import logging
-from pymodbus.client import AsyncModbusTcpClient
-from pymodbus.exceptions import ModbusIOException, ConnectionException
-from datetime import datetime, timezone
+import sys
+import time
+from typing import Dict, Optional
 
-from ..models.config_models import ModbusCollectorConfig, SensorConfig, SensorModbusCollectorParams
-from ..models.sensor_reading import SensorReading
+from ..capture import capture_file
+from ..metrics.registry import REGISTRY
+from ..models.config_models import ModbusCollectorConfig, SensorConfig
+from ..models.sensor_reading import STATUS_INVALID, STATUS_VALID, SensorDescriptor, SensorReading, build_descriptors
+from .adaptive_polling import AdaptivePollController, change_threshold
+from .circuit_breaker import CLOSED, CircuitBreaker
+from .modbus_connection_pool import ModbusConnectionPool, ModbusReadError
+from .modbus_decoding import BIT_REGISTER_TYPES, BlockDecoder
+from .modbus_read_planner import ReadBlock, plan_reads
+from .polling_scheduler import PollCallback, PollingScheduler, PollJobStats
 
 logger = logging.getLogger(__name__)
 
+MODBUS_POLLS = REGISTRY.counter("gateway_modbus_polls_total", "Modbus block polls", ("device",))
+MODBUS_POLL_ERRORS = REGISTRY.counter("gateway_modbus_poll_errors_total",
+                                      "Modbus block polls that failed or returned an exception", ("device",))
+MODBUS_READ_SECONDS = REGISTRY.histogram("gateway_modbus_read_seconds", "Modbus read round trip", ("device",))
+MODBUS_CONNECTED = REGISTRY.gauge("gateway_modbus_connected", "1 while the device connection is up", ("device",))
+MODBUS_UNIT_STATE = REGISTRY.gauge("gateway_modbus_unit_breaker_state",
+                                   "Circuit breaker per device and unit id: 0 closed, 1 open, 2 half-open",
+                                   ("device", "unit"))
+MODBUS_BREAKER_TRIPS = REGISTRY.counter("gateway_modbus_unit_breaker_trips_total",
+                                        "Times a device/unit breaker opened", ("device", "unit"))
+MODBUS_PLANNED_RATE = REGISTRY.gauge("gateway_modbus_planned_transactions_per_second",
+                                     "Block reads per second at the current poll intervals")
+MODBUS_BUDGET_STRETCH = REGISTRY.gauge("gateway_modbus_budget_stretch",
+                                       "Factor all poll intervals are stretched by to stay within the transaction budget")
+
+# Exception responses that mean the unit itself is not answering: slave device failure,
+# slave busy, gateway path unavailable, gateway target failed to respond
+UNIT_FAILURE_EXCEPTION_CODES = frozenset({0x04, 0x06, 0x0A, 0x0B})
+
+def _members(block: ReadBlock) -> list[tuple]:
+    # Includes the decoding settings, so a retyped or rescaled sensor gets a fresh decoder
+    return [(p.sensor.id, p.offset, p.sensor.collector_config) for p in block.sensors]
+
+def _block_decoder(block: ReadBlock) -> BlockDecoder:
+    return BlockDecoder([p.sensor.collector_config for p in block.sensors], [p.offset for p in block.sensors],
+                        bits=block.register_type in BIT_REGISTER_TYPES)
+
 class ModbusCollector:
     def __init__(self, collector_config: ModbusCollectorConfig):
         self.config = collector_config
-        self.client = AsyncModbusTcpClient(host=self.config.host, port=self.config.port, timeout=self.config.default_read_timeout_seconds)
-        self._sensor_tasks: dict[str, asyncio.Task] = {}
+        self.pool = ModbusConnectionPool(self.config)
+        self._scheduler = PollingScheduler("modbus")
+        self._blocks: dict[str, ReadBlock] = {}
+        self._decoders: dict[str, BlockDecoder] = {}
+        self._breakers: dict[tuple[str, int], CircuitBreaker] = {}
+        self._failed_blocks: set[str] = set()   # blocks whose last publish was Invalid after a unit failure
+        self._intervals = AdaptivePollController(self.config.adaptive_polling, self.config.max_transactions_per_second)
+        self._descriptors: Dict[str, SensorDescriptor] = {}
+        self._data_queue: Optional[asyncio.Queue] = None
         self._running = False
 
-    async def _connect_client(self):
-        while self._running and not self.client.connected:
-            try:
-                logger.info(f"Attempting to connect to Modbus server at {self.config.host}:{self.config.port}")
-                await self.client.connect()
-                if self.client.connected:
-                    logger.info(f"Successfully connected to Modbus server at {self.config.host}:{self.config.port}")
-                    break
-            except Exception as e:
-                logger.error(f"Failed to connect to Modbus server: {e}. Retrying in {self.config.connection_retry_delay_seconds}s...")
-                await asyncio.sleep(self.config.connection_retry_delay_seconds)
-            if not self._running:
-                break
-
-    async def _read_sensor_loop(self, sensor: SensorConfig, data_queue: asyncio.Queue):
-        if not isinstance(sensor.collector_config, SensorModbusCollectorParams):
-            logger.error(f"Invalid collector_config type for Modbus sensor {sensor.id}")
+    async def _put_invalid_block(self, block: ReadBlock, data_queue: asyncio.Queue):
+        timestamp_ns = time.time_ns()
+        descriptors = self._descriptors
+        for planned in block.sensors:
+            descriptor = descriptors.get(planned.sensor.id)
+            if descriptor is not None:
+                await data_queue.put(SensorReading(descriptor, None, STATUS_INVALID, timestamp_ns))
+
+    def _breaker(self, block: ReadBlock) -> CircuitBreaker:
+        unit = (block.device, block.unit_id)
+        breaker = self._breakers.get(unit)
+        if breaker is None:
+            settings = self.config.circuit_breaker
+            breaker = self._breakers[unit] = CircuitBreaker(
+                settings.failure_threshold if settings.enabled else sys.maxsize,
+                settings.open_seconds, settings.max_open_seconds)
+            MODBUS_UNIT_STATE.labels(block.device, str(block.unit_id)).set_function(lambda: breaker.state)
+        return breaker
+
+    async def _unit_failed(self, block: ReadBlock, breaker: CircuitBreaker, reason: str, data_queue: asyncio.Queue):
+        MODBUS_POLL_ERRORS.labels(block.device).inc()
+        if breaker.record_failure(time.monotonic()):
+            MODBUS_BREAKER_TRIPS.labels(block.device, str(block.unit_id)).inc()
+            logger.warning("Modbus '%s' unit %d: %d failed polls in a row (%s). Pausing its polls for %.1fs.",
+                           block.device, block.unit_id, breaker.failures, reason, breaker.backoff)
+            # One Invalid for every sensor of the unit; nothing more is published while it stays open
+            for other in list(self._blocks.values()):
+                if (other.device, other.unit_id) == (block.device, block.unit_id) and other.key not in self._failed_blocks:
+                    self._failed_blocks.add(other.key)
+                    await self._put_invalid_block(other, data_queue)
+        elif breaker.state == CLOSED:
+            logger.error("Modbus error reading block %s: %s", block.key, reason)
+            self._failed_blocks.add(block.key)
+            await self._put_invalid_block(block, data_queue)
+        else:
+            logger.debug("Modbus '%s' unit %d: Probe failed (%s). Next probe in %.1fs.",
+                         block.device, block.unit_id, reason, breaker.backoff)
+
+    async def _poll_block(self, block: ReadBlock, decoder: BlockDecoder, data_queue: asyncio.Queue):
+        breaker = self._breaker(block)
+        if not breaker.allow(time.monotonic()):
+            return
+        connection = self.pool.get(block.device)
+        MODBUS_POLLS.labels(block.device).inc()
+        try:
+            if not connection.connected:
+                if not await connection.ensure_connected():
+                    MODBUS_POLL_ERRORS.labels(block.device).inc()
+                    logger.debug("Modbus device '%s' unavailable for block %s. Retrying on a later poll.", block.device, block.key)
+                    breaker.release()
+                    return
+
+            started = time.perf_counter()
+            rr = await connection.read(block.register_type, block.start_address, block.count, block.unit_id)
+            MODBUS_READ_SECONDS.labels(block.device).observe(time.perf_counter() - started)
+            if capture_file.ACTIVE is not None:
+                capture_file.ACTIVE.modbus(block.device, block.unit_id, block.register_type,
+                                           block.start_address, block.count, rr)
+
+            if rr.isError() and getattr(rr, "exception_code", None) in UNIT_FAILURE_EXCEPTION_CODES:
+                await self._unit_failed(block, breaker, str(rr), data_queue)
+                return
+            if breaker.record_success():
+                logger.info(f"Modbus '{block.device}' unit {block.unit_id}: Responding again. Polls resumed.")
+            if rr.isError():
+                # Illegal function/address/value: the unit is fine, the block configuration is not
+                MODBUS_POLL_ERRORS.labels(block.device).inc()
+                logger.error("Modbus error reading block %s: %s", block.key, rr)
+                await self._put_invalid_block(block, data_queue)
+            else:
+                self._failed_blocks.discard(block.key)
+                values = decoder.decode(rr.bits if decoder.bits else rr.registers)
+                timestamp_ns = time.time_ns()
+                descriptors = self._descriptors
+                for planned, value in zip(block.sensors, values):
+                    # A poll still running across a config reload may include removed sensors
+                    descriptor = descriptors.get(planned.sensor.id)
+                    if descriptor is not None:
+                        status = STATUS_VALID if value is not None else STATUS_INVALID
+                        await data_queue.put(SensorReading(descriptor, value, status, timestamp_ns))
+                if self.config.adaptive_polling.enabled:
+                    self._set_intervals(self._intervals.observe(block.key, values, time.monotonic()))
+
+        except ModbusReadError as e:
+            if capture_file.ACTIVE is not None:
+                capture_file.ACTIVE.modbus_failure(block.device, block.unit_id, block.register_type,
+                                                   block.start_address, block.count, str(e))
+            await self._unit_failed(block, breaker, str(e), data_queue)
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
+        except Exception as e:
+            breaker.release()
+            MODBUS_POLL_ERRORS.labels(block.device).inc()
+            logger.error("Unexpected error reading Modbus block %s: %s", block.key, e, exc_info=True)
+            await self._put_invalid_block(block, data_queue)
+
+    def _set_intervals(self, intervals: list[tuple[str, float]]):
+        for key, interval in intervals:
+            self._scheduler.set_interval(key, interval)
+
+    def _apply_budget(self):
+        stretch = self._intervals.stretch
+        self._set_intervals(self._intervals.rebalance())
+        if self._intervals.stretch == stretch:
             return
+        if self._intervals.stretch > 1.0:
+            logger.warning(f"Modbus: Polling needs {self._intervals.demand():.1f} reads/s, over the budget of "
+                           f"{self.config.max_transactions_per_second:.1f}/s. Poll intervals stretched "
+                           f"{self._intervals.stretch:.2f}x.")
+        else:
+            logger.info("Modbus: Polling is back within the transaction budget.")
 
-        sensor_modbus_params = sensor.collector_config
-        unit_id = sensor_modbus_params.unit_id or self.config.default_unit_id
-        polling_interval = sensor_modbus_params.polling_interval_seconds or self.config.default_polling_interval_seconds
-        register_address = sensor_modbus_params.register_address
-        
-        logger.info(f"Starting Modbus polling for sensor {sensor.id} (Register: {register_address}, Unit: {unit_id}) every {polling_interval}s")
-
-        while self._running:
-            try:
-                if not self.client.connected:
-                    logger.warning(f"Modbus client disconnected for sensor {sensor.id}. Attempting to reconnect...")
-                    await self._connect_client()
-                    if not self.client.connected:
-                        logger.error(f"Modbus reconnection failed for sensor {sensor.id}. Sleeping before next attempt.")
-                        await asyncio.sleep(polling_interval)
-                        continue
-                
-                rr = await self.client.read_holding_registers(address=register_address, count=1, slave=unit_id)
-
-                if rr.isError():
-                    logger.error(f"Modbus error reading sensor {sensor.id} (Register: {register_address}): {rr}")
-                    value = None
-                    status = "Invalid"
-                else:
-                    value = rr.registers[0]
-                    status = "Valid"
-                    logger.debug(f"Sensor {sensor.id}: value={value} {sensor.publisher_config.unit}")
-
-                reading = SensorReading(
-                    sensor_id=sensor.id,
-                    value=value,
-                    unit=sensor.publisher_config.unit,
-                    status=status,
-                    timestamp=datetime.now(timezone.utc),
-                    mqtt_topic_suffix=sensor.publisher_config.mqtt_topic_suffix,
-                    change_threshold=sensor.publisher_config.change_threshold,
-                    min_publish_interval_seconds=sensor.publisher_config.min_publish_interval_seconds
-                )
-                await data_queue.put(reading)
-
-            except Exception as e:
-                logger.error(f"Unexpected error reading Modbus sensor {sensor.id}: {e}", exc_info=True)
-                error_reading = SensorReading(
-                    sensor_id=sensor.id, value=None, unit=sensor.publisher_config.unit, 
-                    status = "Invalid",
-                    timestamp=datetime.now(timezone.utc), mqtt_topic_suffix=sensor.publisher_config.mqtt_topic_suffix,
-                    change_threshold=sensor.publisher_config.change_threshold,
-                    min_publish_interval_seconds=sensor.publisher_config.min_publish_interval_seconds
-                )
-                await data_queue.put(error_reading)
-            
-            if not self._running:
-                break
-            await asyncio.sleep(polling_interval)
-
-    async def start(self, sensors_to_collect: list[SensorConfig], data_queue: asyncio.Queue):
+    def _track_block(self, block: ReadBlock):
+        """Registers (or retunes) the block with the poll interval controller."""
+        ceilings = [p.sensor.collector_config.max_polling_interval_seconds for p in block.sensors]
+        ceiling = min((c for c in ceilings if c is not None), default=None)
+        self._intervals.add_block(block.key, block.polling_interval, ceiling,
+                                  [change_threshold(p.sensor) for p in block.sensors])
+
+    def _phase_offsets(self, blocks: list[ReadBlock]) -> dict[str, float]:
+        """
+        Spreads blocks sharing a configured polling interval evenly across the period each is
+        actually polled at (the adaptive interval, stretched to the budget). Blocks must be tracked.
+        """
+        offsets: dict[str, float] = {}
+        by_interval: dict[float, list[ReadBlock]] = {}
+        for block in blocks:
+            by_interval.setdefault(block.polling_interval, []).append(block)
+        for members in by_interval.values():
+            for i, block in enumerate(members):
+                offsets[block.key] = self._intervals.interval(block.key) * i / len(members) if self.config.stagger_polls else 0.0
+        return offsets
+
+    def get_polling_stats(self) -> dict[str, PollJobStats]:
+        """Deadline-miss and jitter statistics per sensor id (shared by the sensors of one block)."""
+        job_stats = self._scheduler.stats()
+        return {planned.sensor.id: job_stats[key]
+                for key, block in self._blocks.items() if key in job_stats
+                for planned in block.sensors}
+
+    def _check_block_device(self, block: ReadBlock) -> bool:
+        if self.pool.get(block.device) is None:
+            sensor_ids = ", ".join(p.sensor.id for p in block.sensors)
+            logger.error(f"Unknown Modbus device '{block.device}' for sensors: {sensor_ids}. Skipping.")
+            return False
+        return True
+
+    def _plan(self, sensors: list[SensorConfig]) -> list[ReadBlock]:
+        modbus_sensors = [s for s in sensors if s.collector_type == "modbus_tcp"]
+        blocks = plan_reads(modbus_sensors, self.config.default_unit_id, self.config.default_polling_interval_seconds,
+                            max_gap=self.config.max_register_gap, max_block_size=self.config.max_registers_per_read)
+        blocks = [b for b in blocks if self._check_block_device(b)]
+        for device in {b.device for b in blocks}:
+            connection = self.pool.get(device)
+            MODBUS_CONNECTED.labels(device).set_function(lambda c=connection: c.connected)
+        return blocks
+
+    def _schedule(self, blocks: list[ReadBlock], peers: Optional[list[ReadBlock]] = None):
+        """Schedules new blocks, phased among peers (all blocks of the plan; default: blocks)."""
+        added = []
+        for block in blocks:
+            if block.key in self._blocks:
+                logger.warning(f"Modbus block {block.key} already scheduled. Skipping.")
+                continue
+            self._blocks[block.key] = block
+            self._track_block(block)
+            added.append(block)
+        offsets = self._phase_offsets(blocks if peers is None else peers)
+        for block in added:
+            sensor_ids = ", ".join(p.sensor.id for p in block.sensors)
+            logger.info(f"Scheduling Modbus block {block.key} (Registers: {block.start_address}-{block.end_address}, "
+                        f"Unit: {block.unit_id}) every {block.polling_interval}s for sensors: {sensor_ids}")
+            decoder = self._decoders[block.key] = _block_decoder(block)
+            self._scheduler.add_job(block.key, self._intervals.interval(block.key),
+                                    functools.partial(self._poll_block, block, decoder, self._data_queue),
+                                    phase_offset=offsets[block.key])
+
+    async def start(self, sensors_to_collect: list[SensorConfig], data_queue: asyncio.Queue,
+                    descriptors: Optional[Dict[str, SensorDescriptor]] = None):
         if not self.config.enabled:
             logger.info("Modbus TCP Collector is disabled by configuration.")
             return
 
         self._running = True
-        await self._connect_client()
-
-        if not self.client.connected and self._running:
-             logger.warning(f"Modbus client still not connected to {self.config.host}:{self.config.port}. Sensor loops will attempt reconnections.")
-
-        for sensor_cfg in sensors_to_collect:
-            if sensor_cfg.collector_type == "modbus_tcp":
-                if sensor_cfg.id in self._sensor_tasks and not self._sensor_tasks[sensor_cfg.id].done():
-                    logger.warning(f"Task for Modbus sensor {sensor_cfg.id} already running. Skipping.")
-                    continue
-                task = asyncio.create_task(self._read_sensor_loop(sensor_cfg, data_queue))
-                self._sensor_tasks[sensor_cfg.id] = task
-            if not self._running:
-                break
-        
-        if not self._sensor_tasks:
+        self._data_queue = data_queue
+        self._descriptors = descriptors or build_descriptors(sensors_to_collect)
+        blocks = self._plan(sensors_to_collect)
+        devices = {b.device for b in blocks}
+        await asyncio.gather(*(self.pool.get(d).ensure_connected() for d in devices))
+        for device in devices:
+            if not self.pool.get(device).connected:
+                logger.warning(f"Modbus device '{device}' not connected yet. Its block polls will attempt reconnections.")
+
+        self._schedule(blocks)
+        if not self._blocks:
             logger.info("No Modbus TCP sensors configured or enabled for this collector.")
+            return
+        self._apply_budget()
+        MODBUS_PLANNED_RATE.set_function(self._intervals.planned_rate)
+        MODBUS_BUDGET_STRETCH.set_function(lambda: self._intervals.stretch)
+        self._scheduler.start()
+
+    def attach_replay(self, sensors_to_collect: list[SensorConfig], data_queue: asyncio.Queue,
+                      descriptors: Dict[str, SensorDescriptor], pool) -> list[tuple[ReadBlock, PollCallback]]:
+        """
+        Sets the collector up for capture replay: blocks are planned as in start() and read
+        from `pool` (same interface as ModbusConnectionPool), but nothing is scheduled. The
+        replay runs a block's poll by calling its callback.
+        """
+        self.pool = pool
+        self._running = True
+        self._data_queue = data_queue
+        self._descriptors = descriptors
+        polls = []
+        for block in self._plan(sensors_to_collect):
+            self._blocks[block.key] = block
+            decoder = self._decoders[block.key] = _block_decoder(block)
+            self._track_block(block)
+            polls.append((block, functools.partial(self._poll_block, block, decoder, data_queue)))
+        return polls
+
+    async def update_sensors(self, sensors: list[SensorConfig], descriptors: Dict[str, SensorDescriptor]):
+        """
+        Applies a reloaded sensor list: blocks whose sensors are unchanged keep polling on their
+        current schedule, the rest are unscheduled or added. Device connections stay open.
+        """
+        if not self._running:
+            return
+        self._descriptors = descriptors
+        blocks = {b.key: b for b in self._plan(sensors)}
+        removed = [key for key, block in self._blocks.items()
+                   if key not in blocks or _members(blocks[key]) != _members(block)]
+        for key in removed:
+            # Let a running read finish so a pipelined connection does not lose its response
+            self._scheduler.remove_job(key, cancel_in_flight=False)
+            del self._blocks[key]
+            del self._decoders[key]
+            self._intervals.remove_block(key)
+            self._failed_blocks.discard(key)
+        added = [b for key, b in blocks.items() if key not in self._blocks]
+        for key in self._blocks:
+            # Kept blocks pick up changed thresholds and ceilings without losing their activity
+            self._track_block(blocks[key])
+        self._schedule(added, list(blocks.values()))
+        self._apply_budget()
+        if self._blocks:
+            self._scheduler.start()
+        logger.info(f"Modbus: Reload applied ({len(removed)} blocks unscheduled, {len(added)} scheduled, "
+                    f"{len(self._blocks) - len(added)} unchanged).")
 
     async def stop(self):
         logger.info("Stopping Modbus TCP Collector...")
         self._running = False
-        if self.client.connected:
-            await self.client.close()
-            logger.info("Modbus client connection closed.")
-        
-        for sensor_id, task in self._sensor_tasks.items():
-            if not task.done():
-                task.cancel()
-                logger.debug(f"Cancelled task for Modbus sensor {sensor_id}")
-        
-        results = await asyncio.gather(*self._sensor_tasks.values(), return_exceptions=True)
-        for sensor_id, result in zip(self._sensor_tasks.keys(), results):
-            if isinstance(result, asyncio.CancelledError):
-                logger.info(f"Modbus sensor task {sensor_id} was cancelled.")
-            elif isinstance(result, Exception):
-                logger.error(f"Exception in Modbus sensor task {sensor_id} during shutdown: {result}")
-        
-        self._sensor_tasks.clear()
+        await self._scheduler.stop()
+        self.pool.close_all()
+        for block_key, stats in self._scheduler.stats().items():
+            if stats.deadline_misses:
+                logger.info(f"Modbus block {block_key}: {stats.polls} polls, {stats.deadline_misses} missed deadlines, "
+                            f"max jitter {stats.max_jitter_seconds * 1000:.1f} ms")
+        for key in self._blocks:
+            self._intervals.remove_block(key)
+        self._blocks.clear()
+        self._decoders.clear()
+        self._failed_blocks.clear()
         logger.info("Modbus TCP Collector stopped.")
 
     def is_running(self) -> bool:
-        return self._running and any(not task.done() for task in self._sensor_tasks.values())
\ No newline at end of file
+        return self._running and self._scheduler.is_running()
\ No newline at end of file
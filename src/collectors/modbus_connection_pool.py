@@ -0,0 +1,141 @@
+import asyncio
+import contextlib
+import inspect
+import logging
+import time
+from typing import Dict, Optional
+
+from pymodbus.client import AsyncModbusTcpClient
+from pymodbus.exceptions import ModbusException
+
+from ..models.config_models import ModbusCollectorConfig, ModbusDeviceConfig
+from .modbus_read_planner import DEFAULT_DEVICE
+from .modbus_tcp_client import PipelinedModbusTcpClient
+
+logger = logging.getLogger(__name__)
+
+# pymodbus renamed the unit id keyword from "slave" to "device_id" in 3.10
+_UNIT_KWARG = "device_id" if "device_id" in inspect.signature(AsyncModbusTcpClient.read_holding_registers).parameters else "slave"
+# Client method per register_type; pymodbus and PipelinedModbusTcpClient share these names
+_READ_METHODS = {"holding": "read_holding_registers", "input": "read_input_registers",
+                 "coil": "read_coils", "discrete_input": "read_discrete_inputs"}
+
+
+class ModbusReadError(Exception):
+    """A read that got no usable response: timeout, lost connection or a client-side failure."""
+
+
+class ModbusDeviceConnection:
+    """
+    One Modbus TCP connection to a PLC or gateway with its own in-flight limit.
+    Connection attempts never block longer than one connect timeout; after a failure the
+    device is left alone until the retry delay has passed, so a dead device only costs
+    its own polls. The delay doubles with every failed attempt up to max_retry_delay, and
+    attempts take a slot from reconnect_slots, shared by all devices of the pool.
+    """
+
+    def __init__(self, name: str, device_config: ModbusDeviceConfig, read_timeout: float, retry_delay: float,
+                 max_retry_delay: Optional[float] = None, reconnect_slots: Optional[asyncio.Semaphore] = None):
+        self.name = name
+        self.host = device_config.host
+        self.port = device_config.port
+        self.read_timeout = device_config.read_timeout_seconds or read_timeout
+        self.pipelining = device_config.pipelining
+        self.max_in_flight = device_config.max_in_flight
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max(max_retry_delay or retry_delay, retry_delay)
+        self._reconnect_slots = reconnect_slots
+        self._connect_failures = 0
+        if self.pipelining:
+            self.client = PipelinedModbusTcpClient(self.host, self.port, timeout=self.read_timeout)
+        else:
+            self.client = AsyncModbusTcpClient(host=self.host, port=self.port, timeout=self.read_timeout)
+        self._in_flight = asyncio.Semaphore(self.max_in_flight)
+        self._connect_lock = asyncio.Lock()
+        self._next_connect_attempt = 0.0
+
+    @property
+    def connected(self) -> bool:
+        return bool(self.client.connected)
+
+    async def ensure_connected(self) -> bool:
+        if self.connected:
+            return True
+        async with self._connect_lock:
+            if self.connected:
+                return True
+            if time.monotonic() < self._next_connect_attempt:
+                return False
+            async with self._reconnect_slots or contextlib.nullcontext():
+                await self._connect()
+            if self.connected:
+                self._connect_failures = 0
+                logger.info(f"Successfully connected to Modbus device '{self.name}' at {self.host}:{self.port}")
+                return True
+            delay = min(self.retry_delay * 2 ** self._connect_failures, self.max_retry_delay)
+            self._connect_failures += 1
+            self._next_connect_attempt = time.monotonic() + delay
+            logger.info(f"Modbus device '{self.name}': Next connection attempt in {delay:.0f}s.")
+            return False
+
+    async def _connect(self):
+        try:
+            logger.info(f"Attempting to connect to Modbus device '{self.name}' at {self.host}:{self.port}")
+            await asyncio.wait_for(self.client.connect(), timeout=max(self.read_timeout * 10, 1.0))
+        except Exception as e:
+            logger.error(f"Failed to connect to Modbus device '{self.name}' at {self.host}:{self.port}: {e}")
+
+    async def read(self, register_type: str, address: int, count: int, unit_id: int):
+        """
+        Reads count registers (or bits, for coils and discrete inputs) of one register type.
+        Raises ModbusReadError when no response arrives; exception responses are returned.
+        """
+        method = _READ_METHODS[register_type]
+        try:
+            async with self._in_flight:
+                if self.pipelining:
+                    return await getattr(self.client, method)(address, count, unit_id)
+                return await asyncio.wait_for(
+                    getattr(self.client, method)(address=address, count=count, **{_UNIT_KWARG: unit_id}),
+                    timeout=self.read_timeout * 4)
+        except (asyncio.TimeoutError, ConnectionError, ModbusException) as e:
+            raise ModbusReadError(str(e) or type(e).__name__) from e
+
+    def close(self):
+        if self.connected:
+            self.client.close()
+            logger.info(f"Modbus connection to device '{self.name}' closed.")
+
+
+class ModbusConnectionPool:
+    """Keeps one ModbusDeviceConnection per configured device name."""
+
+    def __init__(self, collector_config: ModbusCollectorConfig):
+        self.config = collector_config
+        self._connections: Dict[str, ModbusDeviceConnection] = {}
+        reconnect_slots = asyncio.Semaphore(collector_config.max_concurrent_reconnects)
+        for name, device_config in self.device_configs().items():
+            self._connections[name] = ModbusDeviceConnection(
+                name, device_config, read_timeout=collector_config.default_read_timeout_seconds,
+                retry_delay=collector_config.connection_retry_delay_seconds,
+                max_retry_delay=collector_config.max_connection_retry_delay_seconds, reconnect_slots=reconnect_slots)
+
+    def device_configs(self) -> Dict[str, ModbusDeviceConfig]:
+        devices = dict(self.config.devices)
+        if DEFAULT_DEVICE not in devices:
+            devices[DEFAULT_DEVICE] = ModbusDeviceConfig(host=self.config.host, port=self.config.port,
+                                                         max_in_flight=self.config.default_max_in_flight)
+        return devices
+
+    def get(self, name: Optional[str]) -> Optional[ModbusDeviceConnection]:
+        return self._connections.get(name or DEFAULT_DEVICE)
+
+    def connections(self) -> Dict[str, ModbusDeviceConnection]:
+        return self._connections
+
+    def close_all(self):
+        for connection in self._connections.values():
+            try:
+                connection.close()
+            except Exception as e:
+                logger.error(f"Error closing Modbus connection to device '{connection.name}': {e}")
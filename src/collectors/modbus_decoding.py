@@ -0,0 +1,142 @@
+import math
+import struct
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+from ..models.config_models import SensorModbusCollectorParams
+
+# data type -> (struct code, width in registers); "bool" reads a single coil/discrete input bit
+DATA_TYPES: Dict[str, Tuple[Optional[str], int]] = {
+    "uint16": ("H", 1), "int16": ("h", 1),
+    "uint32": ("I", 2), "int32": ("i", 2), "float32": ("f", 2),
+    "uint64": ("Q", 4), "int64": ("q", 4), "float64": ("d", 4),
+    "bool": (None, 1),
+}
+DATA_TYPE_WIDTHS = {code: width for code, width in DATA_TYPES.values() if code}
+BIT_REGISTER_TYPES = ("coil", "discrete_input")
+
+Value = Union[int, float, None]
+
+
+def register_width(params: SensorModbusCollectorParams) -> int:
+    return DATA_TYPES[params.data_type][1]
+
+
+@dataclass
+class _Field:
+    position: int          # index of the sensor in the block's sensor list
+    offset: int            # register offset in the block
+    code: str
+    mask: int = 0
+    shift: int = 0
+    scale: float = 1.0
+    add: float = 0.0
+
+
+class _Group:
+    """Fields decoded with one precompiled struct call: same buffer and endianness, no overlap."""
+
+    def __init__(self, swapped: bool, prefix: str):
+        self.swapped = swapped
+        self.prefix = prefix
+        self.fields: List[_Field] = []
+        self.end = 0   # next free register offset
+        self.struct: Optional[struct.Struct] = None
+        self.start = 0
+
+    def compile(self):
+        parts, cursor = [], self.fields[0].offset
+        for f in self.fields:
+            if f.offset > cursor:
+                parts.append(f"{(f.offset - cursor) * 2}x")
+            parts.append(f.code)
+            cursor = f.offset + DATA_TYPE_WIDTHS[f.code]
+        self.start = self.fields[0].offset * 2
+        self.struct = struct.Struct(self.prefix + "".join(parts))
+
+
+class BlockDecoder:
+    """
+    Decodes all sensors of one block read in a few struct calls.
+
+    The registers are packed once into a big-endian byte buffer (and, if any sensor needs it,
+    a copy with the bytes of every register swapped). Each (word order, byte order)
+    combination then maps to one buffer and one struct prefix:
+
+        word big,    byte big    -> buffer,  ">"   (ABCD)
+        word little, byte little -> buffer,  "<"   (DCBA)
+        word big,    byte little -> swapped, ">"   (BADC)
+        word little, byte big    -> swapped, "<"   (CDAB)
+
+    Sensors sharing a combination are laid out in one struct format with pad bytes between
+    them, so a block usually decodes in one or two unpack_from calls. Bit masks, scale and
+    offset are applied afterwards; non-finite floats decode as None (Invalid).
+    """
+
+    def __init__(self, params: Sequence[SensorModbusCollectorParams], offsets: Sequence[int], bits: bool = False):
+        self.size = len(params)
+        self.bits = bits
+        self._bit_offsets = list(offsets) if bits else []
+        self._groups: List[_Group] = []
+        self._post: List[_Field] = []
+        self.needs_swap = False
+        if bits:
+            return
+        order = sorted(range(len(params)), key=lambda i: offsets[i])
+        open_groups: Dict[Tuple[bool, str], _Group] = {}
+        for position in order:
+            p = params[position]
+            code, width = DATA_TYPES[p.data_type]
+            swapped = p.word_order != p.byte_order
+            prefix = ">" if p.word_order == "big" else "<"
+            shift = (p.bit_mask & -p.bit_mask).bit_length() - 1 if p.bit_mask else 0
+            field = _Field(position, offsets[position], code, p.bit_mask or 0, shift, p.scale, p.offset)
+            group = open_groups.get((swapped, prefix))
+            if group is None or field.offset < group.end:
+                # Overlaps the previous field of this layout (e.g. two bit masks on one register)
+                group = open_groups[(swapped, prefix)] = _Group(swapped, prefix)
+                self._groups.append(group)
+            group.fields.append(field)
+            group.end = field.offset + width
+            self.needs_swap = self.needs_swap or swapped
+            if field.mask or field.scale != 1.0 or field.add != 0.0 or code in "fd":
+                self._post.append(field)
+        for group in self._groups:
+            group.compile()
+
+    def decode(self, data: Sequence) -> List[Value]:
+        """
+        Values in block sensor order from the response registers (or bits, for coil and
+        discrete input blocks); None where the response is short or a float is not finite.
+        """
+        if self.bits:
+            count = len(data)
+            return [int(bool(data[o])) if o < count else None for o in self._bit_offsets]
+        registers = data
+        count = len(registers)
+        buffer = struct.pack(f">{count}H", *registers)
+        swapped = struct.pack(f"<{count}H", *registers) if self.needs_swap else b""
+        values: List[Value] = [None] * self.size
+        for group in self._groups:
+            source = swapped if group.swapped else buffer
+            if group.start + group.struct.size <= len(source):
+                for field, value in zip(group.fields, group.struct.unpack_from(source, group.start)):
+                    values[field.position] = value
+                continue
+            # Short response: decode what arrived, the rest stays Invalid
+            for field in group.fields:
+                if (field.offset + DATA_TYPE_WIDTHS[field.code]) * 2 <= len(source):
+                    values[field.position] = struct.unpack_from(group.prefix + field.code, source, field.offset * 2)[0]
+        for field in self._post:
+            value = values[field.position]
+            if value is None:
+                continue
+            if field.mask:
+                value = (value & field.mask) >> field.shift
+            if field.code in "fd" and not math.isfinite(value):
+                values[field.position] = None
+                continue
+            if field.scale != 1.0 or field.add != 0.0:
+                value = value * field.scale + field.add
+            values[field.position] = value
+        return values
@@ -0,0 +1,91 @@
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from ..models.config_models import SensorConfig, SensorModbusCollectorParams
+from .modbus_decoding import BIT_REGISTER_TYPES, register_width
+
+logger = logging.getLogger(__name__)
+
+# Modbus application protocol limits for a single read holding/input registers request
+# and a single read coils/discrete inputs request
+MODBUS_MAX_READ_REGISTERS = 125
+MODBUS_MAX_READ_BITS = 2000
+
+# Device name used for sensors that do not name a target device
+DEFAULT_DEVICE = "default"
+
+
+@dataclass
+class PlannedSensor:
+    sensor: SensorConfig
+    offset: int
+    register_count: int = 1
+
+
+@dataclass
+class ReadBlock:
+    device: str
+    unit_id: int
+    polling_interval: float
+    start_address: int
+    count: int
+    sensors: List[PlannedSensor] = field(default_factory=list)
+    register_type: str = "holding"
+
+    @property
+    def end_address(self) -> int:
+        return self.start_address + self.count - 1
+
+    @property
+    def key(self) -> str:
+        return (f"{self.device}/unit{self.unit_id}/{self.register_type}@{self.polling_interval}s:"
+                f"{self.start_address}+{self.count}")
+
+
+def plan_reads(sensors: List[SensorConfig], default_unit_id: int, default_polling_interval: float,
+               max_gap: int = 0, max_block_size: int = MODBUS_MAX_READ_REGISTERS) -> List[ReadBlock]:
+    """
+    Groups Modbus sensors by device, unit id, register type and effective polling interval and
+    merges nearby register addresses into the fewest block reads that stay within max_block_size.
+    Registers up to max_gap apart are read together (the gap registers are discarded).
+    Multi-register values are never split across blocks. Coils and discrete inputs are planned
+    in bits, up to the protocol limit of one request.
+    """
+    max_block_size = min(max_block_size, MODBUS_MAX_READ_REGISTERS)
+    groups: Dict[Tuple[str, int, str, float], List[Tuple[int, int, SensorConfig]]] = {}
+    for sensor in sensors:
+        params = sensor.collector_config
+        if not isinstance(params, SensorModbusCollectorParams):
+            logger.error(f"Invalid collector_config type for Modbus sensor {sensor.id}")
+            continue
+        unit_id = params.unit_id or default_unit_id
+        interval = params.polling_interval_seconds or default_polling_interval
+        device = params.device or DEFAULT_DEVICE
+        groups.setdefault((device, unit_id, params.register_type, interval), []).append(
+            (params.register_address, register_width(params), sensor))
+
+    blocks: List[ReadBlock] = []
+    for (device, unit_id, register_type, interval), members in sorted(groups.items(), key=lambda item: item[0]):
+        members.sort(key=lambda m: m[0])
+        limit = MODBUS_MAX_READ_BITS if register_type in BIT_REGISTER_TYPES else max_block_size
+        current: Optional[ReadBlock] = None
+        for address, register_count, sensor in members:
+            end = address + register_count - 1
+            if current is not None:
+                gap = address - current.end_address - 1
+                new_count = max(end, current.end_address) - current.start_address + 1
+                if gap <= max_gap and new_count <= limit:
+                    current.count = new_count
+                    current.sensors.append(PlannedSensor(sensor, address - current.start_address, register_count))
+                    continue
+                blocks.append(current)
+            current = ReadBlock(device=device, unit_id=unit_id, polling_interval=interval, start_address=address,
+                                count=register_count, sensors=[PlannedSensor(sensor, 0, register_count)],
+                                register_type=register_type)
+        if current is not None:
+            blocks.append(current)
+
+    sensor_count = sum(len(b.sensors) for b in blocks)
+    logger.info(f"Modbus read plan: {sensor_count} sensors in {len(blocks)} block reads.")
+    return blocks
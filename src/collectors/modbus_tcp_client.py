@@ -0,0 +1,193 @@
+import asyncio
+import logging
+import struct
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_MBAP_HEADER = struct.Struct(">HHHB")
+_READ_REQUEST = struct.Struct(">BHH")
+
+READ_COILS = 0x01
+READ_DISCRETE_INPUTS = 0x02
+READ_HOLDING_REGISTERS = 0x03
+READ_INPUT_REGISTERS = 0x04
+
+# MBAP length field: unit id plus a PDU of at most 253 bytes
+_MAX_MBAP_LENGTH = 254
+
+
+class ModbusReadResult:
+    """Minimal read response mirroring the parts of the pymodbus response API used by the collector."""
+
+    __slots__ = ("function_code", "registers", "bits", "exception_code")
+
+    def __init__(self, function_code: int, registers: Optional[List[int]] = None, bits: Optional[List[bool]] = None,
+                 exception_code: Optional[int] = None):
+        self.function_code = function_code
+        self.registers = registers or []
+        self.bits = bits or []
+        self.exception_code = exception_code
+
+    def isError(self) -> bool:
+        return self.exception_code is not None
+
+    def __repr__(self) -> str:
+        if self.exception_code is not None:
+            return f"ModbusReadResult(fc={self.function_code:#04x}, exception_code={self.exception_code})"
+        return f"ModbusReadResult(fc={self.function_code:#04x}, registers={len(self.registers)}, bits={len(self.bits)})"
+
+
+def _response_error(pdu: bytes, function_code: int, count: int) -> Optional[str]:
+    """Why a read response PDU does not answer the request, or None if it does."""
+    if pdu[0] & 0x7F != function_code:
+        return f"function code {pdu[0] & 0x7F:#04x} for a {function_code:#04x} request"
+    if pdu[0] & 0x80:
+        return None if len(pdu) == 2 else f"exception response of {len(pdu)} bytes"
+    if function_code in (READ_COILS, READ_DISCRETE_INPUTS):
+        expected = (count + 7) // 8
+    else:
+        expected = 2 * count
+    if len(pdu) < 2 or pdu[1] != expected or len(pdu) != 2 + expected:
+        return f"{len(pdu) - 2} data bytes (byte count {pdu[1] if len(pdu) > 1 else None}) for {count} items, expected {expected}"
+    return None
+
+
+class _PipelinedModbusProtocol(asyncio.Protocol):
+    def __init__(self, client: "PipelinedModbusTcpClient"):
+        self._client = client
+        self._buffer = bytearray()
+        self._transport: Optional[asyncio.Transport] = None
+
+    def connection_made(self, transport):
+        self._transport = transport
+        self._client._transport = transport
+
+    def data_received(self, data: bytes):
+        buffer = self._buffer
+        buffer += data
+        while len(buffer) >= _MBAP_HEADER.size:
+            tid, pid, length, unit_id = _MBAP_HEADER.unpack_from(buffer, 0)
+            if pid != 0 or not 2 <= length <= _MAX_MBAP_LENGTH:
+                # Frame boundaries are lost; no later byte of this stream can be trusted
+                buffer.clear()
+                self._client._abort(f"bad MBAP header (protocol id {pid}, length {length})")
+                return
+            frame_end = 6 + length
+            if len(buffer) < frame_end:
+                break
+            pdu = bytes(buffer[_MBAP_HEADER.size:frame_end])
+            del buffer[:frame_end]
+            self._client._resolve(tid, unit_id, pdu)
+            if self._client._transport is not self._transport:
+                # The response aborted the connection
+                buffer.clear()
+                return
+
+    def connection_lost(self, exc):
+        # After close() or an abort the client may already be on a new connection
+        if self._client._transport is self._transport:
+            self._client._connection_lost(exc)
+
+
+class PipelinedModbusTcpClient:
+    """
+    Asyncio Modbus TCP client that keeps several requests in flight on one connection.
+    Responses are matched to requests by MBAP transaction id, so the slave must support
+    queued transactions (most Modbus TCP PLCs and gateways do).
+    """
+
+    def __init__(self, host: str, port: int, timeout: float):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self._transport: Optional[asyncio.Transport] = None
+        # transaction id -> (future, function code, count, unit id)
+        self._pending: Dict[int, Tuple[asyncio.Future, int, int, int]] = {}
+        self._next_tid = 0
+
+    @property
+    def connected(self) -> bool:
+        return self._transport is not None and not self._transport.is_closing()
+
+    async def connect(self) -> bool:
+        loop = asyncio.get_running_loop()
+        await asyncio.wait_for(loop.create_connection(lambda: _PipelinedModbusProtocol(self), self.host, self.port),
+                               timeout=self.timeout * 10)
+        return self.connected
+
+    def close(self):
+        if self._transport is not None:
+            self._transport.close()
+        self._connection_lost(None)
+
+    def _connection_lost(self, exc: Optional[Exception]):
+        self._transport = None
+        pending, self._pending = self._pending, {}
+        for future, *_ in pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError(f"Modbus connection to {self.host}:{self.port} lost: {exc}"))
+
+    def _abort(self, reason: str):
+        """Fails every pending request and drops the connection; the next read reconnects."""
+        logger.error(f"Modbus {self.host}:{self.port}: {reason}. Dropping the connection.")
+        transport = self._transport
+        self._connection_lost(ConnectionError(reason))
+        if transport is not None:
+            transport.abort()
+
+    def _resolve(self, tid: int, unit_id: int, pdu: bytes):
+        request = self._pending.pop(tid, None)
+        if request is None or request[0].done():
+            logger.debug("Modbus %s:%d: dropping response for unknown transaction %d", self.host, self.port, tid)
+            return
+        future, function_code, count, request_unit_id = request
+        error = _response_error(pdu, function_code, count)
+        if error is None and unit_id != request_unit_id:
+            error = f"unit id {unit_id} for a request to unit {request_unit_id}"
+        if error is not None:
+            # A response that does not fit its request means transactions got mixed up
+            self._pending[tid] = request
+            self._abort(f"transaction {tid}: {error}")
+            return
+        future.set_result(pdu)
+
+    def _allocate_tid(self) -> int:
+        for _ in range(0x10000):
+            self._next_tid = (self._next_tid + 1) & 0xFFFF
+            if self._next_tid not in self._pending:
+                return self._next_tid
+        raise RuntimeError("No free Modbus transaction ids")
+
+    async def _read(self, function_code: int, address: int, count: int, unit_id: int) -> ModbusReadResult:
+        if not self.connected:
+            raise ConnectionError(f"Modbus client {self.host}:{self.port} is not connected")
+        tid = self._allocate_tid()
+        future = asyncio.get_running_loop().create_future()
+        self._pending[tid] = (future, function_code, count, unit_id)
+        self._transport.write(_MBAP_HEADER.pack(tid, 0, 1 + _READ_REQUEST.size, unit_id)
+                              + _READ_REQUEST.pack(function_code, address, count))
+        try:
+            pdu = await asyncio.wait_for(future, timeout=self.timeout)
+        finally:
+            self._pending.pop(tid, None)
+
+        if pdu[0] & 0x80:
+            return ModbusReadResult(function_code, exception_code=pdu[1])
+        data = pdu[2:]
+        if function_code in (READ_COILS, READ_DISCRETE_INPUTS):
+            bits = [bool(data[i >> 3] & (1 << (i & 7))) for i in range(min(count, len(data) * 8))]
+            return ModbusReadResult(function_code, bits=bits)
+        return ModbusReadResult(function_code, registers=list(struct.unpack(f">{len(data) // 2}H", data)))
+
+    async def read_coils(self, address: int, count: int, unit_id: int) -> ModbusReadResult:
+        return await self._read(READ_COILS, address, count, unit_id)
+
+    async def read_discrete_inputs(self, address: int, count: int, unit_id: int) -> ModbusReadResult:
+        return await self._read(READ_DISCRETE_INPUTS, address, count, unit_id)
+
+    async def read_holding_registers(self, address: int, count: int, unit_id: int) -> ModbusReadResult:
+        return await self._read(READ_HOLDING_REGISTERS, address, count, unit_id)
+
+    async def read_input_registers(self, address: int, count: int, unit_id: int) -> ModbusReadResult:
+        return await self._read(READ_INPUT_REGISTERS, address, count, unit_id)
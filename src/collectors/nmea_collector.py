@@ -1,102 +1,151 @@
 import asyncio
 import logging
+import time
 import pynmea2
-from datetime import datetime, timezone
-from typing import Optional, Dict
+from typing import Dict, Optional
 
-from ..models.config_models import SensorConfig, SensorNmeaCollectorParams, NmeaCollectorConfig
-from ..models.sensor_reading import SensorReading
+from ..metrics.registry import REGISTRY
+from ..models.config_models import SensorConfig, SensorNmeaCollectorParams, NmeaCollectorConfig, NmeaSourceConfig
+from ..models.sensor_reading import SensorDescriptor, SensorReading
+from .nmea_fast_parser import parse_fast
+from .nmea_framing import split_checksum, xor_checksum
+from .nmea_router import NmeaRouter, extract_value, route_key_from_frame
+from .nmea_sources import SOURCE_TYPES, NmeaSource, ReplaySource
+
+# Source name used when the collector is configured with a single host/port
+DEFAULT_SOURCE = "default"
 
 logger = logging.getLogger(__name__)
 
+NMEA_SENTENCES = REGISTRY.counter("gateway_nmea_sentences_total", "NMEA sentences routed to at least one sensor")
+NMEA_UNROUTED = REGISTRY.counter("gateway_nmea_unrouted_total", "NMEA sentences dropped unparsed (no subscriber)")
+NMEA_CHECKSUM_ERRORS = REGISTRY.counter("gateway_nmea_checksum_errors_total", "NMEA sentences with a bad checksum")
+NMEA_PARSE_ERRORS = REGISTRY.counter("gateway_nmea_parse_errors_total", "NMEA sentences that failed to parse")
+NMEA_PARSE_SECONDS = REGISTRY.histogram("gateway_nmea_parse_seconds", "NMEA checksum check and parse time per sentence",
+                                        buckets=(1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 1e-3))
+
 class NmeaCollector:
     def __init__(self, collector_config: NmeaCollectorConfig):
         self.config = collector_config
-        self._sensor_configs: Dict[str, SensorConfig] = {}
+        self._sources: Dict[str, NmeaSource] = {}
         self._data_queue: Optional[asyncio.Queue] = None
-        self._connection_task: Optional[asyncio.Task] = None
         self._running = False
-        self._reader: Optional[asyncio.StreamReader] = None
-        self._writer: Optional[asyncio.StreamWriter] = None
 
-    async def _process_line(self, raw_line: str):
+    async def _process_frame(self, router: NmeaRouter, frame: bytes):
         if not self._data_queue: return
 
         try:
-            clean_line = raw_line.strip()
-            if not clean_line: return
-
-            nmea_msg = pynmea2.parse(clean_line)
-            
-            for sensor_id, sensor_cfg in self._sensor_configs.items():
-                if not isinstance(sensor_cfg.collector_config, SensorNmeaCollectorParams): continue
-                nmea_params = sensor_cfg.collector_config
-                
-                if (nmea_msg.talker == nmea_params.expected_talker_id and
-                    nmea_msg.sentence_type == nmea_params.expected_sentence_type):
-                    
-                    value = None
-                    status = "Invalid" 
-
-                    if nmea_msg.sentence_type == 'ROT':
-                        if len(nmea_msg.data) >= 2:
-                            rot_str, data_status_char = nmea_msg.data[0], nmea_msg.data[1]
-                            if data_status_char == 'A':
-                                try: value = float(rot_str); status = "Valid"
-                                except ValueError: logger.error(f"NMEA: Bad ROT value '{rot_str}'")
-
-                    reading = SensorReading(
-                        sensor_id=sensor_id, value=value, unit=sensor_cfg.publisher_config.unit, status=status,
-                        timestamp=datetime.now(timezone.utc), mqtt_topic_suffix=sensor_cfg.publisher_config.mqtt_topic_suffix,
-                        change_threshold=sensor_cfg.publisher_config.change_threshold,
-                        min_publish_interval_seconds=sensor_cfg.publisher_config.min_publish_interval_seconds
-                    )
-                    await self._data_queue.put(reading)
-                    return 
+            subscribers = router.lookup(route_key_from_frame(frame))
+            if not subscribers:
+                NMEA_UNROUTED.inc()
+                return
+            NMEA_SENTENCES.inc()
+
+            started = time.perf_counter()
+            body, transmitted_checksum = split_checksum(frame)
+            if transmitted_checksum is not None and xor_checksum(body) != transmitted_checksum:
+                NMEA_CHECKSUM_ERRORS.inc()
+                logger.warning("NMEA: Checksum mismatch. Raw: %r", frame)
+                return
+
+            nmea_msg = parse_fast(body)
+            if nmea_msg is None:
+                nmea_msg = pynmea2.parse(frame.decode('ascii', errors='ignore'))
+            NMEA_PARSE_SECONDS.observe(time.perf_counter() - started)
+
+            timestamp_ns = time.time_ns()
+            for subscriber in subscribers:
+                value, status_code = extract_value(nmea_msg, nmea_msg.sentence_type, subscriber.value_field)
+                await self._data_queue.put(SensorReading(subscriber.descriptor, value, status_code, timestamp_ns))
         except pynmea2.ParseError:
-            logger.warning(f"NMEA: Parse Error. Raw: '{raw_line.strip()}'")
+            NMEA_PARSE_ERRORS.inc()
+            logger.warning("NMEA: Parse Error. Raw: %r", frame)
         except Exception as e:
-            logger.error(f"NMEA: Error processing line '{raw_line.strip()}': {e}")
-
-    async def _connection_loop(self):
-        logger.info(f"NMEA: Connecting to TCP {self.config.host}:{self.config.port}")
-        while self._running:
-            try:
-                self._reader, self._writer = await asyncio.open_connection(self.config.host, self.config.port)
-                logger.info(f"NMEA: Connected to TCP server: {self.config.host}:{self.config.port}")
-                while self._running:
-                    line_bytes = await self._reader.readline()
-                    if not line_bytes: logger.warning("NMEA: Server closed connection."); break 
-                    await self._process_line(line_bytes.decode('ascii', errors='ignore'))
-            except Exception as e:
-                logger.error(f"NMEA: Connection/read error: {e}. Retrying in {self.config.connection_retry_delay_seconds}s...")
-            finally:
-                if self._writer and not self._writer.is_closing():
-                    self._writer.close()
-                    try: await self._writer.wait_closed()
-                    except Exception: pass
-                self._reader, self._writer = None, None
-            if not self._running: break
-            await asyncio.sleep(self.config.connection_retry_delay_seconds)
-        logger.info("NMEA: Connection loop stopped.")
-
-    async def start(self, sensors_to_collect: list[SensorConfig], data_queue: asyncio.Queue):
+            NMEA_PARSE_ERRORS.inc()
+            logger.error("NMEA: Error processing frame %r: %s", frame, e)
+
+    def _source_configs(self) -> list[NmeaSourceConfig]:
+        if self.config.sources:
+            return list(self.config.sources)
+        return [NmeaSourceConfig(name=DEFAULT_SOURCE, type="tcp_client", host=self.config.host, port=self.config.port)]
+
+    def _sensors_for_source(self, source_name: str, sensors: list[SensorConfig]) -> list[SensorConfig]:
+        return [s for s in sensors
+                if isinstance(s.collector_config, SensorNmeaCollectorParams)
+                and s.collector_config.source in (None, source_name)]
+
+    async def start(self, sensors_to_collect: list[SensorConfig], data_queue: asyncio.Queue,
+                    descriptors: Optional[Dict[str, SensorDescriptor]] = None):
         if not self.config.enabled: return
         self._running = True
         self._data_queue = data_queue
-        for sensor_cfg in sensors_to_collect:
-            if sensor_cfg.collector_type == "nmea":
-                if isinstance(sensor_cfg.collector_config, SensorNmeaCollectorParams):
-                    self._sensor_configs[sensor_cfg.id] = sensor_cfg
-        if not self._sensor_configs: logger.info("NMEA: No sensors for this collector."); self._running=False; return
-        self._connection_task = asyncio.create_task(self._connection_loop())
+        for source_cfg, router in self._build_routers(sensors_to_collect, descriptors):
+            if not router.sensor_count():
+                logger.info(f"NMEA[{source_cfg.name}]: No sensors routed to this source. Not starting it.")
+                continue
+            self._start_source(source_cfg, router)
+        if not self._sources: logger.info("NMEA: No sensors for this collector."); self._running=False; return
+
+    def _build_routers(self, sensors: list[SensorConfig],
+                       descriptors: Optional[Dict[str, SensorDescriptor]]) -> list[tuple[NmeaSourceConfig, NmeaRouter]]:
+        nmea_sensors = [s for s in sensors if s.collector_type == "nmea"]
+        source_configs = self._source_configs()
+        known_sources = {c.name for c in source_configs}
+        for sensor_cfg in nmea_sensors:
+            source = getattr(sensor_cfg.collector_config, "source", None)
+            if source is not None and source not in known_sources:
+                logger.error(f"NMEA: Unknown source '{source}' for sensor {sensor_cfg.id}. Skipping.")
+        return [(c, NmeaRouter(self._sensors_for_source(c.name, nmea_sensors), descriptors)) for c in source_configs]
+
+    def _start_source(self, source_cfg: NmeaSourceConfig, router: NmeaRouter):
+        source = SOURCE_TYPES[source_cfg.type](source_cfg, router, self._process_frame,
+                                               read_chunk_bytes=self.config.read_chunk_bytes,
+                                               retry_delay=self.config.connection_retry_delay_seconds)
+        self._sources[source_cfg.name] = source
+        source.start()
+
+    def attach_replay(self, sensors_to_collect: list[SensorConfig], data_queue: asyncio.Queue,
+                      descriptors: Dict[str, SensorDescriptor]) -> Dict[str, ReplaySource]:
+        """
+        Sets the collector up for capture replay: every configured source gets a ReplaySource
+        with the same routing, fed by the replay instead of a connection. Keyed by source name.
+        """
+        self._running = True
+        self._data_queue = data_queue
+        for source_cfg, router in self._build_routers(sensors_to_collect, descriptors):
+            self._sources[source_cfg.name] = ReplaySource(source_cfg, router, self._process_frame,
+                                                          read_chunk_bytes=self.config.read_chunk_bytes,
+                                                          retry_delay=self.config.connection_retry_delay_seconds)
+        return dict(self._sources)
+
+    async def update_sensors(self, sensors: list[SensorConfig], descriptors: Dict[str, SensorDescriptor]):
+        """
+        Applies a reloaded sensor list by swapping each source's router. Running sources keep
+        their connection; a source is only started or stopped when it gains its first sensor
+        or loses its last one.
+        """
+        if not self.config.enabled or self._data_queue is None: return
+        for source_cfg, router in self._build_routers(sensors, descriptors):
+            source = self._sources.get(source_cfg.name)
+            if source is None:
+                if router.sensor_count():
+                    logger.info(f"NMEA[{source_cfg.name}]: Sensors added by reload. Starting source.")
+                    self._start_source(source_cfg, router)
+            elif not router.sensor_count():
+                logger.info(f"NMEA[{source_cfg.name}]: No sensors left after reload. Stopping source.")
+                await source.stop()
+                del self._sources[source_cfg.name]
+            else:
+                router.dropped_sentences = source.router.dropped_sentences
+                source.router = router
+        self._running = bool(self._sources)
 
     async def stop(self):
         self._running = False
-        if self._writer and not self._writer.is_closing():
-            self._writer.close(); await asyncio.sleep(0.1)
-        if self._connection_task and not self._connection_task.done():
-            self._connection_task.cancel()
-            try: await self._connection_task
-            except asyncio.CancelledError: pass
-        logger.info("NMEA TCP Collector stopped.")
\ No newline at end of file
+        await asyncio.gather(*(source.stop() for source in self._sources.values()), return_exceptions=True)
+        for source in self._sources.values():
+            if source.router.dropped_sentences:
+                logger.info(f"NMEA[{source.name}]: {source.router.dropped_sentences} sentences without subscribers were dropped unparsed.")
+        self._sources.clear()
+        self._data_queue = None
+        logger.info("NMEA Collector stopped.")
\ No newline at end of file
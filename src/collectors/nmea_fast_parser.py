@@ -0,0 +1,73 @@
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Field names follow pynmea2 so routing and value extraction work the same on both paths
+_FIELD_NAMES: Dict[str, Tuple[str, ...]] = {
+    "ROT": ("rate_of_turn", "status"),
+    "HDT": ("heading", "hdg_true"),
+    "HDG": ("heading", "deviation", "dev_dir", "variation", "var_dir"),
+    "VTG": ("true_track", "true_track_sym", "mag_track", "mag_track_sym", "spd_over_grnd_kts",
+            "spd_over_grnd_kts_sym", "spd_over_grnd_kmph", "spd_over_grnd_kmph_sym", "faa_mode"),
+    "MWV": ("wind_angle", "reference", "wind_speed", "wind_speed_units", "status"),
+    "GGA": ("timestamp", "lat", "lat_dir", "lon", "lon_dir", "gps_qual", "num_sats", "horizontal_dil",
+            "altitude", "altitude_units", "geo_sep", "geo_sep_units", "age_gps_data", "ref_station_id"),
+}
+
+FAST_SENTENCE_TYPES = frozenset(_FIELD_NAMES)
+
+
+class FastSentence:
+    """Parsed sentence exposing its fields as attributes, like a pynmea2 sentence."""
+
+    def __init__(self, talker: str, sentence_type: str, fields: Dict[str, str]):
+        self.__dict__.update(fields)
+        self.talker = talker
+        self.sentence_type = sentence_type
+
+
+def _nmea_degrees(value: str, hemisphere: str, negative: str) -> Optional[float]:
+    if not value:
+        return None
+    point = value.find(".")
+    split_at = (point if point != -1 else len(value)) - 2
+    degrees = float(value[:split_at] or 0) + float(value[split_at:]) / 60.0
+    return -degrees if hemisphere == negative else degrees
+
+
+def _finish_gga(fields: Dict[str, str]):
+    # Fields are converted one by one, so a malformed one only invalidates its own value.
+    # Like pynmea2, a typed field that does not convert keeps its raw text.
+    try:
+        fields["gps_qual"] = int(fields["gps_qual"] or 0)
+    except ValueError:
+        pass
+    for target, name, hemisphere, negative in (("latitude", "lat", "lat_dir", "S"), ("longitude", "lon", "lon_dir", "W")):
+        try:
+            fields[target] = _nmea_degrees(fields[name], fields[hemisphere], negative)
+        except ValueError:
+            fields[target] = None
+
+
+_FINISHERS: Dict[str, Callable[[Dict[str, str]], None]] = {"GGA": _finish_gga}
+
+
+def parse_fast(body: bytes) -> Optional[FastSentence]:
+    """
+    Parses the body of a hot sentence type (between '$' and '*', checksum already verified).
+    Returns None if the type is not handled here, so the caller can fall back to pynmea2.
+    """
+    parts: List[str] = body.decode("ascii", errors="ignore").split(",")
+    address = parts[0]
+    names = _FIELD_NAMES.get(address[2:])
+    if names is None or len(address) != 5:
+        return None
+    values = parts[1:]
+    if len(values) < len(names):
+        values += [""] * (len(names) - len(values))
+    fields = dict(zip(names, values))
+    finisher = _FINISHERS.get(address[2:])
+    if finisher is not None:
+        finisher(fields)
+    return FastSentence(address[:2], address[2:], fields)
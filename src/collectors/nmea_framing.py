@@ -0,0 +1,67 @@
+import logging
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# IEC 61162-1 limits a sentence to 82 characters; anything much longer is line noise
+MAX_FRAME_LENGTH = 1024
+
+
+class NmeaFramer:
+    """
+    Splits a byte stream into NMEA frames on CR and/or LF. Incomplete trailing data is kept
+    in a reusable buffer until the next chunk arrives.
+    """
+
+    def __init__(self, max_frame_length: int = MAX_FRAME_LENGTH):
+        self.max_frame_length = max_frame_length
+        self._buffer = bytearray()
+        self.discarded_bytes = 0
+
+    def feed(self, chunk: bytes) -> List[bytes]:
+        buffer = self._buffer
+        buffer += chunk
+        end = max(buffer.rfind(b"\n"), buffer.rfind(b"\r"))
+        if end == -1:
+            if len(buffer) > self.max_frame_length:
+                self.discarded_bytes += len(buffer)
+                buffer.clear()
+            return []
+        frames = [frame for frame in (line.strip() for line in bytes(buffer[:end + 1]).splitlines()) if frame]
+        del buffer[:end + 1]
+        return frames
+
+    def reset(self):
+        self._buffer.clear()
+
+
+def xor_checksum(data: bytes) -> int:
+    """XOR of all bytes, folded on a single integer instead of looping byte by byte in Python."""
+    width = len(data)
+    if width == 0:
+        return 0
+    value = int.from_bytes(data, "little")
+    while width > 1:
+        half = (width + 1) // 2
+        value = (value & ((1 << (8 * half)) - 1)) ^ (value >> (8 * half))
+        width = half
+    return value
+
+
+def split_checksum(frame: bytes) -> Tuple[bytes, Optional[int]]:
+    """
+    Returns (body between the start delimiter and '*', transmitted checksum). The checksum is
+    None when the sentence has no checksum field, and -1 when the field is not valid hex.
+    """
+    star = frame.rfind(b"*")
+    if star == -1:
+        return frame[1:], None
+    try:
+        return frame[1:star], int(frame[star + 1:star + 3], 16)
+    except ValueError:
+        return frame[1:star], -1
+
+
+def checksum_ok(frame: bytes) -> bool:
+    body, transmitted = split_checksum(frame)
+    return transmitted is None or xor_checksum(body) == transmitted
@@ -0,0 +1,111 @@
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from ..models.config_models import SensorConfig, SensorNmeaCollectorParams
+from ..models.sensor_reading import STATUS_INVALID, STATUS_VALID, SensorDescriptor
+
+logger = logging.getLogger(__name__)
+
+RouteKey = Tuple[str, str]
+
+# Field published when a sensor does not set value_field
+DEFAULT_VALUE_FIELDS: Dict[str, str] = {
+    "ROT": "rate_of_turn",
+    "HDT": "heading",
+    "HDG": "heading",
+    "VTG": "spd_over_grnd_kts",
+    "MWV": "wind_speed",
+    "GGA": "altitude",
+}
+
+# (status field, value meaning "valid") for sentence types that carry a data status
+_STATUS_FIELDS: Dict[str, Tuple[str, str]] = {
+    "ROT": ("status", "A"),
+    "MWV": ("status", "A"),
+    "RMC": ("status", "A"),
+    "GLL": ("status", "A"),
+}
+
+
+@dataclass
+class NmeaSubscriber:
+    sensor: SensorConfig
+    value_field: str
+    descriptor: SensorDescriptor
+
+
+def route_key_from_frame(frame: bytes) -> Optional[RouteKey]:
+    """
+    Reads (talker, sentence type) from the address field of a raw frame without parsing it.
+    Returns None for frames that are not talker sentences (e.g. proprietary $P... sentences).
+    """
+    if len(frame) < 6 or frame[0] not in b"$!":
+        return None
+    comma = frame.find(b",", 1)
+    address = frame[1:comma] if comma != -1 else frame[1:].split(b"*", 1)[0]
+    if len(address) < 5 or address[0] == 0x50:  # 'P'
+        return None
+    address_str = address.decode("ascii", errors="ignore")
+    return address_str[:2], address_str[2:]
+
+
+def extract_value(fields: Any, sentence_type: str, value_field: str) -> Tuple[Optional[float], int]:
+    """
+    Returns (value, status code) for one subscriber. fields is a parsed pynmea2 sentence or any
+    object exposing the sentence fields as attributes.
+    """
+    status_rule = _STATUS_FIELDS.get(sentence_type)
+    if status_rule is not None and getattr(fields, status_rule[0], None) != status_rule[1]:
+        return None, STATUS_INVALID
+    if sentence_type == "GGA" and not getattr(fields, "gps_qual", 0):
+        return None, STATUS_INVALID
+
+    raw_value: Union[str, float, None] = getattr(fields, value_field, None)
+    if raw_value is None or raw_value == "":
+        return None, STATUS_INVALID
+    try:
+        return float(raw_value), STATUS_VALID
+    except (TypeError, ValueError):
+        logger.error("NMEA: Bad %s %s value '%s'", sentence_type, value_field, raw_value)
+        return None, STATUS_INVALID
+
+
+class NmeaRouter:
+    """
+    Prebuilt index from (talker, sentence type) to every sensor subscribed to that sentence,
+    so one sentence can feed several sensors and unsubscribed sentences can be dropped
+    before they are parsed.
+    """
+
+    def __init__(self, sensors: List[SensorConfig], descriptors: Optional[Dict[str, SensorDescriptor]] = None):
+        self._routes: Dict[RouteKey, List[NmeaSubscriber]] = {}
+        self._descriptors = descriptors or {}
+        self.dropped_sentences = 0
+        for sensor in sensors:
+            self.add_sensor(sensor)
+
+    def add_sensor(self, sensor: SensorConfig) -> bool:
+        params = sensor.collector_config
+        if not isinstance(params, SensorNmeaCollectorParams):
+            logger.error(f"Invalid collector_config type for NMEA sensor {sensor.id}")
+            return False
+        sentence_type = params.expected_sentence_type.upper()
+        value_field = params.value_field or DEFAULT_VALUE_FIELDS.get(sentence_type)
+        if value_field is None:
+            logger.error(f"NMEA sensor {sensor.id}: no value_field configured for sentence type {sentence_type}. Skipping.")
+            return False
+        key = (params.expected_talker_id.upper(), sentence_type)
+        descriptor = self._descriptors.get(sensor.id) or SensorDescriptor.from_config(sensor, -1)
+        self._routes.setdefault(key, []).append(NmeaSubscriber(sensor, value_field, descriptor))
+        return True
+
+    def lookup(self, key: Optional[RouteKey]) -> List[NmeaSubscriber]:
+        subscribers = self._routes.get(key) if key is not None else None
+        if not subscribers:
+            self.dropped_sentences += 1
+            return []
+        return subscribers
+
+    def sensor_count(self) -> int:
+        return sum(len(subscribers) for subscribers in self._routes.values())
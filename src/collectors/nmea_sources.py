@@ -0,0 +1,252 @@
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+import socket
+import struct
+from typing import Awaitable, Callable, List, Optional, Set
+
+from ..capture import capture_file
+from ..metrics.registry import REGISTRY
+from ..models.config_models import NmeaSourceConfig
+from .nmea_framing import NmeaFramer
+from .nmea_router import NmeaRouter
+
+logger = logging.getLogger(__name__)
+
+FrameHandler = Callable[[NmeaRouter, bytes], Awaitable[None]]
+
+NMEA_BYTES = REGISTRY.counter("gateway_nmea_bytes_total", "Bytes received per NMEA source", ("source",))
+NMEA_DATAGRAMS_DROPPED = REGISTRY.counter("gateway_nmea_datagrams_dropped_total",
+                                          "UDP datagrams dropped because the source queue was full", ("source",))
+
+# IEC 61162-450 datagram header ("UdPbC" + NUL) preceding the sentences of one datagram
+IEC_61162_450_HEADER = b"UdPbC\x00"
+
+
+def strip_tag_block(frame: bytes) -> bytes:
+    """Removes an IEC 61162-450 / NMEA 4.x tag block (\\s:SRC,c:123*hh\\) in front of a sentence."""
+    if frame[:1] == b"\\":
+        end = frame.find(b"\\", 1)
+        if end != -1:
+            return frame[end + 1:]
+    return frame
+
+
+def split_datagram(data: bytes) -> List[bytes]:
+    """The sentences of one UDP datagram, without IEC 61162-450 header and tag blocks."""
+    if data.startswith(IEC_61162_450_HEADER):
+        data = data[len(IEC_61162_450_HEADER):]
+    return [strip_tag_block(line.strip()) for line in data.splitlines() if line.strip()]
+
+
+class NmeaSource(ABC):
+    """One NMEA input with its own sensor routing and its own reconnect loop."""
+
+    def __init__(self, config: NmeaSourceConfig, router: NmeaRouter, frame_handler: FrameHandler,
+                 read_chunk_bytes: int, retry_delay: float):
+        self.config = config
+        self.name = config.name
+        self.router = router
+        self._frame_handler = frame_handler
+        self.read_chunk_bytes = read_chunk_bytes
+        self.retry_delay = config.connection_retry_delay_seconds or retry_delay
+        self._running = False
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def endpoint(self) -> str:
+        return f"{self.config.host}:{self.config.port}"
+
+    @abstractmethod
+    async def _run_once(self):
+        """Connects (or binds) and reads until the input closes; errors are retried by _run."""
+        pass
+
+    async def _run(self):
+        while self._running:
+            try:
+                await self._run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"NMEA[{self.name}]: {self.config.type} {self.endpoint} error: {e}. "
+                             f"Retrying in {self.retry_delay}s...")
+            if not self._running: break
+            await asyncio.sleep(self.retry_delay)
+        logger.info(f"NMEA[{self.name}]: Source loop stopped.")
+
+    async def _read_stream(self, reader: asyncio.StreamReader):
+        framer = NmeaFramer()
+        bytes_counter = NMEA_BYTES.labels(self.name)
+        while self._running:
+            chunk = await reader.read(self.read_chunk_bytes)
+            if not chunk: return
+            bytes_counter.inc(len(chunk))
+            if capture_file.ACTIVE is not None:
+                capture_file.ACTIVE.nmea(self.name, chunk)
+            for frame in framer.feed(chunk):
+                await self._frame_handler(self.router, strip_tag_block(frame))
+
+    def start(self):
+        self._running = True
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._running = False
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try: await self._task
+            except asyncio.CancelledError: pass
+
+
+class TcpClientSource(NmeaSource):
+    async def _run_once(self):
+        logger.info(f"NMEA[{self.name}]: Connecting to TCP {self.endpoint}")
+        reader, writer = await asyncio.open_connection(self.config.host, self.config.port)
+        logger.info(f"NMEA[{self.name}]: Connected to TCP server: {self.endpoint}")
+        try:
+            await self._read_stream(reader)
+            if self._running: logger.warning(f"NMEA[{self.name}]: Server closed connection.")
+        finally:
+            writer.close()
+            try: await writer.wait_closed()
+            except Exception: pass
+
+
+class TcpServerSource(NmeaSource):
+    """Listens for NMEA talkers (e.g. multiplexers configured as TCP clients) connecting to the gateway."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._client_tasks: Set[asyncio.Task] = set()
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        peer = writer.get_extra_info("peername")
+        logger.info(f"NMEA[{self.name}]: Talker connected from {peer}")
+        task = asyncio.current_task()
+        self._client_tasks.add(task)
+        try:
+            await self._read_stream(reader)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"NMEA[{self.name}]: Read error from {peer}: {e}")
+        finally:
+            self._client_tasks.discard(task)
+            writer.close()
+            logger.info(f"NMEA[{self.name}]: Talker {peer} disconnected.")
+
+    async def _run_once(self):
+        server = await asyncio.start_server(self._handle_client, self.config.host, self.config.port)
+        logger.info(f"NMEA[{self.name}]: Listening on TCP {self.endpoint}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for task in list(self._client_tasks):
+                task.cancel()
+
+
+class _DatagramProtocol(asyncio.DatagramProtocol):
+    def __init__(self, queue: asyncio.Queue, source_name: str):
+        self._queue = queue
+        self._source_name = source_name
+        self.closed = asyncio.get_running_loop().create_future()
+        self.dropped_datagrams = 0
+
+    def datagram_received(self, data: bytes, addr):
+        try:
+            self._queue.put_nowait(data)
+        except asyncio.QueueFull:
+            self.dropped_datagrams += 1
+
+    def error_received(self, exc):
+        logger.warning(f"NMEA[{self._source_name}]: UDP error: {exc}")
+
+    def connection_lost(self, exc):
+        if not self.closed.done():
+            self.closed.set_result(exc)
+        # Wakes the reader if it waits on an empty queue; a non-empty one is checked per datagram
+        try:
+            self._queue.put_nowait(None)
+        except asyncio.QueueFull:
+            pass
+
+
+class UdpSource(NmeaSource):
+    """UDP unicast or multicast listener, e.g. IEC 61162-450 bridge network groups."""
+
+    DATAGRAM_QUEUE_SIZE = 4096
+
+    def _make_socket(self) -> socket.socket:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        group = self.config.multicast_group
+        sock.bind((group if group else self.config.host, self.config.port))
+        if group:
+            membership = struct.pack("4s4s", socket.inet_aton(group), socket.inet_aton(self.config.multicast_interface))
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+        sock.setblocking(False)
+        return sock
+
+    @property
+    def endpoint(self) -> str:
+        if self.config.multicast_group:
+            return f"{self.config.multicast_group}:{self.config.port} (multicast)"
+        return super().endpoint
+
+    async def _run_once(self):
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.DATAGRAM_QUEUE_SIZE)
+        transport, protocol = await loop.create_datagram_endpoint(lambda: _DatagramProtocol(queue, self.name),
+                                                                  sock=self._make_socket())
+        logger.info(f"NMEA[{self.name}]: Listening on UDP {self.endpoint}")
+        bytes_counter = NMEA_BYTES.labels(self.name)
+        NMEA_DATAGRAMS_DROPPED.labels(self.name).set_function(lambda: protocol.dropped_datagrams)
+        try:
+            while self._running and not protocol.closed.done():
+                data = await queue.get()
+                if data is None:
+                    break
+                bytes_counter.inc(len(data))
+                if capture_file.ACTIVE is not None:
+                    capture_file.ACTIVE.nmea(self.name, data, datagram=True)
+                for frame in split_datagram(data):
+                    await self._frame_handler(self.router, frame)
+            if self._running and protocol.closed.done():
+                logger.warning(f"NMEA[{self.name}]: UDP socket closed: {protocol.closed.result()}")
+        finally:
+            transport.close()
+            if protocol.dropped_datagrams:
+                logger.warning(f"NMEA[{self.name}]: {protocol.dropped_datagrams} datagrams dropped (queue full).")
+
+
+class ReplaySource(NmeaSource):
+    """
+    Source without a connection: capture replay feeds it recorded stream chunks and
+    datagrams, which go through the same framing and frame handler as live input.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._framer = NmeaFramer()
+
+    def start(self):
+        # No connection to run: the replay calls feed()
+        self._running = True
+
+    async def _run_once(self):
+        pass
+
+    async def feed(self, data: bytes, datagram: bool):
+        NMEA_BYTES.labels(self.name).inc(len(data))
+        frames = split_datagram(data) if datagram else [strip_tag_block(f) for f in self._framer.feed(data)]
+        for frame in frames:
+            await self._frame_handler(self.router, frame)
+
+
+SOURCE_TYPES = {
+    "tcp_client": TcpClientSource,
+    "tcp_server": TcpServerSource,
+    "udp": UdpSource,
+}
@@ -0,0 +1,178 @@
+import asyncio
+import heapq
+import itertools
+import logging
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+PollCallback = Callable[[], Awaitable[None]]
+
+
+@dataclass
+class PollJobStats:
+    polls: int = 0
+    deadline_misses: int = 0
+    last_jitter_seconds: float = 0.0
+    max_jitter_seconds: float = 0.0
+    mean_jitter_seconds: float = 0.0
+
+    def record_fire(self, jitter: float):
+        self.polls += 1
+        self.last_jitter_seconds = jitter
+        if jitter > self.max_jitter_seconds:
+            self.max_jitter_seconds = jitter
+        # Exponentially weighted so the figure follows the current load, not the whole uptime
+        self.mean_jitter_seconds += (jitter - self.mean_jitter_seconds) * 0.1
+
+
+@dataclass
+class _PollJob:
+    key: str
+    interval: float
+    callback: PollCallback
+    next_deadline: float
+    stats: PollJobStats = field(default_factory=PollJobStats)
+    in_flight: Optional[asyncio.Task] = None
+    removed: bool = False
+    heap_sequence: int = -1   # sequence of the job's live heap entry; older entries are stale
+
+
+class PollingScheduler:
+    """
+    Fires poll callbacks on absolute deadlines (start + phase + n * interval) from a single
+    task, so the period does not drift with read latency. If a deadline passes while the
+    previous poll of the same job is still running, or the loop was late by whole periods,
+    those ticks are skipped and counted as deadline misses instead of being bunched up.
+    """
+
+    def __init__(self, name: str = "poller"):
+        self.name = name
+        self._jobs: Dict[str, _PollJob] = {}
+        # Polls of removed jobs left to complete; stop() still has to cancel them
+        self._orphans: Set[asyncio.Task] = set()
+        self._heap: List[Tuple[float, int, _PollJob]] = []
+        self._sequence = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._running = False
+
+    def add_job(self, key: str, interval: float, callback: PollCallback, phase_offset: float = 0.0):
+        if key in self._jobs:
+            self.remove_job(key)
+        loop = asyncio.get_running_loop()
+        job = _PollJob(key=key, interval=interval, callback=callback,
+                       next_deadline=loop.time() + (phase_offset % interval if interval > 0 else 0.0))
+        self._jobs[key] = job
+        self._push(job)
+        self._wakeup.set()
+
+    def _push(self, job: _PollJob):
+        job.heap_sequence = next(self._sequence)
+        heapq.heappush(self._heap, (job.next_deadline, job.heap_sequence, job))
+
+    def remove_job(self, key: str, cancel_in_flight: bool = True):
+        """Unschedules a job; with cancel_in_flight=False a running poll is left to complete."""
+        job = self._jobs.pop(key, None)
+        if job is None:
+            return
+        job.removed = True
+        task = job.in_flight
+        if task is None or task.done():
+            return
+        if cancel_in_flight:
+            task.cancel()
+        else:
+            self._orphans.add(task)
+            task.add_done_callback(self._orphans.discard)
+
+    def set_interval(self, key: str, interval: float):
+        """
+        Changes a job's period. The next poll moves to the last deadline plus the new
+        interval (or now, if that has passed), so a shorter interval takes effect at once.
+        """
+        job = self._jobs.get(key)
+        if job is None or interval <= 0 or interval == job.interval:
+            return
+        now = asyncio.get_running_loop().time()
+        next_deadline = max(job.next_deadline - job.interval + interval, now)
+        job.interval = interval
+        if next_deadline != job.next_deadline:
+            # The old heap entry becomes stale and is dropped by _run
+            job.next_deadline = next_deadline
+            self._push(job)
+            self._wakeup.set()
+
+    def stats(self) -> Dict[str, PollJobStats]:
+        return {key: job.stats for key, job in self._jobs.items()}
+
+    def _fire(self, job: _PollJob, now: float):
+        missed = 0
+        if job.in_flight is not None and not job.in_flight.done():
+            missed += 1
+        else:
+            job.stats.record_fire(now - job.next_deadline)
+            job.in_flight = asyncio.create_task(self._run_callback(job))
+
+        job.next_deadline += job.interval
+        if job.next_deadline <= now:
+            behind = int((now - job.next_deadline) // job.interval) + 1
+            job.next_deadline += behind * job.interval
+            missed += behind
+        if missed:
+            job.stats.deadline_misses += missed
+            logger.debug("Scheduler %s: job %s missed %d deadline(s).", self.name, job.key, missed)
+        self._push(job)
+
+    async def _run_callback(self, job: _PollJob):
+        try:
+            await job.callback()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("Scheduler %s: poll %s failed: %s", self.name, job.key, e)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while self._running:
+            while self._heap and (self._heap[0][2].removed or self._heap[0][1] != self._heap[0][2].heap_sequence):
+                heapq.heappop(self._heap)
+            if not self._heap:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            deadline, _, job = self._heap[0]
+            now = loop.time()
+            if deadline > now:
+                self._wakeup.clear()
+                timer = loop.call_at(deadline, self._wakeup.set)
+                try:
+                    await self._wakeup.wait()
+                finally:
+                    timer.cancel()
+                continue
+
+            heapq.heappop(self._heap)
+            if not job.removed:
+                self._fire(job, now)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._running = True
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._running = False
+        tasks = [job.in_flight for job in self._jobs.values() if job.in_flight is not None and not job.in_flight.done()]
+        tasks.extend(self._orphans)
+        if self._task is not None and not self._task.done():
+            tasks.append(self._task)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
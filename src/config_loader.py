@@ -1,35 +1,104 @@
+import hashlib
+import os
+import pickle
+import sys
 import yaml
 from pathlib import Path
 import logging
+from typing import Optional
+from pydantic import VERSION as PYDANTIC_VERSION
+from .models import config_models
 from .models.config_models import AppConfig
+from .plugins import COLLECTOR_ENTRY_POINT_GROUP, PUBLISHER_ENTRY_POINT_GROUP
 
 logger = logging.getLogger(__name__)
 
 DEFAULT_CONFIG_PATH = Path(__file__).resolve().parent.parent / "config" / "gateway_config.default.yml"
 USER_CONFIG_PATH = Path(__file__).resolve().parent.parent / "config" / "gateway_config.yml"
+# Validated AppConfig of the last loaded file; GATEWAY_CONFIG_CACHE="" disables the cache
+CONFIG_CACHE_PATH = os.environ.get("GATEWAY_CONFIG_CACHE",
+                                   str(Path(__file__).resolve().parent.parent / "data" / "config_cache.pickle"))
 
-def load_config() -> AppConfig:
-    config_path_to_load = None
-    config_data = {}
+_YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
 
+def _plugin_entry_points() -> str:
+    """Installed collector and publisher plugins; their config sections are validated with the models."""
+    from importlib.metadata import entry_points
+    found = []
+    for group in (COLLECTOR_ENTRY_POINT_GROUP, PUBLISHER_ENTRY_POINT_GROUP):
+        for entry_point in entry_points(group=group):
+            dist = entry_point.dist
+            found.append(f"{group}|{entry_point.name}|{entry_point.value}|"
+                         f"{dist.name if dist else ''}|{dist.version if dist else ''}")
+    return "\n".join(sorted(found))
+
+def _cache_key(raw_config: bytes) -> str:
+    digest = hashlib.sha256(raw_config)
+    # A cached object is only valid for the models (and pydantic) that validated it
+    digest.update(Path(config_models.__file__).read_bytes())
+    digest.update(f"{PYDANTIC_VERSION}|{sys.version}".encode())
+    digest.update(_plugin_entry_points().encode())
+    return digest.hexdigest()
+
+def _read_cache(key: str) -> Optional[AppConfig]:
+    try:
+        with open(CONFIG_CACHE_PATH, "rb") as f:
+            cached_key, app_config = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.debug("Config cache unreadable, validating from source: %s", e)
+        return None
+    return app_config if cached_key == key and isinstance(app_config, AppConfig) else None
+
+def _write_cache(key: str, app_config: AppConfig):
+    tmp_path = f"{CONFIG_CACHE_PATH}.tmp"
+    try:
+        os.makedirs(os.path.dirname(CONFIG_CACHE_PATH) or ".", exist_ok=True)
+        with open(tmp_path, "wb") as f:
+            pickle.dump((key, app_config), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, CONFIG_CACHE_PATH)
+    except OSError as e:
+        logger.debug("Config cache not written: %s", e)
+
+def resolve_config_path() -> Path:
     if USER_CONFIG_PATH.exists():
-        config_path_to_load = USER_CONFIG_PATH
         logger.info(f"Loading user configuration from: {USER_CONFIG_PATH}")
+        return USER_CONFIG_PATH
     elif DEFAULT_CONFIG_PATH.exists():
-        config_path_to_load = DEFAULT_CONFIG_PATH
         logger.info(f"User configuration not found. Loading default: {DEFAULT_CONFIG_PATH}")
         logger.warning(f"Tip: Copy '{DEFAULT_CONFIG_PATH.name}' to '{USER_CONFIG_PATH.name}' to customize.")
+        return DEFAULT_CONFIG_PATH
     else:
         logger.error("CRITICAL: No configuration file found (default or user). Cannot start.")
         raise FileNotFoundError("Configuration file (gateway_config.default.yml or gateway_config.yml) not found.")
 
-    with open(config_path_to_load, 'r') as f:
-        config_data = yaml.safe_load(f)
+def load_config(config_path_to_load: Optional[Path] = None, use_cache: bool = True) -> AppConfig:
+    """
+    Loads and validates the configuration. The validated AppConfig is cached by file hash (and the
+    models, pydantic and installed plugins that validated it), so an unchanged file is restored
+    without YAML parsing or pydantic validation. The cache file
+    is written by the gateway itself and must not be writable by anyone else (it is a pickle).
+    """
+    if config_path_to_load is None:
+        config_path_to_load = resolve_config_path()
+
+    with open(config_path_to_load, 'rb') as f:
+        raw_config = f.read()
+    cache_key = _cache_key(raw_config) if use_cache and CONFIG_CACHE_PATH else None
+    if cache_key:
+        app_config = _read_cache(cache_key)
+        if app_config is not None:
+            logger.info("Configuration unchanged since last validation. Loaded from cache.")
+            return app_config
 
+    config_data = yaml.load(raw_config, Loader=_YamlLoader)
     try:
         app_config = AppConfig(**config_data)
         logger.info("Configuration loaded and validated.")
+        if cache_key:
+            _write_cache(cache_key, app_config)
         return app_config
     except Exception as e:
         logger.error(f"Error validating configuration from {config_path_to_load}: {e}")
-        raise
\ No newline at end of file
+        raise
@@ -0,0 +1,142 @@
+import asyncio
+import logging
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from .config_loader import load_config
+from .metrics.registry import REGISTRY
+from .models.config_models import AppConfig, SensorConfig
+
+logger = logging.getLogger(__name__)
+
+CONFIG_RELOADS = REGISTRY.counter("gateway_config_reloads_total", "Configuration reload attempts", ("result",))
+
+# Top-level sections applied live; every other section is read at startup only
+LIVE_SECTIONS = {"sensors", "logging"}
+
+
+@dataclass
+class SensorDiff:
+    added: List[SensorConfig] = field(default_factory=list)
+    removed: List[SensorConfig] = field(default_factory=list)
+    changed: List[SensorConfig] = field(default_factory=list)
+
+    def is_empty(self) -> bool:
+        return not (self.added or self.removed or self.changed)
+
+    def __str__(self) -> str:
+        return f"{len(self.added)} added, {len(self.removed)} removed, {len(self.changed)} changed"
+
+
+def diff_sensors(old: List[SensorConfig], new: List[SensorConfig]) -> SensorDiff:
+    """Compares two sensor lists by sensor id; changed sensors are reported with their new config."""
+    old_by_id = {s.id: s for s in old}
+    new_ids = {s.id for s in new}
+    diff = SensorDiff()
+    for sensor in new:
+        previous = old_by_id.get(sensor.id)
+        if previous is None:
+            diff.added.append(sensor)
+        elif previous != sensor:
+            diff.changed.append(sensor)
+    diff.removed = [s for s in old if s.id not in new_ids]
+    return diff
+
+
+def restart_only_changes(old: AppConfig, new: AppConfig) -> List[str]:
+    """Top-level sections that differ between old and new but cannot be applied live."""
+    return [name for name in AppConfig.model_fields
+            if name not in LIVE_SECTIONS and getattr(old, name) != getattr(new, name)]
+
+
+def duplicate_sensor_ids(sensors: List[SensorConfig]) -> List[str]:
+    seen, duplicates = set(), []
+    for sensor in sensors:
+        if sensor.id in seen:
+            duplicates.append(sensor.id)
+        seen.add(sensor.id)
+    return duplicates
+
+
+class ConfigReloader:
+    """
+    Reloads the configuration file on request (SIGHUP) or when it changes on disk and hands
+    the validated AppConfig to apply. The file is polled by mtime and size; a change is only
+    loaded once the file has stayed the same for one poll, so a half-written file is not read.
+    An invalid file is logged and the running configuration is kept.
+    """
+
+    def __init__(self, path: Path, apply: Callable[[AppConfig], Awaitable[None]],
+                 watch_file: bool = True, poll_interval: float = 2.0):
+        self.path = path
+        self._apply = apply
+        self.watch_file = watch_file
+        self.poll_interval = poll_interval
+        self._requested = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.path)
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    def request(self):
+        """Asks for a reload; safe to call from a signal handler via loop.call_soon_threadsafe."""
+        self._requested.set()
+
+    async def reload(self) -> bool:
+        try:
+            config = await asyncio.to_thread(load_config, self.path)
+        except Exception as e:
+            CONFIG_RELOADS.labels("invalid").inc()
+            logger.error(f"Config reload: {self.path} rejected, keeping the running configuration: {e}")
+            return False
+        try:
+            await self._apply(config)
+        except Exception as e:
+            CONFIG_RELOADS.labels("failed").inc()
+            logger.error(f"Config reload: Applying {self.path} failed: {e}", exc_info=True)
+            return False
+        CONFIG_RELOADS.labels("applied").inc()
+        return True
+
+    async def _run(self):
+        last_seen = self._stat()
+        pending: Optional[Tuple[int, int]] = None
+        while True:
+            try:
+                await asyncio.wait_for(self._requested.wait(), self.poll_interval if self.watch_file else None)
+            except asyncio.TimeoutError:
+                pass
+            requested = self._requested.is_set()
+            self._requested.clear()
+            current = self._stat()
+            if not requested:
+                if current is None or current == last_seen:
+                    pending = None
+                    continue
+                if current != pending:
+                    pending = current
+                    continue
+                logger.info(f"Config reload: {self.path} changed on disk.")
+            else:
+                logger.info("Config reload: Reload requested.")
+            last_seen, pending = current, None
+            await self.reload()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+            if self.watch_file:
+                logger.info(f"Config reload: Watching {self.path} every {self.poll_interval}s.")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try: await self._task
+            except asyncio.CancelledError: pass
+            self._task = None
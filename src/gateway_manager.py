@@ -1,59 +1,230 @@
 import asyncio
+import json
 import logging
-from typing import List, Optional
+import time
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
 
+from .capture.capture_file import start_capture, stop_capture
 from .models.config_models import AppConfig
-from .models.sensor_reading import SensorReading
-from .collectors.modbus_collector import ModbusCollector
-from .collectors.nmea_collector import NmeaCollector
-from .publishers.mqtt_publisher import MQTTPublisher
+from .models.sensor_reading import SensorDescriptor, build_descriptors
+from .config_reload import diff_sensors, duplicate_sensor_ids, restart_only_changes
+from .pipeline.aggregation import WindowAggregator
+from .pipeline.reading_queue import ReadingQueue, ReadingQueueStats
+from .plugins import COLLECTORS, PUBLISHERS
+from .metrics.registry import REGISTRY
+from .utils.http_server import HttpResponse, HttpServer
+
+if TYPE_CHECKING:
+    from .collectors.modbus_collector import ModbusCollector
+    from .collectors.nmea_collector import NmeaCollector
+    from .history.store import HistoryStore
+    from .publishers.mqtt_publisher import MQTTPublisher
 
 logger = logging.getLogger(__name__)
 
+QUEUE_WAIT_SECONDS = REGISTRY.histogram("gateway_queue_wait_seconds", "Time from capture until the reading leaves the pipeline queue")
+QUEUE_DEPTH = REGISTRY.gauge("gateway_queue_depth", "Readings waiting in the pipeline queue")
+QUEUE_DROPPED = REGISTRY.counter("gateway_queue_dropped_total", "Readings discarded by the drop_oldest overload policy")
+QUEUE_CONFLATED = REGISTRY.counter("gateway_queue_conflated_total", "Readings replaced by a newer value under the conflate policy")
+
 class GatewayManager:
     def __init__(self, config: AppConfig):
         self.config = config
-        self.data_queue: asyncio.Queue[SensorReading] = asyncio.Queue()
-        
-        self.modbus_collector: Optional[ModbusCollector] = None
-        if config.collectors.modbus_collector.enabled:
-            if any(s.collector_type == "modbus_tcp" for s in config.sensors):
-                self.modbus_collector = ModbusCollector(config.collectors.modbus_collector)
+        self.data_queue = ReadingQueue(config.pipeline.max_queue_size, config.pipeline.overload_policy)
+        self.sensor_descriptors = build_descriptors(config.sensors)
+        self._sensor_indices = {sensor_id: d.index for sensor_id, d in self.sensor_descriptors.items()}
+        self._next_sensor_index = len(config.sensors)
 
-        self.nmea_collector: Optional[NmeaCollector] = None
-        if config.collectors.nmea_collector.enabled:
-            if any(s.collector_type == "nmea" for s in config.sensors):
-                self.nmea_collector = NmeaCollector(config.collectors.nmea_collector)
+        # Collector modules are imported only for collector types that configured sensors use
+        self.collectors: Dict[str, Any] = {}
+        if config.sharding.enabled:
+            from .sharding.supervisor import ShardSupervisor
+            self.collectors["sharded"] = ShardSupervisor(config)
+        else:
+            for collector_type in self._wanted_collectors(config.sensors):
+                self.collectors[collector_type] = self._create_collector(collector_type)
 
-        self.mqtt_publisher: Optional[MQTTPublisher] = None
+        self.aggregator = WindowAggregator(config.sensors)
+        self.mqtt_publisher: Optional["MQTTPublisher"] = None
         if config.mqtt_publisher.enabled:
-            self.mqtt_publisher = MQTTPublisher(config.mqtt_publisher)
-            
+            # Several connections or brokers: per-connection queues and tasks, see publisher_group
+            grouped = config.mqtt_publisher.connections > 1 or config.mqtt_publisher.destinations
+            self.mqtt_publisher = PUBLISHERS.load("mqtt_group" if grouped else "mqtt")(config.mqtt_publisher, config.sensors)
+
+        self.metrics_server: Optional[HttpServer] = None
+        if config.metrics.http_enabled:
+            self.metrics_server = HttpServer(config.metrics.http_host, config.metrics.http_port, "Metrics")
+            self.metrics_server.add_route("/metrics", self._metrics_response)
+        self.history: Optional["HistoryStore"] = None
+        self.history_server: Optional[HttpServer] = None
+        if config.history.enabled:
+            from .history.store import HistoryStore
+            self.history = HistoryStore(config.history)
+            if config.history.http_enabled:
+                from .history.http_api import HistoryApi
+                self.history_server = HttpServer(config.history.http_host, config.history.http_port, "History")
+                HistoryApi(self.history, config.history).register(self.history_server)
+        QUEUE_DEPTH.set_function(self.data_queue.qsize)
+        QUEUE_DROPPED.set_function(lambda: self.data_queue.stats.dropped)
+        QUEUE_CONFLATED.set_function(lambda: self.data_queue.stats.conflated)
+
         self._running = False
+        self._reconfigure_lock = asyncio.Lock()
         self._processing_task: Optional[asyncio.Task] = None
+        self._stats_task: Optional[asyncio.Task] = None
+        self._aggregation_task: Optional[asyncio.Task] = None
+
+    @property
+    def modbus_collector(self) -> Optional["ModbusCollector"]:
+        return self.collectors.get("modbus_tcp")
+
+    @property
+    def nmea_collector(self) -> Optional["NmeaCollector"]:
+        return self.collectors.get("nmea")
+
+    def _collector_config(self, collector_type: str) -> Any:
+        return getattr(self.config.collectors, COLLECTORS.spec(collector_type).config_section, None)
+
+    def _wanted_collectors(self, sensors) -> List[str]:
+        wanted = []
+        for collector_type in dict.fromkeys(s.collector_type for s in sensors):
+            collector_config = self._collector_config(collector_type)
+            enabled = collector_config.get("enabled", True) if isinstance(collector_config, dict) else getattr(collector_config, "enabled", True)
+            if enabled:
+                wanted.append(collector_type)
+        return wanted
+
+    def _create_collector(self, collector_type: str) -> Any:
+        return COLLECTORS.load(collector_type)(self._collector_config(collector_type))
+
+    def _metrics_response(self, request) -> HttpResponse:
+        return HttpResponse(body=REGISTRY.to_prometheus_text(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+    async def _push_stats(self):
+        metrics_config = self.config.metrics
+        while self._running:
+            await asyncio.sleep(metrics_config.mqtt_push_interval_seconds)
+            try:
+                await self.mqtt_publisher.publish_stats(metrics_config.mqtt_topic_suffix, json.dumps(REGISTRY.snapshot()))
+            except Exception as e: logger.error(f"Stats push error: {e}")
+
+    async def _publish_summaries(self):
+        for suffix, payload in self.aggregator.take_summaries():
+            if self.mqtt_publisher:
+                await self.mqtt_publisher.publish_summary(suffix, payload)
+
+    async def _close_windows(self):
+        """Closes aggregation windows of sensors that stopped reporting."""
+        while self._running:
+            await asyncio.sleep(1)
+            try:
+                self.aggregator.tick(time.time_ns())
+                await self._publish_summaries()
+            except Exception as e: logger.error(f"Aggregation error: {e}")
 
     async def _process_data_queue(self):
+        pipeline_config = self.config.pipeline
         while self._running:
             try:
-                reading = await self.data_queue.get()
-                if self.mqtt_publisher:
-                    await self.mqtt_publisher.publish_reading(reading)
-                self.data_queue.task_done()
+                batch = await self.data_queue.get_batch(pipeline_config.batch_max_items,
+                                                        pipeline_config.batch_max_wait_ms / 1000)
+                now_ns = time.time_ns()
+                for reading in batch:
+                    QUEUE_WAIT_SECONDS.observe((now_ns - reading.timestamp_ns) / 1e9)
+                if self.history:
+                    self.history.append(batch)
+                if self.aggregator.active:
+                    batch = self.aggregator.process(batch)
+                    await self._publish_summaries()
+                if self.mqtt_publisher and batch:
+                    await self.mqtt_publisher.publish_readings(batch)
             except asyncio.CancelledError: break
             except Exception as e: logger.error(f"Queue processing error: {e}")
 
+    async def apply_config(self, new_config: AppConfig):
+        """
+        Applies a reloaded configuration without a restart. Sensors are diffed by id and only
+        the affected polling blocks, NMEA routes and publisher entries change; connections and
+        report-by-exception state are kept. Other sections need a restart and are ignored.
+        """
+        async with self._reconfigure_lock:
+            await self._apply_config(new_config)
+
+    async def _apply_config(self, new_config: AppConfig):
+        if not self._running:
+            logger.warning("Config reload: Gateway is not running. Ignored.")
+            return
+        duplicates = duplicate_sensor_ids(new_config.sensors)
+        if duplicates:
+            raise ValueError(f"duplicate sensor ids: {', '.join(duplicates)}")
+        for section in restart_only_changes(self.config, new_config):
+            logger.warning(f"Config reload: Changes to '{section}' take effect after a restart.")
+        if new_config.logging.level != self.config.logging.level:
+            logging.getLogger().setLevel(new_config.logging.level)
+            logger.info(f"Config reload: Log level set to {new_config.logging.level}.")
+
+        diff = diff_sensors(self.config.sensors, new_config.sensors)
+        self.config = self.config.model_copy(update={"sensors": new_config.sensors, "logging": new_config.logging})
+        if diff.is_empty():
+            logger.info("Config reload: No sensor changes.")
+            return
+
+        # A sensor id keeps its descriptor index for the process lifetime, also when removed and
+        # re-added, so it stays aligned with the publisher's exception engine slot
+        descriptors = {}
+        for sensor in new_config.sensors:
+            index = self._sensor_indices.get(sensor.id)
+            if index is None:
+                index = self._sensor_indices[sensor.id] = self._next_sensor_index
+                self._next_sensor_index += 1
+            descriptors[sensor.id] = SensorDescriptor.from_config(sensor, index)
+        self.sensor_descriptors = descriptors
+
+        self.aggregator.update_sensors(diff.added + diff.changed, diff.removed)
+        if self.mqtt_publisher:
+            self.mqtt_publisher.update_sensors(diff.added + diff.changed)
+        sensors = new_config.sensors
+        for collector in self.collectors.values():
+            await collector.update_sensors(sensors, descriptors)
+        for collector_type in ([] if self.config.sharding.enabled else self._wanted_collectors(sensors)):
+            if collector_type not in self.collectors:
+                collector = self.collectors[collector_type] = self._create_collector(collector_type)
+                await collector.start(sensors, self.data_queue, descriptors)
+        logger.info(f"Config reload: Sensors updated ({diff}).")
+
+    def get_pipeline_stats(self) -> ReadingQueueStats:
+        return self.data_queue.stats
+
     async def start(self):
         logger.info("Starting GatewayManager...")
         self._running = True
+        # Startup completes before a config reload can touch the collectors
+        async with self._reconfigure_lock:
+            if self.metrics_server:
+                try: await self.metrics_server.start()
+                except OSError as e:
+                    logger.error(f"Metrics endpoint unavailable on {self.config.metrics.http_host}:{self.config.metrics.http_port}: {e}")
+                    self.metrics_server = None
+            if self.history:
+                await asyncio.to_thread(self.history.start)
+                if self.history_server:
+                    try: await self.history_server.start()
+                    except OSError as e:
+                        logger.error(f"History endpoint unavailable on {self.config.history.http_host}:{self.config.history.http_port}: {e}")
+                        self.history_server = None
+            if self.mqtt_publisher: await self.mqtt_publisher.start(); await asyncio.sleep(1)
+            # With sharding the workers record their own input
+            if self.config.capture.enabled and not self.config.sharding.enabled:
+                start_capture(self.config.capture)
 
-        if self.mqtt_publisher: await self.mqtt_publisher.start(); await asyncio.sleep(1)
-
-        collectors_to_start = []
-        if self.modbus_collector: collectors_to_start.append(self.modbus_collector.start(self.config.sensors, self.data_queue))
-        if self.nmea_collector: collectors_to_start.append(self.nmea_collector.start(self.config.sensors, self.data_queue))
-        if collectors_to_start: await asyncio.gather(*collectors_to_start)
+            collectors_to_start = [c.start(self.config.sensors, self.data_queue, self.sensor_descriptors)
+                                   for c in self.collectors.values()]
+            if collectors_to_start: await asyncio.gather(*collectors_to_start)
 
-        self._processing_task = asyncio.create_task(self._process_data_queue())
+            self._processing_task = asyncio.create_task(self._process_data_queue())
+            self._aggregation_task = asyncio.create_task(self._close_windows())
+            if self.mqtt_publisher and self.config.metrics.mqtt_push_interval_seconds > 0:
+                self._stats_task = asyncio.create_task(self._push_stats())
         logger.info("GatewayManager running.")
         while self._running: await asyncio.sleep(1)
 
@@ -61,15 +232,21 @@ class GatewayManager:
         logger.info("Stopping GatewayManager...")
         self._running = False 
 
-        stoppers = []
-        if self.modbus_collector: stoppers.append(self.modbus_collector.stop())
-        if self.nmea_collector: stoppers.append(self.nmea_collector.stop())
+        stoppers = [c.stop() for c in self.collectors.values()]
         if stoppers: await asyncio.gather(*stoppers, return_exceptions=True)
+        stop_capture()
 
-        if self._processing_task and not self._processing_task.done():
-            self._processing_task.cancel()
-            try: await self._processing_task
-            except asyncio.CancelledError: pass
+        for task in (self._processing_task, self._aggregation_task, self._stats_task):
+            if task and not task.done():
+                task.cancel()
+                try: await task
+                except asyncio.CancelledError: pass
+        if self.metrics_server: await self.metrics_server.stop()
+        if self.history_server: await self.history_server.stop()
+        if self.history: await asyncio.to_thread(self.history.stop)
         
         if self.mqtt_publisher: await self.mqtt_publisher.stop()
+        stats = self.data_queue.stats
+        logger.info(f"Pipeline: {stats.enqueued} readings enqueued, max depth {stats.max_depth}, "
+                    f"{stats.dropped} dropped, {stats.conflated} conflated.")
         logger.info("GatewayManager stopped.")
\ No newline at end of file
@@ -0,0 +1,116 @@
+import asyncio
+import json
+import logging
+import math
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+from ..models.config_models import HistoryConfig
+from ..models.sensor_reading import STATUS_NAMES
+from ..utils.http_server import HttpRequest, HttpResponse, HttpServer
+from .store import HistoryStore
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SPAN_SECONDS = 3600
+_JSON = "application/json"
+# Timestamps are stored as signed 64-bit nanoseconds
+_MAX_NS = 2 ** 63 - 1
+
+
+def parse_time(text: Optional[str], default_ns: int) -> int:
+    """ISO-8601 (naive means UTC) or epoch seconds to epoch nanoseconds; ValueError if out of range."""
+    if not text:
+        return default_ns
+    try:
+        seconds = float(text)
+    except ValueError:
+        timestamp = datetime.fromisoformat(text.replace("Z", "+00:00"))
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.replace(tzinfo=timezone.utc)
+        ns = int(timestamp.timestamp() * 1e6) * 1000
+    else:
+        # float() accepts "inf" and "nan"
+        if not math.isfinite(seconds) or abs(seconds) >= _MAX_NS / 1e9:
+            raise ValueError(f"time out of range: {text}")
+        ns = int(seconds * 1e9)
+    if abs(ns) > _MAX_NS:
+        raise ValueError(f"time out of range: {text}")
+    return ns
+
+
+def _bad_request(message: str) -> HttpResponse:
+    return HttpResponse(400, json.dumps({"error": message}), _JSON)
+
+
+class HistoryApi:
+    """
+    Read-only JSON endpoints over the history store:
+
+    /history/sensors                                    recorded sensors with their first/last raw timestamp
+    /history/range?sensor=&start=&end=&limit=           raw readings as [epoch ms, value, status]
+    /history/downsample?sensor=&start=&end=&step=       [epoch ms, count, min, max, mean] per step seconds
+
+    start/end default to the last hour. Queries run in a worker thread.
+    """
+
+    def __init__(self, store: HistoryStore, config: HistoryConfig):
+        self.store = store
+        self.config = config
+
+    def register(self, server: HttpServer):
+        server.add_route("/history/sensors", self._sensors)
+        server.add_route("/history/range", self._range)
+        server.add_route("/history/downsample", self._downsample)
+
+    def _time_range(self, request: HttpRequest):
+        end_ns = parse_time(request.query.get("end"), time.time_ns())
+        start_ns = parse_time(request.query.get("start"), end_ns - DEFAULT_SPAN_SECONDS * 1_000_000_000)
+        if start_ns >= end_ns:
+            raise ValueError("start must be before end")
+        return start_ns, end_ns
+
+    async def _sensors(self, request: HttpRequest) -> HttpResponse:
+        rows = await asyncio.to_thread(self.store.sensors)
+        sensors = [{"sensor_id": sensor_id, "unit": unit,
+                    "first": first // 1_000_000 if first is not None else None,
+                    "last": last // 1_000_000 if last is not None else None}
+                   for sensor_id, unit, first, last in rows]
+        return HttpResponse(200, json.dumps({"sensors": sensors}), _JSON)
+
+    async def _range(self, request: HttpRequest) -> HttpResponse:
+        sensor_id = request.query.get("sensor")
+        if not sensor_id:
+            return _bad_request("sensor is required")
+        try:
+            start_ns, end_ns = self._time_range(request)
+            limit = int(request.query.get("limit", self.config.max_points_per_query))
+        except (ValueError, OverflowError) as e:
+            return _bad_request(str(e))
+        limit = max(1, min(limit, self.config.max_points_per_query))
+        rows = await asyncio.to_thread(self.store.query_range, sensor_id, start_ns, end_ns, limit)
+        points = [[ts // 1_000_000, value, STATUS_NAMES[status]] for ts, value, status in rows]
+        body = {"sensor_id": sensor_id, "unit": await asyncio.to_thread(self.store.unit, sensor_id),
+                "truncated": len(points) == limit, "points": points}
+        return HttpResponse(200, json.dumps(body), _JSON)
+
+    async def _downsample(self, request: HttpRequest) -> HttpResponse:
+        sensor_id = request.query.get("sensor")
+        if not sensor_id:
+            return _bad_request("sensor is required")
+        try:
+            start_ns, end_ns = self._time_range(request)
+            step = int(request.query.get("step", 60))
+            if step <= 0:
+                raise ValueError("step must be a positive number of seconds")
+        except (ValueError, OverflowError) as e:
+            return _bad_request(str(e))
+        if (end_ns - start_ns) // (step * 1_000_000_000) > self.config.max_points_per_query:
+            return _bad_request(f"more than {self.config.max_points_per_query} buckets; use a larger step")
+        source, rows = await asyncio.to_thread(self.store.query_downsample, sensor_id, start_ns, end_ns, step)
+        points = [[bucket // 1_000_000, count, low, high, total / count if count else None]
+                  for bucket, count, low, high, total in rows]
+        body = {"sensor_id": sensor_id, "step": step, "source": f"rollup_{source}s" if source else "raw",
+                "columns": ["time", "count", "min", "max", "mean"], "points": points}
+        return HttpResponse(200, json.dumps(body), _JSON)
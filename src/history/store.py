@@ -0,0 +1,265 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Sequence, Tuple
+
+from ..metrics.registry import REGISTRY
+from ..models.config_models import HistoryConfig
+from ..models.sensor_reading import STATUS_VALID, SensorReading
+
+logger = logging.getLogger(__name__)
+
+HISTORY_WRITTEN = REGISTRY.counter("gateway_history_written_total", "Readings written to the history database")
+HISTORY_DROPPED = REGISTRY.counter("gateway_history_dropped_total", "Readings dropped because the history writer fell behind")
+HISTORY_PENDING = REGISTRY.gauge("gateway_history_pending", "Readings waiting for the history writer")
+HISTORY_WRITE_SECONDS = REGISTRY.histogram("gateway_history_write_seconds", "History write transaction duration")
+
+# Pending readings that wake the writer before its flush interval
+_EARLY_FLUSH_READINGS = 20000
+_NS = 1_000_000_000
+
+# (bucket start ns, count, min, max, sum)
+Bucket = Tuple[int, int, Optional[float], Optional[float], Optional[float]]
+
+
+def rollup_table(interval_seconds: int) -> str:
+    return f"rollup_{interval_seconds}s"
+
+
+class HistoryStore:
+    """
+    Local history of every raw reading in a SQLite database in WAL mode.
+
+    The event loop only appends readings to an in-memory buffer. A writer thread commits
+    the buffer once per flush interval in a single transaction, and updates the rollup
+    tables in the same transaction (count/min/max/sum per sensor and bucket). Raw readings
+    and rollups are clustered by (sensor, time), so range queries are index scans.
+    Retention deletes expired rows per sensor and returns the pages to the file system.
+    Queries run on a separate read connection, which WAL lets proceed while the writer commits.
+    """
+
+    def __init__(self, config: HistoryConfig):
+        self.config = config
+        self._pending: Deque[SensorReading] = deque()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+        self._sensor_keys: Dict[str, int] = {}
+        self._read_conn: Optional[sqlite3.Connection] = None
+        self._read_lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.config.path, timeout=10, check_same_thread=False)
+        # auto_vacuum only takes effect on a new database, and only before the switch to WAL
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _create_schema(self, conn: sqlite3.Connection):
+        conn.execute("CREATE TABLE IF NOT EXISTS sensors (id INTEGER PRIMARY KEY, sensor_id TEXT NOT NULL UNIQUE, unit TEXT)")
+        conn.execute("CREATE TABLE IF NOT EXISTS readings (sensor INTEGER NOT NULL, ts INTEGER NOT NULL, value REAL, "
+                     "status INTEGER NOT NULL, PRIMARY KEY (sensor, ts)) WITHOUT ROWID")
+        for interval in self.config.rollup_intervals_seconds:
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {rollup_table(interval)} (sensor INTEGER NOT NULL, "
+                         f"bucket INTEGER NOT NULL, count INTEGER NOT NULL, min REAL, max REAL, sum REAL, "
+                         f"PRIMARY KEY (sensor, bucket)) WITHOUT ROWID")
+        conn.commit()
+
+    def start(self):
+        directory = os.path.dirname(self.config.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        self._create_schema(conn)
+        self._sensor_keys = dict(conn.execute("SELECT sensor_id, id FROM sensors"))
+        conn.close()
+        self._read_conn = self._connect()
+        HISTORY_WRITTEN.set_function(lambda: self.written)
+        HISTORY_DROPPED.set_function(lambda: self.dropped)
+        HISTORY_PENDING.set_function(lambda: len(self._pending))
+        self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+        self._thread.start()
+        logger.info(f"History: Recording to {self.config.path} "
+                    f"(raw {self.config.raw_retention_hours:g} h, rollups {self.config.rollup_intervals_seconds} s).")
+
+    def stop(self, timeout: float = 30.0):
+        """Writes what is still pending and closes the database. Blocking; call from a thread."""
+        self._stopping = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        if self._read_conn is not None:
+            with self._read_lock:
+                self._read_conn.close()
+                self._read_conn = None
+        logger.info(f"History: Stopped after {self.written} readings ({self.dropped} dropped).")
+
+    def append(self, readings: Sequence[SensorReading]):
+        """Called from the event loop; never blocks on the database."""
+        with self._lock:
+            pending = self._pending
+            pending.extend(readings)
+            overflow = len(pending) - self.config.max_pending_readings
+            if overflow > 0:
+                for _ in range(overflow):
+                    pending.popleft()
+                self.dropped += overflow
+            if len(pending) >= _EARLY_FLUSH_READINGS:
+                self._wakeup.set()
+
+    # --- writer thread ---
+
+    def _run(self):
+        conn = self._connect()
+        next_retention = time.monotonic()
+        try:
+            while True:
+                self._wakeup.wait(self.config.flush_interval_seconds)
+                self._wakeup.clear()
+                with self._lock:
+                    batch, self._pending = self._pending, deque()
+                if batch:
+                    try:
+                        self._write(conn, batch)
+                    except sqlite3.Error as e:
+                        conn.rollback()
+                        self.dropped += len(batch)
+                        logger.error(f"History: Write of {len(batch)} readings failed: {e}")
+                if time.monotonic() >= next_retention:
+                    next_retention = time.monotonic() + self.config.retention_check_interval_seconds
+                    try:
+                        self._apply_retention(conn)
+                    except sqlite3.Error as e:
+                        conn.rollback()
+                        logger.error(f"History: Retention failed: {e}")
+                if self._stopping and not self._pending:
+                    break
+        finally:
+            conn.close()
+
+    def _sensor_key(self, conn: sqlite3.Connection, reading: SensorReading) -> int:
+        descriptor = reading.descriptor
+        conn.execute("INSERT INTO sensors (sensor_id, unit) VALUES (?, ?) ON CONFLICT(sensor_id) DO UPDATE SET unit = excluded.unit",
+                     (descriptor.sensor_id, descriptor.unit))
+        key = conn.execute("SELECT id FROM sensors WHERE sensor_id = ?", (descriptor.sensor_id,)).fetchone()[0]
+        self._sensor_keys[descriptor.sensor_id] = key
+        return key
+
+    def _write(self, conn: sqlite3.Connection, batch: Sequence[SensorReading]):
+        started = time.perf_counter()
+        keys = self._sensor_keys
+        # The first reading per (sensor, ts) wins, as with INSERT OR IGNORE
+        by_key: Dict[Tuple[int, int], Tuple[Optional[float], int]] = {}
+        for reading in batch:
+            key = keys.get(reading.descriptor.sensor_id)
+            if key is None:
+                key = self._sensor_key(conn, reading)
+            by_key.setdefault((key, reading.timestamp_ns), (reading.value, reading.status_code))
+        self._drop_recorded(conn, by_key)
+        rows = [(key, ts, value, status) for (key, ts), (value, status) in by_key.items()]
+        # Only new rows remain, so the rollups never count a reading twice (e.g. a replay after a restart)
+        conn.executemany("INSERT INTO readings (sensor, ts, value, status) VALUES (?, ?, ?, ?)", rows)
+
+        for interval in self.config.rollup_intervals_seconds:
+            width = interval * _NS
+            buckets: Dict[Tuple[int, int], List[float]] = {}
+            for key, ts, value, status in rows:
+                if status != STATUS_VALID or value is None:
+                    continue
+                bucket = buckets.get((key, ts - ts % width))
+                if bucket is None:
+                    buckets[(key, ts - ts % width)] = [1, value, value, value]
+                else:
+                    bucket[0] += 1
+                    if value < bucket[1]: bucket[1] = value
+                    if value > bucket[2]: bucket[2] = value
+                    bucket[3] += value
+            conn.executemany(
+                f"INSERT INTO {rollup_table(interval)} (sensor, bucket, count, min, max, sum) VALUES (?, ?, ?, ?, ?, ?) "
+                f"ON CONFLICT(sensor, bucket) DO UPDATE SET count = count + excluded.count, "
+                f"min = min(min, excluded.min), max = max(max, excluded.max), sum = sum + excluded.sum",
+                [(key, bucket, *agg) for (key, bucket), agg in buckets.items()])
+        conn.commit()
+        self.written += len(rows)
+        HISTORY_WRITE_SECONDS.observe(time.perf_counter() - started)
+
+    def _drop_recorded(self, conn: sqlite3.Connection, by_key: Dict[Tuple[int, int], tuple]):
+        """Removes the (sensor, ts) keys that are already in the readings table."""
+        ranges: Dict[int, List[int]] = {}
+        for key, ts in by_key:
+            span = ranges.get(key)
+            if span is None:
+                ranges[key] = [ts, ts]
+            elif ts < span[0]:
+                span[0] = ts
+            elif ts > span[1]:
+                span[1] = ts
+        for key, (first, last) in ranges.items():
+            for (ts,) in conn.execute("SELECT ts FROM readings WHERE sensor = ? AND ts >= ? AND ts <= ?", (key, first, last)):
+                by_key.pop((key, ts), None)
+
+    def _apply_retention(self, conn: sqlite3.Connection):
+        now_ns = time.time_ns()
+        raw_cutoff = now_ns - int(self.config.raw_retention_hours * 3600 * _NS)
+        rollup_cutoff = now_ns - int(self.config.rollup_retention_days * 86400 * _NS)
+        deleted = 0
+        for (key,) in conn.execute("SELECT id FROM sensors").fetchall():
+            deleted += conn.execute("DELETE FROM readings WHERE sensor = ? AND ts < ?", (key, raw_cutoff)).rowcount
+            for interval in self.config.rollup_intervals_seconds:
+                deleted += conn.execute(f"DELETE FROM {rollup_table(interval)} WHERE sensor = ? AND bucket < ?",
+                                        (key, rollup_cutoff)).rowcount
+        conn.commit()
+        if deleted:
+            # execute() would only step the pragma once, freeing a single page
+            conn.executescript("PRAGMA incremental_vacuum")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            logger.info(f"History: Retention removed {deleted} rows.")
+
+    # --- queries (blocking; run them in a thread) ---
+
+    def _query(self, sql: str, params: tuple) -> list:
+        with self._read_lock:
+            if self._read_conn is None:
+                raise RuntimeError("history store is stopped")
+            return self._read_conn.execute(sql, params).fetchall()
+
+    def sensors(self) -> List[Tuple[str, Optional[str], Optional[int], Optional[int]]]:
+        """(sensor id, unit, first raw timestamp ns, last raw timestamp ns) per recorded sensor."""
+        return self._query("SELECT sensor_id, unit, (SELECT min(ts) FROM readings WHERE sensor = s.id), "
+                           "(SELECT max(ts) FROM readings WHERE sensor = s.id) FROM sensors s ORDER BY sensor_id", ())
+
+    def unit(self, sensor_id: str) -> Optional[str]:
+        rows = self._query("SELECT unit FROM sensors WHERE sensor_id = ?", (sensor_id,))
+        return rows[0][0] if rows else None
+
+    def query_range(self, sensor_id: str, start_ns: int, end_ns: int, limit: int) -> List[Tuple[int, Optional[float], int]]:
+        return self._query("SELECT ts, value, status FROM readings WHERE sensor = (SELECT id FROM sensors WHERE sensor_id = ?) "
+                           "AND ts >= ? AND ts < ? ORDER BY ts LIMIT ?", (sensor_id, start_ns, end_ns, limit))
+
+    def downsample_source(self, step_seconds: int) -> Optional[int]:
+        """The coarsest rollup interval that divides step_seconds (None: aggregate raw readings)."""
+        fitting = [i for i in self.config.rollup_intervals_seconds if step_seconds % i == 0]
+        return max(fitting) if fitting else None
+
+    def query_downsample(self, sensor_id: str, start_ns: int, end_ns: int, step_seconds: int) -> Tuple[Optional[int], List[Bucket]]:
+        """Buckets of step_seconds from the best fitting rollup, or from the raw readings."""
+        step_ns = step_seconds * _NS
+        interval = self.downsample_source(step_seconds)
+        params = (step_ns, step_ns, sensor_id, start_ns, end_ns)
+        if interval is None:
+            sql = ("SELECT ts / ? * ?, count(value), min(value), max(value), sum(value) FROM readings "
+                   "WHERE sensor = (SELECT id FROM sensors WHERE sensor_id = ?) AND ts >= ? AND ts < ? "
+                   f"AND status = {STATUS_VALID} GROUP BY 1 ORDER BY 1")
+        else:
+            sql = (f"SELECT bucket / ? * ?, sum(count), min(min), max(max), sum(sum) FROM {rollup_table(interval)} "
+                   "WHERE sensor = (SELECT id FROM sensors WHERE sensor_id = ?) AND bucket >= ? AND bucket < ? "
+                   "GROUP BY 1 ORDER BY 1")
+        return interval, self._query(sql, params)
@@ -3,8 +3,9 @@ import logging
 import signal
 from typing import Optional
 
-from .config_loader import load_config
-from .utils.logging_setup import setup_logging
+from .config_loader import load_config, resolve_config_path
+from .config_reload import ConfigReloader
+from .utils.logging_setup import setup_logging, stop_logging
 from .models.config_models import AppConfig
 from .gateway_manager import GatewayManager
 
@@ -13,7 +14,9 @@ logger = logging.getLogger(__name__)
 
 async def _main_async():
     gateway_manager: Optional[GatewayManager] = None
+    reloader: Optional[ConfigReloader] = None
     shutdown_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
 
     def signal_handler(*args):
         logger.info("Shutdown signal received...")
@@ -23,11 +26,17 @@ async def _main_async():
     signal.signal(signal.SIGTERM, signal_handler)
 
     try:
-        config: AppConfig = load_config()
+        config_path = resolve_config_path()
+        config: AppConfig = load_config(config_path)
         setup_logging(config.logging)
         logger.info(f"Starting {config.application_name}...")
         gateway_manager = GatewayManager(config)
+        reloader = ConfigReloader(config_path, gateway_manager.apply_config,
+                                  config.config_reload.watch_file, config.config_reload.poll_interval_seconds)
+        if hasattr(signal, "SIGHUP"):
+            signal.signal(signal.SIGHUP, lambda *args: loop.call_soon_threadsafe(reloader.request))
         manager_task = asyncio.create_task(gateway_manager.start())
+        reloader.start()
         shutdown_task = asyncio.create_task(shutdown_event.wait())
         
         done, pending = await asyncio.wait(
@@ -44,6 +53,8 @@ async def _main_async():
     except Exception as e:
         logging.getLogger("Bootstrap").error(f"CRITICAL: Unexpected startup error: {e}", exc_info=True)
     finally:
+        if reloader:
+            await reloader.stop()
         if gateway_manager:
             logger.info("Initiating final shutdown of GatewayManager...")
             await gateway_manager.stop()
@@ -56,6 +67,8 @@ def run_gateway():
         logger.info("Exiting via KeyboardInterrupt (fallback).")
     except Exception as e:
         logger.critical(f"Unhandled exception in run_gateway: {e}", exc_info=True)
+    finally:
+        stop_logging()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,254 @@
+"""
+Small in-process metrics library: counters, gauges and fixed-bucket histograms with
+Prometheus text exposition. Metrics are module-level objects registered on REGISTRY;
+hot paths should keep the child returned by labels() instead of looking it up per event.
+
+Updates are plain attribute arithmetic without locks. Increments from another thread (the
+paho network thread) can in rare cases lose an update, which is acceptable for monitoring.
+"""
+import math
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels.items()) + "}"
+
+
+def _finite_or_none(value: float) -> Optional[float]:
+    """JSON has no NaN or infinity: non-finite values (e.g. a failing function gauge) become null."""
+    return value if math.isfinite(value) else None
+
+
+def _format_value(value: float) -> str:
+    if value != value:
+        return "NaN"
+    if value in (float("inf"), float("-inf")):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+class _ValueChild:
+    __slots__ = ("value", "function")
+
+    def __init__(self):
+        self.value = 0.0
+        self.function: Optional[Callable[[], float]] = None
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def set_function(self, function: Callable[[], float]):
+        """Reads the value from function at collection time instead of storing it."""
+        self.function = function
+
+    def get(self) -> float:
+        if self.function is None:
+            return self.value
+        try:
+            return float(self.function())
+        except Exception:
+            return float("nan")
+
+
+class _GaugeChild(_ValueChild):
+    __slots__ = ()
+
+    def set(self, value: float):
+        self.value = value
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-quantile (None when empty)."""
+        if not self.count:
+            return None
+        target = q * self.count
+        running = 0
+        for bound, count in zip(self.bounds, self.counts):
+            running += count
+            if running >= target:
+                return bound
+        return float("inf")
+
+
+class _Metric(ABC):
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        if not self.labelnames:
+            self._default = self._new_child()
+            self._children[()] = self._default
+
+    @abstractmethod
+    def _new_child(self):
+        """A fresh child holding the values of one label combination."""
+        pass
+
+    def labels(self, *values: str):
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            child = self._children[key] = self._new_child()
+        return child
+
+    def remove(self, *values: str):
+        self._children.pop(tuple(str(v) for v in values), None)
+
+    def _label_dict(self, key: Tuple[str, ...]) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    def samples(self) -> Iterator[Sample]:
+        for key, child in list(self._children.items()):
+            yield self.name, self._label_dict(key), child.get()
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def _new_child(self):
+        return _ValueChild()
+
+    def inc(self, amount: float = 1.0):
+        self._default.value += amount
+
+    def set_function(self, function: Callable[[], float]):
+        self._default.set_function(function)
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self._default.value = value
+
+    def inc(self, amount: float = 1.0):
+        self._default.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self._default.value -= amount
+
+    def set_function(self, function: Callable[[], float]):
+        self._default.set_function(function)
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.bounds = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.bounds)
+
+    def observe(self, value: float):
+        self._default.observe(value)
+
+    def samples(self) -> Iterator[Sample]:
+        for key, child in list(self._children.items()):
+            labels = self._label_dict(key)
+            running = 0
+            for bound, count in zip(child.bounds + (float("inf"),), child.counts):
+                running += count
+                yield f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, running
+            yield f"{self.name}_sum", labels, child.sum
+            yield f"{self.name}_count", labels, child.count
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _get_or_create(self, cls, name: str, *args, **kwargs):
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = cls(name, *args, **kwargs)
+        elif not isinstance(metric, cls):
+            raise ValueError(f"Metric {name} already registered as {metric.type_name}")
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def metrics(self) -> List[_Metric]:
+        return list(self._metrics.values())
+
+    def to_prometheus_text(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {_escape(metric.documentation)}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> Dict[str, Optional[float]]:
+        """
+        Flat summary for the MQTT stats topic: counters and gauges by name and labels;
+        histograms as count, sum and bucket-bound p50/p99 estimates. Non-finite values are
+        None, so the result always serializes to valid JSON.
+        """
+        result: Dict[str, Optional[float]] = {}
+        for metric in self._metrics.values():
+            for key, child in list(metric._children.items()):
+                series = f"{metric.name}{_format_labels(metric._label_dict(key))}"
+                if isinstance(child, _HistogramChild):
+                    result[f"{series}.count"] = child.count
+                    result[f"{series}.sum"] = _finite_or_none(round(child.sum, 6))
+                    for q in (0.5, 0.99):
+                        estimate = child.quantile(q)
+                        # Observations beyond the last bucket have no finite estimate
+                        result[f"{series}.p{int(q * 100)}"] = None if estimate is None else _finite_or_none(estimate)
+                else:
+                    result[series] = _finite_or_none(child.get())
+        return result
+
+
+REGISTRY = MetricsRegistry()
@@ -1,10 +1,38 @@
-from pydantic import BaseModel, Field, field_validator
-from typing import List, Literal, Optional, Union
+from pydantic import BaseModel, ConfigDict, Field, ValidationInfo, field_validator, model_validator
+from typing import Any, Dict, List, Literal, Optional, Union
+
+from ..plugins import COLLECTORS
 
 class LoggingConfig(BaseModel):
     level: Literal["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"] = "INFO"
     format: str = "[%(asctime)s] [%(levelname)s] [%(name)s:%(lineno)d] %(message)s"
     date_format: str = "%Y-%m-%d %H:%M:%S"
+    # Records are handed to a writer thread through a queue of this size (0 = write on the caller's thread)
+    queue_size: int = Field(10000, ge=0)
+    # Identical messages from one call site are written once per window, then summarised (0 = off)
+    repeat_window_seconds: float = Field(10.0, ge=0)
+
+class ModbusDeviceConfig(BaseModel):
+    host: str
+    port: int = 502
+    read_timeout_seconds: Optional[float] = Field(None, gt=0)
+    max_in_flight: int = Field(1, ge=1, le=64)
+    pipelining: bool = False
+
+class AdaptivePollingConfig(BaseModel):
+    enabled: bool = False
+    # Quiet blocks slow down to this interval; the configured polling interval stays the fastest rate
+    max_interval_seconds: float = Field(10.0, gt=0)
+    # Poll often enough that a value moves about this fraction of its change_threshold between polls
+    target_change_fraction: float = Field(0.5, gt=0, le=1)
+
+class CircuitBreakerConfig(BaseModel):
+    enabled: bool = True
+    # Consecutive failed polls of one device/unit id before its polls are paused
+    failure_threshold: int = Field(3, ge=1)
+    # First pause; doubles after every failed probe up to max_open_seconds
+    open_seconds: float = Field(2.0, gt=0)
+    max_open_seconds: float = Field(60.0, gt=0)
 
 class ModbusCollectorConfig(BaseModel):
     enabled: bool = True
@@ -14,44 +42,192 @@ class ModbusCollectorConfig(BaseModel):
     default_polling_interval_seconds: float = Field(0.5, gt=0)
     default_read_timeout_seconds: float = Field(0.1, gt=0)
     connection_retry_delay_seconds: int = Field(5, ge=1)
+    # Reconnect delay doubles after every failed attempt up to this
+    max_connection_retry_delay_seconds: int = Field(60, ge=1)
+    max_concurrent_reconnects: int = Field(2, ge=1)
+    circuit_breaker: CircuitBreakerConfig = Field(default_factory=CircuitBreakerConfig)
+    max_register_gap: int = Field(8, ge=0)
+    max_registers_per_read: int = Field(125, ge=1, le=125)
+    default_max_in_flight: int = Field(1, ge=1, le=64)
+    stagger_polls: bool = True
+    adaptive_polling: AdaptivePollingConfig = Field(default_factory=AdaptivePollingConfig)
+    # Read requests per second across all devices; intervals are stretched evenly to stay below it
+    max_transactions_per_second: Optional[float] = Field(None, gt=0)
+    devices: Dict[str, ModbusDeviceConfig] = {}
+
+class NmeaSourceConfig(BaseModel):
+    name: str
+    type: Literal["tcp_client", "tcp_server", "udp"] = "tcp_client"
+    # tcp_client: remote talker address; tcp_server/udp: local bind address
+    host: str = "0.0.0.0"
+    port: int
+    multicast_group: Optional[str] = None
+    multicast_interface: str = "0.0.0.0"
+    connection_retry_delay_seconds: Optional[int] = Field(None, ge=1)
 
 class NmeaCollectorConfig(BaseModel):
     enabled: bool = True
     host: str = "127.0.0.1"
     port: int = 8888
     connection_retry_delay_seconds: int = Field(5, ge=1)
+    read_chunk_bytes: int = Field(65536, ge=256)
+    sources: List[NmeaSourceConfig] = []
 
 class CollectorsConfig(BaseModel):
+    # Collector plugins registered through entry points bring their own section, kept as a dict
+    model_config = ConfigDict(extra="allow")
+
     modbus_collector: ModbusCollectorConfig = Field(default_factory=ModbusCollectorConfig)
     nmea_collector: NmeaCollectorConfig = Field(default_factory=NmeaCollectorConfig)
 
 class SensorModbusCollectorParams(BaseModel):
     register_address: int = Field(..., ge=0)
+    device: Optional[str] = None
     unit_id: Optional[int] = None
     polling_interval_seconds: Optional[float] = None
+    # Per-sensor ceiling for adaptive polling (adaptive_polling.max_interval_seconds otherwise)
+    max_polling_interval_seconds: Optional[float] = Field(None, gt=0)
+    register_type: Literal["holding", "input", "coil", "discrete_input"] = "holding"
+    # Coils and discrete inputs are always "bool"; the numeric types span 1, 2 or 4 registers
+    data_type: Literal["uint16", "int16", "uint32", "int32", "float32", "uint64", "int64", "float64", "bool"] = "uint16"
+    # word_order: register holding the most significant word first ("big") or last ("little")
+    # byte_order: byte order inside each register
+    word_order: Literal["big", "little"] = "big"
+    byte_order: Literal["big", "little"] = "big"
+    # value = ((raw & bit_mask) >> lowest set bit of bit_mask) * scale + offset
+    bit_mask: Optional[int] = Field(None, gt=0)
+    scale: float = 1.0
+    offset: float = 0.0
+
+    @model_validator(mode='after')
+    def _check_data_type(self) -> 'SensorModbusCollectorParams':
+        bit_register = self.register_type in ("coil", "discrete_input")
+        if bit_register and "data_type" not in self.model_fields_set:
+            self.data_type = "bool"
+        if bit_register != (self.data_type == "bool"):
+            raise ValueError(f"data_type '{self.data_type}' cannot be read from {self.register_type} registers")
+        if self.bit_mask is not None and self.data_type in ("bool", "float32", "float64"):
+            raise ValueError("bit_mask needs an integer data_type")
+        return self
 
 class SensorNmeaCollectorParams(BaseModel):
     expected_talker_id: str
     expected_sentence_type: str
+    value_field: Optional[str] = None
+    source: Optional[str] = None
+
+# Collector params models of the built-in collector types; plugin collectors get a plain dict
+SENSOR_COLLECTOR_PARAMS = {"modbus_tcp": SensorModbusCollectorParams, "nmea": SensorNmeaCollectorParams}
+
+class AggregationConfig(BaseModel):
+    window_seconds: float = Field(60.0, gt=0)
+    # tumbling: one summary per window; sliding: a summary of the last window_seconds every step_seconds
+    mode: Literal["tumbling", "sliding"] = "tumbling"
+    step_seconds: Optional[float] = Field(None, gt=0)
+    quantiles: List[float] = [0.95]
+    # Summaries go to <mqtt_topic_suffix>/<topic_suffix>
+    topic_suffix: str = "stats"
+    # false: only the summaries are published for this sensor, no raw samples
+    forward_raw: bool = True
+
+    @field_validator('quantiles')
+    @classmethod
+    def _check_quantiles(cls, v: List[float]) -> List[float]:
+        if any(not 0.0 <= q <= 1.0 for q in v):
+            raise ValueError("quantiles must be between 0 and 1")
+        return v
+
+    @model_validator(mode='after')
+    def _check_step(self) -> 'AggregationConfig':
+        if self.mode == "sliding":
+            if self.step_seconds is None or self.step_seconds > self.window_seconds:
+                raise ValueError("sliding windows need step_seconds <= window_seconds")
+            panes = self.window_seconds / self.step_seconds
+            if abs(panes - round(panes)) > 1e-6:
+                raise ValueError("window_seconds must be a whole multiple of step_seconds")
+        return self
 
 class SensorPublisherParams(BaseModel):
     mqtt_topic_suffix: str
     unit: str
     change_threshold: float
     min_publish_interval_seconds: Optional[int] = None
+    # absolute: change_threshold in engineering units
+    # percent_of_span: change_threshold in % of (span_high - span_low)
+    # swinging_door: change_threshold is the compression deviation
+    exception_mode: Literal["absolute", "percent_of_span", "swinging_door"] = "absolute"
+    span_low: Optional[float] = None
+    span_high: Optional[float] = None
+    # Windowed min/max/mean/stddev/quantile summaries computed at the edge
+    aggregation: Optional[AggregationConfig] = None
+
+    @model_validator(mode='after')
+    def _check_span(self) -> 'SensorPublisherParams':
+        if self.exception_mode == "percent_of_span":
+            if self.span_low is None or self.span_high is None or self.span_high <= self.span_low:
+                raise ValueError("percent_of_span needs span_low < span_high")
+        return self
 
 class SensorConfig(BaseModel):
     id: str
     name: str
-    collector_type: Literal["modbus_tcp", "nmea"]
-    collector_config: Union[SensorModbusCollectorParams, SensorNmeaCollectorParams]
+    collector_type: str
+    collector_config: Union[SensorModbusCollectorParams, SensorNmeaCollectorParams, Dict[str, Any]]
     publisher_config: SensorPublisherParams
 
+    @field_validator('collector_type')
+    @classmethod
+    def _check_collector_type(cls, v: str) -> str:
+        if COLLECTORS.spec(v) is None:
+            raise ValueError(f"unknown collector_type '{v}' (available: {', '.join(COLLECTORS.names())})")
+        return v
+
     @field_validator('collector_config', mode='before')
     @classmethod
-    def _check_collector_config_type(cls, v: any, values: any) -> any:
+    def _check_collector_config_type(cls, v: Any, info: ValidationInfo) -> Any:
+        params_model = SENSOR_COLLECTOR_PARAMS.get(info.data.get("collector_type"))
+        if params_model is not None and not isinstance(v, params_model):
+            return params_model.model_validate(v)
         return v
 
+class SpoolConfig(BaseModel):
+    enabled: bool = False
+    directory: str = "data/mqtt_spool"
+    segment_size_bytes: int = Field(4 * 1024 * 1024, ge=4096)
+    max_total_bytes: int = Field(256 * 1024 * 1024, ge=8192)
+    replay_rate_per_second: int = Field(100, ge=1)
+    flush_interval_seconds: int = Field(5, ge=1)
+
+class MqttBatchConfig(BaseModel):
+    enabled: bool = False
+    topic_suffix: str = "batch"
+    compression: Literal["none", "zlib", "lz4"] = "zlib"
+    float_encoding: Literal["float32", "float64"] = "float32"
+    max_readings_per_message: int = Field(500, ge=1)
+    text_topics: bool = True
+
+# Name of the destination given by the mqtt_publisher broker settings themselves
+PRIMARY_DESTINATION = "primary"
+
+class MqttDestinationConfig(BaseModel):
+    """An additional broker the readings are fanned out to, e.g. a shore broker over VSAT."""
+    name: str = Field(..., pattern=r"^[A-Za-z0-9_-]+$")
+    broker_host: str
+    broker_port: int = 1883
+    username: Optional[str] = None
+    password: Optional[str] = None
+    # Unset fields fall back to the main mqtt_publisher settings
+    topic_prefix: Optional[str] = None
+    engine: Optional[Literal["paho", "asyncio"]] = None
+    connections: Optional[int] = Field(None, ge=1, le=16)
+    # Rate policy of this destination: every sensor's deadband is multiplied by deadband_scale
+    # and its min publish interval raised to at least min_publish_interval_seconds
+    deadband_scale: float = Field(1.0, gt=0)
+    min_publish_interval_seconds: Optional[int] = Field(None, ge=1)
+    max_queue_batches: Optional[int] = Field(None, ge=1)
+    spool: Optional[SpoolConfig] = None
+    batch: Optional[MqttBatchConfig] = None
+
 class MqttPublisherConfig(BaseModel):
     enabled: bool = True
     broker_host: str = "broker.hivemq.com"
@@ -64,10 +240,99 @@ class MqttPublisherConfig(BaseModel):
     lwt_message: str = "connection lost"
     topic_prefix: str = "ows-challenge/mv-sinking-boat"
     timestamp_format: str = "%Y-%m-%d at %H:%M UTC"
+    engine: Literal["paho", "asyncio"] = "paho"
+    mqtt_version: Literal["3.1.1", "5"] = "3.1.1"
+    max_inflight_messages: int = Field(100, ge=1, le=65535)
+    topic_alias_maximum: int = Field(0, ge=0, le=65535)
+    reconnect_delay_seconds: int = Field(5, ge=1)
+    connect_timeout_seconds: int = Field(5, ge=1)
+    spool: SpoolConfig = Field(default_factory=SpoolConfig)
+    batch: MqttBatchConfig = Field(default_factory=MqttBatchConfig)
+    # Broker connections; sensors are spread across them by a hash of the sensor id
+    connections: int = Field(1, ge=1, le=16)
+    # With several connections or destinations, every destination publishes from its own
+    # queue of pipeline batches; beyond this the oldest batches go to the spool (dropped without one)
+    max_queue_batches: int = Field(1000, ge=1)
+    destinations: List[MqttDestinationConfig] = []
+
+    @field_validator('destinations')
+    @classmethod
+    def _check_destinations(cls, v: List[MqttDestinationConfig]) -> List[MqttDestinationConfig]:
+        names = [d.name for d in v]
+        if len(set(names)) != len(names) or PRIMARY_DESTINATION in names:
+            raise ValueError(f"destination names must be unique and not '{PRIMARY_DESTINATION}'")
+        return v
+
+class PipelineConfig(BaseModel):
+    max_queue_size: int = Field(10000, ge=1)
+    overload_policy: Literal["block", "drop_oldest", "conflate"] = "block"
+    batch_max_items: int = Field(200, ge=1)
+    batch_max_wait_ms: int = Field(50, ge=0)
+
+class MetricsConfig(BaseModel):
+    http_enabled: bool = True
+    http_host: str = "127.0.0.1"
+    http_port: int = Field(9108, ge=0, le=65535)
+    mqtt_push_interval_seconds: int = Field(0, ge=0)
+    mqtt_topic_suffix: str = "gateway_stats"
+
+class ConfigReloadConfig(BaseModel):
+    # Sensor changes are applied live on SIGHUP, or when the file changes if watch_file is set
+    watch_file: bool = True
+    poll_interval_seconds: float = Field(2.0, gt=0)
+
+class ShardingConfig(BaseModel):
+    # Collect in worker processes, each owning the Modbus devices and NMEA sources hashed to it
+    enabled: bool = False
+    workers: int = Field(2, ge=1, le=64)
+    ring_capacity: int = Field(65536, ge=1024)          # readings buffered per worker
+    poll_interval_ms: float = Field(2.0, gt=0)          # publisher wait when every ring is empty
+    restart_delay_seconds: float = Field(1.0, gt=0)     # doubled per consecutive crash
+    max_restart_delay_seconds: float = Field(60.0, gt=0)
+
+class HistoryConfig(BaseModel):
+    enabled: bool = False
+    path: str = "data/history.sqlite3"
+    # Readings are written by a background thread in one transaction per flush
+    flush_interval_seconds: float = Field(1.0, gt=0)
+    # Readings waiting for the writer; the oldest are dropped beyond this
+    max_pending_readings: int = Field(200000, ge=1000)
+    raw_retention_hours: float = Field(72.0, gt=0)
+    # Rollup levels (count/min/max/mean per bucket), kept longer than the raw readings
+    rollup_intervals_seconds: List[int] = [60, 3600]
+    rollup_retention_days: float = Field(365.0, gt=0)
+    retention_check_interval_seconds: int = Field(300, ge=10)
+    http_enabled: bool = True
+    http_host: str = "127.0.0.1"
+    http_port: int = Field(9109, ge=0, le=65535)
+    max_points_per_query: int = Field(10000, ge=1)
+
+    @field_validator('rollup_intervals_seconds')
+    @classmethod
+    def _check_rollups(cls, v: List[int]) -> List[int]:
+        if any(i <= 0 for i in v):
+            raise ValueError("rollup intervals must be positive")
+        return sorted(set(v))
+
+class CaptureConfig(BaseModel):
+    enabled: bool = False
+    # {timestamp} is replaced by the start time; shard workers add -shard<n> before the extension
+    path: str = "data/capture/capture-{timestamp}.mgwcap"
+    nmea: bool = True
+    modbus: bool = True
+    flush_interval_seconds: float = Field(1.0, gt=0)
+    # Recording stops when the file reaches this size
+    max_file_mb: float = Field(1024.0, gt=0)
 
 class AppConfig(BaseModel):
     logging: LoggingConfig = Field(default_factory=LoggingConfig)
     application_name: str = "MaritimeIoTGateway"
     collectors: CollectorsConfig = Field(default_factory=CollectorsConfig)
     sensors: List[SensorConfig] = []
-    mqtt_publisher: MqttPublisherConfig = Field(default_factory=MqttPublisherConfig)
\ No newline at end of file
+    pipeline: PipelineConfig = Field(default_factory=PipelineConfig)
+    mqtt_publisher: MqttPublisherConfig = Field(default_factory=MqttPublisherConfig)
+    metrics: MetricsConfig = Field(default_factory=MetricsConfig)
+    config_reload: ConfigReloadConfig = Field(default_factory=ConfigReloadConfig)
+    sharding: ShardingConfig = Field(default_factory=ShardingConfig)
+    history: HistoryConfig = Field(default_factory=HistoryConfig)
+    capture: CaptureConfig = Field(default_factory=CaptureConfig)
\ No newline at end of file
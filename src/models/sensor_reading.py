@@ -1,14 +1,89 @@
-from dataclasses import dataclass, field
-from datetime import datetime, timezone
-from typing import Union, Optional
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Sequence, Union
 
-@dataclass
-class SensorReading:
+from .config_models import SensorConfig
+
+STATUS_VALID = 0
+STATUS_INVALID = 1
+STATUS_NAMES = ("Valid", "Invalid")
+STATUS_CODES = {name: code for code, name in enumerate(STATUS_NAMES)}
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+@dataclass(frozen=True, slots=True)
+class SensorDescriptor:
+    """Per-sensor publishing metadata, built once from SensorConfig and shared by all its readings."""
+    index: int
     sensor_id: str
-    value: Union[float, int, None]
     unit: str
-    timestamp: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
-    status: str = "Valid"
     mqtt_topic_suffix: Optional[str] = None
     change_threshold: Optional[float] = None
-    min_publish_interval_seconds: Optional[int] = None
\ No newline at end of file
+    min_publish_interval_seconds: Optional[int] = None
+
+    @classmethod
+    def from_config(cls, sensor: SensorConfig, index: int) -> "SensorDescriptor":
+        params = sensor.publisher_config
+        return cls(index, sensor.id, params.unit, params.mqtt_topic_suffix, params.change_threshold,
+                   params.min_publish_interval_seconds)
+
+
+def build_descriptors(sensors: Sequence[SensorConfig]) -> Dict[str, SensorDescriptor]:
+    """Descriptors keyed by sensor id; the index is the sensor's position in the config."""
+    return {sensor.id: SensorDescriptor.from_config(sensor, index) for index, sensor in enumerate(sensors)}
+
+
+@dataclass(slots=True)
+class SensorReading:
+    descriptor: SensorDescriptor
+    value: Union[float, int, None]
+    status_code: int = STATUS_VALID
+    timestamp_ns: int = 0
+
+    def __post_init__(self):
+        if not self.timestamp_ns:
+            self.timestamp_ns = time.time_ns()
+
+    @classmethod
+    def from_values(cls, sensor_id: str, value: Union[float, int, None], unit: str,
+                    timestamp: Optional[datetime] = None, status: str = "Valid",
+                    mqtt_topic_suffix: Optional[str] = None, change_threshold: Optional[float] = None,
+                    min_publish_interval_seconds: Optional[int] = None) -> "SensorReading":
+        """Builds a reading with its own descriptor, for callers without a sensor config."""
+        descriptor = SensorDescriptor(-1, sensor_id, unit, mqtt_topic_suffix, change_threshold,
+                                      min_publish_interval_seconds)
+        timestamp_ns = 0
+        if timestamp is not None:
+            if timestamp.tzinfo is None:
+                timestamp = timestamp.replace(tzinfo=timezone.utc)
+            timestamp_ns = (timestamp - _EPOCH) // timedelta(microseconds=1) * 1000
+        return cls(descriptor, value, STATUS_CODES[status], timestamp_ns)
+
+    @property
+    def sensor_id(self) -> str:
+        return self.descriptor.sensor_id
+
+    @property
+    def unit(self) -> str:
+        return self.descriptor.unit
+
+    @property
+    def mqtt_topic_suffix(self) -> Optional[str]:
+        return self.descriptor.mqtt_topic_suffix
+
+    @property
+    def change_threshold(self) -> Optional[float]:
+        return self.descriptor.change_threshold
+
+    @property
+    def min_publish_interval_seconds(self) -> Optional[int]:
+        return self.descriptor.min_publish_interval_seconds
+
+    @property
+    def status(self) -> str:
+        return STATUS_NAMES[self.status_code]
+
+    @property
+    def timestamp(self) -> datetime:
+        return datetime.fromtimestamp(self.timestamp_ns / 1e9, tz=timezone.utc)
@@ -0,0 +1,252 @@
+import json
+import logging
+import math
+from collections import deque
+from datetime import datetime, timezone
+from typing import Deque, Dict, List, Optional, Sequence, Tuple
+
+from ..metrics.registry import REGISTRY
+from ..models.config_models import AggregationConfig, SensorConfig
+from ..models.sensor_reading import STATUS_VALID, SensorReading
+
+logger = logging.getLogger(__name__)
+
+AGGREGATION_WINDOWS = REGISTRY.counter("gateway_aggregation_windows_total", "Window summaries produced")
+
+# A pane is closed by the timer once the clock is this far past its end, leaving time for
+# readings still waiting in the pipeline queue
+CLOSE_GRACE_NS = 1_000_000_000
+
+# (topic suffix, JSON payload)
+Summary = Tuple[str, str]
+
+
+class QuantileSketch:
+    """
+    Log-bucketed quantile sketch with relative error alpha: a value x lands in bucket
+    ceil(log_gamma(|x|)), gamma = (1 + alpha) / (1 - alpha). Buckets are plain counts, so
+    sketches of adjacent panes merge exactly by adding them.
+    """
+
+    __slots__ = ("_log_gamma", "_gamma", "_positive", "_negative", "zeros", "count")
+
+    _MIN_VALUE = 1e-9
+
+    def __init__(self, alpha: float = 0.01):
+        self._gamma = (1 + alpha) / (1 - alpha)
+        self._log_gamma = math.log(self._gamma)
+        self._positive: Dict[int, int] = {}
+        self._negative: Dict[int, int] = {}
+        self.zeros = 0
+        self.count = 0
+
+    def add(self, x: float):
+        self.count += 1
+        if x > self._MIN_VALUE:
+            key = math.ceil(math.log(x) / self._log_gamma)
+            self._positive[key] = self._positive.get(key, 0) + 1
+        elif x < -self._MIN_VALUE:
+            key = math.ceil(math.log(-x) / self._log_gamma)
+            self._negative[key] = self._negative.get(key, 0) + 1
+        else:
+            self.zeros += 1
+
+    def merge(self, other: "QuantileSketch"):
+        for mine, theirs in ((self._positive, other._positive), (self._negative, other._negative)):
+            for key, n in theirs.items():
+                mine[key] = mine.get(key, 0) + n
+        self.zeros += other.zeros
+        self.count += other.count
+
+    def _bucket_value(self, key: int) -> float:
+        return 2 * self._gamma ** key / (self._gamma + 1)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for key in sorted(self._negative, reverse=True):
+            seen += self._negative[key]
+            if seen > rank:
+                return -self._bucket_value(key)
+        seen += self.zeros
+        if seen > rank:
+            return 0.0
+        for key in sorted(self._positive):
+            seen += self._positive[key]
+            if seen > rank:
+                return self._bucket_value(key)
+        return self._bucket_value(max(self._positive))
+
+
+class WindowStats:
+    """Running count/mean/variance (Welford), min, max and quantile sketch of one pane or window."""
+
+    __slots__ = ("count", "mean", "m2", "min", "max", "invalid", "sketch")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.invalid = 0
+        self.sketch = QuantileSketch()
+
+    def add(self, x: float):
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+        if x < self.min: self.min = x
+        if x > self.max: self.max = x
+        self.sketch.add(x)
+
+    def merge(self, other: "WindowStats"):
+        """Chan et al. pairwise combination of two Welford accumulators."""
+        if other.count:
+            total = self.count + other.count
+            delta = other.mean - self.mean
+            self.mean += delta * other.count / total
+            self.m2 += other.m2 + delta * delta * self.count * other.count / total
+            self.count = total
+            self.min = min(self.min, other.min)
+            self.max = max(self.max, other.max)
+            self.sketch.merge(other.sketch)
+        self.invalid += other.invalid
+
+    def is_empty(self) -> bool:
+        return not self.count and not self.invalid
+
+
+def _iso(timestamp_ns: int) -> str:
+    return datetime.fromtimestamp(timestamp_ns / 1e9, tz=timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+class SensorWindows:
+    """
+    Panes of step length for one sensor, aligned to the epoch, in a ring buffer holding one
+    window. Tumbling windows are sliding windows whose step is the whole window.
+    """
+
+    def __init__(self, sensor: SensorConfig, config: AggregationConfig):
+        self.sensor_id = sensor.id
+        self.unit = sensor.publisher_config.unit
+        self.config = config
+        self.topic_suffix = f"{sensor.publisher_config.mqtt_topic_suffix}/{config.topic_suffix}"
+        step = config.step_seconds if config.mode == "sliding" else config.window_seconds
+        self.step_ns = int(step * 1e9)
+        self.window_ns = int(config.window_seconds * 1e9)
+        self.panes: Deque[Tuple[int, WindowStats]] = deque(maxlen=max(1, round(self.window_ns / self.step_ns)))
+        self.current = WindowStats()
+        self.pane_start: Optional[int] = None
+        self._last_data_ns = 0
+
+    def add(self, reading: SensorReading, out: List[Summary]):
+        timestamp_ns = reading.timestamp_ns
+        if self.pane_start is None:
+            self.pane_start = timestamp_ns - timestamp_ns % self.step_ns
+        elif timestamp_ns >= self.pane_start + self.step_ns:
+            self.roll(timestamp_ns, out)
+        # Readings older than the open pane (late out of the queue) are counted in the open pane
+        if reading.status_code == STATUS_VALID and reading.value is not None:
+            self.current.add(float(reading.value))
+        else:
+            self.current.invalid += 1
+
+    def roll(self, now_ns: int, out: List[Summary]):
+        """Closes every pane that ended at or before now_ns, emitting one summary per close."""
+        if self.pane_start is None:
+            return
+        while self.pane_start + self.step_ns <= now_ns:
+            if not self.current.is_empty():
+                self._last_data_ns = self.pane_start
+            self.panes.append((self.pane_start, self.current))
+            self.current = WindowStats()
+            self.pane_start += self.step_ns
+            self._emit(out)
+            if self.pane_start - self._last_data_ns >= self.window_ns:
+                # The last pane with data has left the window: skip ahead to the current pane
+                self.panes.clear()
+                self.pane_start = max(self.pane_start, now_ns - now_ns % self.step_ns)
+
+    def _emit(self, out: List[Summary]):
+        window = WindowStats()
+        for _, pane in self.panes:
+            window.merge(pane)
+        if window.is_empty():
+            return
+        end_ns = self.pane_start
+        summary = {"sensor_id": self.sensor_id, "unit": self.unit,
+                   "window_start": _iso(end_ns - self.window_ns), "window_end": _iso(end_ns),
+                   "count": window.count, "invalid_count": window.invalid}
+        if window.count:
+            stddev = math.sqrt(window.m2 / (window.count - 1)) if window.count > 1 else 0.0
+            summary.update(min=window.min, max=window.max, mean=window.mean, stddev=stddev)
+            for q in self.config.quantiles:
+                summary[f"p{q * 100:g}"] = window.sketch.quantile(q)
+        AGGREGATION_WINDOWS.inc()
+        out.append((self.topic_suffix, json.dumps(summary)))
+
+
+class WindowAggregator:
+    """
+    Pipeline stage between the reading queue and the publisher for sensors with
+    publisher_config.aggregation. Every reading of such a sensor (before report-by-exception)
+    goes into its current pane; when a pane closes, the summary of the window ending there is
+    queued for publishing. Panes close on the first reading past their end, or from tick()
+    once the clock is CLOSE_GRACE_NS past it.
+    """
+
+    def __init__(self, sensors: Sequence[SensorConfig]):
+        self._windows: Dict[str, SensorWindows] = {}
+        self._summary_only: set = set()
+        self._summaries: List[Summary] = []
+        self.update_sensors(sensors, [])
+
+    @property
+    def active(self) -> bool:
+        return bool(self._windows)
+
+    def update_sensors(self, sensors: Sequence[SensorConfig], removed: Sequence[SensorConfig]):
+        """Adds or reconfigures the given sensors; sensors with unchanged aggregation keep their panes."""
+        for sensor in removed:
+            self._windows.pop(sensor.id, None)
+            self._summary_only.discard(sensor.id)
+        for sensor in sensors:
+            config = sensor.publisher_config.aggregation
+            windows = self._windows.get(sensor.id)
+            if config is None:
+                self._windows.pop(sensor.id, None)
+                self._summary_only.discard(sensor.id)
+                continue
+            if windows is None or windows.config != config:
+                self._windows[sensor.id] = SensorWindows(sensor, config)
+            else:
+                windows.unit = sensor.publisher_config.unit
+                windows.topic_suffix = f"{sensor.publisher_config.mqtt_topic_suffix}/{config.topic_suffix}"
+            if config.forward_raw:
+                self._summary_only.discard(sensor.id)
+            else:
+                self._summary_only.add(sensor.id)
+
+    def process(self, readings: List[SensorReading]) -> List[SensorReading]:
+        """Feeds a batch; returns the readings still to be published raw."""
+        windows, out = self._windows, self._summaries
+        for reading in readings:
+            sensor_windows = windows.get(reading.descriptor.sensor_id)
+            if sensor_windows is not None:
+                sensor_windows.add(reading, out)
+        if not self._summary_only:
+            return readings
+        summary_only = self._summary_only
+        return [r for r in readings if r.descriptor.sensor_id not in summary_only]
+
+    def tick(self, now_ns: int):
+        for sensor_windows in self._windows.values():
+            sensor_windows.roll(now_ns - CLOSE_GRACE_NS, self._summaries)
+
+    def take_summaries(self) -> List[Summary]:
+        summaries, self._summaries = self._summaries, []
+        return summaries
@@ -0,0 +1,152 @@
+import asyncio
+import logging
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List
+
+from ..models.sensor_reading import SensorReading
+
+logger = logging.getLogger(__name__)
+
+OVERLOAD_POLICIES = ("block", "drop_oldest", "conflate")
+
+
+@dataclass
+class ReadingQueueStats:
+    depth: int = 0
+    max_depth: int = 0
+    enqueued: int = 0
+    dropped: int = 0
+    conflated: int = 0
+
+
+class ReadingQueue:
+    """
+    Bounded queue between the collectors and the publisher. Collectors use it like an
+    asyncio.Queue (await put); the consumer drains it in batches with get_batch.
+
+    Overload policies once maxsize readings are waiting:
+      - block:       put waits for space (backpressure on the collectors)
+      - drop_oldest: the oldest waiting reading is discarded
+      - conflate:    a new reading replaces the newest waiting reading of its sensor; a
+                     sensor with nothing waiting displaces the oldest reading instead
+
+    Below maxsize every policy queues every reading. Under conflate the queue holds
+    one-element lists, so a waiting reading can be replaced in place.
+    """
+
+    def __init__(self, maxsize: int, policy: str = "block"):
+        if policy not in OVERLOAD_POLICIES:
+            raise ValueError(f"Unknown overload policy '{policy}'")
+        self.maxsize = maxsize
+        self.policy = policy
+        self._items: Deque = deque()
+        # conflate: sensor_id -> the slot holding that sensor's newest waiting reading
+        self._waiting: Dict[str, List[SensorReading]] = {}
+        self._not_empty = asyncio.Event()
+        self._not_full = asyncio.Event()
+        self._not_full.set()
+        self._overloaded = False
+        self.stats = ReadingQueueStats()
+
+    def qsize(self) -> int:
+        return len(self._items)
+
+    def empty(self) -> bool:
+        return self.qsize() == 0
+
+    def _note_overload(self):
+        if not self._overloaded:
+            self._overloaded = True
+            logger.warning(f"Reading queue full ({self.maxsize}); applying '{self.policy}' policy.")
+
+    def put_nowait(self, reading: SensorReading):
+        if self.policy == "conflate":
+            sensor_id = reading.descriptor.sensor_id
+            if len(self._items) >= self.maxsize:
+                self._note_overload()
+                slot = self._waiting.get(sensor_id)
+                if slot is not None:
+                    slot[0] = reading
+                    self.stats.conflated += 1
+                    self.stats.enqueued += 1
+                    return
+                self._forget(self._items.popleft())
+                self.stats.dropped += 1
+            slot = [reading]
+            self._items.append(slot)
+            self._waiting[sensor_id] = slot
+        else:
+            if len(self._items) >= self.maxsize:
+                if self.policy == "block":
+                    raise asyncio.QueueFull
+                self._items.popleft()
+                self.stats.dropped += 1
+                self._note_overload()
+            self._items.append(reading)
+
+        self.stats.enqueued += 1
+        depth = self.qsize()
+        self.stats.depth = depth
+        if depth > self.stats.max_depth:
+            self.stats.max_depth = depth
+        if self.policy == "block" and depth >= self.maxsize:
+            self._not_full.clear()
+        self._not_empty.set()
+
+    async def put(self, reading: SensorReading):
+        while self.policy == "block" and len(self._items) >= self.maxsize:
+            self._note_overload()
+            await self._not_full.wait()
+        self.put_nowait(reading)
+
+    def _forget(self, slot: List[SensorReading]):
+        sensor_id = slot[0].descriptor.sensor_id
+        if self._waiting.get(sensor_id) is slot:
+            del self._waiting[sensor_id]
+
+    def _take(self, max_items: int, batch: List[SensorReading]):
+        if self.policy == "conflate":
+            while self._items and len(batch) < max_items:
+                slot = self._items.popleft()
+                self._forget(slot)
+                batch.append(slot[0])
+        else:
+            while self._items and len(batch) < max_items:
+                batch.append(self._items.popleft())
+
+        depth = self.qsize()
+        self.stats.depth = depth
+        if depth == 0:
+            self._not_empty.clear()
+        if depth < self.maxsize:
+            self._not_full.set()
+        if self._overloaded and depth <= self.maxsize // 2:
+            self._overloaded = False
+            logger.info(f"Reading queue recovered. Dropped so far: {self.stats.dropped}, conflated: {self.stats.conflated}.")
+
+    async def get_batch(self, max_items: int, max_wait_seconds: float) -> List[SensorReading]:
+        """
+        Waits for at least one reading, then keeps collecting until max_items readings are
+        taken or max_wait_seconds have passed since the first one.
+        """
+        batch: List[SensorReading] = []
+        await self._not_empty.wait()
+        self._take(max_items, batch)
+        if len(batch) >= max_items or max_wait_seconds <= 0:
+            return batch
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + max_wait_seconds
+        while len(batch) < max_items:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            if self.empty():
+                timer = loop.call_later(remaining, self._not_empty.set)
+                try:
+                    await self._not_empty.wait()
+                finally:
+                    timer.cancel()
+            self._take(max_items, batch)
+        return batch
@@ -0,0 +1,88 @@
+"""
+Registry of collector and publisher implementations, imported on first use so that the
+dependencies of an unused collector (pymodbus, pynmea2, paho-mqtt) are never loaded.
+
+Built-in plugins are listed below as "module:attribute" strings. Other packages can add
+collectors through the "maritime_gateway.collectors" entry point group; the entry point name
+is the sensor collector_type and its config is the same-named section under `collectors`.
+"""
+import importlib
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+COLLECTOR_ENTRY_POINT_GROUP = "maritime_gateway.collectors"
+PUBLISHER_ENTRY_POINT_GROUP = "maritime_gateway.publishers"
+
+
+@dataclass
+class PluginSpec:
+    name: str
+    target: str                            # "module:attribute"; relative modules resolve against this package
+    config_section: Optional[str] = None   # attribute of the parent config section holding the plugin config
+    entry_point: Any = None
+
+
+class PluginRegistry:
+    def __init__(self, kind: str, entry_point_group: str):
+        self.kind = kind
+        self.entry_point_group = entry_point_group
+        self._specs: Dict[str, PluginSpec] = {}
+        self._loaded: Dict[str, Any] = {}
+        self._entry_points_scanned = False
+
+    def register(self, name: str, target: str, config_section: Optional[str] = None):
+        self._specs[name] = PluginSpec(name, target, config_section or name)
+        self._loaded.pop(name, None)
+
+    def _scan_entry_points(self):
+        # importlib.metadata scans every installed distribution; only pay for it on a miss
+        if self._entry_points_scanned:
+            return
+        self._entry_points_scanned = True
+        from importlib.metadata import entry_points
+        for entry_point in entry_points(group=self.entry_point_group):
+            if entry_point.name not in self._specs:
+                self._specs[entry_point.name] = PluginSpec(entry_point.name, entry_point.value,
+                                                           entry_point.name, entry_point)
+
+    def spec(self, name: str) -> Optional[PluginSpec]:
+        if name not in self._specs:
+            self._scan_entry_points()
+        return self._specs.get(name)
+
+    def names(self) -> List[str]:
+        self._scan_entry_points()
+        return list(self._specs)
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._loaded
+
+    def load(self, name: str) -> Any:
+        """Imports the plugin module on first use and returns the registered class."""
+        plugin = self._loaded.get(name)
+        if plugin is not None:
+            return plugin
+        spec = self.spec(name)
+        if spec is None:
+            raise KeyError(f"Unknown {self.kind} '{name}'")
+        if spec.entry_point is not None:
+            plugin = spec.entry_point.load()
+        else:
+            module_name, _, attribute = spec.target.partition(":")
+            module = importlib.import_module(module_name, package=__package__)
+            plugin = getattr(module, attribute)
+        logger.debug("Loaded %s '%s' from %s", self.kind, name, spec.target)
+        self._loaded[name] = plugin
+        return plugin
+
+
+COLLECTORS = PluginRegistry("collector", COLLECTOR_ENTRY_POINT_GROUP)
+COLLECTORS.register("modbus_tcp", ".collectors.modbus_collector:ModbusCollector", "modbus_collector")
+COLLECTORS.register("nmea", ".collectors.nmea_collector:NmeaCollector", "nmea_collector")
+
+PUBLISHERS = PluginRegistry("publisher", PUBLISHER_ENTRY_POINT_GROUP)
+PUBLISHERS.register("mqtt", ".publishers.mqtt_publisher:MQTTPublisher", "mqtt_publisher")
+PUBLISHERS.register("mqtt_group", ".publishers.publisher_group:PublisherGroup", "mqtt_publisher")
@@ -0,0 +1,189 @@
+"""
+Compact binary encoding for batches of sensor readings.
+
+This module only depends on the standard library (lz4 is optional) so it can be copied
+to the shore side to decode what the gateway publishes on its batch topic:
+
+    sensors = json.loads(index_message)["sensors"]
+    for record in decode_batch(batch_message).records:
+        print(sensors[record.sensor_index]["id"], record.timestamp, record.value, record.valid)
+
+Message layout (big endian):
+    magic "MB" | version u8 | compression u8 | schema u32 | body
+Body (compressed as a whole unless compression is 0):
+    base timestamp ms u64 | record count varint | records
+Record:
+    sensor index varint | timestamp delta ms (zigzag varint, from previous record) |
+    status u8 | value
+Status bits: 0 = valid, 1-2 = value kind (0 none, 1 zigzag varint, 2 float32, 3 float64).
+"""
+import json
+import math
+import struct
+import zlib
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+MAGIC = b"MB"
+VERSION = 1
+COMPRESSION_NONE = 0
+COMPRESSION_ZLIB = 1
+COMPRESSION_LZ4 = 2
+COMPRESSION_CODES = {"none": COMPRESSION_NONE, "zlib": COMPRESSION_ZLIB, "lz4": COMPRESSION_LZ4}
+
+STATUS_VALID = 0x01
+VALUE_NONE = 0
+VALUE_VARINT = 1
+VALUE_FLOAT32 = 2
+VALUE_FLOAT64 = 3
+
+_HEADER = struct.Struct(">2sBBI")
+_BASE_TIMESTAMP = struct.Struct(">Q")
+_FLOAT32 = struct.Struct(">f")
+_FLOAT64 = struct.Struct(">d")
+# Integral values beyond this are sent as floats
+_MAX_VARINT_VALUE = 1 << 53
+
+
+@dataclass
+class BatchRecord:
+    sensor_index: int
+    timestamp_ms: int
+    value: Optional[float]
+    valid: bool
+
+    @property
+    def timestamp(self) -> datetime:
+        return datetime.fromtimestamp(self.timestamp_ms / 1000, tz=timezone.utc)
+
+
+@dataclass
+class DecodedBatch:
+    schema: int
+    records: List[BatchRecord]
+
+
+def _zigzag(n: int) -> int:
+    return (n << 1) ^ (n >> 63)
+
+
+def _unzigzag(n: int) -> int:
+    return (n >> 1) ^ -(n & 1)
+
+
+def _write_varint(out: bytearray, n: int):
+    while n > 0x7F:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    result, shift = 0, 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+def index_schema(sensors: Sequence[dict]) -> int:
+    """Identifier of a sensor index map; batches carry it so decoders can detect a stale map."""
+    return zlib.crc32(json.dumps(list(sensors), sort_keys=True, separators=(",", ":")).encode("utf-8"))
+
+
+def encode_index(sensors: Sequence[dict]) -> str:
+    return json.dumps({"version": VERSION, "schema": index_schema(sensors), "sensors": list(sensors)},
+                      separators=(",", ":"))
+
+
+def encode_batch(records: Iterable[Tuple[int, int, Optional[float], bool]], schema: int,
+                 compression: str = "zlib", float_encoding: str = "float32") -> bytes:
+    """Encodes (sensor index, timestamp ms, value, valid) tuples into one batch message."""
+    records = list(records)
+    body = bytearray()
+    base_ms = min((r[1] for r in records), default=0)
+    body += _BASE_TIMESTAMP.pack(base_ms)
+    _write_varint(body, len(records))
+    float_kind, float_struct = (VALUE_FLOAT64, _FLOAT64) if float_encoding == "float64" else (VALUE_FLOAT32, _FLOAT32)
+
+    previous_ms = base_ms
+    for sensor_index, timestamp_ms, value, valid in records:
+        _write_varint(body, sensor_index)
+        _write_varint(body, _zigzag(timestamp_ms - previous_ms))
+        previous_ms = timestamp_ms
+        status = STATUS_VALID if valid else 0
+        if value is None:
+            body.append(status)
+        elif math.isfinite(value) and value == int(value) and abs(value) < _MAX_VARINT_VALUE:
+            body.append(status | (VALUE_VARINT << 1))
+            _write_varint(body, _zigzag(int(value)))
+        else:
+            body.append(status | (float_kind << 1))
+            body += float_struct.pack(value)
+
+    code = COMPRESSION_CODES[compression]
+    if code == COMPRESSION_LZ4 and lz4_frame is None:
+        code = COMPRESSION_ZLIB
+    if code == COMPRESSION_ZLIB:
+        payload = zlib.compress(bytes(body), 6)
+    elif code == COMPRESSION_LZ4:
+        payload = lz4_frame.compress(bytes(body))
+    else:
+        payload = bytes(body)
+    return _HEADER.pack(MAGIC, VERSION, code, schema) + payload
+
+
+def decode_batch(data: bytes) -> DecodedBatch:
+    magic, version, code, schema = _HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a supported reading batch")
+    body = data[_HEADER.size:]
+    if code == COMPRESSION_ZLIB:
+        body = zlib.decompress(body)
+    elif code == COMPRESSION_LZ4:
+        if lz4_frame is None:
+            raise ValueError("Batch is LZ4 compressed but the lz4 package is not installed")
+        body = lz4_frame.decompress(body)
+
+    timestamp_ms = _BASE_TIMESTAMP.unpack_from(body, 0)[0]
+    count, pos = _read_varint(body, _BASE_TIMESTAMP.size)
+    records: List[BatchRecord] = []
+    for _ in range(count):
+        sensor_index, pos = _read_varint(body, pos)
+        delta, pos = _read_varint(body, pos)
+        timestamp_ms += _unzigzag(delta)
+        status = body[pos]
+        pos += 1
+        kind = (status >> 1) & 0x03
+        value: Optional[float] = None
+        if kind == VALUE_VARINT:
+            raw, pos = _read_varint(body, pos)
+            value = float(_unzigzag(raw))
+        elif kind == VALUE_FLOAT32:
+            value = _FLOAT32.unpack_from(body, pos)[0]
+            pos += 4
+        elif kind == VALUE_FLOAT64:
+            value = _FLOAT64.unpack_from(body, pos)[0]
+            pos += 8
+        records.append(BatchRecord(sensor_index, timestamp_ms, value, bool(status & STATUS_VALID)))
+    return DecodedBatch(schema, records)
+
+
+def decode_batch_with_index(data: bytes, index_message: str) -> List[Dict]:
+    """Decodes a batch into dicts keyed by sensor id, checking it against the published index map."""
+    index = json.loads(index_message)
+    batch = decode_batch(data)
+    if batch.schema != index["schema"]:
+        raise ValueError(f"Batch schema {batch.schema} does not match index schema {index['schema']}")
+    sensors = index["sensors"]
+    return [{"sensor_id": sensors[r.sensor_index]["id"], "unit": sensors[r.sensor_index].get("unit"),
+             "timestamp": r.timestamp, "value": r.value, "valid": r.valid} for r in batch.records]
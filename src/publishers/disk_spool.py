@@ -0,0 +1,231 @@
+import logging
+import mmap
+import os
+import struct
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Segment header: magic, version, read offset of the first unconsumed record.
+# The read offset is updated in place once the broker has acknowledged a record, so a
+# restarted gateway resumes after the last acknowledged message (at-least-once).
+_SEGMENT_MAGIC = b"MGSP"
+_SEGMENT_VERSION = 1
+_HEADER = struct.Struct(">4sHxxQ")
+_READ_OFFSET_POS = 8
+_RECORD_HEADER = struct.Struct(">II")  # payload length, crc32
+_U64 = struct.Struct(">Q")
+
+# (segment sequence, offset after the record): where a delivered record ends
+SpoolPosition = Tuple[int, int]
+
+
+@dataclass
+class SpoolRecord:
+    topic: str
+    payload: bytes
+    qos: int
+    retain: bool
+
+
+def _encode_record(record: SpoolRecord) -> bytes:
+    topic = record.topic.encode("utf-8")
+    flags = (record.qos & 0x03) | (0x04 if record.retain else 0)
+    return struct.pack(">HB", len(topic), flags) + topic + record.payload
+
+
+def _decode_record(data: bytes) -> SpoolRecord:
+    topic_length, flags = struct.unpack_from(">HB", data, 0)
+    topic = data[3:3 + topic_length].decode("utf-8")
+    return SpoolRecord(topic, bytes(data[3 + topic_length:]), flags & 0x03, bool(flags & 0x04))
+
+
+class _Segment:
+    def __init__(self, path: Path, size: int, create: bool):
+        self.path = path
+        self.sequence = int(path.stem.split("-")[1])
+        if create:
+            with open(path, "wb") as f:
+                f.truncate(size)
+        self._file = open(path, "r+b")
+        self.size = os.fstat(self._file.fileno()).st_size
+        self.map = mmap.mmap(self._file.fileno(), self.size)
+        if create:
+            self.map[:_HEADER.size] = _HEADER.pack(_SEGMENT_MAGIC, _SEGMENT_VERSION, _HEADER.size)
+        magic, version, self.read_offset = _HEADER.unpack_from(self.map, 0)
+        if magic != _SEGMENT_MAGIC or version != _SEGMENT_VERSION:
+            raise ValueError(f"{path} is not a spool segment")
+        self.write_offset = self._recover_write_offset()
+
+    def _recover_write_offset(self) -> int:
+        """Scans records from the header; the first empty or corrupt record ends the segment."""
+        pos = _HEADER.size
+        while pos + _RECORD_HEADER.size <= self.size:
+            length, crc = _RECORD_HEADER.unpack_from(self.map, pos)
+            end = pos + _RECORD_HEADER.size + length
+            if length == 0 or end > self.size or zlib.crc32(self.map[pos + _RECORD_HEADER.size:end]) != crc:
+                break
+            pos = end
+        return pos
+
+    def append(self, data: bytes) -> bool:
+        end = self.write_offset + _RECORD_HEADER.size + len(data)
+        if end > self.size:
+            return False
+        # Body first, header last: a crash in between leaves an empty record that ends the scan
+        self.map[self.write_offset + _RECORD_HEADER.size:end] = data
+        self.map[self.write_offset:self.write_offset + _RECORD_HEADER.size] = _RECORD_HEADER.pack(len(data), zlib.crc32(data))
+        self.write_offset = end
+        return True
+
+    def read(self, offset: int) -> Optional[tuple]:
+        if offset >= self.write_offset:
+            return None
+        length, _ = _RECORD_HEADER.unpack_from(self.map, offset)
+        start = offset + _RECORD_HEADER.size
+        return self.map[start:start + length], start + length
+
+    def commit(self, new_read_offset: int):
+        self.read_offset = new_read_offset
+        self.map[_READ_OFFSET_POS:_READ_OFFSET_POS + 8] = _U64.pack(new_read_offset)
+
+    def pending_bytes(self) -> int:
+        return self.write_offset - self.read_offset
+
+    def flush(self):
+        self.map.flush()
+
+    def close(self):
+        self.map.flush()
+        self.map.close()
+        self._file.close()
+
+    def delete(self):
+        self.map.close()
+        self._file.close()
+        self.path.unlink(missing_ok=True)
+
+
+class DiskSpool:
+    """
+    Segmented, append-only store-and-forward buffer for MQTT payloads that could not be sent.
+
+    Segments are fixed-size memory-mapped files. When max_total_bytes would be exceeded the
+    oldest segment is evicted. Records are sent oldest first with peek()/advance(), which
+    move an in-memory delivery cursor, and consumed with commit_through() once the broker
+    acknowledged them. rewind() returns the cursor to the first unacknowledged record, e.g.
+    after the connection dropped with records in flight.
+    """
+
+    def __init__(self, directory: Path, segment_size: int, max_total_bytes: int):
+        self.directory = Path(directory)
+        self.segment_size = segment_size
+        self.max_segments = max(2, max_total_bytes // segment_size)
+        self.evicted_segments = 0
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._segments: List[_Segment] = []
+        for path in sorted(self.directory.glob("spool-*.seg")):
+            try:
+                self._segments.append(_Segment(path, segment_size, create=False))
+            except Exception as e:
+                logger.error(f"Spool: Discarding unreadable segment {path}: {e}")
+                path.unlink(missing_ok=True)
+        self._peeked: Optional[SpoolPosition] = None
+        # Next record to send; None: the first unconsumed record
+        self._cursor: Optional[SpoolPosition] = None
+        self._drop_consumed_segments()
+        if self._segments:
+            logger.info(f"Spool: Recovered {len(self._segments)} segment(s) with {self.pending_bytes()} bytes pending.")
+
+    def _new_segment(self) -> _Segment:
+        sequence = self._segments[-1].sequence + 1 if self._segments else 0
+        while len(self._segments) >= self.max_segments:
+            oldest = self._segments.pop(0)
+            logger.warning(f"Spool: Size cap reached. Evicting oldest segment {oldest.path.name} "
+                           f"({oldest.pending_bytes()} bytes undelivered).")
+            oldest.delete()
+            self.evicted_segments += 1
+            self._peeked = None
+        segment = _Segment(self.directory / f"spool-{sequence:010d}.seg", self.segment_size, create=True)
+        self._segments.append(segment)
+        return segment
+
+    def append(self, topic: str, payload: bytes, qos: int = 1, retain: bool = False) -> bool:
+        data = _encode_record(SpoolRecord(topic, payload, qos, retain))
+        if _HEADER.size + _RECORD_HEADER.size + len(data) > self.segment_size:
+            logger.error(f"Spool: Message for {topic} ({len(data)} bytes) exceeds the segment size. Dropped.")
+            return False
+        if not self._segments or not self._segments[-1].append(data):
+            self._new_segment().append(data)
+        return True
+
+    def _drop_consumed_segments(self):
+        # Keep the newest segment (it is the write target) even when fully consumed
+        while len(self._segments) > 1 and self._segments[0].pending_bytes() == 0:
+            self._segments.pop(0).delete()
+
+    def peek(self) -> Optional[SpoolRecord]:
+        """The next record to send, without moving the delivery cursor."""
+        self._drop_consumed_segments()
+        self._peeked = None
+        cursor = self._cursor
+        for segment in self._segments:
+            if cursor is not None and segment.sequence < cursor[0]:
+                continue
+            offset = segment.read_offset
+            if cursor is not None and segment.sequence == cursor[0]:
+                offset = max(offset, cursor[1])
+            result = segment.read(offset)
+            if result is not None:
+                data, end = result
+                self._peeked = (segment.sequence, end)
+                return _decode_record(data)
+        return None
+
+    def advance(self) -> Optional[SpoolPosition]:
+        """Moves the delivery cursor past the record returned by the last peek() and returns its position."""
+        position, self._peeked = self._peeked, None
+        if position is not None:
+            self._cursor = position
+        return position
+
+    def commit_through(self, position: SpoolPosition):
+        """Marks every record up to and including the one ending at position as delivered."""
+        sequence, offset = position
+        for segment in self._segments:
+            if segment.sequence < sequence:
+                segment.commit(segment.write_offset)
+            elif segment.sequence == sequence:
+                if offset > segment.read_offset:
+                    segment.commit(offset)
+                break
+        self._drop_consumed_segments()
+
+    def commit(self):
+        """Marks the record returned by the last peek() as delivered."""
+        position = self.advance()
+        if position is not None:
+            self.commit_through(position)
+
+    def rewind(self, position: Optional[SpoolPosition] = None):
+        """Sends again from the record after position, by default from the first record not yet committed."""
+        self._cursor = position
+        self._peeked = None
+
+    def pending_bytes(self) -> int:
+        return sum(segment.pending_bytes() for segment in self._segments)
+
+    def is_empty(self) -> bool:
+        return all(segment.pending_bytes() == 0 for segment in self._segments)
+
+    def flush(self):
+        for segment in self._segments:
+            segment.flush()
+
+    def close(self):
+        for segment in self._segments:
+            segment.close()
+        self._segments.clear()
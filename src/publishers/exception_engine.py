@@ -0,0 +1,226 @@
+import math
+import time
+from array import array
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from ..models.config_models import SensorConfig
+from ..models.sensor_reading import STATUS_VALID, SensorReading
+
+MODE_ABSOLUTE = 0
+MODE_SWINGING_DOOR = 1
+
+_NAN = float("nan")
+_INF = float("inf")
+
+
+class ExceptionEngine:
+    """
+    Report-by-exception decisions for all sensors. Per-sensor state lives in arrays indexed by
+    sensor number; publish intervals use the monotonic clock, read once per evaluated batch.
+
+    Deadband modes (SensorPublisherParams.exception_mode):
+      - absolute / percent_of_span: publish when the value moved more than the deadband since
+        the last published value (percent_of_span converts the deadband once at registration)
+      - swinging_door: swinging-door trending. A point is held back until a later point shows
+        it cannot be interpolated within the compression deviation, then the held point is
+        published and becomes the new pivot.
+    A reading is always published for the first value, on a Valid/Invalid transition and once
+    the sensor's min publish interval has elapsed.
+    """
+
+    def __init__(self, topic_prefix: str, default_min_interval_seconds: float,
+                 sensors: Optional[Sequence[SensorConfig]] = None):
+        self.topic_prefix = topic_prefix
+        self.default_min_interval_seconds = default_min_interval_seconds
+        self.sensor_ids: List[str] = []
+        self.topics: List[str] = []
+        self.units: List[str] = []
+        self.topic_suffixes: List[str] = []
+        self._indices: Dict[str, int] = {}
+        self._modes = array("b")
+        self._deadbands = array("d")
+        self._min_intervals = array("d")
+        self._published = array("b")      # anything published yet
+        self._last_values = array("d")    # NaN when the last published reading had no value
+        self._last_times = array("d")
+        # Swinging door state: pivot point, admissible slope range and the held-back point
+        self._pivot_values = array("d")
+        self._pivot_times = array("d")
+        self._slope_low = array("d")
+        self._slope_high = array("d")
+        self._held_values = array("d")
+        self._held_times = array("d")
+        self._held: List[Optional[SensorReading]] = []
+        for sensor in sensors or []:
+            self.configure(sensor)
+
+    def configure(self, sensor: SensorConfig) -> int:
+        """
+        Registers a sensor from its config, or retunes an already registered one in place. A
+        retuned sensor keeps its last published value and time; a changed deadband or mode
+        restarts the swinging door from the current pivot.
+        """
+        params = sensor.publisher_config
+        deadband = params.change_threshold or 0.0
+        if params.exception_mode == "percent_of_span":
+            deadband = params.change_threshold / 100.0 * (params.span_high - params.span_low)
+        mode = MODE_SWINGING_DOOR if params.exception_mode == "swinging_door" else MODE_ABSOLUTE
+        index = self._indices.get(sensor.id)
+        if index is None:
+            return self.register(sensor.id, params.mqtt_topic_suffix, params.unit, deadband,
+                                 params.min_publish_interval_seconds, mode)
+
+        self.topic_suffixes[index] = params.mqtt_topic_suffix
+        self.topics[index] = f"{self.topic_prefix}/{params.mqtt_topic_suffix}"
+        self.units[index] = params.unit
+        self._min_intervals[index] = float(params.min_publish_interval_seconds or self.default_min_interval_seconds)
+        if mode != self._modes[index] or deadband != self._deadbands[index]:
+            self._modes[index] = mode
+            self._deadbands[index] = deadband
+            self._slope_low[index] = -_INF
+            self._slope_high[index] = _INF
+            self._held[index] = None
+        return index
+
+    def register(self, sensor_id: str, topic_suffix: str, unit: str, deadband: float,
+                 min_interval_seconds: Optional[float], mode: int = MODE_ABSOLUTE) -> int:
+        index = len(self.sensor_ids)
+        self._indices[sensor_id] = index
+        self.sensor_ids.append(sensor_id)
+        self.topic_suffixes.append(topic_suffix)
+        self.topics.append(f"{self.topic_prefix}/{topic_suffix}")
+        self.units.append(unit)
+        self._modes.append(mode)
+        self._deadbands.append(deadband or 0.0)
+        self._min_intervals.append(float(min_interval_seconds or self.default_min_interval_seconds))
+        self._published.append(0)
+        self._last_values.append(_NAN)
+        self._last_times.append(0.0)
+        self._pivot_values.append(_NAN)
+        self._pivot_times.append(0.0)
+        self._slope_low.append(-_INF)
+        self._slope_high.append(_INF)
+        self._held_values.append(_NAN)
+        self._held_times.append(0.0)
+        self._held.append(None)
+        return index
+
+    def index_of(self, reading: SensorReading) -> int:
+        descriptor = reading.descriptor
+        index = descriptor.index
+        if 0 <= index < len(self.sensor_ids) and self.sensor_ids[index] == descriptor.sensor_id:
+            return index
+        index = self._indices.get(descriptor.sensor_id)
+        if index is None:
+            index = self.register(descriptor.sensor_id, descriptor.mqtt_topic_suffix, descriptor.unit,
+                                  descriptor.change_threshold, descriptor.min_publish_interval_seconds)
+        return index
+
+    def sensor_count(self) -> int:
+        return len(self.sensor_ids)
+
+    def forget(self, index: int):
+        """Treats the sensor as never published, e.g. after its publish failed."""
+        self._published[index] = 0
+        self._pivot_values[index] = _NAN
+        self._held[index] = None
+
+    def _reset_door(self, index: int, value: float, point_time: float):
+        self._pivot_values[index] = value
+        self._pivot_times[index] = point_time
+        self._slope_low[index] = -_INF
+        self._slope_high[index] = _INF
+        self._held[index] = None
+
+    def _mark(self, index: int, value: float, now: float):
+        self._published[index] = 1
+        self._last_values[index] = value
+        self._last_times[index] = now
+
+    def evaluate_batch(self, readings: Sequence[SensorReading], now: Optional[float] = None) -> List[Tuple[int, SensorReading]]:
+        """Returns the (sensor index, reading) pairs to publish, in order."""
+        if now is None:
+            now = time.monotonic()
+        out: List[Tuple[int, SensorReading]] = []
+        sensor_ids = self.sensor_ids
+        for reading in readings:
+            descriptor = reading.descriptor
+            if descriptor.mqtt_topic_suffix is None:
+                continue
+            index = descriptor.index
+            if index < 0 or index >= len(sensor_ids) or sensor_ids[index] != descriptor.sensor_id:
+                index = self.index_of(reading)
+            raw = reading.value
+            valid = raw is not None and reading.status_code == STATUS_VALID
+            value = float(raw) if valid else _NAN
+            swinging_door = self._modes[index] == MODE_SWINGING_DOOR
+            # The door works on sample time so held-back and queued points keep their spacing
+            point_time = reading.timestamp_ns / 1e9 if swinging_door else now
+            interval_reached = now - self._last_times[index] >= self._min_intervals[index]
+
+            if not self._published[index]:
+                out.append((index, reading))
+                self._mark(index, value, now)
+                if valid:
+                    self._reset_door(index, value, point_time)
+                continue
+
+            last_value = self._last_values[index]
+            if not valid:
+                # Flush a point the door was still holding, then report the transition
+                held = self._held[index]
+                if held is not None:
+                    out.append((index, held))
+                    self._held[index] = None
+                    self._pivot_values[index] = _NAN
+                    last_value = self._held_values[index]
+                if interval_reached or not math.isnan(last_value):
+                    out.append((index, reading))
+                    self._mark(index, _NAN, now)
+                    self._pivot_values[index] = _NAN
+                continue
+
+            if interval_reached or math.isnan(last_value):
+                out.append((index, reading))
+                self._mark(index, value, now)
+                self._reset_door(index, value, point_time)
+                continue
+
+            if not swinging_door:
+                if abs(value - last_value) > self._deadbands[index]:
+                    out.append((index, reading))
+                    self._mark(index, value, now)
+                continue
+
+            # Swinging door
+            deviation = self._deadbands[index]
+            pivot_value = self._pivot_values[index]
+            elapsed = point_time - self._pivot_times[index]
+            if elapsed <= 0.0:
+                elapsed = 1e-9
+            low = max(self._slope_low[index], (value - deviation - pivot_value) / elapsed)
+            high = min(self._slope_high[index], (value + deviation - pivot_value) / elapsed)
+            if low <= high:
+                self._slope_low[index] = low
+                self._slope_high[index] = high
+            else:
+                held = self._held[index]
+                if held is None:
+                    # Door closed on the first point after the pivot: nothing to hold, publish it
+                    out.append((index, reading))
+                    self._mark(index, value, now)
+                    self._reset_door(index, value, point_time)
+                    continue
+                out.append((index, held))
+                held_value, held_time = self._held_values[index], self._held_times[index]
+                self._mark(index, held_value, now)
+                self._reset_door(index, held_value, held_time)
+                elapsed = point_time - held_time
+                if elapsed <= 0.0:
+                    elapsed = 1e-9
+                self._slope_low[index] = (value - deviation - held_value) / elapsed
+                self._slope_high[index] = (value + deviation - held_value) / elapsed
+            self._held[index] = reading
+            self._held_values[index] = value
+            self._held_times[index] = point_time
+        return out
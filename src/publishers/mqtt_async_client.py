@@ -0,0 +1,458 @@
+import asyncio
+import logging
+import struct
+import time
+from typing import Callable, Dict, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+MQTT_V311 = 4
+MQTT_V5 = 5
+
+CONNECT = 0x10
+CONNACK = 0x20
+PUBLISH = 0x30
+PUBACK = 0x40
+PINGREQ = 0xC0
+PINGRESP = 0xD0
+DISCONNECT = 0xE0
+
+PROP_RECEIVE_MAXIMUM = 0x21
+PROP_TOPIC_ALIAS_MAXIMUM = 0x22
+PROP_TOPIC_ALIAS = 0x23
+
+_U16 = struct.Struct(">H")
+
+# MQTT 5 property identifiers grouped by encoding, used to skip properties we do not use
+_PROPERTY_SIZES: Dict[int, str] = {
+    **{p: "byte" for p in (0x01, 0x17, 0x19, 0x24, 0x25, 0x28, 0x29, 0x2A)},
+    **{p: "u16" for p in (0x13, 0x21, 0x22, 0x23)},
+    **{p: "u32" for p in (0x02, 0x11, 0x18, 0x27)},
+    **{p: "varint" for p in (0x0B,)},
+    **{p: "binary" for p in (0x03, 0x08, 0x09, 0x12, 0x15, 0x16, 0x1A, 0x1C, 0x1F)},
+    **{p: "pair" for p in (0x26,)},
+}
+
+
+def encode_varint(value: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def decode_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    value, shift = 0, 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+
+
+def encode_string(value: Union[str, bytes]) -> bytes:
+    raw = value.encode("utf-8") if isinstance(value, str) else value
+    return _U16.pack(len(raw)) + raw
+
+
+def decode_properties(data: bytes, pos: int) -> Tuple[Dict[int, int], int]:
+    """Returns the integer-valued properties and the position after the property block."""
+    length, pos = decode_varint(data, pos)
+    end = pos + length
+    properties: Dict[int, int] = {}
+    while pos < end:
+        identifier = data[pos]
+        pos += 1
+        kind = _PROPERTY_SIZES.get(identifier)
+        if kind == "byte":
+            properties[identifier] = data[pos]; pos += 1
+        elif kind == "u16":
+            properties[identifier] = _U16.unpack_from(data, pos)[0]; pos += 2
+        elif kind == "u32":
+            properties[identifier] = struct.unpack_from(">I", data, pos)[0]; pos += 4
+        elif kind == "varint":
+            properties[identifier], pos = decode_varint(data, pos)
+        elif kind == "binary":
+            pos += 2 + _U16.unpack_from(data, pos)[0]
+        elif kind == "pair":
+            pos += 2 + _U16.unpack_from(data, pos)[0]
+            pos += 2 + _U16.unpack_from(data, pos)[0]
+        else:
+            raise ValueError(f"Unknown MQTT property {identifier:#04x}")
+    return properties, end
+
+
+def build_packet(packet_type: int, body: bytes) -> bytes:
+    return bytes((packet_type,)) + encode_varint(len(body)) + body
+
+
+class _InFlightMessage:
+    __slots__ = ("topic", "payload", "retain", "sent_at", "on_ack")
+
+    def __init__(self, topic: str, payload: bytes, retain: bool, on_ack: Optional[Callable[[], None]] = None):
+        self.topic = topic
+        self.payload = payload
+        self.retain = retain
+        self.sent_at = 0.0
+        self.on_ack = on_ack
+
+
+class AsyncMqttClient:
+    """
+    MQTT 3.1.1 / 5 publishing client running on the caller's asyncio event loop.
+
+    - QoS 1 publishes are pipelined: up to max_inflight PUBLISH packets wait for their PUBACK
+      at the same time; publish() only waits when the window is full.
+    - Packets written in the same event loop iteration are coalesced into one socket write.
+    - With MQTT 5 and topic_alias_maximum > 0, repeated topics are sent as two-byte aliases.
+    Unacknowledged QoS 1 messages are retransmitted (DUP) after a reconnect.
+    """
+
+    def __init__(self, host: str, port: int, client_id: str, keepalive: int = 60,
+                 username: Optional[str] = None, password: Optional[str] = None,
+                 protocol_version: int = MQTT_V311, max_inflight: int = 100, topic_alias_maximum: int = 0,
+                 reconnect_delay: float = 5.0, connect_timeout: float = 5.0):
+        self.host = host
+        self.port = port
+        self.client_id = client_id
+        self.keepalive = keepalive
+        self.username = username
+        self.password = password
+        self.protocol_version = protocol_version
+        self.max_inflight = max_inflight
+        self.topic_alias_maximum = topic_alias_maximum if protocol_version == MQTT_V5 else 0
+        self.reconnect_delay = reconnect_delay
+        self.connect_timeout = connect_timeout
+        self.on_connect: Optional[Callable[[], None]] = None
+        self.on_disconnect: Optional[Callable[[Optional[Exception]], None]] = None
+        self.on_puback: Optional[Callable[[float], None]] = None
+
+        self._will: Optional[Tuple[str, bytes, int, bool]] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._connected = asyncio.Event()
+        # Set while not connected; publishers waiting for an in-flight slot give up on it
+        self._disconnected = asyncio.Event()
+        self._disconnected.set()
+        self._running = False
+        self._task: Optional[asyncio.Task] = None
+        self._out = bytearray()
+        self._flush_scheduled = False
+        self._next_packet_id = 0
+        self._in_flight: Dict[int, _InFlightMessage] = {}
+        self._window = asyncio.Semaphore(max_inflight)
+        # Slots to retire after the broker lowered the window (receive maximum)
+        self._window_debt = 0
+        self._aliases: Dict[str, int] = {}
+        self._server_alias_maximum = 0
+        self._last_pingresp = 0.0
+
+    @property
+    def connected(self) -> bool:
+        return self._connected.is_set()
+
+    def will_set(self, topic: str, payload: Union[str, bytes], qos: int = 0, retain: bool = False):
+        self._will = (topic, payload.encode("utf-8") if isinstance(payload, str) else payload, qos, retain)
+
+    # --- packet construction -------------------------------------------------
+
+    def _connect_packet(self) -> bytes:
+        flags = 0x02  # clean session / clean start
+        if self._will:
+            _, _, will_qos, will_retain = self._will
+            flags |= 0x04 | (will_qos << 3) | (0x20 if will_retain else 0)
+        if self.username:
+            flags |= 0x80
+        if self.password:
+            flags |= 0x40
+        body = bytearray(encode_string("MQTT"))
+        body += bytes((self.protocol_version, flags)) + _U16.pack(self.keepalive)
+        if self.protocol_version == MQTT_V5:
+            body += encode_varint(0)
+        body += encode_string(self.client_id)
+        if self._will:
+            will_topic, will_payload, _, _ = self._will
+            if self.protocol_version == MQTT_V5:
+                body += encode_varint(0)
+            body += encode_string(will_topic) + encode_string(will_payload)
+        if self.username:
+            body += encode_string(self.username)
+        if self.password:
+            body += encode_string(self.password)
+        return build_packet(CONNECT, bytes(body))
+
+    def _publish_packet(self, topic: str, payload: bytes, qos: int, retain: bool, packet_id: int = 0,
+                        dup: bool = False) -> bytes:
+        header = PUBLISH | (0x08 if dup else 0) | (qos << 1) | (0x01 if retain else 0)
+        properties = b""
+        if self.protocol_version == MQTT_V5:
+            alias_limit = min(self.topic_alias_maximum, self._server_alias_maximum)
+            alias = self._aliases.get(topic)
+            if alias is not None:
+                topic_field = b""
+                properties = bytes((PROP_TOPIC_ALIAS,)) + _U16.pack(alias)
+            else:
+                topic_field = topic
+                if len(self._aliases) < alias_limit:
+                    alias = len(self._aliases) + 1
+                    self._aliases[topic] = alias
+                    properties = bytes((PROP_TOPIC_ALIAS,)) + _U16.pack(alias)
+            body = encode_string(topic_field)
+            if qos:
+                body += _U16.pack(packet_id)
+            body += encode_varint(len(properties)) + properties
+        else:
+            body = encode_string(topic)
+            if qos:
+                body += _U16.pack(packet_id)
+        return build_packet(header, body + payload)
+
+    # --- writing -------------------------------------------------------------
+
+    def _send(self, packet: bytes):
+        self._out += packet
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            asyncio.get_running_loop().call_soon(self._flush)
+
+    def _flush(self):
+        self._flush_scheduled = False
+        if not self._out:
+            return
+        if self._writer is None or self._writer.is_closing():
+            self._out.clear()
+            return
+        self._writer.write(bytes(self._out))
+        self._out.clear()
+
+    def _allocate_packet_id(self) -> int:
+        for _ in range(0xFFFF):
+            self._next_packet_id = self._next_packet_id % 0xFFFF + 1
+            if self._next_packet_id not in self._in_flight:
+                return self._next_packet_id
+        raise RuntimeError("No free MQTT packet ids")
+
+    async def publish(self, topic: str, payload: Union[str, bytes], qos: int = 1, retain: bool = False,
+                      on_ack: Optional[Callable[[], None]] = None) -> bool:
+        """
+        Queues a PUBLISH on the connection. Returns False if the client is not connected.
+        QoS 1 messages stay in the in-flight window until their PUBACK arrives, which calls on_ack
+        unless the broker rejected the message (MQTT 5 reason code 0x80 or above).
+        """
+        if not self.connected:
+            return False
+        raw = payload.encode("utf-8") if isinstance(payload, str) else payload
+        if qos == 0:
+            self._send(self._publish_packet(topic, raw, 0, retain))
+            return True
+        if not await self._acquire_window():
+            return False
+        packet_id = self._allocate_packet_id()
+        message = _InFlightMessage(topic, raw, retain, on_ack)
+        message.sent_at = time.monotonic()
+        self._in_flight[packet_id] = message
+        self._send(self._publish_packet(topic, raw, 1, retain, packet_id))
+        return True
+
+    async def _acquire_slot(self) -> bool:
+        """Waits for a free in-flight slot; False if the connection is lost meanwhile."""
+        if not self._window.locked():
+            await self._window.acquire()
+            return True
+        acquire = asyncio.ensure_future(self._window.acquire())
+        lost = asyncio.ensure_future(self._disconnected.wait())
+        try:
+            await asyncio.wait((acquire, lost), return_when=asyncio.FIRST_COMPLETED)
+        except BaseException:
+            if acquire.done() and not acquire.cancelled():
+                self._window.release()
+            acquire.cancel()
+            raise
+        finally:
+            lost.cancel()
+        if acquire.done():
+            return True
+        acquire.cancel()
+        return False
+
+    async def _acquire_window(self) -> bool:
+        """
+        Takes an in-flight slot for a QoS 1 publish. Returns False (slot released) if the
+        connection is gone, so callers can spool instead of waiting out the outage.
+        """
+        while True:
+            if not await self._acquire_slot():
+                return False
+            if not self._window_debt:
+                break
+            self._window_debt -= 1
+        if not self.connected:
+            self._window.release()
+            return False
+        return True
+
+    def in_flight_count(self) -> int:
+        return len(self._in_flight)
+
+    # --- connection handling -------------------------------------------------
+
+    async def _read_packet(self, reader: asyncio.StreamReader) -> Tuple[int, bytes]:
+        header = (await reader.readexactly(1))[0]
+        length, shift = 0, 0
+        while True:
+            byte = (await reader.readexactly(1))[0]
+            length |= (byte & 0x7F) << shift
+            if not byte & 0x80:
+                break
+            shift += 7
+        return header, await reader.readexactly(length) if length else b""
+
+    async def _open(self) -> asyncio.StreamReader:
+        reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        await self._handshake(reader)
+        return reader
+
+    async def _handshake(self, reader: asyncio.StreamReader):
+        self._writer.write(self._connect_packet())
+        header, body = await self._read_packet(reader)
+        if header & 0xF0 != CONNACK:
+            raise ConnectionError(f"Expected CONNACK, got packet type {header:#04x}")
+        reason = body[1]
+        if reason != 0:
+            raise ConnectionError(f"Broker refused connection (reason code {reason})")
+        self._server_alias_maximum = 0
+        if self.protocol_version == MQTT_V5 and len(body) > 2:
+            properties, _ = decode_properties(body, 2)
+            self._server_alias_maximum = properties.get(PROP_TOPIC_ALIAS_MAXIMUM, 0)
+            receive_maximum = properties.get(PROP_RECEIVE_MAXIMUM)
+            if receive_maximum and receive_maximum < self.max_inflight:
+                logger.info(f"MQTT: Broker receive maximum {receive_maximum} limits the in-flight window.")
+                # Slots are retired as they are next taken or freed, never waited for here
+                self._window_debt += self.max_inflight - receive_maximum
+                self.max_inflight = receive_maximum
+
+    def _retransmit_in_flight(self):
+        now = time.monotonic()
+        for packet_id, message in self._in_flight.items():
+            message.sent_at = now
+            self._send(self._publish_packet(message.topic, message.payload, 1, message.retain, packet_id, dup=True))
+
+    async def _keepalive_loop(self):
+        interval = max(self.keepalive / 2, 1)
+        while True:
+            await asyncio.sleep(interval)
+            if time.monotonic() - self._last_pingresp > self.keepalive * 1.5:
+                raise ConnectionError("Keepalive timeout: no PINGRESP from broker")
+            self._send(bytes((PINGREQ, 0)))
+
+    async def _read_loop(self, reader: asyncio.StreamReader):
+        while True:
+            header, body = await self._read_packet(reader)
+            packet_type = header & 0xF0
+            if packet_type == PUBACK:
+                packet_id = _U16.unpack_from(body, 0)[0]
+                message = self._in_flight.pop(packet_id, None)
+                if message is not None:
+                    if self._window_debt:
+                        self._window_debt -= 1
+                    else:
+                        self._window.release()
+                    reason = body[2] if len(body) > 2 else 0
+                    if reason >= 0x80:
+                        logger.warning("MQTT: Broker rejected a message on %s (reason code %#04x)", message.topic, reason)
+                        continue
+                    if self.on_puback:
+                        self.on_puback(time.monotonic() - message.sent_at)
+                    if message.on_ack:
+                        message.on_ack()
+            elif packet_type == PINGRESP:
+                self._last_pingresp = time.monotonic()
+            elif packet_type == DISCONNECT:
+                reason = body[0] if body else 0
+                raise ConnectionError(f"Broker sent DISCONNECT (reason code {reason})")
+            else:
+                logger.debug("MQTT: Ignoring packet type %#04x", packet_type)
+
+    async def _run(self):
+        while self._running:
+            error: Optional[Exception] = None
+            try:
+                # Bounded separately from the keepalive, so a half-open connect does not stall reconnects
+                try:
+                    reader = await asyncio.wait_for(self._open(), timeout=self.connect_timeout)
+                except asyncio.TimeoutError:
+                    raise ConnectionError(f"No CONNACK within {self.connect_timeout}s") from None
+                self._aliases.clear()
+                self._last_pingresp = time.monotonic()
+                self._connected.set()
+                self._disconnected.clear()
+                logger.info(f"MQTT: Connected to {self.host}:{self.port} (asyncio engine)")
+                if self.on_connect:
+                    self.on_connect()
+                self._retransmit_in_flight()
+                tasks = {asyncio.create_task(self._keepalive_loop()), asyncio.create_task(self._read_loop(reader))}
+                try:
+                    done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        task.result()
+                finally:
+                    for task in tasks:
+                        task.cancel()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                error = e
+            finally:
+                was_connected = self._connected.is_set()
+                self._connected.clear()
+                self._disconnected.set()
+                self._out.clear()
+                if self._writer is not None:
+                    self._writer.close()
+                    self._writer = None
+                if was_connected:
+                    if self._running:
+                        logger.warning(f"MQTT: Disconnected from {self.host}:{self.port}: {error}. Will auto-reconnect.")
+                    else:
+                        logger.info(f"MQTT: Disconnected from {self.host}:{self.port}.")
+                    if self.on_disconnect:
+                        self.on_disconnect(error)
+            if not self._running:
+                break
+            if error is not None:
+                logger.error(f"MQTT: Connection error: {error}. Retrying in {self.reconnect_delay}s...")
+            await asyncio.sleep(self.reconnect_delay)
+
+    def start(self):
+        self._running = True
+        self._task = asyncio.create_task(self._run())
+
+    async def wait_connected(self, timeout: float) -> bool:
+        try:
+            await asyncio.wait_for(self._connected.wait(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def stop(self, drain_timeout: float = 1.0):
+        if self.connected and self._in_flight:
+            deadline = time.monotonic() + drain_timeout
+            while self._in_flight and time.monotonic() < deadline:
+                await asyncio.sleep(0.01)
+        self._running = False
+        if self.connected:
+            self._send(bytes((DISCONNECT, 0)))
+            self._flush()
+            if self._writer is not None:
+                try: await asyncio.wait_for(self._writer.drain(), timeout=drain_timeout)
+                except Exception: pass
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try: await self._task
+            except asyncio.CancelledError: pass
@@ -1,44 +1,173 @@
 import asyncio
+import importlib
 import logging
-from datetime import datetime, timezone, timedelta
-from typing import Dict, Tuple, Optional
-import paho.mqtt.client as mqtt
+import threading
+import time
+from collections import deque
+from functools import partial
+from pathlib import Path
+from typing import Callable, Deque, Dict, List, Set, Tuple, Optional, Union
 
-from ..models.config_models import MqttPublisherConfig
-from ..models.sensor_reading import SensorReading
-from ..utils.helpers import generate_mqtt_client_id, format_payload_timestamp
+from ..metrics.registry import REGISTRY
+from ..models.config_models import MqttPublisherConfig, SensorConfig
+from ..models.sensor_reading import STATUS_VALID, SensorReading
+from ..utils.helpers import generate_mqtt_client_id, CachedTimestampFormatter
+from .batch_codec import encode_batch, encode_index, index_schema
+from .disk_spool import DiskSpool, SpoolPosition
+from .exception_engine import ExceptionEngine
+from .mqtt_async_client import MQTT_V311, MQTT_V5, AsyncMqttClient
 
 logger = logging.getLogger(__name__)
 
+# paho.mqtt.client, imported when a publisher uses the paho engine
+mqtt = None
+
+MQTT_PUBLISHES = REGISTRY.counter("gateway_mqtt_publishes_total", "Messages handed to the MQTT client")
+MQTT_PUBLISH_FAILURES = REGISTRY.counter("gateway_mqtt_publish_failures_total", "Messages the MQTT client refused")
+MQTT_ACK_SECONDS = REGISTRY.histogram("gateway_mqtt_ack_seconds", "Time from publish to PUBACK (QoS 1)")
+MQTT_CONNECTED = REGISTRY.gauge("gateway_mqtt_connected", "1 while connected to the broker")
+MQTT_IN_FLIGHT = REGISTRY.gauge("gateway_mqtt_in_flight", "QoS 1 messages awaiting PUBACK")
+MQTT_SPOOLED = REGISTRY.counter("gateway_mqtt_spooled_total", "Messages written to the disk spool")
+MQTT_REPLAYED = REGISTRY.counter("gateway_mqtt_replayed_total", "Spooled messages replayed to the broker")
+MQTT_SPOOL_BYTES = REGISTRY.gauge("gateway_mqtt_spool_pending_bytes", "Undelivered bytes in the disk spool")
+PUBLISHER_READINGS = REGISTRY.counter("gateway_publisher_readings_total", "Readings evaluated by the exception engine")
+PUBLISHER_REPORTED = REGISTRY.counter("gateway_publisher_readings_reported_total",
+                                      "Readings that passed the exception engine")
+
 class MQTTPublisher:
-    def __init__(self, publisher_config: MqttPublisherConfig):
+    def __init__(self, publisher_config: MqttPublisherConfig, sensors: Optional[List[SensorConfig]] = None,
+                 status_will: bool = True):
         self.config = publisher_config
+        # Whether this connection owns the retained gateway status (its will and the graceful offline)
+        self.status_will = status_will
         self.client_id = generate_mqtt_client_id(self.config.client_id_prefix)
-        self.client = mqtt.Client(client_id=self.client_id, protocol=mqtt.MQTTv311)
-        self._last_published_data: Dict[str, Tuple[Optional[float], datetime]] = {}
+        self.client: Optional["mqtt.Client"] = None
+        self._async_client: Optional[AsyncMqttClient] = None
+        if self.config.engine == "asyncio":
+            self._async_client = AsyncMqttClient(
+                self.config.broker_host, self.config.broker_port, self.client_id,
+                keepalive=self.config.keepalive_seconds, username=self.config.username, password=self.config.password,
+                protocol_version=MQTT_V5 if self.config.mqtt_version == "5" else MQTT_V311,
+                max_inflight=self.config.max_inflight_messages, topic_alias_maximum=self.config.topic_alias_maximum,
+                reconnect_delay=self.config.reconnect_delay_seconds,
+                connect_timeout=self.config.connect_timeout_seconds)
+        else:
+            global mqtt
+            if mqtt is None:
+                mqtt = importlib.import_module("paho.mqtt.client")
+            protocol = mqtt.MQTTv5 if self.config.mqtt_version == "5" else mqtt.MQTTv311
+            self.client = mqtt.Client(client_id=self.client_id, protocol=protocol)
+        self._exceptions = ExceptionEngine(self.config.topic_prefix, self.config.default_min_publish_interval_seconds, sensors)
+        self._timestamp_formatter = CachedTimestampFormatter(self.config.timestamp_format)
         self._connected = False
         self._running = False
+        self._spool: Optional[DiskSpool] = None
+        self._replay_task: Optional[asyncio.Task] = None
+        self.spooled_messages = 0
+        self.replayed_messages = 0
+        # Replayed spool records awaiting their PUBACK, oldest first: [position, acknowledged]
+        self._replay_unacked: Deque[list] = deque()
+        # Bumped on disconnect, so acknowledgements of an earlier connection are ignored
+        self._replay_generation = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        if self.config.spool.enabled:
+            spool_config = self.config.spool
+            self._spool = DiskSpool(Path(spool_config.directory), spool_config.segment_size_bytes, spool_config.max_total_bytes)
+        self._batch_topic = f"{self.config.topic_prefix}/{self.config.batch.topic_suffix}"
+        self._index_topic = f"{self._batch_topic}/index"
+        self._batch_index: List[dict] = []
+        self._batch_schema = 0
+        self._index_message: Optional[str] = None
+        self._index_published = False
+        # Schema of the index map last written to the spool; spooled batches follow their map
+        self._spooled_schema: Optional[int] = None
+        self._pending_batch: List[Tuple[int, int, Optional[float], bool]] = []
+        self._sync_batch_index()
+        self._paho_sent_at: Dict[int, float] = {}
+        self._paho_early_acks: Set[int] = set()
+        self._paho_ack_callbacks: Dict[int, Callable[[], None]] = {}
+        self._paho_lock = threading.Lock()
         self._setup_client()
+        self._register_metrics()
+
+    def _register_metrics(self):
+        MQTT_CONNECTED.set_function(lambda: self._connected)
+        MQTT_SPOOLED.set_function(lambda: self.spooled_messages)
+        MQTT_REPLAYED.set_function(lambda: self.replayed_messages)
+        if self._spool is not None:
+            MQTT_SPOOL_BYTES.set_function(self.spool_pending_bytes)
+        MQTT_IN_FLIGHT.set_function(self.in_flight_count)
 
     def _setup_client(self):
+        lwt_topic = f"{self.config.topic_prefix}/gateway_status"
+        if self._async_client is not None:
+            self._async_client.on_connect = self._on_async_connect
+            self._async_client.on_disconnect = self._on_async_disconnect
+            self._async_client.on_puback = MQTT_ACK_SECONDS.observe
+            if self.status_will:
+                self._async_client.will_set(lwt_topic, payload=self.config.lwt_message, qos=1, retain=True)
+            return
+
         self.client.on_connect = self._on_connect
         self.client.on_disconnect = self._on_disconnect
+        self.client.on_publish = self._on_publish
+        self.client.max_inflight_messages_set(self.config.max_inflight_messages)
         if self.config.username and self.config.password:
             self.client.username_pw_set(self.config.username, self.config.password)
         
-        lwt_topic = f"{self.config.topic_prefix}/gateway_status"
-        self.client.will_set(lwt_topic, payload=self.config.lwt_message, qos=1, retain=True)
+        if self.status_will:
+            self.client.will_set(lwt_topic, payload=self.config.lwt_message, qos=1, retain=True)
+
+    def _on_async_connect(self):
+        self._connected = True
+
+    def _on_async_disconnect(self, error: Optional[Exception]):
+        # The client keeps its in-flight window, replayed records included, and retransmits
+        # it after the reconnect; rewinding the spool as well would send those records twice
+        self._connected = False
+        self._index_published = False
 
     def _on_connect(self, client, userdata, flags, rc, properties=None):
         if rc == 0: self._connected = True; logger.info(f"MQTT: Connected to {self.config.broker_host}")
         else: self._connected = False; logger.error(f"MQTT: Connection failed: {mqtt.connack_string(rc)}")
 
     def _on_disconnect(self, client, userdata, rc, properties=None):
-        self._connected = False; logger.warning(f"MQTT: Disconnected. Will auto-reconnect: {rc}")
+        self._connected = False; self._index_published = False
+        with self._paho_lock:
+            self._paho_sent_at.clear(); self._paho_early_acks.clear(); self._paho_ack_callbacks.clear()
+        self._call_on_loop(self._rewind_replay)
+        logger.warning(f"MQTT: Disconnected. Will auto-reconnect: {rc}")
+
+    def _on_publish(self, client, userdata, mid, *args):
+        # Runs on the paho network thread, possibly before _send_payload has recorded the mid
+        with self._paho_lock:
+            sent_at = self._paho_sent_at.pop(mid, None)
+            on_ack = self._paho_ack_callbacks.pop(mid, None)
+            if sent_at is None:
+                if len(self._paho_early_acks) > 65535:  # QoS 0 acks are never claimed
+                    self._paho_early_acks.clear()
+                self._paho_early_acks.add(mid)
+        if sent_at is not None:
+            MQTT_ACK_SECONDS.observe(time.monotonic() - sent_at)
+        if on_ack is not None:
+            self._call_on_loop(on_ack)
+
+    def _call_on_loop(self, callback: Callable[[], None]):
+        """Hands a callback from the paho network thread to the event loop."""
+        if self._loop is not None:
+            try: self._loop.call_soon_threadsafe(callback)
+            except RuntimeError: pass  # loop already closed at shutdown
 
     async def start(self):
         if not self.config.enabled: return
         self._running = True
+        self._loop = asyncio.get_running_loop()
+        if self._spool is not None:
+            self._replay_task = asyncio.create_task(self._replay_spool())
+        if self._async_client is not None:
+            self._async_client.start()
+            logger.info("MQTT Publisher started (asyncio engine).")
+            return
         try:
             self.client.connect(self.config.broker_host, self.config.broker_port, self.config.keepalive_seconds)
             self.client.loop_start()
@@ -48,39 +177,298 @@ class MQTTPublisher:
 
     async def stop(self):
         self._running = False
-        if self.client:
-            lwt_topic = f"{self.config.topic_prefix}/gateway_status"
-            self.client.publish(lwt_topic, "offline_graceful", qos=1, retain=True)
+        if self._replay_task:
+            self._replay_task.cancel()
+            try: await self._replay_task
+            except asyncio.CancelledError: pass
+            self._replay_task = None
+        lwt_topic = f"{self.config.topic_prefix}/gateway_status"
+        if self._async_client is not None:
+            # A broker that stopped acknowledging keeps the in-flight window full
+            if self.status_will:
+                try: await asyncio.wait_for(self._async_client.publish(lwt_topic, "offline_graceful", qos=1, retain=True), 1.0)
+                except asyncio.TimeoutError: logger.warning("MQTT: Broker did not accept the offline status message.")
+            await self._async_client.stop()
+        elif self.client:
+            if self.status_will:
+                self.client.publish(lwt_topic, "offline_graceful", qos=1, retain=True)
             await asyncio.sleep(0.1)
             self.client.loop_stop(); self.client.disconnect()
+        if self._spool is not None:
+            logger.info(f"MQTT: Spool has {self._spool.pending_bytes()} bytes pending "
+                        f"(spooled {self.spooled_messages}, replayed {self.replayed_messages} this run).")
+            self._spool.close()
         logger.info("MQTT Publisher stopped.")
 
     async def publish_reading(self, reading: SensorReading):
-        if not self.config.enabled or not self._running or not self._connected: return
-        if reading.mqtt_topic_suffix is None: return
+        await self.publish_readings([reading])
 
-        full_topic = f"{self.config.topic_prefix}/{reading.mqtt_topic_suffix}"
-        last_val, last_pub_time = self._last_published_data.get(reading.sensor_id, (None, datetime.min.replace(tzinfo=timezone.utc)))
-        
-        changed = False
-        if reading.value is not None and reading.status == "Valid":
-            if last_val is None or abs(reading.value - last_val) > (reading.change_threshold or 0.0):
-                changed = True
-        elif reading.status != "Valid" and last_val is not None :
-             changed = True
-
-        interval_reached = (datetime.now(timezone.utc) - last_pub_time) >= timedelta(seconds=reading.min_publish_interval_seconds or self.config.default_min_publish_interval_seconds)
-        first_message = reading.sensor_id not in self._last_published_data
-
-        if changed or interval_reached or first_message:
-            val_str = f"{reading.value:.1f}{reading.unit}" if reading.value is not None else "N/A"
-            status_str = "Valid" if reading.status == "Valid" and reading.value is not None else "Invalid"
-            
-            timestamp_str = format_payload_timestamp(reading.timestamp, self.config.timestamp_format)
-            payload = f"{val_str}, {status_str}, {timestamp_str}"
-            
-            msg_info = self.client.publish(topic=full_topic, payload=payload, qos=1, retain=False)
-            if msg_info.rc == mqtt.MQTT_ERR_SUCCESS:
-                self._last_published_data[reading.sensor_id] = (reading.value, datetime.now(timezone.utc))
+    def _sync_batch_index(self):
+        """Extends the batch index map with sensors the exception engine registered since."""
+        engine = self._exceptions
+        for index in range(len(self._batch_index), engine.sensor_count()):
+            self._batch_index.append({"id": engine.sensor_ids[index], "topic": engine.topic_suffixes[index],
+                                      "unit": engine.units[index]})
+            self._index_published = False
+            self._index_message = None
+        self._batch_schema = index_schema(self._batch_index)
+
+    def _current_index(self) -> Tuple[int, str]:
+        """Schema and index message of the current batch index map."""
+        if self._index_message is None:
+            self._index_message = encode_index(self._batch_index)
+        return self._batch_schema, self._index_message
+
+    def update_sensors(self, sensors: List[SensorConfig]):
+        """Registers new sensors and retunes changed ones after a config reload."""
+        for sensor in sensors:
+            self._exceptions.configure(sensor)
+        # Topics or units may have changed: rebuild the index map so it is republished
+        self._batch_index = []
+        self._index_message = None
+        self._sync_batch_index()
+
+    def _batch_record(self, index: int, reading: SensorReading) -> Tuple[int, int, Optional[float], bool]:
+        if index >= len(self._batch_index):
+            self._sync_batch_index()
+        valid = reading.status_code == STATUS_VALID and reading.value is not None
+        return index, reading.timestamp_ns // 1_000_000, reading.value, valid
+
+    def _queue_for_batch(self, index: int, reading: SensorReading):
+        self._pending_batch.append(self._batch_record(index, reading))
+
+    def _text_payload(self, reading: SensorReading) -> str:
+        value = reading.value
+        valid = reading.status_code == STATUS_VALID and value is not None
+        val_str = f"{value:.1f}{reading.descriptor.unit}" if value is not None else "N/A"
+        return f"{val_str}, {'Valid' if valid else 'Invalid'}, {self._timestamp_formatter.format_ns(reading.timestamp_ns)}"
+
+    async def _flush_batch(self):
+        if not self._pending_batch:
+            return
+        batch_config = self.config.batch
+        schema, index_message = self._current_index()
+        if self._connected and not self._index_published:
+            self._index_published = await self._send_payload(self._index_topic, index_message, qos=1, retain=True)
+        pending, self._pending_batch = self._pending_batch, []
+        for i in range(0, len(pending), batch_config.max_readings_per_message):
+            payload = encode_batch(pending[i:i + batch_config.max_readings_per_message], schema,
+                                   batch_config.compression, batch_config.float_encoding)
+            if not (self._connected and await self._send_payload(self._batch_topic, payload)) \
+                    and not self._spool_batch(payload, schema, index_message):
+                logger.warning(f"MQTT: Dropped a batch of {len(pending[i:i + batch_config.max_readings_per_message])} readings.")
+
+    async def _deliver(self, topic: str, payload: Union[str, bytes]) -> bool:
+        """Sends live, or writes to the spool while the broker is unreachable."""
+        if self._connected and await self._send_payload(topic, payload):
+            return True
+        return self._spool_payload(topic, payload)
+
+    def _spool_payload(self, topic: str, payload: Union[str, bytes]) -> bool:
+        if self._spool is not None and self._spool.append(topic, payload.encode("utf-8") if isinstance(payload, str) else payload):
+            self.spooled_messages += 1
+            return True
+        return False
+
+    def _spool_batch(self, payload: bytes, schema: int, index_message: str) -> bool:
+        """
+        Spools a batch behind the index map it was encoded against, so a replay after a reload
+        (or a restart) publishes the map its batches refer to before them.
+        """
+        if self._spool is None:
+            return False
+        if self._spooled_schema != schema:
+            if not self._spool.append(self._index_topic, index_message.encode("utf-8"), retain=True):
+                return False
+            self._spooled_schema = schema
+        return self._spool_payload(self._batch_topic, payload)
+
+    async def _send_payload(self, topic: str, payload, qos: int = 1, retain: bool = False,
+                            on_ack: Optional[Callable[[], None]] = None) -> bool:
+        """Hands a message to the client; on_ack is called on the event loop when a QoS 1 PUBACK arrives."""
+        if self._async_client is not None:
+            sent = await self._async_client.publish(topic, payload, qos=qos, retain=retain, on_ack=on_ack)
+        else:
+            sent_at = time.monotonic()
+            msg_info = self.client.publish(topic=topic, payload=payload, qos=qos, retain=retain)
+            sent = msg_info.rc == mqtt.MQTT_ERR_SUCCESS
+            if sent and qos:
+                with self._paho_lock:
+                    if msg_info.mid in self._paho_early_acks:
+                        self._paho_early_acks.discard(msg_info.mid)
+                        MQTT_ACK_SECONDS.observe(time.monotonic() - sent_at)
+                        if on_ack is not None:
+                            on_ack()
+                    else:
+                        self._paho_sent_at[msg_info.mid] = sent_at
+                        if on_ack is not None:
+                            self._paho_ack_callbacks[msg_info.mid] = on_ack
+        if sent:
+            MQTT_PUBLISHES.inc()
+        else:
+            MQTT_PUBLISH_FAILURES.inc()
+        return sent
+
+    def _on_replay_ack(self, entry: list, generation: int):
+        """Commits the replayed records acknowledged so far, up to the oldest still unacknowledged."""
+        if generation != self._replay_generation:
+            return
+        entry[1] = True
+        position: Optional[SpoolPosition] = None
+        unacked = self._replay_unacked
+        while unacked and unacked[0][1]:
+            position = unacked.popleft()[0]
+        if position is not None:
+            self._spool.commit_through(position)
+
+    def _rewind_replay(self):
+        """Records replayed but not acknowledged go back to the spool and are sent again."""
+        if self._spool is None:
+            return
+        self._replay_generation += 1
+        self._replay_unacked.clear()
+        self._spool.rewind()
+
+    def _unsend_replay(self, entry: list):
+        """Moves the delivery cursor back before a replayed record the client refused."""
+        unacked = self._replay_unacked
+        if not unacked or unacked[-1] is not entry:
+            return  # already rewound by a disconnect
+        unacked.pop()
+        self._spool.rewind(unacked[-1][0] if unacked else None)
+
+    async def _replay_spool(self):
+        """
+        Drains the spool oldest first while connected. A token bucket caps the replay rate so
+        the backlog goes out between live batches instead of ahead of them. A record leaves
+        the spool only once the broker acknowledged it (at-least-once). Records in flight at a
+        disconnect are retransmitted by the asyncio client, or replayed again with paho, which
+        forgets them.
+        """
+        spool_config = self.config.spool
+        rate = spool_config.replay_rate_per_second
+        loop = asyncio.get_running_loop()
+        tokens, last_refill = 0.0, loop.time()
+        next_flush = last_refill + spool_config.flush_interval_seconds
+        replaying = False
+        while self._running:
+            now = loop.time()
+            if now >= next_flush:
+                self._spool.flush()
+                next_flush = now + spool_config.flush_interval_seconds
+            if not self._connected or self._spool.is_empty():
+                if replaying and self._spool.is_empty():
+                    logger.info(f"MQTT: Spool backlog delivered ({self.replayed_messages} messages replayed).")
+                replaying = False
+                tokens, last_refill = 0.0, now
+                await asyncio.sleep(0.5)
+                continue
+            if not replaying:
+                replaying = True
+                logger.info(f"MQTT: Replaying {self._spool.pending_bytes()} spooled bytes at {rate} msg/s.")
+
+            tokens = min(float(rate), tokens + (now - last_refill) * rate)
+            last_refill = now
+            while tokens >= 1.0:
+                record = self._spool.peek()
+                if record is None:
+                    break
+                entry = [self._spool.advance(), False]
+                generation = self._replay_generation
+                self._replay_unacked.append(entry)
+                on_ack = partial(self._on_replay_ack, entry, generation) if record.qos else None
+                if not await self._send_payload(record.topic, record.payload, record.qos, record.retain, on_ack):
+                    self._unsend_replay(entry)
+                    break
+                if not record.qos:
+                    self._on_replay_ack(entry, generation)
+                if record.topic == self._index_topic:
+                    # A replayed map replaced the retained one; republish the current map
+                    self._index_published = False
+                self.replayed_messages += 1
+                tokens -= 1.0
+            await asyncio.sleep(max(1.0 / rate, 0.02))
+
+    async def publish_readings(self, readings: List[SensorReading]):
+        if not self.config.enabled or not self._running: return
+        if not self._connected and self._spool is None: return
+
+        batch_enabled = self.config.batch.enabled
+        text_topics = not batch_enabled or self.config.batch.text_topics
+        engine = self._exceptions
+        reported = engine.evaluate_batch(readings)
+        PUBLISHER_READINGS.inc(len(readings))
+        PUBLISHER_REPORTED.inc(len(reported))
+        for index, reading in reported:
+            published = False
+            if batch_enabled:
+                self._queue_for_batch(index, reading)
+                published = True
+            if text_topics:
+                published = await self._deliver(engine.topics[index], self._text_payload(reading)) or published
+            if not published:
+                engine.forget(index)
+        if batch_enabled:
+            await self._flush_batch()
+
+    def spool_readings(self, readings: List[SensorReading]) -> bool:
+        """
+        Runs readings through the exception engine and writes what passes straight to the
+        spool, without touching the connection; for a queue in front of this publisher that
+        overflows. Returns False when there is no spool to write to.
+        """
+        if self._spool is None or not self._running:
+            return False
+        batch_config = self.config.batch
+        text_topics = not batch_config.enabled or batch_config.text_topics
+        engine = self._exceptions
+        reported = engine.evaluate_batch(readings)
+        PUBLISHER_READINGS.inc(len(readings))
+        PUBLISHER_REPORTED.inc(len(reported))
+        pending = []
+        for index, reading in reported:
+            spooled = False
+            if batch_config.enabled:
+                pending.append(self._batch_record(index, reading))
+                spooled = True
+            if text_topics:
+                spooled = self._spool_payload(engine.topics[index], self._text_payload(reading)) or spooled
+            if not spooled:
+                engine.forget(index)
+        schema, index_message = self._current_index()
+        for i in range(0, len(pending), batch_config.max_readings_per_message):
+            self._spool_batch(encode_batch(pending[i:i + batch_config.max_readings_per_message], schema,
+                                           batch_config.compression, batch_config.float_encoding),
+                              schema, index_message)
+        return True
+
+    async def publish_stats(self, suffix: str, payload: str) -> bool:
+        """Publishes a gateway status message; never spooled, dropped while disconnected."""
+        if not self._running or not self._connected:
+            return False
+        return await self._send_payload(f"{self.config.topic_prefix}/{suffix}", payload, qos=1)
+
+    async def publish_summary(self, suffix: str, payload: str) -> bool:
+        """Publishes a window summary; spooled like readings while the broker is unreachable."""
+        if not self.config.enabled or not self._running:
+            return False
+        return await self._deliver(f"{self.config.topic_prefix}/{suffix}", payload)
+
+    def spool_summary(self, suffix: str, payload: str) -> bool:
+        """Writes a window summary straight to the spool; see spool_readings."""
+        if not self.config.enabled or not self._running:
+            return False
+        return self._spool_payload(f"{self.config.topic_prefix}/{suffix}", payload)
+
+    def in_flight_count(self) -> int:
+        if self._async_client is not None:
+            return self._async_client.in_flight_count()
+        return len(self._paho_sent_at)
+
+    def spool_pending_bytes(self) -> int:
+        return self._spool.pending_bytes() if self._spool is not None else 0
+
+    def has_spool_backlog(self) -> bool:
+        return self._spool is not None and not self._spool.is_empty()
 
     def is_connected(self) -> bool: return self._connected
\ No newline at end of file
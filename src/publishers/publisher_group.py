@@ -0,0 +1,305 @@
+"""
+Publishes to several brokers ("destinations") over several connections each.
+
+Every destination has its own MQTTPublisher per connection. Sensors are assigned to a
+connection by a hash of their id, so each sensor's readings stay in order on one
+connection. A sensor's exception state, deadband and rate policy exist once per
+destination, so a destination with a coarser policy (e.g. a shore broker over VSAT)
+publishes less. Every connection registers all sensors, so its exception engine is
+indexed like the pipeline's descriptors, but only sees readings of its own partition.
+The first connection of a destination owns the retained gateway status (the will).
+Every connection is fed from its own bounded queue by its own task: a slow or
+unreachable broker fills its own queues only, never the pipeline or the other
+connections. When a queue is full its oldest batch goes to the connection's disk spool,
+or is dropped if the destination has none.
+"""
+import asyncio
+import logging
+import zlib
+from collections import deque
+from functools import partial
+from typing import Callable, Deque, Dict, List, Optional, Tuple, Union
+
+from ..metrics.registry import REGISTRY
+from ..models.config_models import PRIMARY_DESTINATION, MqttDestinationConfig, MqttPublisherConfig, SensorConfig
+from ..models.sensor_reading import SensorReading
+from .mqtt_publisher import (MQTT_CONNECTED, MQTT_IN_FLIGHT, MQTT_REPLAYED, MQTT_SPOOL_BYTES, MQTT_SPOOLED,
+                             MQTTPublisher)
+
+logger = logging.getLogger(__name__)
+
+MQTT_DESTINATION_QUEUED = REGISTRY.gauge("gateway_mqtt_destination_queued_batches",
+                                         "Pipeline batches waiting to be published, per destination", ("destination",))
+MQTT_DESTINATION_DROPPED = REGISTRY.counter("gateway_mqtt_destination_dropped_readings_total",
+                                            "Readings dropped because a destination queue was full and had no spool",
+                                            ("destination",))
+MQTT_DESTINATION_CONNECTED = REGISTRY.gauge("gateway_mqtt_destination_connections",
+                                            "Broker connections up, per destination", ("destination",))
+
+# Seconds stop() waits for the queues to drain before the connections are closed
+_DRAIN_TIMEOUT = 2.0
+
+# A queued list of readings, or a (topic suffix, payload) window summary
+_QueueItem = Union[List[SensorReading], Tuple[str, str]]
+
+
+def partition_of(key: str, partitions: int) -> int:
+    """Stable connection index for a sensor id (or topic): the same across restarts and processes."""
+    return zlib.crc32(key.encode("utf-8")) % partitions
+
+
+def destination_sensors(sensors: List[SensorConfig], destination: MqttDestinationConfig,
+                        default_min_interval: int) -> List[SensorConfig]:
+    """The sensors with the destination's deadband scale and minimum publish interval applied."""
+    scale, floor = destination.deadband_scale, destination.min_publish_interval_seconds
+    if scale == 1.0 and floor is None:
+        return list(sensors)
+    adjusted = []
+    for sensor in sensors:
+        params = sensor.publisher_config
+        update = {"change_threshold": params.change_threshold * scale}
+        if floor is not None:
+            update["min_publish_interval_seconds"] = max(params.min_publish_interval_seconds or default_min_interval, floor)
+        adjusted.append(sensor.model_copy(update={"publisher_config": params.model_copy(update=update)}))
+    return adjusted
+
+
+class _Connection:
+    """One broker connection of a destination, with the queue its publishing task drains."""
+
+    def __init__(self, destination: str, publisher: MQTTPublisher, max_queue: int):
+        self.destination = destination
+        self.publisher = publisher
+        self.max_queue = max_queue
+        self.queue: Deque[_QueueItem] = deque()
+        self.dropped_readings = 0
+        self._wakeup = asyncio.Event()
+        self._busy = False
+        self._task: Optional[asyncio.Task] = None
+
+    def put(self, item: _QueueItem):
+        if len(self.queue) >= self.max_queue:
+            self._overflow(self.queue.popleft())
+        self.queue.append(item)
+        self._wakeup.set()
+
+    def _overflow(self, item: _QueueItem):
+        """Writes the oldest queued item to the spool, which replays it once the broker is back, or drops it."""
+        publisher = self.publisher
+        if isinstance(item, list):
+            if not publisher.spool_readings(item):
+                self.dropped_readings += len(item)
+        else:
+            suffix, payload = item
+            publisher.spool_summary(suffix, payload)
+
+    def idle(self) -> bool:
+        return not self.queue and not self._busy
+
+    async def _run(self):
+        publisher = self.publisher
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self.queue:
+                item = self.queue.popleft()
+                self._busy = True
+                try:
+                    if isinstance(item, list):
+                        await publisher.publish_readings(item)
+                    else:
+                        await publisher.publish_summary(*item)
+                except Exception as e:
+                    logger.error(f"MQTT[{self.destination}]: Publishing failed: {e}", exc_info=True)
+                finally:
+                    self._busy = False
+
+    async def start(self):
+        await self.publisher.start()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try: await self._task
+            except asyncio.CancelledError: pass
+        await self.publisher.stop()
+
+
+def _destination_config(config: MqttPublisherConfig, destination: MqttDestinationConfig) -> MqttPublisherConfig:
+    """Publisher settings of an extra destination: its broker, the main settings for anything it leaves unset."""
+    update = {"broker_host": destination.broker_host, "broker_port": destination.broker_port,
+              "username": destination.username, "password": destination.password}
+    for field in ("topic_prefix", "engine", "spool", "batch"):
+        value = getattr(destination, field)
+        if value is not None:
+            update[field] = value
+    return config.model_copy(update=update)
+
+
+class _Destination:
+    def __init__(self, name: str, config: MqttPublisherConfig, connection_count: int, max_queue: int,
+                 sensors: List[SensorConfig], adjust_sensors: Callable[[List[SensorConfig]], List[SensorConfig]]):
+        self.name = name
+        self.config = config
+        self.connection_count = connection_count
+        self.adjust_sensors = adjust_sensors
+        self._partitions: Dict[str, int] = {}
+        adjusted = self.adjust_sensors(sensors)
+        self.connections = [_Connection(name, MQTTPublisher(self._connection_config(n), adjusted, status_will=n == 0),
+                                        max_queue)
+                            for n in range(connection_count)]
+
+    def _connection_config(self, n: int) -> MqttPublisherConfig:
+        """
+        Client id, spool directory and batch topic of the n-th connection. The main broker over
+        a single connection keeps the plain settings, as without a group.
+        """
+        config = self.config
+        parts = [] if self.name == PRIMARY_DESTINATION else [self.name]
+        if self.connection_count > 1:
+            parts.append(str(n))
+        if not parts:
+            return config
+        # Brokers disconnect an older session when a client id connects again
+        update = {"client_id_prefix": "-".join([config.client_id_prefix, *parts]),
+                  "spool": config.spool.model_copy(update={"directory": "/".join([config.spool.directory, *parts])})}
+        if self.connection_count > 1:
+            # Each connection has its own batch index map, so it needs its own batch topic
+            update["batch"] = config.batch.model_copy(update={"topic_suffix": f"{config.batch.topic_suffix}/{n}"})
+        return config.model_copy(update=update)
+
+    def partition(self, key: str) -> int:
+        n = self._partitions.get(key)
+        if n is None:
+            n = self._partitions[key] = partition_of(key, self.connection_count)
+        return n
+
+    def enqueue(self, readings: List[SensorReading]):
+        connections = self.connections
+        if len(connections) == 1:
+            connections[0].put(readings)
+            return
+        by_partition: Dict[int, List[SensorReading]] = {}
+        partitions = self._partitions
+        for reading in readings:
+            sensor_id = reading.descriptor.sensor_id
+            n = partitions.get(sensor_id)
+            if n is None:
+                n = self.partition(sensor_id)
+            part = by_partition.get(n)
+            if part is None:
+                part = by_partition[n] = []
+            part.append(reading)
+        for n, part in by_partition.items():
+            connections[n].put(part)
+
+    def update_sensors(self, sensors: List[SensorConfig]):
+        adjusted = self.adjust_sensors(sensors)
+        for connection in self.connections:
+            connection.publisher.update_sensors(adjusted)
+
+    def connected_count(self) -> int:
+        return sum(c.publisher.is_connected() for c in self.connections)
+
+    def queued_batches(self) -> int:
+        return sum(len(c.queue) for c in self.connections)
+
+    def dropped_readings(self) -> int:
+        return sum(c.dropped_readings for c in self.connections)
+
+
+class PublisherGroup:
+    """
+    Drop-in replacement for MQTTPublisher when mqtt_publisher has several connections or
+    extra destinations. publish_readings() only enqueues, so the pipeline never waits for
+    a broker; publish_stats() goes straight to the main broker.
+    """
+
+    def __init__(self, publisher_config: MqttPublisherConfig, sensors: Optional[List[SensorConfig]] = None):
+        self.config = publisher_config
+        sensors = list(sensors or [])
+        self.destinations = [_Destination(PRIMARY_DESTINATION, publisher_config, publisher_config.connections,
+                                          publisher_config.max_queue_batches, sensors, list)]
+        for destination in publisher_config.destinations:
+            self.destinations.append(_Destination(
+                destination.name, _destination_config(publisher_config, destination),
+                destination.connections or publisher_config.connections,
+                destination.max_queue_batches or publisher_config.max_queue_batches, sensors,
+                partial(destination_sensors, destination=destination,
+                        default_min_interval=publisher_config.default_min_publish_interval_seconds)))
+        self._primary = self.destinations[0]
+        self._running = False
+        self._register_metrics()
+
+    def _connections(self) -> List[_Connection]:
+        return [c for d in self.destinations for c in d.connections]
+
+    def _register_metrics(self):
+        for destination in self.destinations:
+            MQTT_DESTINATION_QUEUED.labels(destination.name).set_function(destination.queued_batches)
+            MQTT_DESTINATION_DROPPED.labels(destination.name).set_function(destination.dropped_readings)
+            MQTT_DESTINATION_CONNECTED.labels(destination.name).set_function(destination.connected_count)
+        # The connections' publishers each registered themselves last-wins; report the totals instead
+        publishers = [c.publisher for c in self._connections()]
+        MQTT_CONNECTED.set_function(self.is_connected)
+        MQTT_SPOOLED.set_function(lambda: sum(p.spooled_messages for p in publishers))
+        MQTT_REPLAYED.set_function(lambda: sum(p.replayed_messages for p in publishers))
+        MQTT_SPOOL_BYTES.set_function(lambda: sum(p.spool_pending_bytes() for p in publishers))
+        MQTT_IN_FLIGHT.set_function(lambda: sum(p.in_flight_count() for p in publishers))
+
+    async def start(self):
+        if not self.config.enabled: return
+        self._running = True
+        for destination in self.destinations:
+            logger.info(f"MQTT[{destination.name}]: Publishing to {destination.config.broker_host}:"
+                        f"{destination.config.broker_port} over {destination.connection_count} connection(s).")
+            for connection in destination.connections:
+                await connection.start()
+
+    async def stop(self):
+        if self._running:
+            self._running = False
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + _DRAIN_TIMEOUT
+            while loop.time() < deadline and not all(c.idle() for c in self._connections()):
+                await asyncio.sleep(0.05)
+        for destination in self.destinations:
+            if destination.queued_batches() or destination.dropped_readings():
+                logger.warning(f"MQTT[{destination.name}]: {destination.dropped_readings()} readings dropped (queue full), "
+                               f"{destination.queued_batches()} batches unsent at shutdown.")
+        await asyncio.gather(*(c.stop() for c in self._connections()), return_exceptions=True)
+
+    async def publish_reading(self, reading: SensorReading):
+        await self.publish_readings([reading])
+
+    async def publish_readings(self, readings: List[SensorReading]):
+        if not self._running or not readings: return
+        for destination in self.destinations:
+            destination.enqueue(readings)
+
+    async def publish_stats(self, suffix: str, payload: str) -> bool:
+        """Publishes a gateway status message on the main broker's first connection."""
+        if not self._running:
+            return False
+        return await self._primary.connections[0].publisher.publish_stats(suffix, payload)
+
+    async def publish_summary(self, suffix: str, payload: str) -> bool:
+        """Queues a window summary for every destination, on the connection its topic hashes to."""
+        if not self._running:
+            return False
+        for destination in self.destinations:
+            destination.connections[destination.partition(suffix)].put((suffix, payload))
+        return True
+
+    def update_sensors(self, sensors: List[SensorConfig]):
+        """Registers new sensors and retunes changed ones after a config reload, per destination policy."""
+        for destination in self.destinations:
+            destination.update_sensors(sensors)
+
+    def has_spool_backlog(self) -> bool:
+        return any(not c.idle() or c.publisher.has_spool_backlog() for c in self._connections())
+
+    def is_connected(self) -> bool:
+        """True while every connection to the main broker is up."""
+        return self._primary.connected_count() == self._primary.connection_count
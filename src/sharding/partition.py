@@ -0,0 +1,50 @@
+import zlib
+from typing import List
+
+from ..collectors.modbus_read_planner import DEFAULT_DEVICE
+from ..models.config_models import AppConfig, SensorConfig, SensorModbusCollectorParams, SensorNmeaCollectorParams
+
+# NMEA source name used when the collector is configured with a single host/port
+_DEFAULT_NMEA_SOURCE = "default"
+
+
+def _nmea_source_names(config: AppConfig) -> List[str]:
+    nmea_config = config.collectors.nmea_collector
+    return [s.name for s in nmea_config.sources] if nmea_config.sources else [_DEFAULT_NMEA_SOURCE]
+
+
+def connection_units(sensor: SensorConfig, config: AppConfig) -> List[str]:
+    """
+    The connections a sensor is read over. Units are what gets assigned to shards, so every
+    Modbus device and NMEA source is owned by exactly one worker.
+    """
+    params = sensor.collector_config
+    if isinstance(params, SensorModbusCollectorParams):
+        return [f"modbus:{params.device or DEFAULT_DEVICE}"]
+    if isinstance(params, SensorNmeaCollectorParams):
+        # A sensor without a source listens on every source
+        return [f"nmea:{params.source}"] if params.source else [f"nmea:{name}" for name in _nmea_source_names(config)]
+    return [sensor.collector_type]
+
+
+def shard_of(unit: str, workers: int) -> int:
+    """Stable across restarts and reloads, so a device never moves to another worker."""
+    return zlib.crc32(unit.encode("utf-8")) % workers
+
+
+def shard_config(config: AppConfig, shard: int, workers: int) -> AppConfig:
+    """Worker configuration: the sensors and NMEA sources of one shard, with no local HTTP or MQTT."""
+    sensors = [s for s in config.sensors
+               if any(shard_of(unit, workers) == shard for unit in connection_units(s, config))]
+    nmea_config = config.collectors.nmea_collector
+    if nmea_config.sources:
+        nmea_config = nmea_config.model_copy(update={
+            "sources": [s for s in nmea_config.sources if shard_of(f"nmea:{s.name}", workers) == shard]})
+    collectors = config.collectors.model_copy(update={"nmea_collector": nmea_config})
+    return config.model_copy(update={
+        "sensors": sensors,
+        "collectors": collectors,
+        "mqtt_publisher": config.mqtt_publisher.model_copy(update={"enabled": False}),
+        "metrics": config.metrics.model_copy(update={"http_enabled": False, "mqtt_push_interval_seconds": 0}),
+        "sharding": config.sharding.model_copy(update={"enabled": False}),
+    })
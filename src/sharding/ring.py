@@ -0,0 +1,150 @@
+import math
+import struct
+from multiprocessing.shared_memory import SharedMemory
+from typing import List, Optional, Sequence, Tuple
+
+# sensor index, status code, has value, timestamp (ns), value
+RECORD = struct.Struct("<IBBxxqd")
+RECORD_SIZE = RECORD.size
+
+_MAGIC = b"RRNG"
+_HEADER = struct.Struct("<4sII")   # magic, record size, capacity
+_COUNTER = struct.Struct("<Q")
+# Each counter has its own cache line so producer and consumer do not share one
+_WRITE_OFFSET = 64
+_READ_OFFSET = 128
+_FULL_OFFSET = 192
+_DATA_OFFSET = 256
+
+RingRecord = Tuple[int, int, Optional[float], int]   # (sensor index, status code, value, timestamp ns)
+
+# The lock only guards two counter accesses; a holder that keeps it longer is stuck or dead
+LOCK_TIMEOUT_SECONDS = 0.05
+
+
+class RingLockTimeout(RuntimeError):
+    """The ring lock was not released in time, e.g. its holder was killed while holding it."""
+
+
+class ReadingRing:
+    """
+    Single-producer single-consumer ring of fixed-size reading records in shared memory, from
+    one shard worker to the publisher process. Write and read positions are free-running
+    64-bit counters; a slot is position % capacity.
+
+    CPython has no memory fences, so the two counters are only read and written while
+    holding a multiprocessing lock. The lock is never held while records are copied; its
+    acquire/release orders the record stores before the counter update on every CPU.
+    Acquiring it times out (RingLockTimeout) instead of blocking; once the producer process
+    has exited, retire_producer() lets the consumer drain what is left without the lock.
+    """
+
+    def __init__(self, shm: SharedMemory, lock, owner: bool):
+        self._shm = shm
+        self._buf = shm.buf
+        self._lock = lock
+        self._owner = owner
+        magic, record_size, self.capacity = _HEADER.unpack_from(self._buf, 0)
+        if magic != _MAGIC or record_size != RECORD_SIZE:
+            raise ValueError(f"shared memory {shm.name} is not a reading ring")
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    @classmethod
+    def create(cls, capacity: int, lock) -> "ReadingRing":
+        shm = SharedMemory(create=True, size=_DATA_OFFSET + capacity * RECORD_SIZE)
+        _HEADER.pack_into(shm.buf, 0, _MAGIC, RECORD_SIZE, capacity)
+        for offset in (_WRITE_OFFSET, _READ_OFFSET, _FULL_OFFSET):
+            _COUNTER.pack_into(shm.buf, offset, 0)
+        return cls(shm, lock, owner=True)
+
+    @classmethod
+    def attach(cls, name: str, lock) -> "ReadingRing":
+        # Spawned workers share the parent's resource tracker, so registering again is harmless
+        # and the segment is unlinked by the owner only
+        return cls(SharedMemory(name=name), lock, owner=False)
+
+    def _read_positions(self) -> Tuple[int, int]:
+        return (_COUNTER.unpack_from(self._buf, _WRITE_OFFSET)[0],
+                _COUNTER.unpack_from(self._buf, _READ_OFFSET)[0])
+
+    def _acquire(self):
+        if not self._lock.acquire(timeout=LOCK_TIMEOUT_SECONDS):
+            raise RingLockTimeout(f"ring {self.name}: lock held for more than {LOCK_TIMEOUT_SECONDS}s")
+
+    def _positions(self) -> Tuple[int, int]:
+        if self._lock is None:
+            return self._read_positions()
+        self._acquire()
+        try:
+            return self._read_positions()
+        finally:
+            self._lock.release()
+
+    def _store_counter(self, offset: int, value: int):
+        if self._lock is None:
+            _COUNTER.pack_into(self._buf, offset, value)
+            return
+        self._acquire()
+        try:
+            _COUNTER.pack_into(self._buf, offset, value)
+        finally:
+            self._lock.release()
+
+    def retire_producer(self):
+        """
+        Consumer side, after the producer process exited: counters are accessed without the
+        lock from now on, which the producer may have died holding.
+        """
+        self._lock = None
+
+    def depth(self) -> int:
+        # Unlocked: a gauge may be off by the records of one concurrent push or pop
+        write, read = self._read_positions()
+        return write - read
+
+    def full_events(self) -> int:
+        return _COUNTER.unpack_from(self._buf, _FULL_OFFSET)[0]
+
+    def push_many(self, records: Sequence[RingRecord]) -> int:
+        """Producer side. Writes as many records as fit and returns how many were written."""
+        write, read = self._positions()
+        count = min(len(records), self.capacity - (write - read))
+        if count < len(records):
+            _COUNTER.pack_into(self._buf, _FULL_OFFSET, self.full_events() + 1)
+        pack_into, buf, capacity = RECORD.pack_into, self._buf, self.capacity
+        for i in range(count):
+            index, status, value, timestamp_ns = records[i]
+            has_value = value is not None and not (isinstance(value, float) and math.isnan(value))
+            pack_into(buf, _DATA_OFFSET + ((write + i) % capacity) * RECORD_SIZE,
+                      index, status, has_value, timestamp_ns, value if has_value else 0.0)
+        if count:
+            self._store_counter(_WRITE_OFFSET, write + count)
+        return count
+
+    def pop_many(self, max_records: int) -> List[RingRecord]:
+        """Consumer side. Returns up to max_records records, oldest first."""
+        write, read = self._positions()
+        count = min(write - read, max_records)
+        if count <= 0:
+            return []
+        start = read % self.capacity
+        first = min(count, self.capacity - start)
+        chunks = [self._buf[_DATA_OFFSET + start * RECORD_SIZE:_DATA_OFFSET + (start + first) * RECORD_SIZE]]
+        if first < count:
+            chunks.append(self._buf[_DATA_OFFSET:_DATA_OFFSET + (count - first) * RECORD_SIZE])
+        out = [(index, status, value if has_value else None, timestamp_ns)
+               for chunk in chunks
+               for index, status, has_value, timestamp_ns, value in RECORD.iter_unpack(chunk)]
+        for chunk in chunks:
+            chunk.release()
+        self._store_counter(_READ_OFFSET, read + count)
+        return out
+
+    def close(self):
+        self._buf.release()
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
@@ -0,0 +1,234 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from ..metrics.registry import REGISTRY
+from ..models.config_models import AppConfig, SensorConfig
+from ..models.sensor_reading import SensorDescriptor, SensorReading
+from .partition import shard_config
+from .ring import ReadingRing, RingLockTimeout
+from .worker import run_worker
+
+logger = logging.getLogger(__name__)
+
+SHARD_RESTARTS = REGISTRY.counter("gateway_shard_restarts_total", "Shard worker restarts after an exit", ("shard",))
+SHARD_UP = REGISTRY.gauge("gateway_shard_up", "1 while the shard worker process is alive", ("shard",))
+SHARD_RING_DEPTH = REGISTRY.gauge("gateway_shard_ring_depth", "Readings waiting in the shard ring", ("shard",))
+SHARD_RING_FULL = REGISTRY.counter("gateway_shard_ring_full_total", "Times a shard worker found its ring full", ("shard",))
+
+# A worker that ran this long before exiting restarts after the base delay again
+_STABLE_RUN_SECONDS = 60.0
+_DRAIN_BATCH = 4096
+
+
+@dataclass
+class _Shard:
+    index: int
+    ring: ReadingRing
+    lock: object
+    config: Optional[AppConfig] = None
+    process: Optional[multiprocessing.Process] = None
+    started_at: float = 0.0
+    failures: int = 0
+    restart_at: Optional[float] = None
+    # Rings of exited workers, drained without their lock and then closed
+    retired_rings: List[ReadingRing] = field(default_factory=list)
+    # Full events counted by retired rings
+    full_events_base: int = 0
+
+
+class ShardSupervisor:
+    """
+    Sharded collection: N worker processes each own the Modbus devices and NMEA sources that
+    hash to them and stream readings into a shared-memory ring per worker. This process
+    drains the rings into the pipeline queue, so deadbands and MQTT stay in one place.
+
+    Used by GatewayManager in place of the local collectors (same start/update_sensors/stop
+    interface). Workers that exit are restarted with exponential backoff.
+    """
+
+    def __init__(self, config: AppConfig):
+        self.config = config
+        self.sharding = config.sharding
+        self._context = multiprocessing.get_context("spawn")
+        self._shards: List[_Shard] = []
+        for index in range(self.sharding.workers):
+            lock = self._context.Lock()
+            self._shards.append(_Shard(index, ReadingRing.create(self.sharding.ring_capacity, lock), lock))
+        self._descriptors_by_index: Dict[int, SensorDescriptor] = {}
+        self._sensor_indices: Dict[str, int] = {}
+        self._data_queue = None
+        self._running = False
+        self._drain_task: Optional[asyncio.Task] = None
+        self._monitor_task: Optional[asyncio.Task] = None
+
+    def _set_descriptors(self, descriptors: Dict[str, SensorDescriptor]):
+        self._descriptors_by_index = {d.index: d for d in descriptors.values()}
+        self._sensor_indices = {sensor_id: d.index for sensor_id, d in descriptors.items()}
+
+    def _start_worker(self, shard: _Shard):
+        process = self._context.Process(
+            target=run_worker, name=f"gateway-shard-{shard.index}", daemon=True,
+            args=(shard.index, shard.config, self._sensor_indices, shard.ring.name, shard.lock, os.getpid()))
+        process.start()
+        shard.process, shard.started_at, shard.restart_at = process, time.monotonic(), None
+        logger.info(f"Shard {shard.index}: Worker started (pid {process.pid}, {len(shard.config.sensors)} sensors).")
+
+    def _renew_ring(self, shard: _Shard):
+        """
+        Gives a shard whose worker has exited a new ring and lock: a killed worker may have died
+        holding the old lock, which a restarted worker would otherwise inherit. The old ring's
+        remaining readings are drained without its lock.
+        """
+        old = shard.ring
+        old.retire_producer()
+        shard.retired_rings.append(old)
+        shard.full_events_base += old.full_events()
+        shard.lock = self._context.Lock()
+        shard.ring = ReadingRing.create(self.sharding.ring_capacity, shard.lock)
+
+    def _stop_worker(self, shard: _Shard, timeout: float = 5.0):
+        process, shard.process = shard.process, None
+        if process is None:
+            return
+        if process.is_alive():
+            process.terminate()
+            process.join(timeout)
+            if process.is_alive():
+                logger.warning(f"Shard {shard.index}: Worker did not stop in {timeout}s. Killing it.")
+                process.kill()
+                process.join(1.0)
+        process.close()
+
+    def _register_metrics(self, shard: _Shard):
+        label = str(shard.index)
+        SHARD_UP.labels(label).set_function(lambda: shard.process is not None and shard.process.is_alive())
+        SHARD_RING_DEPTH.labels(label).set_function(
+            lambda: shard.ring.depth() + sum(ring.depth() for ring in shard.retired_rings))
+        SHARD_RING_FULL.labels(label).set_function(lambda: shard.full_events_base + shard.ring.full_events())
+
+    async def start(self, sensors: List[SensorConfig], data_queue, descriptors: Dict[str, SensorDescriptor]):
+        self._running = True
+        self._data_queue = data_queue
+        self._set_descriptors(descriptors)
+        config = self.config.model_copy(update={"sensors": sensors})
+        for shard in self._shards:
+            shard.config = shard_config(config, shard.index, len(self._shards))
+            self._register_metrics(shard)
+            if shard.config.sensors:
+                self._start_worker(shard)
+            else:
+                logger.info(f"Shard {shard.index}: No devices or sources assigned. Not starting a worker.")
+        self._drain_task = asyncio.create_task(self._drain())
+        self._monitor_task = asyncio.create_task(self._monitor())
+
+    async def update_sensors(self, sensors: List[SensorConfig], descriptors: Dict[str, SensorDescriptor]):
+        """Restarts only the workers whose sensors changed; devices never move between workers."""
+        if not self._running:
+            return
+        self._set_descriptors(descriptors)
+        config = self.config.model_copy(update={"sensors": sensors})
+        for shard in self._shards:
+            new_config = shard_config(config, shard.index, len(self._shards))
+            if new_config.sensors == shard.config.sensors:
+                continue
+            shard.config = new_config
+            if shard.process is not None:
+                await asyncio.to_thread(self._stop_worker, shard)
+                self._renew_ring(shard)
+            shard.failures, shard.restart_at = 0, None
+            if new_config.sensors:
+                logger.info(f"Shard {shard.index}: Sensors changed by reload. Restarting worker.")
+                self._start_worker(shard)
+
+    async def _monitor(self):
+        while self._running:
+            now = time.monotonic()
+            for shard in self._shards:
+                process = shard.process
+                if process is not None and process.exitcode is not None:
+                    if now - shard.started_at >= _STABLE_RUN_SECONDS:
+                        shard.failures = 0
+                    delay = min(self.sharding.restart_delay_seconds * 2 ** shard.failures,
+                                self.sharding.max_restart_delay_seconds)
+                    shard.failures += 1
+                    SHARD_RESTARTS.labels(str(shard.index)).inc()
+                    logger.error(f"Shard {shard.index}: Worker exited with code {process.exitcode}. Restarting in {delay:.1f}s.")
+                    process.close()
+                    shard.process, shard.restart_at = None, now + delay
+                    self._renew_ring(shard)
+                elif process is None and shard.restart_at is not None and now >= shard.restart_at:
+                    self._start_worker(shard)
+            await asyncio.sleep(0.5)
+
+    def _drain_ring(self, ring: ReadingRing) -> Tuple[int, List[SensorReading]]:
+        """Pops a batch of records; returns how many were popped and the readings of known sensors."""
+        descriptors = self._descriptors_by_index
+        records = ring.pop_many(_DRAIN_BATCH)
+        readings = []
+        for index, status, value, timestamp_ns in records:
+            descriptor = descriptors.get(index)
+            # A worker restarting after a reload may still flush readings of removed sensors
+            if descriptor is not None:
+                readings.append(SensorReading(descriptor, value, status, timestamp_ns))
+        return len(records), readings
+
+    async def _drain(self):
+        poll_interval = self.sharding.poll_interval_ms / 1000
+        while self._running:
+            drained = 0
+            try:
+                for shard in self._shards:
+                    for ring in list(shard.retired_rings):
+                        popped, readings = self._drain_ring(ring)
+                        # Closed only once empty: a batch of removed sensors' records leaves no readings
+                        if not popped:
+                            shard.retired_rings.remove(ring)
+                            ring.close()
+                        drained += popped
+                        for reading in readings:
+                            await self._data_queue.put(reading)
+                    try:
+                        popped, readings = self._drain_ring(shard.ring)
+                    except RingLockTimeout as e:
+                        await self._restart_stuck_worker(shard, e)
+                        continue
+                    drained += popped
+                    for reading in readings:
+                        await self._data_queue.put(reading)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Shard ring drain error: {e}", exc_info=True)
+            if not drained:
+                await asyncio.sleep(poll_interval)
+
+    async def _restart_stuck_worker(self, shard: _Shard, error: RingLockTimeout):
+        logger.error(f"Shard {shard.index}: {error}. Restarting the worker with a new ring.")
+        if shard.process is not None:
+            await asyncio.to_thread(self._stop_worker, shard)
+        self._renew_ring(shard)
+        if shard.restart_at is None:
+            shard.restart_at = time.monotonic()
+
+    async def stop(self):
+        logger.info("Stopping shard workers...")
+        self._running = False
+        for task in (self._monitor_task, self._drain_task):
+            if task is not None and not task.done():
+                task.cancel()
+                try: await task
+                except asyncio.CancelledError: pass
+        await asyncio.gather(*(asyncio.to_thread(self._stop_worker, shard) for shard in self._shards))
+        for shard in self._shards:
+            for ring in (*shard.retired_rings, shard.ring):
+                ring.close()
+        self._shards.clear()
+        logger.info("Shard workers stopped.")
+
+    def is_running(self) -> bool:
+        return self._running and any(s.process is not None and s.process.is_alive() for s in self._shards)
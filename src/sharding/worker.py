@@ -0,0 +1,100 @@
+import asyncio
+import logging
+import os
+import signal
+from typing import Dict, List
+
+from ..capture.capture_file import start_capture, stop_capture
+from ..models.config_models import AppConfig
+from ..models.sensor_reading import SensorDescriptor, SensorReading
+from ..plugins import COLLECTORS
+from ..utils.logging_setup import setup_logging, stop_logging
+from .ring import ReadingRing, RingLockTimeout, RingRecord
+
+logger = logging.getLogger(__name__)
+
+# Readings a worker buffers while its ring is full before collectors are made to wait
+MAX_PENDING_READINGS = 8192
+
+
+class RingSink:
+    """
+    Stands in for the pipeline queue inside a worker. Readings are buffered and written to
+    the ring once per event loop pass, so one Modbus block or NMEA chunk costs a single
+    index update. A full ring applies backpressure to the collectors, like the "block" policy.
+    """
+
+    def __init__(self, ring: ReadingRing):
+        self.ring = ring
+        self._pending: List[RingRecord] = []
+        self._flush_scheduled = False
+        self.written = 0
+
+    def put_nowait(self, reading: SensorReading):
+        self._pending.append((reading.descriptor.index, reading.status_code, reading.value, reading.timestamp_ns))
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            asyncio.get_running_loop().call_soon(self._flush)
+
+    async def put(self, reading: SensorReading):
+        self.put_nowait(reading)
+        while len(self._pending) >= MAX_PENDING_READINGS:
+            await asyncio.sleep(0.001)
+
+    def _flush(self):
+        self._flush_scheduled = False
+        if not self._pending:
+            return
+        try:
+            written = self.ring.push_many(self._pending)
+        except RingLockTimeout as e:
+            logger.warning(f"Ring write delayed: {e}")
+            written = 0
+        self.written += written
+        del self._pending[:written]
+        if self._pending:
+            self._flush_scheduled = True
+            asyncio.get_running_loop().call_later(0.001, self._flush)
+
+
+async def _run(shard: int, config: AppConfig, sensor_indices: Dict[str, int], ring_name: str, ring_lock, parent_pid: int):
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    loop.add_signal_handler(signal.SIGTERM, stop.set)
+
+    ring = ReadingRing.attach(ring_name, ring_lock)
+    sink = RingSink(ring)
+    descriptors = {s.id: SensorDescriptor.from_config(s, sensor_indices[s.id]) for s in config.sensors}
+    collectors = []
+    for collector_type in dict.fromkeys(s.collector_type for s in config.sensors):
+        section = getattr(config.collectors, COLLECTORS.spec(collector_type).config_section, None)
+        collectors.append(COLLECTORS.load(collector_type)(section))
+    if config.capture.enabled:
+        start_capture(config.capture, f"shard{shard}")
+    await asyncio.gather(*(c.start(config.sensors, sink, descriptors) for c in collectors))
+    logger.info(f"Shard {shard}: Collecting {len(config.sensors)} sensors (pid {os.getpid()}).")
+
+    while not stop.is_set():
+        if os.getppid() != parent_pid:
+            logger.error(f"Shard {shard}: Publisher process is gone. Exiting.")
+            break
+        try: await asyncio.wait_for(stop.wait(), timeout=1.0)
+        except asyncio.TimeoutError: pass
+
+    await asyncio.gather(*(c.stop() for c in collectors), return_exceptions=True)
+    stop_capture()
+    sink._flush()
+    ring.close()
+    logger.info(f"Shard {shard}: Stopped after {sink.written} readings.")
+
+
+def run_worker(shard: int, config: AppConfig, sensor_indices: Dict[str, int], ring_name: str, ring_lock, parent_pid: int):
+    """Process entry point of a shard worker."""
+    # Ctrl+C reaches the whole process group; the supervisor stops workers with SIGTERM
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    log_config = config.logging
+    setup_logging(log_config.model_copy(update={"format": log_config.format.replace("%(name)s", f"shard{shard}:%(name)s")}))
+    try:
+        asyncio.run(_run(shard, config, sensor_indices, ring_name, ring_lock, parent_pid))
+    finally:
+        stop_logging()
@@ -14,4 +14,27 @@ def format_payload_timestamp(dt: datetime.datetime, fmt: str) -> str:
         dt = dt.replace(tzinfo=datetime.timezone.utc)
     else:
         dt = dt.astimezone(datetime.timezone.utc)
-    return dt.strftime(fmt)
\ No newline at end of file
+    return dt.strftime(fmt)
+
+class CachedTimestampFormatter:
+    """
+    Payload timestamp formatting with a one-entry cache keyed on the whole second, so readings
+    taken within the same second share one strftime call.
+    """
+
+    def __init__(self, fmt: str):
+        self.fmt = fmt
+        self._cacheable = "%f" not in fmt
+        self._last_second: int = -1
+        self._last_text = ""
+
+    def format_ns(self, timestamp_ns: int) -> str:
+        """Formats an integer UTC timestamp in ns, building a datetime only when the second changes."""
+        second = timestamp_ns // 1_000_000_000
+        if not self._cacheable or second != self._last_second:
+            dt = datetime.datetime.fromtimestamp(timestamp_ns / 1e9, tz=datetime.timezone.utc)
+            if not self._cacheable:
+                return dt.strftime(self.fmt)
+            self._last_second = second
+            self._last_text = dt.strftime(self.fmt)
+        return self._last_text
@@ -0,0 +1,90 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Optional, Union
+from urllib.parse import parse_qs, urlsplit
+
+logger = logging.getLogger(__name__)
+
+MAX_REQUEST_HEAD_BYTES = 16384
+
+
+@dataclass
+class HttpRequest:
+    method: str
+    path: str
+    query: Dict[str, str]
+
+
+@dataclass
+class HttpResponse:
+    status: int = 200
+    body: Union[str, bytes] = b""
+    content_type: str = "text/plain; charset=utf-8"
+
+
+Handler = Callable[[HttpRequest], Union[HttpResponse, Awaitable[HttpResponse]]]
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}
+
+
+class HttpServer:
+    """
+    Minimal HTTP/1.0 GET server on the gateway event loop for local endpoints such as
+    /metrics. One request per connection; handlers may be sync or async.
+    """
+
+    def __init__(self, host: str, port: int, name: str = "HTTP"):
+        self.host = host
+        self.port = port
+        self.name = name
+        self._routes: Dict[str, Handler] = {}
+        self._server: Optional[asyncio.base_events.Server] = None
+
+    def add_route(self, path: str, handler: Handler):
+        self._routes[path] = handler
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"{self.name}: Listening on http://{self.host}:{self.port} ({', '.join(self._routes)})")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _respond(self, request: HttpRequest) -> HttpResponse:
+        if request.method != "GET":
+            return HttpResponse(405, "Only GET is supported\n")
+        handler = self._routes.get(request.path)
+        if handler is None:
+            return HttpResponse(404, "Not found\n")
+        response = handler(request)
+        if asyncio.iscoroutine(response):
+            response = await response
+        return response
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout=10)
+            if len(head) > MAX_REQUEST_HEAD_BYTES:
+                raise ValueError("request head too large")
+            method, target, _ = head.split(b"\r\n", 1)[0].decode("latin-1").split(" ", 2)
+            url = urlsplit(target)
+            query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            try:
+                response = await self._respond(HttpRequest(method.upper(), url.path, query))
+            except Exception as e:
+                logger.error(f"{self.name}: Error handling {url.path}: {e}", exc_info=True)
+                response = HttpResponse(500, "Internal error\n")
+            body = response.body.encode("utf-8") if isinstance(response.body, str) else response.body
+            writer.write(f"HTTP/1.0 {response.status} {_REASONS.get(response.status, '')}\r\n"
+                         f"Content-Type: {response.content_type}\r\nContent-Length: {len(body)}\r\n"
+                         f"Connection: close\r\n\r\n".encode("latin-1") + body)
+            await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
@@ -1,13 +1,142 @@
 import logging
+import queue
 import sys
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, List, Optional, Tuple
+
+from ..metrics.registry import REGISTRY
 from ..models.config_models import LoggingConfig
 
+LOG_SUPPRESSED = REGISTRY.counter("gateway_log_suppressed_total", "Log records suppressed as repeats")
+LOG_DROPPED = REGISTRY.counter("gateway_log_dropped_total", "Log records dropped because the log queue was full")
+
+# Call sites remembered by RepeatFilter; expired ones are pruned beyond this
+_MAX_TRACKED_SITES = 4096
+
+_listener: Optional[QueueListener] = None
+_handler: Optional[logging.Handler] = None
+_stream: Optional[logging.Handler] = None
+_repeats: Optional["RepeatFilter"] = None
+
+
+class RepeatFilter(logging.Filter):
+    """
+    Lets the first record of a message through, then suppresses the same message from the
+    same call site for window_seconds. The first record after the window carries the number
+    suppressed meanwhile. A message is the format string with its arguments, so the same
+    call site logging another device or block is not a repeat; records with unhashable
+    arguments are compared by their formatted message.
+    """
+
+    def __init__(self, window_seconds: float):
+        super().__init__()
+        self.window_seconds = window_seconds
+        self.suppressed = 0
+        # (logger, line, level, message, arguments) -> [window start, suppressed in window]
+        self._sites: Dict[Tuple[str, int, int, str, tuple], List] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not isinstance(record.msg, str):
+            return True
+        key = (record.name, record.lineno, record.levelno, record.msg, record.args)
+        try:
+            hash(key)
+        except TypeError:
+            key = (record.name, record.lineno, record.levelno, record.getMessage(), ())
+        now = record.created
+        with self._lock:
+            site = self._sites.get(key)
+            if site is not None and now - site[0] < self.window_seconds:
+                site[1] += 1
+                self.suppressed += 1
+                return False
+            if len(self._sites) >= _MAX_TRACKED_SITES:
+                self._sites = {k: s for k, s in self._sites.items() if now - s[0] < self.window_seconds}
+            self._sites[key] = [now, 0]
+        if site is not None and site[1]:
+            record.msg = f"{record.msg} [{site[1]} more like this suppressed in the last {now - site[0]:.0f}s]"
+        return True
+
+    def pending(self) -> List[Tuple[str, int, str, int]]:
+        """(logger, level, message, count) of repeats suppressed since their last written record."""
+        with self._lock:
+            sites, self._sites = self._sites, {}
+        return [(name, level, msg % args if args else msg, site[1])
+                for (name, _, level, msg, args), site in sites.items() if site[1]]
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """
+    Puts records on the queue untouched: QueueHandler.prepare would format the message
+    and traceback on the calling thread, which is the work this handler exists to move
+    off the event loop. Arguments are therefore formatted later and must not be mutated
+    after the call (hot paths pass strings and numbers). A full queue drops the record.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
 def setup_logging(config: LoggingConfig):
-    logging.basicConfig(
-        level=config.level,
-        format=config.format,
-        datefmt=config.date_format,
-        handlers=[logging.StreamHandler(sys.stdout)]
-    )
+    """
+    Replaces the root handlers with a stdout handler. With queue_size, the event loop only
+    enqueues records and a listener thread formats and writes them.
+    """
+    global _listener, _handler, _stream, _repeats
+    stop_logging()
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+
+    _stream = logging.StreamHandler(sys.stdout)
+    _stream.setFormatter(logging.Formatter(config.format, config.date_format))
+    _handler = _stream
+    if config.queue_size:
+        _handler = _DeferredQueueHandler(queue.Queue(config.queue_size))
+        _listener = QueueListener(_handler.queue, _stream)
+        _listener.start()
+        LOG_DROPPED.set_function(lambda handler=_handler: handler.dropped)
+    _repeats = None
+    if config.repeat_window_seconds:
+        _repeats = RepeatFilter(config.repeat_window_seconds)
+        _handler.addFilter(_repeats)
+        LOG_SUPPRESSED.set_function(lambda repeats=_repeats: repeats.suppressed)
+    root.addHandler(_handler)
+    root.setLevel(config.level)
+
     logger = logging.getLogger(__name__)
-    logger.info(f"Logging configured. Level: {config.level}")
\ No newline at end of file
+    logger.info(f"Logging configured. Level: {config.level}")
+
+
+def stop_logging():
+    """
+    Reports repeats still suppressed, drains the queue and switches the root logger to
+    writing synchronously, so records logged during interpreter shutdown are not lost.
+    """
+    global _listener, _handler
+    if _repeats is not None:
+        for name, level, msg, count in _repeats.pending():
+            logging.getLogger(name).log(level, "%d more like this suppressed: %s", count, msg)
+    if _listener is None:
+        return
+    _listener.stop()
+    _listener = None
+    root = logging.getLogger()
+    root.removeHandler(_handler)
+    if _repeats is not None:
+        _stream.addFilter(_repeats)
+    root.addHandler(_stream)
+    _handler = _stream
@@ -0,0 +1,16 @@
+"""Config builders shared by the unit tests."""
+from src.models.config_models import SensorConfig
+
+
+def modbus_sensor(sensor_id: str, address: int, publisher=None, **params) -> SensorConfig:
+    return SensorConfig(id=sensor_id, name=sensor_id, collector_type="modbus_tcp",
+                        collector_config={"register_address": address, **params},
+                        publisher_config={"mqtt_topic_suffix": sensor_id, "unit": "C", "change_threshold": 0.0,
+                                          **(publisher or {})})
+
+
+def nmea_sensor(sensor_id: str, talker: str, sentence_type: str, publisher=None, **params) -> SensorConfig:
+    return SensorConfig(id=sensor_id, name=sensor_id, collector_type="nmea",
+                        collector_config={"expected_talker_id": talker, "expected_sentence_type": sentence_type, **params},
+                        publisher_config={"mqtt_topic_suffix": sensor_id, "unit": "", "change_threshold": 0.0,
+                                          **(publisher or {})})
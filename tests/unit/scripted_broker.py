@@ -0,0 +1,71 @@
+"""MQTT broker stand-in for tests that need to control acknowledgements and disconnects."""
+import asyncio
+import struct
+
+from src.publishers.mqtt_async_client import CONNACK, CONNECT, PUBACK, PUBLISH, build_packet, encode_varint
+
+_U16 = struct.Struct(">H")
+
+
+class ScriptedBroker:
+    """
+    Accepts MQTT clients and records their QoS 1 PUBLISH packets; sends PUBACKs only while ack
+    is set (with puback_reason when nonzero) and CONNACKs only while connack is set.
+    """
+
+    def __init__(self, connack_properties: bytes = b""):
+        self.connack_properties = connack_properties
+        self.ack = True
+        self.puback_reason = 0
+        self.connack = True
+        self.publishes = []   # (packet id, dup, topic, payload)
+        self.connections = 0
+        self._writers = set()
+        self._server = None
+
+    async def start(self) -> int:
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        return self._server.sockets[0].getsockname()[1]
+
+    def drop_clients(self):
+        for writer in list(self._writers):
+            writer.close()
+
+    def close(self):
+        self.drop_clients()
+        self._server.close()
+
+    async def _handle(self, reader, writer):
+        self._writers.add(writer)
+        try:
+            while True:
+                header = (await reader.readexactly(1))[0]
+                length, shift = 0, 0
+                while True:
+                    byte = (await reader.readexactly(1))[0]
+                    length |= (byte & 0x7F) << shift
+                    if not byte & 0x80:
+                        break
+                    shift += 7
+                body = await reader.readexactly(length)
+                if header & 0xF0 == CONNECT:
+                    if not self.connack:
+                        continue
+                    self.connections += 1
+                    properties = b""
+                    if self.connack_properties:
+                        properties = encode_varint(len(self.connack_properties)) + self.connack_properties
+                    writer.write(build_packet(CONNACK, b"\x00\x00" + properties))
+                elif header & 0xF0 == PUBLISH:
+                    topic_length = _U16.unpack_from(body, 0)[0]
+                    packet_id = _U16.unpack_from(body, 2 + topic_length)[0]
+                    self.publishes.append((packet_id, bool(header & 0x08), body[2:2 + topic_length].decode(),
+                                           body[4 + topic_length:]))
+                    if self.ack:
+                        reason = bytes((self.puback_reason,)) if self.puback_reason else b""
+                        writer.write(build_packet(PUBACK, _U16.pack(packet_id) + reason))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
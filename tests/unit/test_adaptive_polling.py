@@ -0,0 +1,87 @@
+import pytest
+
+from src.collectors.adaptive_polling import AdaptivePollController, change_threshold
+from src.models.config_models import AdaptivePollingConfig
+from tests.unit.factories import modbus_sensor
+
+ENABLED = AdaptivePollingConfig(enabled=True, max_interval_seconds=8.0, target_change_fraction=0.5)
+
+
+def test_change_threshold_matches_the_exception_engine():
+    assert change_threshold(modbus_sensor("a", 0, publisher={"change_threshold": 0.5})) == 0.5
+    sensor = modbus_sensor("a", 0, publisher={"change_threshold": 5, "exception_mode": "percent_of_span",
+                                              "span_low": 0, "span_high": 200})
+    assert change_threshold(sensor) == 10.0
+
+
+def test_quiet_block_slows_down_at_most_twice_per_poll():
+    controller = AdaptivePollController(ENABLED)
+    controller.add_block("a", 1.0, None, [1.0])
+    now, changes = 0.0, []
+    controller.observe("a", [20.0], now)
+    for _ in range(6):
+        now += controller.interval("a")
+        changes.append(controller.observe("a", [20.0], now))
+    assert changes == [[("a", 2.0)], [("a", 4.0)], [("a", 8.0)], [], [], []]
+
+
+def test_step_returns_to_the_fastest_rate():
+    controller = AdaptivePollController(ENABLED)
+    controller.add_block("a", 1.0, None, [1.0, 1.0])
+    controller.observe("a", [0.0, 0.0], 0.0)
+    controller.observe("a", [0.0, 0.0], 1.0)
+    assert controller.interval("a") == 2.0
+    # One member stepping by a full threshold is enough
+    assert controller.observe("a", [0.0, 1.5], 3.0) == [("a", 1.0)]
+
+
+def test_steady_ramp_settles_where_it_moves_the_target_fraction():
+    controller = AdaptivePollController(ENABLED)
+    controller.add_block("a", 0.5, 20.0, [1.0])
+    now = 0.0
+    for _ in range(60):
+        controller.observe("a", [0.1 * now], now)
+        now += controller.interval("a")
+    # 0.1 units/s, half of a 1.0 threshold per poll -> 5 s
+    assert controller.interval("a") == pytest.approx(5.0, rel=0.01)
+
+
+def test_invalid_values_are_ignored():
+    controller = AdaptivePollController(ENABLED)
+    controller.add_block("a", 1.0, None, [1.0])
+    controller.observe("a", [1.0], 0.0)
+    assert controller.observe("a", [None], 1.0) == []
+    assert controller.observe("a", [1.0], 2.0) == [("a", 2.0)]
+
+
+def test_disabled_controller_keeps_the_configured_interval():
+    controller = AdaptivePollController(AdaptivePollingConfig(enabled=False))
+    controller.add_block("a", 1.0, 30.0, [1.0])
+    controller.observe("a", [0.0], 0.0)
+    assert controller.observe("a", [0.0], 1.0) == []
+    assert controller.interval("a") == 1.0
+
+
+def test_budget_stretches_every_block_by_one_factor():
+    controller = AdaptivePollController(ENABLED, max_transactions_per_second=10)
+    controller.add_block("a", 0.1, None, [1.0])
+    controller.add_block("b", 0.2, None, [1.0])
+    assert controller.demand() == pytest.approx(15.0)
+    assert sorted(controller.rebalance()) == [("a", pytest.approx(0.15)), ("b", pytest.approx(0.3))]
+    assert controller.planned_rate() == pytest.approx(10.0)
+    controller.remove_block("b")
+    assert controller.rebalance() == [("a", 0.1)]
+
+
+def test_retuned_block_keeps_its_activity():
+    controller = AdaptivePollController(ENABLED)
+    controller.add_block("a", 1.0, None, [1.0])
+    controller.observe("a", [0.0], 0.0)
+    controller.observe("a", [0.0], 1.0)
+    controller.observe("a", [0.0], 3.0)
+    assert controller.interval("a") == 4.0
+    controller.add_block("a", 1.0, 3.0, [2.0])
+    assert controller.interval("a") == 3.0
+    # A different sensor count starts over
+    controller.add_block("a", 1.0, None, [1.0, 1.0])
+    assert controller.interval("a") == 1.0
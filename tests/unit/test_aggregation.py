@@ -0,0 +1,121 @@
+import json
+import random
+import statistics
+
+import pytest
+
+from src.models.sensor_reading import STATUS_INVALID, SensorDescriptor, SensorReading
+from src.pipeline.aggregation import CLOSE_GRACE_NS, QuantileSketch, WindowAggregator, WindowStats
+from tests.unit.factories import modbus_sensor
+
+SECOND = 1_000_000_000
+# Sample times are seconds after this (a zero timestamp means "now" to SensorReading)
+BASE = 3600
+
+
+def exact_quantile(values, q):
+    return sorted(values)[int(q * (len(values) - 1))]
+
+
+def test_sketch_quantiles_within_relative_error():
+    rng = random.Random(7)
+    values = [rng.lognormvariate(3, 2) for _ in range(20000)]
+    sketch = QuantileSketch(alpha=0.01)
+    for value in values:
+        sketch.add(value)
+    for q in (0.0, 0.1, 0.5, 0.9, 0.99, 1.0):
+        assert sketch.quantile(q) == pytest.approx(exact_quantile(values, q), rel=0.01)
+
+
+def test_sketch_handles_negative_and_zero_values():
+    sketch = QuantileSketch()
+    for value in [-100.0, -1.0, 0.0, 0.0, 1.0, 100.0]:
+        sketch.add(value)
+    assert sketch.quantile(0.0) == pytest.approx(-100.0, rel=0.01)
+    assert sketch.quantile(0.5) == 0.0
+    assert sketch.quantile(1.0) == pytest.approx(100.0, rel=0.01)
+    assert QuantileSketch().quantile(0.5) is None
+
+
+def test_merged_sketch_equals_the_sketch_of_all_values():
+    rng = random.Random(3)
+    values = [rng.uniform(-50, 50) for _ in range(1000)]
+    whole, left, right = QuantileSketch(), QuantileSketch(), QuantileSketch()
+    for i, value in enumerate(values):
+        whole.add(value)
+        (left if i % 3 else right).add(value)
+    left.merge(right)
+    assert [left.quantile(q / 20) for q in range(21)] == [whole.quantile(q / 20) for q in range(21)]
+
+
+def test_welford_merge_matches_a_single_pass():
+    rng = random.Random(11)
+    values = [1e6 + rng.gauss(0, 1) for _ in range(3000)]
+    merged = WindowStats()
+    for start in range(0, len(values), 700):
+        pane = WindowStats()
+        for value in values[start:start + 700]:
+            pane.add(value)
+        merged.merge(pane)
+    merged.merge(WindowStats())
+    assert merged.count == len(values)
+    assert merged.mean == pytest.approx(statistics.fmean(values), rel=1e-12)
+    assert merged.m2 / (merged.count - 1) == pytest.approx(statistics.variance(values), rel=1e-9)
+    assert (merged.min, merged.max) == (min(values), max(values))
+
+
+def aggregator_for(**aggregation):
+    sensor = modbus_sensor("t", 0, publisher={"aggregation": aggregation})
+    return WindowAggregator([sensor]), SensorDescriptor.from_config(sensor, 0)
+
+
+def feed(aggregator, descriptor, samples):
+    """(second, value) samples; None for an Invalid reading. Returns the decoded summaries."""
+    aggregator.process([SensorReading(descriptor, value, STATUS_INVALID if value is None else 0, (BASE + t) * SECOND)
+                        for t, value in samples])
+    return [json.loads(payload) for _, payload in aggregator.take_summaries()]
+
+
+def test_tumbling_window_summary():
+    aggregator, descriptor = aggregator_for(window_seconds=10, quantiles=[0.5])
+    assert feed(aggregator, descriptor, [(t, float(t)) for t in range(10)] + [(5, None)]) == []
+    [summary] = feed(aggregator, descriptor, [(10, 100.0)])
+    assert (summary["count"], summary["invalid_count"], summary["min"], summary["max"]) == (10, 1, 0.0, 9.0)
+    assert summary["mean"] == 4.5 and summary["stddev"] == pytest.approx(statistics.stdev(range(10)))
+    assert summary["p50"] == pytest.approx(4.0, rel=0.01)
+    assert summary["window_start"] == "1970-01-01T01:00:00.000Z"
+    assert summary["window_end"] == "1970-01-01T01:00:10.000Z"
+
+
+def test_sliding_window_overlaps_by_its_step():
+    aggregator, descriptor = aggregator_for(window_seconds=10, mode="sliding", step_seconds=5)
+    summaries = feed(aggregator, descriptor, [(t, float(t)) for t in range(21)])
+    assert [(s["window_end"][17:19], s["count"], s["min"], s["max"]) for s in summaries] == [
+        ("05", 5, 0.0, 4.0), ("10", 10, 0.0, 9.0), ("15", 10, 5.0, 14.0), ("20", 10, 10.0, 19.0)]
+
+
+def test_tick_closes_a_pane_after_the_grace_period():
+    aggregator, descriptor = aggregator_for(window_seconds=10)
+    feed(aggregator, descriptor, [(1, 1.0)])
+    aggregator.tick((BASE + 10) * SECOND + CLOSE_GRACE_NS - 1)
+    assert aggregator.take_summaries() == []
+    aggregator.tick((BASE + 10) * SECOND + CLOSE_GRACE_NS)
+    assert [json.loads(p)["count"] for _, p in aggregator.take_summaries()] == [1]
+
+
+def test_quiet_gap_emits_no_empty_windows():
+    aggregator, descriptor = aggregator_for(window_seconds=10, mode="sliding", step_seconds=5)
+    feed(aggregator, descriptor, [(1, 1.0)])
+    summaries = feed(aggregator, descriptor, [(1000, 2.0), (1010, 3.0)])
+    # The old sample's two windows, then only the window holding the new one
+    assert [s["count"] for s in summaries] == [1, 1, 1, 1]
+    assert summaries[-1]["max"] == 2.0
+
+
+def test_summary_only_sensors_are_not_forwarded_raw():
+    aggregator, descriptor = aggregator_for(window_seconds=10, forward_raw=False)
+    other = SensorDescriptor(1, "other", "C", "other")
+    readings = [SensorReading(descriptor, 1.0, timestamp_ns=SECOND), SensorReading(other, 2.0, timestamp_ns=SECOND)]
+    assert aggregator.process(readings) == readings[1:]
+    aggregator.update_sensors([], [modbus_sensor("t", 0)])
+    assert not aggregator.active and aggregator.process(readings) == readings
@@ -0,0 +1,78 @@
+import json
+import struct
+
+import pytest
+
+from src.publishers.batch_codec import (COMPRESSION_LZ4, COMPRESSION_NONE, COMPRESSION_ZLIB, decode_batch,
+                                        decode_batch_with_index, encode_batch, encode_index, index_schema, lz4_frame)
+
+SENSORS = [{"id": "temp", "topic": "temp", "unit": "C"}, {"id": "rpm", "topic": "rpm", "unit": "rpm"}]
+BASE_MS = 1_700_000_000_000
+
+
+def decoded(records, **kwargs):
+    return [(r.sensor_index, r.timestamp_ms, r.value, r.valid) for r in decode_batch(encode_batch(records, 7, **kwargs)).records]
+
+
+@pytest.mark.parametrize("compression", ["none", "zlib"])
+def test_round_trip(compression):
+    records = [(0, BASE_MS + 500, 21.5, True), (1, BASE_MS, 1500.0, True), (0, BASE_MS + 1000, None, False),
+               (1, BASE_MS + 1000, -3.0, False), (300, BASE_MS + 1000, 0.0, True)]
+    # Timestamps may go backwards between records; deltas are zigzag encoded
+    assert decoded(records, compression=compression) == records
+
+
+def test_compression_code_in_header():
+    assert encode_batch([], 1, compression="none")[3] == COMPRESSION_NONE
+    assert encode_batch([], 1, compression="zlib")[3] == COMPRESSION_ZLIB
+    expected = COMPRESSION_LZ4 if lz4_frame is not None else COMPRESSION_ZLIB
+    assert encode_batch([], 1, compression="lz4")[3] == expected
+
+
+def test_empty_batch():
+    batch = decode_batch(encode_batch([], 42))
+    assert batch.schema == 42 and batch.records == []
+
+
+def test_integral_values_are_exact_beyond_float32():
+    values = [16777217.0, -(2 ** 40), 2.0 ** 53 - 1]
+    records = [(0, BASE_MS, value, True) for value in values]
+    assert [r[2] for r in decoded(records)] == values
+
+
+def test_float_encodings():
+    records = [(0, BASE_MS, 0.1, True), (0, BASE_MS, 1e300, True), (0, BASE_MS, float("inf"), True)]
+    float64 = [r[2] for r in decoded(records, float_encoding="float64")]
+    assert float64 == [0.1, 1e300, float("inf")]
+    float32 = [r[2] for r in decoded(records[:1], float_encoding="float32")]
+    assert float32 == [struct.unpack(">f", struct.pack(">f", 0.1))[0]]
+    # float64 costs four more bytes per value
+    assert len(encode_batch(records[:1], 0, "none", "float64")) == len(encode_batch(records[:1], 0, "none", "float32")) + 4
+
+
+def test_nan_survives():
+    value = decoded([(0, BASE_MS, float("nan"), False)])[0][2]
+    assert value != value
+
+
+def test_not_a_batch_is_rejected():
+    with pytest.raises(ValueError):
+        decode_batch(b"XX\x01\x00\x00\x00\x00\x00")
+
+
+def test_index_schema_follows_the_map():
+    assert index_schema(SENSORS) == index_schema([dict(s) for s in SENSORS])
+    assert index_schema(SENSORS) != index_schema(SENSORS[:1])
+    assert index_schema(SENSORS) != index_schema([SENSORS[0], {**SENSORS[1], "unit": "Hz"}])
+    index = json.loads(encode_index(SENSORS))
+    assert index["schema"] == index_schema(SENSORS) and index["sensors"] == SENSORS
+
+
+def test_decode_with_index():
+    index = encode_index(SENSORS)
+    batch = encode_batch([(1, BASE_MS, 900.0, True)], index_schema(SENSORS))
+    [row] = decode_batch_with_index(batch, index)
+    assert (row["sensor_id"], row["unit"], row["value"], row["valid"]) == ("rpm", "rpm", 900.0, True)
+    assert row["timestamp"].timestamp() == BASE_MS / 1000
+    with pytest.raises(ValueError):
+        decode_batch_with_index(encode_batch([], index_schema(SENSORS[:1])), index)
@@ -0,0 +1,201 @@
+import asyncio
+import json
+import struct
+
+import pytest
+
+from src.capture import capture_file
+from src.capture.capture_file import (CHANNEL, HEADER, MAGIC, MODBUS_BITS, MODBUS_EXCEPTION, MODBUS_FAILURE,
+                                      MODBUS_REGISTERS, NMEA_DATA, CaptureWriter, capture_path, pack_bits,
+                                      read_capture, read_captures, unpack_bits)
+from src.capture.replay import CaptureReplay, ReplayModbusConnection, ReplayModbusPool, ReplayResponse
+from src.collectors.modbus_connection_pool import ModbusReadError
+from src.models.config_models import CaptureConfig
+
+HDT = b"$HEHDT,274.07,T*03\r\n"
+
+
+def write_capture(path, writes, max_bytes=1 << 20):
+    """Runs writes(writer) on an event loop and closes the capture."""
+    async def main():
+        writer = CaptureWriter(str(path), max_bytes)
+        writes(writer)
+        writer.close()
+        return writer
+    return asyncio.run(main())
+
+
+def handmade_capture(path, records):
+    """A capture of (channel definition, capture time ns, kind, payload) records."""
+    channels, data = {}, bytearray(MAGIC)
+    for definition, timestamp_ns, kind, payload in records:
+        key = json.dumps(definition)
+        if key not in channels:
+            channels[key] = len(channels)
+            data += HEADER.pack(CHANNEL, channels[key], timestamp_ns, len(key)) + key.encode()
+        data += HEADER.pack(kind, channels[key], timestamp_ns, len(payload)) + payload
+    path.write_bytes(bytes(data))
+
+
+@pytest.mark.parametrize("count", [0, 1, 7, 8, 9, 2000])
+def test_bits_round_trip(count):
+    bits = [i % 3 == 0 for i in range(count)]
+    assert unpack_bits(pack_bits(bits), count) == bits
+    assert len(pack_bits(bits)) == (count + 7) // 8
+
+
+def test_records_round_trip(tmp_path):
+    def writes(writer):
+        writer.nmea("bridge", HDT[:7])
+        writer.nmea("bridge", HDT[7:])
+        writer.nmea("bridge", HDT, datagram=True)
+        writer.modbus("plc", 1, "holding", 100, 3, ReplayResponse(registers=[1, 0xFFFF, 42]))
+        writer.modbus("plc", 1, "coil", 0, 10, ReplayResponse(bits=[True, False] * 8))
+        writer.modbus("plc", 1, "holding", 100, 3, ReplayResponse(exception_code=2))
+        writer.modbus_failure("plc", 1, "holding", 100, 3, "timeout")
+
+    writer = write_capture(tmp_path / "c.mgwcap", writes)
+    records = list(read_capture(str(tmp_path / "c.mgwcap")))
+    assert writer.records == len(records) == 7
+    assert [r.kind for r in records] == [NMEA_DATA] * 3 + [MODBUS_REGISTERS, MODBUS_BITS, MODBUS_EXCEPTION,
+                                                           MODBUS_FAILURE]
+    assert b"".join(r.payload for r in records[:2]) == HDT
+    assert records[0].channel == {"type": "nmea", "source": "bridge", "datagram": False}
+    assert records[2].channel["datagram"]
+    assert records[3].channel == {"type": "modbus", "device": "plc", "unit": 1, "register_type": "holding",
+                                  "address": 100, "count": 3}
+    assert struct.unpack("<3H", records[3].payload) == (1, 0xFFFF, 42)
+    assert unpack_bits(records[4].payload, 10) == [True, False] * 5
+    assert records[5].payload == b"\x02" and records[6].payload == b"timeout"
+    assert all(a.timestamp_ns <= b.timestamp_ns for a, b in zip(records, records[1:]))
+
+
+def test_reopened_capture_appends(tmp_path):
+    path = tmp_path / "c.mgwcap"
+    write_capture(path, lambda writer: writer.nmea("a", b"1"))
+    write_capture(path, lambda writer: writer.nmea("b", b"2"))
+    assert [(r.channel["source"], r.payload) for r in read_capture(str(path))] == [("a", b"1"), ("b", b"2")]
+
+
+def test_truncated_capture_ends_at_the_last_whole_record(tmp_path):
+    path = tmp_path / "c.mgwcap"
+    write_capture(path, lambda writer: [writer.nmea("a", b"%d" % i) for i in range(3)])
+    path.write_bytes(path.read_bytes()[:-1])
+    assert [r.payload for r in read_capture(str(path))] == [b"0", b"1"]
+
+
+def test_not_a_capture_file(tmp_path):
+    path = tmp_path / "c.mgwcap"
+    path.write_bytes(b"something else")
+    with pytest.raises(ValueError):
+        list(read_capture(str(path)))
+
+
+def test_size_limit_stops_recording(tmp_path):
+    path = tmp_path / "c.mgwcap"
+    writer = write_capture(path, lambda writer: [writer.nmea("a", b"x" * 100) for _ in range(20)], max_bytes=1000)
+    assert writer.full and path.stat().st_size == 0
+
+
+def test_disabled_kinds_are_not_recorded(tmp_path):
+    async def main():
+        writer = CaptureWriter(str(tmp_path / "c.mgwcap"), 1 << 20, modbus=False)
+        writer.modbus_failure("plc", 1, "holding", 0, 1, "timeout")
+        writer.nmea("a", b"1")
+        writer.close()
+        return writer.records
+    assert asyncio.run(main()) == 1
+
+
+def test_captures_merge_by_time(tmp_path):
+    channel = {"type": "nmea", "source": "a", "datagram": False}
+    handmade_capture(tmp_path / "0.mgwcap", [(channel, t, NMEA_DATA, b"%d" % t) for t in (1, 4, 5)])
+    handmade_capture(tmp_path / "1.mgwcap", [(channel, t, NMEA_DATA, b"%d" % t) for t in (2, 3, 6)])
+    paths = [str(tmp_path / "0.mgwcap"), str(tmp_path / "1.mgwcap")]
+    assert [r.timestamp_ns for r in read_captures(paths)] == [1, 2, 3, 4, 5, 6]
+
+
+def test_capture_path():
+    assert capture_path("data/cap.mgwcap", "shard1") == "data/cap-shard1.mgwcap"
+    assert "{timestamp}" not in capture_path("data/cap-{timestamp}.mgwcap")
+
+
+def test_replay_connection_serves_the_last_captured_values():
+    async def main():
+        connection = ReplayModbusConnection("plc")
+        connection.values[(1, "holding")] = {100: 7, 101: 8}
+        assert (await connection.read("holding", 100, 2, 1)).registers == [7, 8]
+        # Registers the capture never saw read as an illegal data address
+        assert (await connection.read("holding", 101, 2, 1)).exception_code == 2
+        assert (await connection.read("holding", 100, 1, 2)).isError()
+
+    asyncio.run(main())
+
+
+class FakeSource:
+    def __init__(self):
+        self.fed = []
+
+    async def feed(self, data, datagram):
+        self.fed.append((data, datagram))
+
+
+def test_replay_paces_by_capture_time(tmp_path):
+    channel = {"type": "nmea", "source": "bridge", "datagram": False}
+    handmade_capture(tmp_path / "c.mgwcap", [(channel, 0, NMEA_DATA, b"a"), (channel, 500_000_000, NMEA_DATA, b"b"),
+                                             ({**channel, "source": "other"}, 1_000_000_000, NMEA_DATA, b"c")])
+
+    async def main(speed):
+        replay = CaptureReplay([str(tmp_path / "c.mgwcap")], {}, speed)
+        source = replay._sources["bridge"] = FakeSource()
+        replay._task = asyncio.create_task(replay._run())
+        await asyncio.wait_for(replay.done.wait(), 5)
+        return replay, source
+
+    replay, source = asyncio.run(main(10.0))
+    assert source.fed == [(b"a", False), (b"b", False)]
+    assert (replay.records, replay.unmatched, replay.capture_span) == (3, 1, 1.0)
+    assert replay.elapsed >= 0.09
+    replay, _ = asyncio.run(main(None))
+    assert replay.elapsed < 0.09
+
+
+def test_replay_polls_a_block_when_its_last_register_arrives(tmp_path):
+    holding = {"type": "modbus", "device": "plc", "unit": 1, "register_type": "holding"}
+    handmade_capture(tmp_path / "c.mgwcap", [
+        ({**holding, "address": 0, "count": 2}, 1, MODBUS_REGISTERS, struct.pack("<2H", 10, 11)),
+        ({**holding, "address": 2, "count": 2}, 2, MODBUS_REGISTERS, struct.pack("<2H", 12, 13)),
+        ({**holding, "address": 0, "count": 4}, 3, MODBUS_FAILURE, b"timeout"),
+    ])
+    reads = []
+
+    async def main():
+        replay = CaptureReplay([str(tmp_path / "c.mgwcap")], {}, None)
+        replay._pool = ReplayModbusPool(["plc"])
+        connection = replay._pool.get("plc")
+
+        async def poll():
+            # The collector's block poll: registers 0-3
+            try:
+                reads.append((await connection.read("holding", 0, 4, 1)).registers)
+            except ModbusReadError as e:
+                reads.append(str(e))
+
+        replay._blocks[("plc", 1, "holding")] = ([3], [poll])
+        replay._task = asyncio.create_task(replay._run())
+        await asyncio.wait_for(replay.done.wait(), 5)
+
+    asyncio.run(main())
+    assert reads == [[10, 11, 12, 13], "timeout"]
+
+
+def test_start_capture_sets_the_active_writer(tmp_path):
+    async def main():
+        writer = capture_file.start_capture(CaptureConfig(path=str(tmp_path / "c-{timestamp}.mgwcap")), "shard0")
+        assert capture_file.ACTIVE is writer and writer.path.endswith("-shard0.mgwcap")
+        capture_file.ACTIVE.nmea("a", b"1")
+        capture_file.stop_capture()
+        assert capture_file.ACTIVE is None
+        return writer.path
+
+    assert [r.payload for r in read_capture(asyncio.run(main()))] == [b"1"]
@@ -0,0 +1,49 @@
+from src.collectors.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+def test_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(3, 2.0, 60.0)
+    assert not breaker.record_failure(0.0)
+    assert not breaker.record_failure(1.0)
+    # A success in between resets the count
+    breaker.record_success()
+    assert not breaker.record_failure(2.0) and not breaker.record_failure(3.0)
+    assert breaker.record_failure(4.0)
+    assert breaker.state == OPEN and breaker.opened_at == 4.0
+    assert not breaker.allow(5.9)
+
+
+def test_half_open_lets_one_probe_through():
+    breaker = CircuitBreaker(1, 2.0, 60.0)
+    breaker.record_failure(0.0)
+    assert breaker.allow(2.0) and breaker.state == HALF_OPEN
+    assert not breaker.allow(2.1)
+    assert breaker.record_success()
+    assert breaker.state == CLOSED and breaker.backoff == 2.0 and breaker.allow(2.2)
+
+
+def test_failed_probes_double_the_backoff_up_to_the_limit():
+    breaker = CircuitBreaker(1, 2.0, 10.0)
+    breaker.record_failure(0.0)
+    now, backoffs = 2.0, []
+    for _ in range(4):
+        assert breaker.allow(now)
+        assert not breaker.record_failure(now)
+        backoffs.append(breaker.backoff)
+        assert not breaker.allow(now + breaker.backoff - 0.01)
+        now += breaker.backoff
+    assert backoffs == [4.0, 8.0, 10.0, 10.0]
+    assert breaker.state == OPEN
+
+
+def test_released_probe_can_be_retried():
+    breaker = CircuitBreaker(1, 1.0, 1.0)
+    breaker.record_failure(0.0)
+    assert breaker.allow(1.0)
+    # Cancelled without an outcome: the next poll probes instead
+    breaker.release()
+    assert breaker.allow(1.1) and breaker.state == HALF_OPEN
+
+
+def test_max_open_is_at_least_the_first_pause():
+    assert CircuitBreaker(1, 5.0, 1.0).max_open_seconds == 5.0
@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+from src import config_loader
+from src.config_reload import ConfigReloader, diff_sensors, duplicate_sensor_ids, restart_only_changes
+from src.models.config_models import AppConfig
+from tests.unit.factories import modbus_sensor
+
+
+@pytest.fixture(autouse=True)
+def no_config_cache(monkeypatch):
+    monkeypatch.setattr(config_loader, "CONFIG_CACHE_PATH", "")
+
+
+def test_diff_sensors_by_id():
+    old = [modbus_sensor("a", 0), modbus_sensor("b", 1), modbus_sensor("c", 2)]
+    new = [modbus_sensor("a", 0), modbus_sensor("b", 5), modbus_sensor("d", 3)]
+    diff = diff_sensors(old, new)
+    assert [s.id for s in diff.added] == ["d"]
+    assert [s.id for s in diff.removed] == ["c"]
+    assert diff.changed == [new[1]]
+    assert str(diff) == "1 added, 1 removed, 1 changed"
+    assert diff_sensors(old, list(old)).is_empty()
+
+
+def test_publisher_only_change_counts_as_changed():
+    diff = diff_sensors([modbus_sensor("a", 0)], [modbus_sensor("a", 0, publisher={"unit": "F"})])
+    assert [s.publisher_config.unit for s in diff.changed] == ["F"]
+
+
+def test_restart_only_changes_ignore_live_sections():
+    old = AppConfig(sensors=[modbus_sensor("a", 0)])
+    new = AppConfig(sensors=[], logging={"level": "DEBUG"})
+    assert restart_only_changes(old, new) == []
+    new = AppConfig(application_name="other", mqtt_publisher={"broker_port": 1884})
+    assert restart_only_changes(old, new) == ["application_name", "mqtt_publisher"]
+
+
+def test_duplicate_sensor_ids():
+    sensors = [modbus_sensor("a", 0), modbus_sensor("b", 1), modbus_sensor("a", 2)]
+    assert duplicate_sensor_ids(sensors) == ["a"]
+
+
+def test_invalid_file_is_rejected_and_not_applied(tmp_path):
+    path = tmp_path / "gateway.yml"
+    path.write_text("application_name: [not, a, string]\n")
+    applied = []
+
+    async def apply(config):
+        applied.append(config)
+
+    assert not asyncio.run(ConfigReloader(path, apply, watch_file=False).reload())
+    assert applied == []
+
+
+def test_failing_apply_is_reported(tmp_path):
+    path = tmp_path / "gateway.yml"
+    path.write_text("application_name: test\n")
+
+    async def apply(config):
+        raise RuntimeError("boom")
+
+    assert not asyncio.run(ConfigReloader(path, apply, watch_file=False).reload())
+
+
+def test_request_and_file_change_trigger_a_reload(tmp_path):
+    path = tmp_path / "gateway.yml"
+    path.write_text("application_name: first\n")
+
+    async def main():
+        applied = []
+
+        async def apply(config):
+            applied.append(config.application_name)
+
+        reloader = ConfigReloader(path, apply, poll_interval=0.02)
+        reloader.start()
+        await asyncio.sleep(0.05)
+        assert applied == []
+        reloader.request()
+        await asyncio.sleep(0.05)
+        assert applied == ["first"]
+        path.write_text("application_name: second, now longer\n")
+        # Loaded once the file stayed the same for a poll
+        await asyncio.sleep(0.2)
+        await reloader.stop()
+        assert applied == ["first", "second, now longer"]
+
+    asyncio.run(main())
@@ -0,0 +1,149 @@
+from src.publishers import disk_spool
+from src.publishers.disk_spool import DiskSpool
+
+SEGMENT_SIZE = 4096
+
+
+def open_spool(path, max_total_bytes=64 * 1024):
+    return DiskSpool(path, SEGMENT_SIZE, max_total_bytes)
+
+
+def drain(spool):
+    payloads = []
+    while (record := spool.peek()) is not None:
+        payloads.append(record.payload)
+        spool.commit()
+    return payloads
+
+
+def test_records_come_back_in_order_with_their_flags(tmp_path):
+    spool = open_spool(tmp_path)
+    spool.append("a/b", b"one")
+    spool.append("a/c", b"two", qos=0, retain=True)
+    record = spool.peek()
+    assert (record.topic, record.payload, record.qos, record.retain) == ("a/b", b"one", 1, False)
+    # Peeking again without commit returns the same record
+    assert spool.peek().payload == b"one"
+    spool.commit()
+    record = spool.peek()
+    assert (record.topic, record.payload, record.qos, record.retain) == ("a/c", b"two", 0, True)
+    spool.commit()
+    assert spool.peek() is None and spool.is_empty()
+
+
+def test_reopened_spool_resumes_after_the_last_commit(tmp_path):
+    spool = open_spool(tmp_path)
+    for i in range(500):
+        spool.append("t", b"%d" % i)
+    for _ in range(200):
+        spool.peek()
+        spool.commit()
+    spool.close()
+    spool = open_spool(tmp_path)
+    assert drain(spool) == [b"%d" % i for i in range(200, 500)]
+
+
+def third_record_offset(data) -> int:
+    pos = disk_spool._HEADER.size
+    for _ in range(2):
+        pos += disk_spool._RECORD_HEADER.size + disk_spool._RECORD_HEADER.unpack_from(data, pos)[0]
+    return pos
+
+
+def write_three_and_tear_the_last(path, tear):
+    spool = open_spool(path)
+    for i in range(3):
+        spool.append("t", b"payload-%d" % i)
+    spool.close()
+    segment = next(path.glob("spool-*.seg"))
+    data = bytearray(segment.read_bytes())
+    tear(data, third_record_offset(data))
+    segment.write_bytes(bytes(data))
+
+
+def test_crash_before_the_record_header_was_written(tmp_path):
+    # Body written, header still zero
+    write_three_and_tear_the_last(tmp_path, lambda data, pos: disk_spool._RECORD_HEADER.pack_into(data, pos, 0, 0))
+    assert drain(open_spool(tmp_path)) == [b"payload-0", b"payload-1"]
+
+
+def test_torn_write_ends_the_segment_at_the_last_whole_record(tmp_path):
+    def corrupt_body(data, pos):
+        data[pos + disk_spool._RECORD_HEADER.size + 3] ^= 0xFF
+
+    write_three_and_tear_the_last(tmp_path, corrupt_body)
+    spool = open_spool(tmp_path)
+    assert drain(spool) == [b"payload-0", b"payload-1"]
+    # New records go after the last whole one, replacing the torn record
+    spool.append("t", b"after-crash")
+    spool.close()
+    assert drain(open_spool(tmp_path)) == [b"after-crash"]
+
+
+def test_records_roll_over_into_new_segments(tmp_path):
+    spool = open_spool(tmp_path)
+    payloads = [bytes([i]) * 500 for i in range(20)]
+    for payload in payloads:
+        spool.append("t", payload)
+    assert len(list(tmp_path.glob("spool-*.seg"))) > 1
+    assert drain(spool) == payloads
+    # Consumed segments are deleted, the write target is kept
+    assert len(list(tmp_path.glob("spool-*.seg"))) == 1
+
+
+def test_size_cap_evicts_the_oldest_segment(tmp_path):
+    spool = open_spool(tmp_path, max_total_bytes=2 * SEGMENT_SIZE)
+    for i in range(30):
+        spool.append("t", bytes([i]) * 500)
+    assert spool.evicted_segments > 0
+    remaining = drain(spool)
+    assert remaining[-1] == bytes([29]) * 500
+    assert len(remaining) < 30
+
+
+def test_oversized_record_is_rejected(tmp_path):
+    spool = open_spool(tmp_path)
+    assert not spool.append("t", b"x" * SEGMENT_SIZE)
+    assert spool.is_empty()
+
+
+def test_commit_through_consumes_only_acknowledged_records(tmp_path):
+    spool = open_spool(tmp_path)
+    for i in range(4):
+        spool.append("t", b"%d" % i)
+    positions = []
+    for _ in range(4):
+        spool.peek()
+        positions.append(spool.advance())
+    assert spool.peek() is None
+    # Sent, but only the first two acknowledged
+    spool.commit_through(positions[1])
+    assert not spool.is_empty()
+    spool.rewind()
+    assert drain(spool) == [b"2", b"3"]
+    spool.close()
+    assert open_spool(tmp_path).is_empty()
+
+
+def test_sent_but_unacknowledged_records_survive_a_restart(tmp_path):
+    spool = open_spool(tmp_path)
+    spool.append("t", b"sent")
+    spool.peek()
+    spool.advance()
+    assert not spool.is_empty()
+    spool.close()
+    assert drain(open_spool(tmp_path)) == [b"sent"]
+
+
+def test_commit_through_across_segments(tmp_path):
+    spool = open_spool(tmp_path)
+    payloads = [bytes([i]) * 500 for i in range(12)]
+    for payload in payloads:
+        spool.append("t", payload)
+    last = None
+    for _ in range(10):
+        spool.peek()
+        last = spool.advance()
+    spool.commit_through(last)
+    spool.rewind()
+    assert drain(spool) == payloads[10:]
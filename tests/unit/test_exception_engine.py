@@ -0,0 +1,97 @@
+from src.models.sensor_reading import STATUS_INVALID, SensorDescriptor, SensorReading
+from src.publishers.exception_engine import ExceptionEngine
+from tests.unit.factories import modbus_sensor
+
+HOUR = 3600
+
+
+def engine_for(**publisher):
+    publisher.setdefault("min_publish_interval_seconds", HOUR)
+    sensor = modbus_sensor("s", 0, publisher=publisher)
+    return ExceptionEngine("gw", 60, [sensor]), SensorDescriptor.from_config(sensor, 0)
+
+
+def published(engine, descriptor, values, now=0.0):
+    """Values reported for a series sampled once a second; None marks an invalid reading."""
+    readings = [SensorReading(descriptor, value, STATUS_INVALID if value is None else 0, (t + 1) * 10 ** 9)
+                for t, value in enumerate(values)]
+    return [reading.value for _, reading in engine.evaluate_batch(readings, now)]
+
+
+def test_absolute_deadband():
+    engine, descriptor = engine_for(change_threshold=0.5)
+    # Compared against the last published value, not the previous reading
+    assert published(engine, descriptor, [10.0, 10.3, 10.6, 10.4, 11.0, 11.2]) == [10.0, 10.6, 11.2]
+
+
+def test_percent_of_span():
+    engine, descriptor = engine_for(change_threshold=10, exception_mode="percent_of_span", span_low=0, span_high=20)
+    assert published(engine, descriptor, [5.0, 6.5, 7.1, 9.2]) == [5.0, 7.1, 9.2]
+
+
+def test_min_interval_publishes_an_unchanged_value():
+    engine, descriptor = engine_for(change_threshold=1.0, min_publish_interval_seconds=30)
+    assert published(engine, descriptor, [1.0], now=100.0) == [1.0]
+    assert published(engine, descriptor, [1.0], now=110.0) == []
+    assert published(engine, descriptor, [1.0], now=130.0) == [1.0]
+
+
+def test_valid_invalid_transitions_are_reported():
+    engine, descriptor = engine_for(change_threshold=5.0)
+    assert published(engine, descriptor, [1.0, None, None, 1.0, 1.0]) == [1.0, None, 1.0]
+
+
+def test_forget_republishes_the_next_value():
+    engine, descriptor = engine_for(change_threshold=5.0)
+    assert published(engine, descriptor, [1.0]) == [1.0]
+    engine.forget(0)
+    assert published(engine, descriptor, [1.0]) == [1.0]
+
+
+def test_swinging_door_against_a_hand_computed_series():
+    # Deviation 1, one sample a second, pivot (t1, 0):
+    #   t2 0.5: slopes [-0.5, 1.5]        t3 1.0: [0, 1]        t4 1.5: [1/6, 5/6]
+    #   t5 5.0: 1 > 5/6, door closes -> publish held t4 (1.5); pivot (t4, 1.5), slopes [2.5, 4.5]
+    #   t6 5.0: (5-1-1.5)/2 = 1.25 -> [2.5, 2.25] closes -> publish held t5 (5.0); slopes [-1, 1]
+    #   t7 5.0: [-0.5, 0.5], held
+    engine, descriptor = engine_for(change_threshold=1.0, exception_mode="swinging_door")
+    values = [0.0, 0.5, 1.0, 1.5, 5.0, 5.0, 5.0]
+    readings = [SensorReading(descriptor, v, timestamp_ns=(t + 1) * 10 ** 9) for t, v in enumerate(values)]
+    reported = engine.evaluate_batch(readings, 0.0)
+    assert [(r.timestamp_ns // 10 ** 9, r.value) for _, r in reported] == [(1, 0.0), (4, 1.5), (5, 5.0)]
+    # An invalid reading flushes the held point before the transition
+    invalid = SensorReading(descriptor, None, STATUS_INVALID, 8 * 10 ** 9)
+    reported = engine.evaluate_batch([invalid], 0.0)
+    assert [(r.timestamp_ns // 10 ** 9, r.value) for _, r in reported] == [(7, 5.0), (8, None)]
+
+
+def test_swinging_door_publishes_only_the_corner_of_a_ramp():
+    engine, descriptor = engine_for(change_threshold=0.1, exception_mode="swinging_door")
+    # A ramp fits the door until it turns flat
+    values = [float(t) for t in range(10)] + [9.0] * 5
+    assert published(engine, descriptor, values) == [0.0, 9.0]
+
+
+def test_unknown_sensor_is_registered_on_first_reading():
+    engine = ExceptionEngine("gw", 60)
+    descriptor = SensorDescriptor(-1, "new", "V", "new", 0.0)
+    assert published(engine, descriptor, [1.0, 1.0, 2.0]) == [1.0, 2.0]
+    assert engine.topics == ["gw/new"] and engine.sensor_count() == 1
+
+
+def test_configure_retunes_in_place():
+    sensor = modbus_sensor("s", 0, publisher={"change_threshold": 5.0, "min_publish_interval_seconds": HOUR})
+    engine = ExceptionEngine("gw", 60, [sensor])
+    descriptor = SensorDescriptor.from_config(sensor, 0)
+    assert published(engine, descriptor, [1.0, 3.0]) == [1.0]
+    retuned = modbus_sensor("s", 0, publisher={"change_threshold": 1.0, "min_publish_interval_seconds": HOUR,
+                                               "mqtt_topic_suffix": "renamed"})
+    assert engine.configure(retuned) == 0
+    # The last published value (1.0) is kept
+    assert published(engine, descriptor, [1.5, 3.0]) == [3.0]
+    assert engine.topics == ["gw/renamed"]
+
+
+def test_readings_without_topic_are_skipped():
+    engine = ExceptionEngine("gw", 60)
+    assert published(engine, SensorDescriptor(-1, "x", "V"), [1.0]) == []
@@ -0,0 +1,136 @@
+import asyncio
+import time
+
+import pytest
+
+from src.history.http_api import HistoryApi, parse_time
+from src.history.store import HistoryStore
+from src.models.config_models import HistoryConfig
+from src.models.sensor_reading import STATUS_INVALID, SensorDescriptor, SensorReading
+from src.utils.http_server import HttpRequest
+
+NS = 1_000_000_000
+# Readings start at a whole hour within the raw retention
+HOUR_START = (time.time_ns() // (3600 * NS) - 2) * 3600 * NS
+TEMP = SensorDescriptor(0, "temp", "C")
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = HistoryStore(HistoryConfig(path=str(tmp_path / "history.sqlite3"), flush_interval_seconds=0.02,
+                                       rollup_intervals_seconds=[60, 3600]))
+    store.start()
+    yield store
+    store.stop()
+
+
+def written(store, readings, new_rows=None):
+    """Appends readings and waits until the writer committed new_rows (default: all) of them."""
+    target = store.written + (len(readings) if new_rows is None else new_rows)
+    store.append(readings)
+    deadline = time.monotonic() + 5
+    while store.written < target:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def series(descriptor, seconds, step=10, value=lambda t: float(t % 97)):
+    return [SensorReading(descriptor, value(t), timestamp_ns=HOUR_START + t * NS) for t in range(0, seconds, step)]
+
+
+def test_rollups_match_the_raw_readings(store):
+    written(store, series(TEMP, 7200))
+    for step in (60, 120, 3600):
+        interval, buckets = store.query_downsample("temp", HOUR_START, HOUR_START + 7200 * NS, step)
+        assert interval == (3600 if step == 3600 else 60)
+        store.config.rollup_intervals_seconds = []
+        raw_interval, raw = store.query_downsample("temp", HOUR_START, HOUR_START + 7200 * NS, step)
+        store.config.rollup_intervals_seconds = [60, 3600]
+        assert raw_interval is None and buckets == raw
+    assert store.query_downsample("temp", HOUR_START, HOUR_START + 7200 * NS, 3600)[1][0][:2] == (HOUR_START, 360)
+
+
+def test_duplicates_are_recorded_and_rolled_up_once(store):
+    readings = series(TEMP, 120)
+    first = SensorReading(TEMP, 1000.0, timestamp_ns=HOUR_START + 130 * NS)
+    again = SensorReading(TEMP, -1000.0, timestamp_ns=HOUR_START + 130 * NS)
+    written(store, readings + [first, again], new_rows=len(readings) + 1)
+    # A replay after a restart writes the same readings again, followed by one new reading
+    later = SensorReading(TEMP, 0.0, timestamp_ns=HOUR_START + 140 * NS)
+    written(store, readings + [again, later], new_rows=1)
+    assert store.written == len(readings) + 2
+    readings.append(later)
+    rows = store.query_range("temp", HOUR_START, HOUR_START + 3600 * NS, 1000)
+    assert len(rows) == len(readings) + 1 and rows[-2][1] == 1000.0
+    _, [(bucket, count, low, high, total)] = store.query_downsample("temp", HOUR_START, HOUR_START + 3600 * NS, 3600)
+    assert (count, low, high) == (len(readings) + 1, 0.0, 1000.0)
+    assert total == sum(r.value for r in readings) + 1000.0
+
+
+def test_invalid_readings_are_kept_raw_but_not_rolled_up(store):
+    written(store, [SensorReading(TEMP, 5.0, timestamp_ns=HOUR_START),
+                    SensorReading(TEMP, None, STATUS_INVALID, HOUR_START + NS)])
+    assert store.query_range("temp", HOUR_START, HOUR_START + 60 * NS, 10) == [(HOUR_START, 5.0, 0),
+                                                                               (HOUR_START + NS, None, STATUS_INVALID)]
+    assert store.query_downsample("temp", HOUR_START, HOUR_START + 60 * NS, 60)[1] == [(HOUR_START, 1, 5.0, 5.0, 5.0)]
+
+
+def test_sensors_and_units(store):
+    written(store, series(TEMP, 30) + series(SensorDescriptor(1, "rpm", "rpm"), 20))
+    assert store.sensors() == [("rpm", "rpm", HOUR_START, HOUR_START + 10 * NS),
+                               ("temp", "C", HOUR_START, HOUR_START + 20 * NS)]
+    assert store.unit("temp") == "C" and store.unit("missing") is None
+
+
+def test_data_survives_a_restart(store):
+    written(store, series(TEMP, 60))
+    store.stop()
+    store.start()
+    assert len(store.query_range("temp", HOUR_START, HOUR_START + 60 * NS, 100)) == 6
+
+
+def test_retention_removes_expired_raw_readings_and_keeps_rollups(tmp_path):
+    config = HistoryConfig(path=str(tmp_path / "history.sqlite3"), flush_interval_seconds=0.02,
+                           raw_retention_hours=1)
+    store = HistoryStore(config)
+    store.start()
+    old = SensorReading(TEMP, 1.0, timestamp_ns=time.time_ns() - 2 * 3600 * NS)
+    recent = SensorReading(TEMP, 2.0, timestamp_ns=time.time_ns() - 60 * NS)
+    written(store, [old, recent])
+    store.stop()
+    # Retention runs when the writer starts
+    store.start()
+    time.sleep(0.1)
+    assert [row[1] for row in store.query_range("temp", 0, time.time_ns(), 10)] == [2.0]
+    assert sum(b[1] for b in store.query_downsample("temp", 0, time.time_ns(), 3600)[1]) == 2
+    store.stop()
+
+
+def test_pending_readings_beyond_the_limit_drop_the_oldest(tmp_path):
+    store = HistoryStore(HistoryConfig(path=str(tmp_path / "history.sqlite3"), max_pending_readings=1000))
+    store.append(series(TEMP, 15000))
+    assert store.dropped == 500 and store._pending[0].timestamp_ns == HOUR_START + 5000 * NS
+
+
+def test_downsample_source_picks_the_coarsest_dividing_rollup(store):
+    assert store.downsample_source(7200) == 3600
+    assert store.downsample_source(300) == 60
+    assert store.downsample_source(90) is None
+
+
+def test_parse_time():
+    assert parse_time(None, 7) == 7
+    assert parse_time("1.5", 0) == 1_500_000_000
+    assert parse_time("1970-01-01T00:00:02Z", 0) == parse_time("1970-01-01T00:00:02", 0) == 2 * NS
+    for text in ("inf", "-inf", "nan", "1e400", "1e300", "9999-12-31T00:00:00"):
+        with pytest.raises(ValueError):
+            parse_time(text, 0)
+
+
+@pytest.mark.parametrize("query", [{"start": "inf"}, {"end": "1e400"}, {"start": "nan"}, {"start": "tomorrow"},
+                                   {"start": "10", "end": "5"}])
+def test_api_rejects_bad_times_with_a_400(store, query):
+    api = HistoryApi(store, store.config)
+    for route in (api._range, api._downsample):
+        response = asyncio.run(route(HttpRequest("GET", "/history/range", {"sensor": "temp", **query})))
+        assert response.status == 400
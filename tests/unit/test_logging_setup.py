@@ -0,0 +1,104 @@
+import logging
+import queue
+
+import pytest
+
+from src.models.config_models import LoggingConfig
+from src.utils import logging_setup
+from src.utils.logging_setup import RepeatFilter, _DeferredQueueHandler, setup_logging, stop_logging
+
+
+def record(msg, created, lineno=10, args=(), name="gw", level=logging.WARNING):
+    log_record = logging.LogRecord(name, level, __file__, lineno, msg, args, None)
+    log_record.created = created
+    return log_record
+
+
+def test_repeats_are_suppressed_within_the_window():
+    repeats = RepeatFilter(10.0)
+    assert repeats.filter(record("Bad frame %r", 0.0, args=(b"\x01",)))
+    assert not repeats.filter(record("Bad frame %r", 1.0, args=(b"\x01",)))
+    assert not repeats.filter(record("Bad frame %r", 9.9, args=(b"\x01",)))
+    assert repeats.suppressed == 2
+    after = record("Bad frame %r", 12.0, args=(b"\x01",))
+    assert repeats.filter(after)
+    assert after.getMessage() == "Bad frame b'\\x01' [2 more like this suppressed in the last 12s]"
+
+
+def test_other_arguments_sites_and_levels_are_not_repeats():
+    repeats = RepeatFilter(10.0)
+    assert repeats.filter(record("x", 0.0))
+    assert repeats.filter(record("x", 0.0, lineno=11))
+    assert repeats.filter(record("x", 0.0, level=logging.ERROR))
+    assert repeats.filter(record("x", 0.0, name="other"))
+    assert repeats.filter(record(ValueError("not a string"), 0.0))
+    assert repeats.filter(record(ValueError("not a string"), 0.0))
+    # One call site tripping the breaker of two units
+    assert repeats.filter(record("Modbus '%s' unit %d: pausing", 0.0, args=("plc", 1)))
+    assert repeats.filter(record("Modbus '%s' unit %d: pausing", 0.0, args=("plc", 2)))
+    assert not repeats.filter(record("Modbus '%s' unit %d: pausing", 1.0, args=("plc", 1)))
+
+
+def test_unhashable_arguments_are_compared_formatted():
+    repeats = RepeatFilter(10.0)
+    assert repeats.filter(record("values %s", 0.0, args=([1],)))
+    assert not repeats.filter(record("values %s", 1.0, args=([1],)))
+    assert repeats.filter(record("values %s", 1.0, args=([2],)))
+    assert repeats.pending() == [("gw", logging.WARNING, "values [1]", 1)]
+
+
+def test_pending_reports_and_clears_suppressed_counts():
+    repeats = RepeatFilter(10.0)
+    for created in (0.0, 1.0, 2.0):
+        repeats.filter(record("again", created))
+    repeats.filter(record("once", 0.0, lineno=20))
+    assert repeats.pending() == [("gw", logging.WARNING, "again", 2)]
+    assert repeats.pending() == []
+
+
+def test_tracked_sites_are_pruned(monkeypatch):
+    monkeypatch.setattr(logging_setup, "_MAX_TRACKED_SITES", 3)
+    repeats = RepeatFilter(1.0)
+    for line in range(3):
+        repeats.filter(record("x", 0.0, lineno=line))
+    repeats.filter(record("x", 5.0, lineno=99))
+    assert len(repeats._sites) == 1
+
+
+def test_full_queue_drops_records_unformatted():
+    handler = _DeferredQueueHandler(queue.Queue(1))
+    args = ([1],)
+    first = record("value %s", 0.0, args=args)
+    handler.emit(first)
+    handler.emit(record("value %s", 0.0))
+    assert handler.dropped == 1
+    queued = handler.queue.get_nowait()
+    assert queued is first and queued.msg == "value %s" and queued.args is args
+
+
+@pytest.fixture
+def restore_root_logger():
+    root = logging.getLogger()
+    handlers, level = root.handlers[:], root.level
+    yield
+    stop_logging()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    for handler in handlers:
+        root.addHandler(handler)
+    root.setLevel(level)
+    logging_setup._repeats = None
+
+
+def test_queued_logging_writes_repeat_summaries_on_stop(capsys, restore_root_logger):
+    setup_logging(LoggingConfig(format="%(levelname)s %(message)s", queue_size=100, repeat_window_seconds=60))
+    logger = logging.getLogger("gw.test")
+    for i in range(5):
+        logger.warning("Checksum mismatch on frame %d", i // 4)
+    stop_logging()
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[1:] == ["WARNING Checksum mismatch on frame 0", "WARNING Checksum mismatch on frame 1",
+                         "WARNING 3 more like this suppressed: Checksum mismatch on frame 0"]
+    # Logging is synchronous after the stop
+    logger.warning("late")
+    assert capsys.readouterr().out == "WARNING late\n"
@@ -0,0 +1,84 @@
+import json
+
+import pytest
+
+from src.metrics.registry import MetricsRegistry, _Metric
+
+
+def test_counter_and_gauge_exposition():
+    registry = MetricsRegistry()
+    counter = registry.counter("reads_total", "Reads", ["unit"])
+    counter.labels(1).inc()
+    counter.labels(1).inc(2)
+    counter.labels("2").inc()
+    gauge = registry.gauge("depth", 'Queue "depth"')
+    gauge.set(5)
+    gauge.dec()
+    assert registry.to_prometheus_text().splitlines() == [
+        "# HELP reads_total Reads",
+        "# TYPE reads_total counter",
+        'reads_total{unit="1"} 3',
+        'reads_total{unit="2"} 1',
+        '# HELP depth Queue \\"depth\\"',
+        "# TYPE depth gauge",
+        "depth 4",
+    ]
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("latency", "Latency", buckets=[0.1, 0.01])
+    for value in (0.005, 0.01, 0.05, 3.0):
+        histogram.observe(value)
+    samples = {(name, labels.get("le")): value for name, labels, value in histogram.samples()}
+    assert samples[("latency_bucket", "0.01")] == 2
+    assert samples[("latency_bucket", "0.1")] == 3
+    assert samples[("latency_bucket", "+Inf")] == 4
+    assert samples[("latency_count", None)] == 4
+    assert samples[("latency_sum", None)] == pytest.approx(3.065)
+
+
+def test_labels_must_match_labelnames():
+    counter = MetricsRegistry().counter("c", "C", ["a", "b"])
+    with pytest.raises(ValueError):
+        counter.labels("only-one")
+
+
+def test_registering_a_name_again_returns_the_same_metric():
+    registry = MetricsRegistry()
+    assert registry.counter("c", "C") is registry.counter("c", "C")
+    with pytest.raises(ValueError):
+        registry.gauge("c", "C")
+
+
+def test_metric_base_is_abstract():
+    with pytest.raises(TypeError):
+        _Metric("m", "M")
+
+
+def test_function_gauge_failure_is_nan_in_text_and_null_in_snapshot():
+    registry = MetricsRegistry()
+    registry.gauge("broken", "Broken").set_function(lambda: 1 / 0)
+    registry.gauge("connected", "Connected").set_function(lambda: True)
+    assert "broken NaN" in registry.to_prometheus_text()
+    snapshot = registry.snapshot()
+    assert snapshot["broken"] is None and snapshot["connected"] == 1.0
+    json.loads(json.dumps(snapshot, allow_nan=False))
+
+
+def test_snapshot_summarizes_histograms():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("latency", "Latency", ["stage"], buckets=[0.001, 0.01, 0.1])
+    child = histogram.labels("publish")
+    for _ in range(98):
+        child.observe(0.0005)
+    child.observe(0.05)
+    child.observe(7.0)
+    snapshot = registry.snapshot()
+    assert snapshot['latency{stage="publish"}.count'] == 100
+    assert snapshot['latency{stage="publish"}.p50'] == 0.001
+    assert snapshot['latency{stage="publish"}.p99'] == 0.1
+    # Beyond the last bucket there is no finite estimate
+    child.observe(7.0)
+    assert registry.snapshot()['latency{stage="publish"}.p99'] is None
+    json.loads(json.dumps(registry.snapshot(), allow_nan=False))
@@ -0,0 +1,80 @@
+import struct
+
+import pytest
+
+from src.collectors.modbus_decoding import DATA_TYPES, BlockDecoder
+from src.models.config_models import SensorModbusCollectorParams
+
+ORDERS = [("big", "big"), ("little", "little"), ("big", "little"), ("little", "big")]
+SAMPLES = {"uint16": 0xBEEF, "int16": -1234, "uint32": 0xDEADBEEF, "int32": -123456789, "float32": 1.5,
+           "uint64": 0x0123456789ABCDEF, "int64": -(2 ** 62) + 7, "float64": -2.718281828459045}
+
+
+def params(data_type, word_order="big", byte_order="big", **kwargs):
+    return SensorModbusCollectorParams(register_address=0, data_type=data_type, word_order=word_order,
+                                       byte_order=byte_order, **kwargs)
+
+
+def encode(value, data_type, word_order="big", byte_order="big"):
+    """Registers a device with the given word and byte order would return for value."""
+    raw = struct.pack(">" + DATA_TYPES[data_type][0], value)
+    words = [raw[i:i + 2] for i in range(0, len(raw), 2)]
+    if word_order == "little":
+        words.reverse()
+    if byte_order == "little":
+        words = [word[::-1] for word in words]
+    return [int.from_bytes(word, "big") for word in words]
+
+
+@pytest.mark.parametrize("word_order,byte_order", ORDERS)
+@pytest.mark.parametrize("data_type", list(SAMPLES))
+def test_round_trip(data_type, word_order, byte_order):
+    decoder = BlockDecoder([params(data_type, word_order, byte_order)], [0])
+    assert decoder.decode(encode(SAMPLES[data_type], data_type, word_order, byte_order)) == [SAMPLES[data_type]]
+
+
+def test_float32_word_swapped_known_registers():
+    # 123.456 is 0x42F6E979; CDAB devices send the low word first
+    decoder = BlockDecoder([params("float32", "little", "big")], [0])
+    assert decoder.decode([0xE979, 0x42F6])[0] == pytest.approx(123.456, rel=1e-6)
+
+
+def test_mixed_layouts_in_one_block():
+    sensors = [(params("float32", "little", "big"), 10), (params("int16"), 0), (params("uint32", "big", "little"), 4),
+               (params("float64", "little", "little"), 20), (params("uint16"), 2)]
+    registers = [0] * 24
+    values = [2.5, -7, 0xCAFEBABE, 1e100, 65535]
+    for (p, offset), value in zip(sensors, values):
+        encoded = encode(value, p.data_type, p.word_order, p.byte_order)
+        registers[offset:offset + len(encoded)] = encoded
+    decoder = BlockDecoder([p for p, _ in sensors], [offset for _, offset in sensors])
+    assert decoder.decode(registers) == values
+
+
+def test_bit_masks_on_one_register_scale_and_offset():
+    sensors = [params("uint16", bit_mask=0x00F0), params("uint16", bit_mask=0x8000),
+               params("uint16", scale=0.1, offset=-40.0), params("int16", bit_mask=0x0003, scale=2.0)]
+    decoder = BlockDecoder(sensors, [0, 0, 1, 2])
+    assert decoder.decode([0x80A5, 650, 0xFFFE]) == [0xA, 1, pytest.approx(25.0), 4.0]
+
+
+def test_non_finite_floats_are_invalid():
+    decoder = BlockDecoder([params("float32"), params("float64", scale=2.0)], [0, 2])
+    registers = encode(float("nan"), "float32") + encode(float("inf"), "float64")
+    assert decoder.decode(registers) == [None, None]
+
+
+def test_short_response_decodes_what_arrived():
+    decoder = BlockDecoder([params("uint16"), params("uint32"), params("uint16")], [0, 1, 3])
+    assert decoder.decode([1, 0, 2]) == [1, 2, None]
+    assert decoder.decode([]) == [None, None, None]
+
+
+def test_bit_blocks():
+    decoder = BlockDecoder([params("bool", register_type="coil")] * 3, [0, 5, 9], bits=True)
+    assert decoder.decode([True, False, False, False, False, True, False]) == [1, 1, None]
+
+
+def test_bit_mask_needs_an_integer_type():
+    with pytest.raises(ValueError):
+        params("float32", bit_mask=1)
@@ -0,0 +1,51 @@
+from src.collectors.modbus_read_planner import MODBUS_MAX_READ_BITS, MODBUS_MAX_READ_REGISTERS, plan_reads
+from tests.unit.factories import modbus_sensor
+
+
+def spans(blocks):
+    return [(b.start_address, b.count) for b in blocks]
+
+
+def test_adjacent_registers_share_one_read():
+    blocks = plan_reads([modbus_sensor(f"s{a}", a) for a in (12, 10, 11)], 1, 5.0)
+    assert spans(blocks) == [(10, 3)]
+    assert [(p.sensor.id, p.offset) for p in blocks[0].sensors] == [("s10", 0), ("s11", 1), ("s12", 2)]
+
+
+def test_gap_is_bridged_only_up_to_max_gap():
+    sensors = [modbus_sensor("a", 0), modbus_sensor("b", 3)]
+    assert spans(plan_reads(sensors, 1, 5.0, max_gap=1)) == [(0, 1), (3, 1)]
+    assert spans(plan_reads(sensors, 1, 5.0, max_gap=2)) == [(0, 4)]
+
+
+def test_blocks_split_at_125_registers():
+    sensors = [modbus_sensor(f"s{a}", a) for a in range(300)]
+    blocks = plan_reads(sensors, 1, 5.0)
+    assert spans(blocks) == [(0, 125), (125, 125), (250, 50)]
+    assert all(b.count <= MODBUS_MAX_READ_REGISTERS for b in blocks)
+
+
+def test_max_block_size_cannot_exceed_the_protocol_limit():
+    sensors = [modbus_sensor(f"s{a}", a) for a in range(200)]
+    assert spans(plan_reads(sensors, 1, 5.0, max_block_size=1000)) == [(0, 125), (125, 75)]
+    assert spans(plan_reads(sensors, 1, 5.0, max_block_size=100)) == [(0, 100), (100, 100)]
+
+
+def test_multi_register_value_is_never_split():
+    sensors = [modbus_sensor(f"s{a}", a) for a in range(124)] + [modbus_sensor("wide", 124, data_type="float32")]
+    blocks = plan_reads(sensors, 1, 5.0)
+    assert spans(blocks) == [(0, 124), (124, 2)]
+    assert blocks[1].sensors[0].register_count == 2
+
+
+def test_groups_by_device_unit_type_and_interval():
+    sensors = [modbus_sensor("a", 0), modbus_sensor("b", 1, unit_id=2), modbus_sensor("c", 2, polling_interval_seconds=1.0),
+               modbus_sensor("d", 3, register_type="input"), modbus_sensor("e", 4, device="plc2")]
+    blocks = plan_reads(sensors, 1, 5.0)
+    assert len(blocks) == 5
+    assert len({b.key for b in blocks}) == 5
+
+
+def test_bit_registers_are_planned_in_bits():
+    sensors = [modbus_sensor(f"c{a}", a, register_type="coil") for a in range(MODBUS_MAX_READ_BITS + 10)]
+    assert spans(plan_reads(sensors, 1, 5.0)) == [(0, MODBUS_MAX_READ_BITS), (MODBUS_MAX_READ_BITS, 10)]
@@ -0,0 +1,137 @@
+import asyncio
+import struct
+
+import pytest
+
+from src.collectors.modbus_tcp_client import PipelinedModbusTcpClient
+
+_MBAP = struct.Struct(">HHHB")
+_REQUEST = struct.Struct(">HHHBBHH")
+
+
+async def serve(respond):
+    """Fake slave: respond(tid, unit, function code, address, count) returns the raw response frames."""
+    async def handle(reader, writer):
+        while True:
+            try:
+                tid, _pid, _length, unit, fc, address, count = _REQUEST.unpack(await reader.readexactly(_REQUEST.size))
+            except (asyncio.IncompleteReadError, ConnectionError):
+                return
+            writer.write(respond(tid, unit, fc, address, count))
+            await writer.drain()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    return server, server.sockets[0].getsockname()[1]
+
+
+def frame(tid, unit, pdu):
+    return _MBAP.pack(tid, 0, len(pdu) + 1, unit) + pdu
+
+
+def registers(tid, unit, fc, address, count):
+    return frame(tid, unit, bytes([fc, 2 * count]) + b"".join(struct.pack(">H", address + i) for i in range(count)))
+
+
+async def connected_client(respond, timeout=1.0):
+    server, port = await serve(respond)
+    client = PipelinedModbusTcpClient("127.0.0.1", port, timeout=timeout)
+    assert await client.connect()
+    return server, client
+
+
+def test_concurrent_reads_are_matched_by_transaction_id():
+    held = []
+
+    def respond(tid, unit, fc, address, count):
+        # Answer in reverse order once both requests are in
+        held.append(registers(tid, unit, fc, address, count))
+        return b"".join(reversed(held)) if len(held) == 2 else b""
+
+    async def main():
+        server, client = await connected_client(respond)
+        first, second = await asyncio.gather(client.read_holding_registers(10, 2, 1),
+                                             client.read_holding_registers(20, 3, 1))
+        assert first.registers == [10, 11]
+        assert second.registers == [20, 21, 22]
+        client.close()
+        server.close()
+
+    asyncio.run(main())
+
+
+def test_exception_response_is_returned():
+    async def main():
+        server, client = await connected_client(lambda tid, unit, fc, a, c: frame(tid, unit, bytes([fc | 0x80, 2])))
+        result = await client.read_input_registers(0, 1, 1)
+        assert result.isError() and result.exception_code == 2
+        assert client.connected
+        client.close()
+        server.close()
+
+    asyncio.run(main())
+
+
+def test_coils_are_unpacked_lsb_first():
+    async def main():
+        server, client = await connected_client(lambda tid, unit, fc, a, c: frame(tid, unit, bytes([fc, 2, 0b00000101, 0b1])))
+        result = await client.read_coils(0, 9, 1)
+        assert result.bits == [True, False, True, False, False, False, False, False, True]
+        client.close()
+        server.close()
+
+    asyncio.run(main())
+
+
+@pytest.mark.parametrize("respond", [
+    lambda tid, unit, fc, a, c: registers(tid, unit, 4, a, c),                          # wrong function code
+    lambda tid, unit, fc, a, c: registers(tid, unit, fc, a, c - 1),                      # short byte count
+    lambda tid, unit, fc, a, c: frame(tid, unit, bytes([fc, 2 * c]) + b"\x00" * (2 * c - 1)),   # truncated data
+    lambda tid, unit, fc, a, c: registers(tid, unit + 1, fc, a, c),                      # other unit
+    lambda tid, unit, fc, a, c: frame(tid, unit, bytes([fc | 0x80, 2, 0])),              # oversized exception
+    lambda tid, unit, fc, a, c: _MBAP.pack(tid, 0, 4000, unit) + bytes([fc, 2 * c]),     # bad MBAP length
+    lambda tid, unit, fc, a, c: _MBAP.pack(tid, 7, 3 + 2 * c, unit) + bytes([fc, 2 * c]) + b"\x00" * 2 * c,   # protocol id
+])
+def test_mismatched_response_fails_all_pending_and_drops_the_connection(respond):
+    async def main():
+        server, client = await connected_client(respond)
+        results = await asyncio.gather(*(client.read_holding_registers(0, 2, 1) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(r, ConnectionError) for r in results)
+        assert not client.connected
+        server.close()
+
+    asyncio.run(main())
+
+
+def test_reconnects_after_an_abort():
+    mode = {"function_code": None}
+
+    def respond(tid, unit, fc, address, count):
+        return registers(tid, unit, mode["function_code"] or fc, address, count)
+
+    async def main():
+        server, client = await connected_client(respond)
+        mode["function_code"] = 4
+        with pytest.raises(ConnectionError):
+            await client.read_holding_registers(0, 1, 1)
+        mode["function_code"] = None
+        assert await client.connect()
+        # The old connection's close must not disconnect the new one
+        await asyncio.sleep(0.05)
+        assert client.connected
+        assert (await client.read_holding_registers(5, 1, 1)).registers == [5]
+        client.close()
+        server.close()
+
+    asyncio.run(main())
+
+
+def test_read_times_out_without_response():
+    async def main():
+        server, client = await connected_client(lambda *request: b"", timeout=0.05)
+        with pytest.raises(asyncio.TimeoutError):
+            await client.read_holding_registers(0, 1, 1)
+        assert client.connected
+        client.close()
+        server.close()
+
+    asyncio.run(main())
@@ -0,0 +1,155 @@
+import asyncio
+import struct
+
+import pytest
+
+from benchmarks.standins.mqtt_broker import MqttBrokerStandIn
+from src.publishers.mqtt_async_client import (MQTT_V5, PROP_RECEIVE_MAXIMUM, AsyncMqttClient, decode_varint,
+                                              encode_string, encode_varint)
+from tests.unit.scripted_broker import ScriptedBroker
+
+_U16 = struct.Struct(">H")
+
+
+async def started_client(port, **kwargs):
+    client = AsyncMqttClient("127.0.0.1", port, "test", reconnect_delay=0.05, **kwargs)
+    client.start()
+    assert await client.wait_connected(2)
+    return client
+
+
+@pytest.mark.parametrize("value", [0, 1, 127, 128, 16383, 16384, 268435455])
+def test_varint_round_trip(value):
+    assert decode_varint(encode_varint(value), 0) == (value, len(encode_varint(value)))
+
+
+def test_encode_string():
+    assert encode_string("ab") == b"\x00\x02ab"
+
+
+def test_publishes_arrive_in_order_and_are_acknowledged():
+    async def main():
+        broker = MqttBrokerStandIn(keep_messages=True)
+        port = await broker.start()
+        client = await started_client(port, max_inflight=4)
+        acks = []
+        for i in range(20):
+            assert await client.publish(f"t/{i % 3}", f"m{i}", on_ack=lambda i=i: acks.append(i))
+        await client.stop()
+        await broker.stop()
+        assert [m.payload for m in broker.messages] == [f"m{i}".encode() for i in range(20)]
+        assert acks == list(range(20))
+
+    asyncio.run(main())
+
+
+def test_mqtt5_topic_aliases_resolve_at_the_broker():
+    async def main():
+        broker = MqttBrokerStandIn(keep_messages=True, topic_alias_maximum=2)
+        port = await broker.start()
+        client = await started_client(port, protocol_version=MQTT_V5, topic_alias_maximum=8)
+        for i in range(6):
+            await client.publish(f"t/{i % 3}", b"x")
+        await client.stop()
+        await broker.stop()
+        assert [m.topic for m in broker.messages] == [f"t/{i % 3}" for i in range(6)]
+
+    asyncio.run(main())
+
+
+def test_publish_waits_for_a_slot_and_gives_up_when_the_connection_drops():
+    async def main():
+        broker = ScriptedBroker()
+        broker.ack = False
+        client = await started_client(await broker.start(), max_inflight=2)
+        assert await client.publish("t", b"1") and await client.publish("t", b"2")
+        third = asyncio.create_task(client.publish("t", b"3"))
+        await asyncio.sleep(0.05)
+        assert not third.done()
+        broker.drop_clients()
+        assert await asyncio.wait_for(third, 1) is False
+        assert client.in_flight_count() == 2
+        broker.close()
+        await client.stop(drain_timeout=0)
+
+    asyncio.run(main())
+
+
+def test_unacknowledged_messages_are_retransmitted_after_reconnect():
+    async def main():
+        broker = ScriptedBroker()
+        broker.ack = False
+        client = await started_client(await broker.start())
+        acks = []
+        await client.publish("t", b"1", on_ack=lambda: acks.append(1))
+        await asyncio.sleep(0.05)
+        broker.ack = True
+        broker.drop_clients()
+        await asyncio.sleep(0.2)
+        assert broker.connections == 2
+        first, again = broker.publishes
+        assert first[0] == again[0] and not first[1] and again[1]
+        assert acks == [1] and client.in_flight_count() == 0
+        await client.stop()
+        broker.close()
+
+    asyncio.run(main())
+
+
+def test_receive_maximum_shrinks_the_window():
+    async def main():
+        broker = ScriptedBroker(connack_properties=bytes((PROP_RECEIVE_MAXIMUM,)) + _U16.pack(2))
+        broker.ack = False
+        client = await started_client(await broker.start(), protocol_version=MQTT_V5, max_inflight=10)
+        results = [asyncio.create_task(client.publish("t", bytes([i]))) for i in range(4)]
+        await asyncio.sleep(0.05)
+        assert [r.done() for r in results] == [True, True, False, False]
+        assert len(broker.publishes) == 2
+        broker.close()
+        await asyncio.gather(*results)
+        await client.stop(drain_timeout=0)
+
+    asyncio.run(main())
+
+
+def test_rejected_messages_free_their_slot_without_an_ack():
+    async def main():
+        broker = ScriptedBroker()
+        broker.puback_reason = 0x97  # quota exceeded
+        client = await started_client(await broker.start(), protocol_version=MQTT_V5, max_inflight=1)
+        acks = []
+        for i in range(3):
+            assert await client.publish("t", bytes([i]), on_ack=lambda: acks.append(1))
+        await asyncio.sleep(0.05)
+        broker.puback_reason = 0x10  # no matching subscribers, still a success
+        await client.publish("t", b"ok", on_ack=lambda: acks.append(2))
+        await asyncio.sleep(0.05)
+        assert acks == [2] and client.in_flight_count() == 0 and len(broker.publishes) == 4
+        await client.stop()
+        broker.close()
+
+    asyncio.run(main())
+
+
+def test_connect_times_out_without_a_connack_and_retries():
+    async def main():
+        broker = ScriptedBroker()
+        broker.connack = False
+        client = AsyncMqttClient("127.0.0.1", await broker.start(), "test", keepalive=600, reconnect_delay=0.05,
+                                 connect_timeout=0.2)
+        client.start()
+        assert not await client.wait_connected(0.3)
+        broker.connack = True
+        assert await client.wait_connected(1)
+        await client.stop()
+        broker.close()
+
+    asyncio.run(main())
+
+
+def test_publish_without_connection_returns_false():
+    async def main():
+        client = AsyncMqttClient("127.0.0.1", 1, "test")
+        assert await client.publish("t", b"x") is False
+
+    asyncio.run(main())
@@ -0,0 +1,151 @@
+import asyncio
+import json
+import socket
+
+from src.models.config_models import MqttPublisherConfig
+from src.models.sensor_reading import SensorDescriptor, SensorReading
+from src.publishers.batch_codec import decode_batch
+from src.publishers.disk_spool import DiskSpool
+from src.publishers.mqtt_publisher import MQTTPublisher
+from tests.unit.factories import modbus_sensor
+from tests.unit.scripted_broker import ScriptedBroker
+
+
+def publisher_config(port, spool_directory, **kwargs) -> MqttPublisherConfig:
+    return MqttPublisherConfig(broker_host="127.0.0.1", broker_port=port, engine="asyncio", keepalive_seconds=60,
+                               spool={"enabled": True, "directory": str(spool_directory), "segment_size_bytes": 4096,
+                                      "max_total_bytes": 65536, "replay_rate_per_second": 1000}, **kwargs)
+
+
+def spooled_records(config):
+    """What the spool would replay, left unconsumed."""
+    spool = DiskSpool(config.spool.directory, config.spool.segment_size_bytes, config.spool.max_total_bytes)
+    records = []
+    while (record := spool.peek()) is not None:
+        records.append(record)
+        spool.advance()
+    spool.close()
+    return records
+
+
+def spooled_payloads(config):
+    return [record.payload for record in spooled_records(config)]
+
+
+async def wait_for(condition, timeout=3.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.02)
+
+
+def fill_spool(config, count):
+    spool = DiskSpool(config.spool.directory, config.spool.segment_size_bytes, config.spool.max_total_bytes)
+    for i in range(count):
+        spool.append("t", b"%d" % i)
+    spool.close()
+
+
+def test_replayed_records_stay_in_the_spool_until_acknowledged(tmp_path):
+    async def main():
+        silent = ScriptedBroker()
+        silent.ack = False
+        config = publisher_config(await silent.start(), tmp_path)
+        fill_spool(config, 5)
+        publisher = MQTTPublisher(config)
+        await publisher.start()
+        await wait_for(lambda: len(silent.publishes) == 5)
+        await publisher.stop()
+        silent.close()
+        # Sent but never acknowledged: still spooled after the restart
+        assert spooled_payloads(config) == [b"%d" % i for i in range(5)]
+
+        broker = ScriptedBroker()
+        config = publisher_config(await broker.start(), tmp_path)
+        publisher = MQTTPublisher(config)
+        await publisher.start()
+        await wait_for(lambda: not publisher.has_spool_backlog())
+        await publisher.stop()
+        broker.close()
+        assert [p for _, _, topic, p in broker.publishes if topic == "t"] == [b"%d" % i for i in range(5)]
+        assert spooled_payloads(config) == []
+
+    asyncio.run(main())
+
+
+def test_records_in_flight_at_a_disconnect_are_sent_once_more(tmp_path):
+    async def main():
+        broker = ScriptedBroker()
+        broker.ack = False
+        config = publisher_config(await broker.start(), tmp_path, reconnect_delay_seconds=1)
+        fill_spool(config, 3)
+        publisher = MQTTPublisher(config)
+        await publisher.start()
+        await wait_for(lambda: len(broker.publishes) == 3)
+        broker.ack = True
+        broker.drop_clients()
+        await wait_for(lambda: not publisher.has_spool_backlog())
+        await publisher.stop()
+        broker.close()
+        receipts = [(dup, p) for _, dup, topic, p in broker.publishes if topic == "t"]
+        # The client retransmits its window after the reconnect (at-least-once); the spool does
+        # not replay those records on top of it
+        assert receipts == [(False, b"0"), (False, b"1"), (False, b"2"), (True, b"0"), (True, b"1"), (True, b"2")]
+        assert spooled_payloads(config) == []
+
+    asyncio.run(main())
+
+
+def test_a_record_the_client_refuses_is_replayed_after_those_it_accepted(tmp_path):
+    async def main():
+        config = publisher_config(1, tmp_path)
+        fill_spool(config, 4)
+        publisher = MQTTPublisher(config)
+        publisher._running = True
+        spool = publisher._spool
+        entries = []
+        for _ in range(3):
+            spool.peek()
+            entries.append([spool.advance(), False])
+        publisher._replay_unacked.extend(entries)
+        publisher._unsend_replay(entries[2])
+        assert spool.peek().payload == b"2" and len(publisher._replay_unacked) == 2
+        publisher._on_replay_ack(entries[0], publisher._replay_generation)
+        publisher._unsend_replay(entries[1])
+        assert spool.peek().payload == b"1"
+        spool.close()
+
+    asyncio.run(main())
+
+
+def unused_tcp_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_spooled_batches_follow_the_index_map_they_were_encoded_against(tmp_path):
+    async def main():
+        config = publisher_config(unused_tcp_port(), tmp_path, reconnect_delay_seconds=10, topic_prefix="gateway",
+                                  batch={"enabled": True, "text_topics": False})
+        sensor = modbus_sensor("temp", 0)
+        publisher = MQTTPublisher(config, [sensor])
+        await publisher.start()
+        descriptor = SensorDescriptor.from_config(sensor, 0)
+        await publisher.publish_readings([SensorReading(descriptor, 1.0)])
+        await publisher.publish_readings([SensorReading(descriptor, 2.0)])
+        # A reload changes the unit, so later batches refer to a new index map
+        publisher.update_sensors([modbus_sensor("temp", 0, publisher={"unit": "F"})])
+        await publisher.publish_readings([SensorReading(descriptor, 3.0)])
+        await publisher.stop()
+
+        records = spooled_records(config)
+        assert [record.topic for record in records] == ["gateway/batch/index", "gateway/batch", "gateway/batch",
+                                                        "gateway/batch/index", "gateway/batch"]
+        assert records[0].retain and records[3].retain
+        first, second = json.loads(records[0].payload), json.loads(records[3].payload)
+        assert [s["unit"] for s in first["sensors"]] == ["C"] and [s["unit"] for s in second["sensors"]] == ["F"]
+        assert decode_batch(records[1].payload).schema == first["schema"]
+        assert decode_batch(records[4].payload).schema == second["schema"]
+
+    asyncio.run(main())
@@ -0,0 +1,100 @@
+from functools import reduce
+
+import pynmea2
+import pytest
+
+from src.collectors.nmea_fast_parser import FAST_SENTENCE_TYPES, parse_fast
+from src.collectors.nmea_framing import NmeaFramer, checksum_ok, split_checksum, xor_checksum
+
+GGA = b"$GPGGA,123519,4807.038,N,01131.000,E,1,08,0.9,545.4,M,46.9,M,,*47"
+HDT = b"$HEHDT,274.07,T*03"
+
+
+def as_number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return value or None
+
+
+def test_frames_split_across_chunks_are_reassembled():
+    framer = NmeaFramer()
+    stream = HDT + b"\r\n" + GGA + b"\r\n"
+    frames = []
+    for i in range(0, len(stream), 7):
+        frames += framer.feed(stream[i:i + 7])
+    assert frames == [HDT, GGA]
+
+
+def test_cr_lf_and_blank_lines_all_end_frames():
+    framer = NmeaFramer()
+    assert framer.feed(HDT + b"\n\n" + HDT + b"\r" + HDT + b"\r\n\r\n$GPG") == [HDT, HDT, HDT]
+    assert framer.feed(b"GA,\n") == [b"$GPGGA,"]
+
+
+def test_overlong_garbage_without_terminator_is_discarded():
+    framer = NmeaFramer(max_frame_length=16)
+    assert framer.feed(b"x" * 20) == []
+    assert framer.discarded_bytes == 20
+    assert framer.feed(HDT + b"\r\n") == [HDT]
+
+
+def test_reset_drops_a_partial_frame():
+    framer = NmeaFramer()
+    framer.feed(b"$HEHDT,27")
+    framer.reset()
+    assert framer.feed(HDT + b"\n") == [HDT]
+
+
+@pytest.mark.parametrize("data", [b"", b"A", b"GPGGA,1", HDT[1:-3], GGA[1:-3], bytes(range(256))])
+def test_xor_checksum_matches_bytewise_xor(data):
+    assert xor_checksum(data) == reduce(lambda a, b: a ^ b, data, 0)
+
+
+def test_split_checksum():
+    assert split_checksum(HDT) == (b"HEHDT,274.07,T", 0x03)
+    assert split_checksum(b"$HEHDT,274.07,T") == (b"HEHDT,274.07,T", None)
+    assert split_checksum(b"$HEHDT,274.07,T*ZZ") == (b"HEHDT,274.07,T", -1)
+    assert checksum_ok(GGA) and checksum_ok(b"$HEHDT,274.07,T")
+    assert not checksum_ok(b"$HEHDT,274.08,T*03")
+
+
+@pytest.mark.parametrize("body", [
+    "HEHDT,274.07,T",
+    "TIROT,-0.3,A",
+    "HCHDG,98.3,0.0,E,12.6,W",
+    "GPVTG,054.7,T,034.4,M,005.5,N,010.2,K,A",
+    "WIMWV,214.8,R,0.1,K,A",
+    "GPGGA,123519,4807.038,N,01131.000,E,1,08,0.9,545.4,M,46.9,M,,",
+    "GPGGA,123519,4807.038,S,01131.000,W,1,08,0.9,545.4,M,46.9,M,,",
+])
+def test_fast_parser_matches_pynmea2(body):
+    reference = pynmea2.parse("$" + body)
+    fast = parse_fast(body.encode())
+    assert (fast.talker, fast.sentence_type) == (reference.talker, reference.sentence_type)
+    # Values are published through float(), so fields only have to agree as numbers
+    for name in (f[1] for f in reference.fields if f[1] != "timestamp"):
+        assert as_number(getattr(fast, name)) == as_number(getattr(reference, name)), name
+    if fast.sentence_type == "GGA":
+        assert fast.latitude == pytest.approx(reference.latitude)
+        assert fast.longitude == pytest.approx(reference.longitude)
+
+
+def test_fast_parser_pads_missing_trailing_fields():
+    fast = parse_fast(b"WIMWV,214.8,R")
+    assert fast.wind_angle == "214.8" and fast.wind_speed == "" and fast.status == ""
+
+
+def test_fast_parser_leaves_other_types_to_pynmea2():
+    assert "RMC" not in FAST_SENTENCE_TYPES
+    assert parse_fast(b"GPRMC,123519,A,4807.038,N,01131.000,E,022.4,084.4,230394,003.1,W") is None
+    assert parse_fast(b"PHDT,274.07,T") is None
+
+
+def test_bad_gga_field_only_invalidates_its_own_value():
+    fast = parse_fast(b"GPGGA,123519,48x7.038,N,01131.000,E,1,08,0.9,545.4,M,46.9,M,,")
+    assert fast.latitude is None
+    assert fast.longitude == pytest.approx(11.516667)
+    assert fast.altitude == "545.4" and fast.gps_qual == 1
+    # Like pynmea2, a typed field that does not convert keeps its text
+    assert parse_fast(b"GPGGA,123519,4807.038,N,01131.000,E,X,08,0.9,545.4,M,46.9,M,,").gps_qual == "X"
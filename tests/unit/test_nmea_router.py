@@ -0,0 +1,54 @@
+from types import SimpleNamespace
+
+from src.collectors.nmea_router import NmeaRouter, extract_value, route_key_from_frame
+from src.models.sensor_reading import STATUS_INVALID, STATUS_VALID
+from tests.unit.factories import modbus_sensor, nmea_sensor
+
+
+def test_route_key_from_frame():
+    assert route_key_from_frame(b"$HEHDT,274.07,T*03") == ("HE", "HDT")
+    assert route_key_from_frame(b"!AIVDM,1,1,,A,13aEOK?P00PD2wVMdLDRhgvL289?,0*26") == ("AI", "VDM")
+    # Address field without any data field
+    assert route_key_from_frame(b"$GPHDT*00") == ("GP", "HDT")
+
+
+def test_route_key_rejects_proprietary_and_garbage():
+    assert route_key_from_frame(b"$PGRME,15.0,M,45.0,M,25.0,M*1C") is None
+    assert route_key_from_frame(b"HEHDT,274.07") is None
+    assert route_key_from_frame(b"$HE") is None
+
+
+def test_one_sentence_fans_out_to_every_subscriber():
+    router = NmeaRouter([nmea_sensor("heading", "HE", "HDT"), nmea_sensor("heading_copy", "he", "hdt"),
+                         nmea_sensor("wind", "WI", "MWV")])
+    subscribers = router.lookup(("HE", "HDT"))
+    assert [s.sensor.id for s in subscribers] == ["heading", "heading_copy"]
+    assert all(s.value_field == "heading" for s in subscribers)
+    assert router.sensor_count() == 3
+
+
+def test_unsubscribed_sentences_are_counted_as_dropped():
+    router = NmeaRouter([nmea_sensor("heading", "HE", "HDT")])
+    assert router.lookup(("GP", "HDT")) == []
+    assert router.lookup(None) == []
+    assert router.dropped_sentences == 2
+
+
+def test_sensors_without_a_value_field_or_nmea_params_are_skipped():
+    router = NmeaRouter([nmea_sensor("unknown", "GP", "ZDA"), modbus_sensor("plc", 0),
+                         nmea_sensor("explicit", "GP", "ZDA", value_field="year")])
+    assert [s.sensor.id for s in router.lookup(("GP", "ZDA"))] == ["explicit"]
+
+
+def test_extract_value():
+    assert extract_value(SimpleNamespace(heading="274.07"), "HDT", "heading") == (274.07, STATUS_VALID)
+    assert extract_value(SimpleNamespace(heading=""), "HDT", "heading") == (None, STATUS_INVALID)
+    assert extract_value(SimpleNamespace(heading="abc"), "HDT", "heading") == (None, STATUS_INVALID)
+    assert extract_value(SimpleNamespace(), "HDT", "heading") == (None, STATUS_INVALID)
+
+
+def test_extract_value_honours_status_fields():
+    assert extract_value(SimpleNamespace(wind_speed="12.5", status="A"), "MWV", "wind_speed") == (12.5, STATUS_VALID)
+    assert extract_value(SimpleNamespace(wind_speed="12.5", status="V"), "MWV", "wind_speed") == (None, STATUS_INVALID)
+    assert extract_value(SimpleNamespace(altitude="5.0", gps_qual=0), "GGA", "altitude") == (None, STATUS_INVALID)
+    assert extract_value(SimpleNamespace(altitude="5.0", gps_qual=1), "GGA", "altitude") == (5.0, STATUS_VALID)
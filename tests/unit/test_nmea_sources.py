@@ -0,0 +1,124 @@
+import asyncio
+import socket
+
+import pytest
+
+from src.collectors import nmea_sources
+from src.collectors.nmea_router import NmeaRouter
+from src.collectors.nmea_sources import (NmeaSource, ReplaySource, TcpClientSource, UdpSource, split_datagram,
+                                         strip_tag_block)
+from src.models.config_models import NmeaSourceConfig
+
+HDT = b"$HEHDT,274.07,T*03"
+ROT = b"$TIROT,-0.3,A*3F"
+
+
+def free_udp_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def make_source(source_type, port, frames):
+    async def handler(router, frame):
+        frames.append(frame)
+    config = NmeaSourceConfig(name="test", type="tcp_client", host="127.0.0.1", port=port)
+    return source_type(config, NmeaRouter([]), handler, read_chunk_bytes=256, retry_delay=1)
+
+
+def test_strip_tag_block():
+    assert strip_tag_block(b"\\s:GP0001,c:1577836800*5B\\" + HDT) == HDT
+    assert strip_tag_block(HDT) == HDT
+    # An unterminated tag block is left for the checksum to reject
+    assert strip_tag_block(b"\\s:GP0001" + HDT) == b"\\s:GP0001" + HDT
+
+
+def test_split_datagram_handles_iec_61162_450_header():
+    datagram = b"UdPbC\x00\\s:GP0001*5B\\" + HDT + b"\r\n\\s:GP0001*5B\\" + ROT + b"\r\n"
+    assert split_datagram(datagram) == [HDT, ROT]
+    assert split_datagram(HDT + b"\r\n\r\n" + ROT) == [HDT, ROT]
+
+
+def test_source_base_class_is_abstract():
+    with pytest.raises(TypeError):
+        NmeaSource(NmeaSourceConfig(name="x", port=1), NmeaRouter([]), None, 256, 1)
+
+
+def test_tcp_client_source_frames_the_stream():
+    async def main():
+        async def talker(reader, writer):
+            writer.write(HDT + b"\r\n" + ROT[:5])
+            await writer.drain()
+            await asyncio.sleep(0.02)
+            writer.write(ROT[5:] + b"\r\n")
+            await writer.drain()
+            writer.close()
+
+        server = await asyncio.start_server(talker, "127.0.0.1", 0)
+        frames = []
+        source = make_source(TcpClientSource, server.sockets[0].getsockname()[1], frames)
+        source.start()
+        await asyncio.sleep(0.1)
+        await source.stop()
+        server.close()
+        assert frames[:2] == [HDT, ROT]
+
+    asyncio.run(main())
+
+
+def test_udp_source_splits_datagrams():
+    async def main():
+        port = free_udp_port()
+        frames = []
+        source = make_source(UdpSource, port, frames)
+        source.start()
+        await asyncio.sleep(0.05)
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.sendto(b"UdPbC\x00" + HDT + b"\r\n" + ROT + b"\r\n", ("127.0.0.1", port))
+        await asyncio.sleep(0.05)
+        await source.stop()
+        assert frames == [HDT, ROT]
+
+    asyncio.run(main())
+
+
+def test_replay_source_frames_chunks_and_datagrams():
+    async def main():
+        frames = []
+        source = make_source(ReplaySource, 0, frames)
+        source.start()
+        await source.feed(HDT[:6], datagram=False)
+        await source.feed(HDT[6:] + b"\r\n", datagram=False)
+        await source.feed(b"\\s:GP0001*5B\\" + ROT + b"\r\n", datagram=True)
+        assert frames == [HDT, ROT]
+        await source.stop()
+
+    asyncio.run(main())
+
+
+def test_udp_source_binds_again_after_its_socket_closed(monkeypatch):
+    transports = []
+
+    class RecordingProtocol(nmea_sources._DatagramProtocol):
+        def connection_made(self, transport):
+            transports.append(transport)
+
+    monkeypatch.setattr(nmea_sources, "_DatagramProtocol", RecordingProtocol)
+
+    async def main():
+        port = free_udp_port()
+        frames = []
+        source = make_source(UdpSource, port, frames)
+        source.start()
+        await asyncio.sleep(0.05)
+        transports[0].close()
+        # Retried after retry_delay (1 s)
+        await asyncio.sleep(1.2)
+        assert len(transports) == 2 and not transports[1].is_closing()
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.sendto(HDT + b"\r\n", ("127.0.0.1", port))
+        await asyncio.sleep(0.05)
+        await source.stop()
+        assert frames == [HDT]
+
+    asyncio.run(main())
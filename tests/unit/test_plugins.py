@@ -0,0 +1,78 @@
+import importlib.metadata
+import json
+
+import pytest
+
+from src import config_loader
+from src.plugins import COLLECTOR_ENTRY_POINT_GROUP, COLLECTORS, PluginRegistry
+
+
+def fake_entry_points(monkeypatch, *entries):
+    installed = [importlib.metadata.EntryPoint(name, value, group) for group, name, value in entries]
+
+    def entry_points(group=None):
+        return [entry for entry in installed if entry.group == group]
+
+    monkeypatch.setattr(importlib.metadata, "entry_points", entry_points)
+
+
+def test_plugins_are_imported_on_first_load():
+    registry = PluginRegistry("collector", "test.group")
+    registry.register("json", "json:dumps")
+    assert not registry.is_loaded("json")
+    assert registry.load("json") is json.dumps
+    assert registry.is_loaded("json") and registry.spec("json").config_section == "json"
+
+
+def test_relative_targets_resolve_against_the_package():
+    registry = PluginRegistry("collector", "test.group")
+    registry.register("modbus_tcp", ".collectors.modbus_read_planner:plan_reads", "modbus_collector")
+    from src.collectors.modbus_read_planner import plan_reads
+    assert registry.load("modbus_tcp") is plan_reads
+
+
+def test_unknown_plugin(monkeypatch):
+    fake_entry_points(monkeypatch)
+    with pytest.raises(KeyError):
+        PluginRegistry("collector", "test.group").load("nope")
+
+
+def test_entry_points_are_scanned_only_on_a_miss(monkeypatch):
+    fake_entry_points(monkeypatch, ("test.group", "csv", "csv:reader"), ("test.group", "json", "os:getcwd"),
+                      ("other.group", "x", "os:sep"))
+    registry = PluginRegistry("collector", "test.group")
+    registry.register("json", "json:dumps")
+    registry.load("json")
+    assert not registry._entry_points_scanned
+    import csv
+    assert registry.load("csv") is csv.reader
+    # Built-in registrations win over an entry point of the same name
+    assert registry.names() == ["json", "csv"] and registry.load("json") is json.dumps
+
+
+def test_builtin_collectors_are_registered():
+    assert {"modbus_tcp", "nmea"} <= set(COLLECTORS._specs)
+
+
+def test_config_cache_is_keyed_on_installed_plugins(tmp_path, monkeypatch):
+    monkeypatch.setattr(config_loader, "CONFIG_CACHE_PATH", str(tmp_path / "cache.pickle"))
+    fake_entry_points(monkeypatch)
+    path = tmp_path / "gateway.yml"
+    path.write_text("application_name: cached\n")
+    assert config_loader.load_config(path).application_name == "cached"
+    key = config_loader._cache_key(path.read_bytes())
+    assert config_loader._read_cache(key).application_name == "cached"
+
+    # A newly installed plugin may bring its own config models: the cached object is stale
+    fake_entry_points(monkeypatch, (COLLECTOR_ENTRY_POINT_GROUP, "can_bus", "gateway_can:CanCollector"))
+    assert config_loader._cache_key(path.read_bytes()) != key
+    assert config_loader._read_cache(config_loader._cache_key(path.read_bytes())) is None
+
+
+def test_config_cache_is_keyed_on_the_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(config_loader, "CONFIG_CACHE_PATH", str(tmp_path / "cache.pickle"))
+    path = tmp_path / "gateway.yml"
+    path.write_text("application_name: first\n")
+    assert config_loader.load_config(path).application_name == "first"
+    path.write_text("application_name: second\n")
+    assert config_loader.load_config(path).application_name == "second"
@@ -0,0 +1,147 @@
+import asyncio
+
+from src.collectors.polling_scheduler import PollingScheduler
+
+
+def recorder(fired):
+    async def poll():
+        fired.append(asyncio.get_running_loop().time())
+    return poll
+
+
+def test_polls_on_absolute_deadlines():
+    async def main():
+        scheduler = PollingScheduler()
+        fired = []
+        scheduler.add_job("a", 0.05, recorder(fired))
+        start = asyncio.get_running_loop().time()
+        scheduler.start()
+        await asyncio.sleep(0.27)
+        await scheduler.stop()
+        assert len(fired) == 6
+        # Deadlines are start + n * interval: no drift accumulates
+        assert abs((fired[-1] - fired[0]) - 0.25) < 0.03
+        assert fired[0] - start < 0.03
+
+    asyncio.run(main())
+
+
+def test_phase_offset_delays_the_first_poll():
+    async def main():
+        scheduler = PollingScheduler()
+        fired = []
+        start = asyncio.get_running_loop().time()
+        scheduler.add_job("a", 1.0, recorder(fired), phase_offset=0.05)
+        scheduler.start()
+        await asyncio.sleep(0.1)
+        await scheduler.stop()
+        assert len(fired) == 1 and fired[0] - start >= 0.05
+
+    asyncio.run(main())
+
+
+def test_slow_poll_skips_ticks_as_deadline_misses():
+    async def main():
+        scheduler = PollingScheduler()
+        polls = []
+
+        async def slow():
+            polls.append(1)
+            await asyncio.sleep(0.12)
+
+        scheduler.add_job("a", 0.05, slow)
+        scheduler.start()
+        await asyncio.sleep(0.28)
+        stats = scheduler.stats()["a"]
+        await scheduler.stop()
+        # Never two polls of one job at once
+        assert len(polls) == stats.polls <= 3
+        assert stats.deadline_misses >= 2
+
+    asyncio.run(main())
+
+
+def test_shorter_interval_takes_effect_at_once():
+    async def main():
+        scheduler = PollingScheduler()
+        fired = []
+        scheduler.add_job("a", 10.0, recorder(fired))
+        scheduler.start()
+        await asyncio.sleep(0.02)
+        assert len(fired) == 1
+        # Next poll: the last deadline plus the new interval, not in 10 s
+        scheduler.set_interval("a", 0.05)
+        await asyncio.sleep(0.06)
+        await scheduler.stop()
+        assert len(fired) == 2
+
+    asyncio.run(main())
+
+
+def test_remove_job_cancels_the_running_poll():
+    async def main():
+        scheduler = PollingScheduler()
+        cancelled = []
+
+        async def slow():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        scheduler.add_job("a", 1.0, slow)
+        scheduler.start()
+        await asyncio.sleep(0.02)
+        scheduler.remove_job("a")
+        await asyncio.sleep(0)
+        assert cancelled == [True]
+        assert "a" not in scheduler.stats()
+        await scheduler.stop()
+
+    asyncio.run(main())
+
+
+def test_stop_cancels_polls_left_running_by_remove_job():
+    async def main():
+        scheduler = PollingScheduler()
+        finished, cancelled = [], []
+
+        async def slow():
+            try:
+                await asyncio.sleep(0.05)
+                finished.append(True)
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        scheduler.add_job("a", 1.0, slow)
+        scheduler.start()
+        await asyncio.sleep(0.02)
+        scheduler.remove_job("a", cancel_in_flight=False)
+        await asyncio.sleep(0.06)
+        # The poll was allowed to go on after the job was removed
+        assert finished == [True] and not cancelled
+        await scheduler.stop()
+        assert cancelled == [True]
+
+    asyncio.run(main())
+
+
+def test_failing_poll_does_not_stop_the_job():
+    async def main():
+        scheduler = PollingScheduler()
+        calls = []
+
+        async def failing():
+            calls.append(1)
+            raise RuntimeError("read failed")
+
+        scheduler.add_job("a", 0.03, failing)
+        scheduler.start()
+        await asyncio.sleep(0.1)
+        await scheduler.stop()
+        assert len(calls) >= 3
+
+    asyncio.run(main())
@@ -0,0 +1,145 @@
+import asyncio
+
+from benchmarks.standins.mqtt_broker import MqttBrokerStandIn
+from src.models.config_models import MqttDestinationConfig, MqttPublisherConfig
+from src.models.sensor_reading import SensorDescriptor, SensorReading
+from src.publishers.publisher_group import PublisherGroup, destination_sensors, partition_of
+from tests.unit.factories import modbus_sensor
+from tests.unit.scripted_broker import ScriptedBroker
+
+SENSORS = [modbus_sensor(f"s{i}", i, publisher={"change_threshold": 1.0, "min_publish_interval_seconds": 3600})
+           for i in range(8)]
+DESCRIPTORS = [SensorDescriptor.from_config(sensor, i) for i, sensor in enumerate(SENSORS)]
+
+
+def group_config(port, **kwargs):
+    return MqttPublisherConfig(broker_host="127.0.0.1", broker_port=port, engine="asyncio", topic_prefix="gw",
+                               keepalive_seconds=60, **kwargs)
+
+
+async def connected(group):
+    for _ in range(100):
+        if all(d.connected_count() == d.connection_count for d in group.destinations):
+            return
+        await asyncio.sleep(0.02)
+    raise AssertionError("publisher group did not connect")
+
+
+def sensor_values(broker):
+    """Payload values per sensor topic, in arrival order."""
+    values = {}
+    for message in broker.messages:
+        if message.topic.startswith("gw/s"):
+            values.setdefault(message.topic[3:], []).append(float(message.payload.split(b"C,")[0]))
+    return values
+
+
+def test_partition_is_stable_and_in_range():
+    assert [partition_of(f"s{i}", 4) for i in range(100)] == [partition_of(f"s{i}", 4) for i in range(100)]
+    assert {partition_of(f"s{i}", 4) for i in range(100)} == {0, 1, 2, 3}
+
+
+def test_destination_policy_scales_deadbands_and_raises_intervals():
+    sensors = [modbus_sensor("a", 0, publisher={"change_threshold": 0.5}),
+               modbus_sensor("b", 1, publisher={"change_threshold": 2.0, "min_publish_interval_seconds": 900})]
+    shore = MqttDestinationConfig(name="shore", broker_host="x", deadband_scale=4, min_publish_interval_seconds=600)
+    adjusted = destination_sensors(sensors, shore, default_min_interval=300)
+    assert [s.publisher_config.change_threshold for s in adjusted] == [2.0, 8.0]
+    assert [s.publisher_config.min_publish_interval_seconds for s in adjusted] == [600, 900]
+    # The main config is left alone
+    assert sensors[0].publisher_config.change_threshold == 0.5
+    assert destination_sensors(sensors, MqttDestinationConfig(name="same", broker_host="x"), 300) == sensors
+
+
+def test_connections_get_their_own_identity():
+    group = PublisherGroup(group_config(1, connections=2, client_id_prefix="gw",
+                                        destinations=[{"name": "shore", "broker_host": "shore.example"}]), SENSORS)
+    configs = [c.publisher.config for d in group.destinations for c in d.connections]
+    assert [c.client_id_prefix for c in configs] == ["gw-0", "gw-1", "gw-shore-0", "gw-shore-1"]
+    assert len({c.spool.directory for c in configs}) == 4
+    assert [c.batch.topic_suffix for c in configs] == ["batch/0", "batch/1"] * 2
+    assert configs[2].broker_host == "shore.example" and configs[2].topic_prefix == "gw"
+    # One retained status will per broker
+    assert [c.publisher.status_will for d in group.destinations for c in d.connections] == [True, False] * 2
+
+
+def test_every_connection_indexes_sensors_like_the_pipeline():
+    group = PublisherGroup(group_config(1, connections=3), SENSORS)
+    for connection in group.destinations[0].connections:
+        engine = connection.publisher._exceptions
+        assert all(engine.sensor_ids[d.index] == d.sensor_id for d in DESCRIPTORS)
+    group.update_sensors(SENSORS + [modbus_sensor("new", 9)])
+    assert all(c.publisher._exceptions.sensor_count() == 9 for c in group.destinations[0].connections)
+
+
+def test_fan_out_keeps_each_sensor_in_order_under_each_policy():
+    async def main():
+        main_broker, shore_broker = MqttBrokerStandIn(keep_messages=True), MqttBrokerStandIn(keep_messages=True)
+        main_port, shore_port = await main_broker.start(), await shore_broker.start()
+        shore = {"name": "shore", "broker_host": "127.0.0.1", "broker_port": shore_port, "deadband_scale": 2.0,
+                 "connections": 3}
+        group = PublisherGroup(group_config(main_port, connections=2, destinations=[shore]), SENSORS)
+        await group.start()
+        await connected(group)
+        for step in range(10):
+            await group.publish_readings([SensorReading(d, 1.5 * step) for d in DESCRIPTORS])
+        await group.stop()
+        await main_broker.stop()
+        await shore_broker.stop()
+        statuses = [[m.payload for m in broker.messages if m.topic == "gw/gateway_status"]
+                    for broker in (main_broker, shore_broker)]
+        return sensor_values(main_broker), sensor_values(shore_broker), statuses
+
+    main_values, shore_values, statuses = asyncio.run(main())
+    # Only each broker's first connection reports the graceful shutdown
+    assert statuses == [[b"offline_graceful"]] * 2
+    assert main_values == {f"s{i}": [1.5 * step for step in range(10)] for i in range(8)}
+    # Twice the deadband: only moves of more than 2.0 since the last published value
+    assert shore_values == {f"s{i}": [3.0 * step for step in range(5)] for i in range(8)}
+
+
+def test_full_queue_overflows_into_the_spool(tmp_path):
+    async def main():
+        broker = ScriptedBroker()
+        broker.ack = False
+        spool = {"enabled": True, "directory": str(tmp_path), "replay_rate_per_second": 1000}
+        config = group_config(await broker.start(), connections=2, max_queue_batches=1, max_inflight_messages=1,
+                              spool=spool)
+        group = PublisherGroup(config, SENSORS)
+        await group.start()
+        await connected(group)
+        # The broker never acknowledges, so each connection's window stays full and its queue backs up
+        for step in range(20):
+            await group.publish_readings([SensorReading(d, 1.5 * step) for d in DESCRIPTORS])
+            await asyncio.sleep(0)
+        destination = group.destinations[0]
+        spooled = sum(c.publisher.spooled_messages for c in destination.connections)
+        assert destination.dropped_readings() == 0 and spooled > 0
+        assert group.has_spool_backlog()
+        broker.close()
+        for connection in destination.connections:
+            connection.queue.clear()
+        await group.stop()
+
+    asyncio.run(main())
+
+
+def test_full_queue_without_a_spool_drops_the_oldest_batch():
+    async def main():
+        broker = ScriptedBroker()
+        broker.ack = False
+        group = PublisherGroup(group_config(await broker.start(), connections=2, max_queue_batches=1,
+                                            max_inflight_messages=1), SENSORS)
+        await group.start()
+        await connected(group)
+        for step in range(20):
+            await group.publish_readings([SensorReading(d, 1.5 * step) for d in DESCRIPTORS])
+            await asyncio.sleep(0)
+        dropped = group.destinations[0].dropped_readings()
+        broker.close()
+        for connection in group.destinations[0].connections:
+            connection.queue.clear()
+        await group.stop()
+        return dropped
+
+    assert asyncio.run(main()) > 0
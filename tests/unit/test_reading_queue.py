@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+
+from src.models.sensor_reading import SensorDescriptor, SensorReading
+from src.pipeline.reading_queue import ReadingQueue
+
+DESCRIPTORS = {name: SensorDescriptor(i, name, "C") for i, name in enumerate("abcd")}
+
+
+def reading(sensor_id, value):
+    return SensorReading(DESCRIPTORS[sensor_id], value, timestamp_ns=1)
+
+
+def drain(queue):
+    return [(r.descriptor.sensor_id, r.value) for r in asyncio.run(queue.get_batch(100, 0))]
+
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        ReadingQueue(10, "newest")
+
+
+def test_drop_oldest_keeps_the_newest_readings():
+    queue = ReadingQueue(3, "drop_oldest")
+    for value in range(5):
+        queue.put_nowait(reading("a", value))
+    assert drain(queue) == [("a", 2), ("a", 3), ("a", 4)]
+    assert queue.stats.dropped == 2 and queue.stats.enqueued == 5 and queue.stats.max_depth == 3
+
+
+def test_conflate_keeps_every_reading_below_maxsize():
+    queue = ReadingQueue(10, "conflate")
+    for value in range(3):
+        queue.put_nowait(reading("a", value))
+    assert queue.qsize() == 3
+    assert drain(queue) == [("a", 0), ("a", 1), ("a", 2)]
+    assert queue.stats.conflated == 0 and queue.stats.dropped == 0
+
+
+def test_conflate_replaces_the_newest_waiting_reading_of_the_sensor_when_full():
+    queue = ReadingQueue(3, "conflate")
+    for sensor_id, value in [("a", 1), ("b", 1), ("a", 2), ("a", 3), ("b", 2), ("a", 4)]:
+        queue.put_nowait(reading(sensor_id, value))
+    assert queue.qsize() == 3
+    assert drain(queue) == [("a", 1), ("b", 2), ("a", 4)]
+    assert queue.stats.conflated == 3 and queue.stats.dropped == 0 and queue.stats.enqueued == 6
+    # Drained slots are forgotten: the next reading of "a" is queued, not conflated
+    queue.put_nowait(reading("a", 5))
+    assert drain(queue) == [("a", 5)] and queue.stats.conflated == 3
+
+
+def test_conflate_drops_the_oldest_reading_for_a_sensor_with_nothing_waiting():
+    queue = ReadingQueue(2, "conflate")
+    for sensor_id in "abc":
+        queue.put_nowait(reading(sensor_id, 1))
+    # "a" was dropped, so its next reading displaces "b" rather than replacing anything
+    queue.put_nowait(reading("a", 2))
+    assert drain(queue) == [("c", 1), ("a", 2)]
+    assert queue.stats.dropped == 2 and queue.stats.conflated == 0
+
+
+def test_block_raises_on_put_nowait_and_waits_on_put():
+    async def main():
+        queue = ReadingQueue(2, "block")
+        queue.put_nowait(reading("a", 1))
+        queue.put_nowait(reading("a", 2))
+        with pytest.raises(asyncio.QueueFull):
+            queue.put_nowait(reading("a", 3))
+        put = asyncio.create_task(queue.put(reading("a", 3)))
+        await asyncio.sleep(0.01)
+        assert not put.done()
+        assert [r.value for r in await queue.get_batch(1, 0)] == [1]
+        await asyncio.wait_for(put, 1)
+        assert [r.value for r in await queue.get_batch(10, 0)] == [2, 3]
+        assert queue.stats.dropped == 0
+
+    asyncio.run(main())
+
+
+def test_get_batch_collects_until_max_items():
+    async def main():
+        queue = ReadingQueue(100)
+        for value in range(5):
+            queue.put_nowait(reading("a", value))
+        assert len(await queue.get_batch(3, 1.0)) == 3
+        assert len(await queue.get_batch(3, 0)) == 2
+
+    asyncio.run(main())
+
+
+def test_get_batch_waits_up_to_max_wait_after_the_first_reading():
+    async def main():
+        queue = ReadingQueue(100)
+        loop = asyncio.get_running_loop()
+
+        async def producer():
+            queue.put_nowait(reading("a", 1))
+            await asyncio.sleep(0.02)
+            queue.put_nowait(reading("a", 2))
+
+        asyncio.create_task(producer())
+        started = loop.time()
+        batch = await queue.get_batch(10, 0.1)
+        assert [r.value for r in batch] == [1, 2]
+        assert loop.time() - started >= 0.09
+        assert queue.empty()
+
+    asyncio.run(main())
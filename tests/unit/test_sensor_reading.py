@@ -0,0 +1,41 @@
+from datetime import datetime, timedelta, timezone
+
+from src.models.sensor_reading import STATUS_INVALID, STATUS_VALID, SensorDescriptor, SensorReading, build_descriptors
+from tests.unit.factories import modbus_sensor, nmea_sensor
+
+
+def test_build_descriptors_indexes_by_config_position():
+    sensors = [modbus_sensor("a", 0, publisher={"change_threshold": 0.5}),
+               nmea_sensor("b", "HE", "HDT", publisher={"min_publish_interval_seconds": 30})]
+    descriptors = build_descriptors(sensors)
+    assert descriptors["a"] == SensorDescriptor(0, "a", "C", "a", 0.5, None)
+    assert descriptors["b"] == SensorDescriptor(1, "b", "", "b", 0.0, 30)
+
+
+def test_readings_share_their_descriptor():
+    descriptor = build_descriptors([modbus_sensor("a", 0)])["a"]
+    first, second = SensorReading(descriptor, 1.0), SensorReading(descriptor, 2.0)
+    assert first.descriptor is second.descriptor
+    assert (first.sensor_id, first.unit, first.mqtt_topic_suffix, first.change_threshold) == ("a", "C", "a", 0.0)
+
+
+def test_timestamp_defaults_to_now():
+    before = datetime.now(timezone.utc)
+    reading = SensorReading(SensorDescriptor(0, "a", "C"), 1.0)
+    assert before - timedelta(seconds=1) <= reading.timestamp <= datetime.now(timezone.utc)
+
+
+def test_from_values():
+    timestamp = datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=timezone.utc)
+    reading = SensorReading.from_values("a", 3, "V", timestamp, "Invalid", mqtt_topic_suffix="a")
+    assert reading.status_code == STATUS_INVALID and reading.status == "Invalid"
+    assert reading.timestamp == timestamp
+    assert reading.descriptor.index == -1 and reading.mqtt_topic_suffix == "a"
+    # A naive timestamp is taken as UTC
+    naive = SensorReading.from_values("a", 3, "V", timestamp.replace(tzinfo=None))
+    assert naive.timestamp == timestamp and naive.status_code == STATUS_VALID
+
+
+def test_reading_has_no_instance_dict():
+    reading = SensorReading(SensorDescriptor(0, "a", "C"), 1.0)
+    assert not hasattr(reading, "__dict__")
@@ -0,0 +1,152 @@
+import asyncio
+import math
+import multiprocessing
+
+import pytest
+
+from src.models.config_models import AppConfig
+from src.models.sensor_reading import SensorDescriptor
+from src.sharding import supervisor
+from src.sharding.partition import connection_units, shard_config, shard_of
+from src.sharding.ring import ReadingRing, RingLockTimeout
+from src.sharding.supervisor import ShardSupervisor
+from tests.unit.factories import modbus_sensor, nmea_sensor
+
+
+@pytest.fixture
+def ring():
+    ring = ReadingRing.create(4, multiprocessing.Lock())
+    yield ring
+    ring.close()
+
+
+def records(start, count):
+    return [(i, i % 2, float(i), 1000 + i) for i in range(start, start + count)]
+
+
+def test_ring_wraps_around(ring):
+    position = 0
+    # Pops of 3 from a ring of 4 move the start through every slot
+    for _ in range(5):
+        assert ring.push_many(records(position, 3)) == 3
+        assert ring.pop_many(10) == records(position, 3)
+        position += 3
+    assert ring.depth() == 0
+
+
+def test_pop_spanning_the_end_of_the_buffer(ring):
+    ring.push_many(records(0, 3))
+    assert ring.pop_many(2) == records(0, 2)
+    assert ring.push_many(records(3, 3)) == 3
+    # Slots 2, 3, 0, 1
+    assert ring.pop_many(10) == records(2, 4)
+
+
+def test_full_ring_takes_what_fits(ring):
+    assert ring.push_many(records(0, 6)) == 4
+    assert ring.full_events() == 1 and ring.depth() == 4
+    assert ring.push_many(records(6, 1)) == 0
+    assert ring.pop_many(2) == records(0, 2)
+    assert ring.push_many(records(4, 2)) == 2
+    assert ring.pop_many(10) == records(2, 4)
+
+
+def test_missing_values_come_back_as_none(ring):
+    ring.push_many([(1, 1, None, 5), (2, 1, math.nan, 6), (3, 0, 7, 7)])
+    assert ring.pop_many(10) == [(1, 1, None, 5), (2, 1, None, 6), (3, 0, 7.0, 7)]
+
+
+def test_attached_ring_shares_the_records(ring):
+    lock = ring._lock
+    consumer = ReadingRing.attach(ring.name, lock)
+    try:
+        ring.push_many(records(0, 2))
+        assert consumer.pop_many(10) == records(0, 2)
+        assert ring.depth() == 0
+    finally:
+        consumer.close()
+
+
+def test_not_a_ring_is_rejected():
+    from multiprocessing.shared_memory import SharedMemory
+    shm = SharedMemory(create=True, size=512)
+    try:
+        with pytest.raises(ValueError):
+            ReadingRing.attach(shm.name, None)
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def test_held_lock_times_out_until_the_producer_is_retired(ring):
+    ring.push_many(records(0, 2))
+    # A producer that died holding the lock
+    assert ring._lock.acquire()
+    with pytest.raises(RingLockTimeout):
+        ring.pop_many(10)
+    ring.retire_producer()
+    assert ring.pop_many(10) == records(0, 2)
+
+
+def _produce(name, lock, count):
+    ring = ReadingRing.attach(name, lock)
+    sent = 0
+    while sent < count:
+        sent += ring.push_many(records(sent, min(50, count - sent)))
+    ring.close()
+
+
+def test_records_cross_processes_in_order():
+    context = multiprocessing.get_context("fork")
+    lock = context.Lock()
+    ring = ReadingRing.create(64, lock)
+    producer = context.Process(target=_produce, args=(ring.name, lock, 2000))
+    producer.start()
+    received = []
+    while len(received) < 2000:
+        received += ring.pop_many(100)
+    producer.join(5)
+    ring.close()
+    assert received == records(0, 2000)
+
+
+def test_shard_assignment_is_stable_and_covers_every_sensor():
+    config = AppConfig(sensors=[modbus_sensor(f"m{i}", i, device=f"plc{i % 5}") for i in range(20)]
+                       + [nmea_sensor("hdt", "HE", "HDT")],
+                       collectors={"modbus_collector": {"devices": {f"plc{i}": {"host": "127.0.0.1"}
+                                                                    for i in range(5)}}})
+    assert connection_units(config.sensors[3], config) == ["modbus:plc3"]
+    assert connection_units(config.sensors[-1], config) == ["nmea:default"]
+    assert shard_of("modbus:plc3", 4) == shard_of("modbus:plc3", 4)
+    shards = [shard_config(config, shard, 3) for shard in range(3)]
+    assert sorted(s.id for shard in shards for s in shard.sensors) == sorted(s.id for s in config.sensors)
+    for shard in shards:
+        assert not shard.mqtt_publisher.enabled and not shard.sharding.enabled
+        # A device is never split across workers
+        devices = {s.collector_config.device for s in shard.sensors if s.collector_type == "modbus_tcp"}
+        assert all(shard_of(f"modbus:{d}", 3) == shards.index(shard) for d in devices)
+
+
+def test_retired_ring_is_drained_past_a_batch_of_removed_sensors(monkeypatch):
+    monkeypatch.setattr(supervisor, "_DRAIN_BATCH", 2)
+
+    async def main():
+        shards = ShardSupervisor(AppConfig(sharding={"enabled": True, "workers": 1, "ring_capacity": 1024}))
+        shard = shards._shards[0]
+        retired = ReadingRing.create(8, multiprocessing.Lock())
+        # Sensors 0-3 were removed by a reload; only sensor 9 is still configured
+        retired.push_many(records(0, 4) + [(9, 0, 1.5, 2000)])
+        shard.retired_rings.append(retired)
+        shards._set_descriptors({"live": SensorDescriptor(9, "live", "C")})
+        shards._data_queue = asyncio.Queue()
+        shards._running = True
+        drain = asyncio.create_task(shards._drain())
+        while shard.retired_rings:
+            await asyncio.sleep(0.01)
+        shards._running = False
+        await drain
+        shard.ring.close()
+        return shards._data_queue.get_nowait()
+
+    reading = asyncio.run(main())
+    assert (reading.descriptor.sensor_id, reading.value) == ("live", 1.5)
@@ -0,0 +1,61 @@
+import asyncio
+
+from benchmarks.standins.modbus_server import ModbusServerStandIn
+from benchmarks.standins.nmea_emitter import SENTENCE_TEMPLATES, NmeaEmitterStandIn, emitter_sensors, with_checksum
+from src.collectors.modbus_tcp_client import PipelinedModbusTcpClient
+from src.collectors.nmea_framing import NmeaFramer, checksum_ok
+
+
+def test_emitted_sentences_frame_and_pass_the_checksum():
+    emitter = NmeaEmitterStandIn()
+    frames = NmeaFramer().feed(emitter._next_chunk(8))
+    assert len(frames) == 8 and all(checksum_ok(frame) for frame in frames)
+    assert with_checksum("GPGLL,5057.970,N,00146.110,E,142451,A") == b"$GPGLL,5057.970,N,00146.110,E,142451,A*27\r\n"
+    # Every template is used and consecutive values differ, so deadbands do not hide the load
+    assert {frame[1:6].decode() for frame in frames} == {address for address, _ in SENTENCE_TEMPLATES}
+    assert len(set(frames)) == 8
+
+
+def test_emitter_sensors_match_the_templates():
+    sensors = emitter_sensors()
+    assert [s["collector_config"]["expected_talker_id"] + s["collector_config"]["expected_sentence_type"]
+            for s in sensors] == [address for address, _ in SENTENCE_TEMPLATES]
+
+
+def test_tcp_emitter_streams_to_a_client():
+    async def main():
+        emitter = NmeaEmitterStandIn(rate=500.0)
+        port = await emitter.start()
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        framer, frames = NmeaFramer(), []
+        while len(frames) < 10:
+            frames += framer.feed(await asyncio.wait_for(reader.read(4096), 5))
+        writer.close()
+        await emitter.stop()
+        return frames
+
+    assert all(checksum_ok(frame) for frame in asyncio.run(main()))
+
+
+def test_modbus_server_serves_its_updated_registers():
+    async def main():
+        server = ModbusServerStandIn(registers=300, update_interval=0.05)
+        port = await server.start()
+        client = PipelinedModbusTcpClient("127.0.0.1", port, timeout=2.0)
+        assert await client.connect()
+        try:
+            for _ in range(100):
+                result = await client.read_holding_registers(0, 120, 1)
+                if result.registers[0]:
+                    break
+                await asyncio.sleep(0.02)
+            # The update loop writes base + i to every register, 120 registers per FC16 write
+            base = result.registers[0]
+            assert result.registers == [(base + i) & 0xFFFF for i in range(120)]
+            tail = await client.read_holding_registers(290, 10, 1)
+            assert len(tail.registers) == 10
+        finally:
+            client.close()
+            await server.stop()
+
+    asyncio.run(main())